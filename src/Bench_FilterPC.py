@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys, argparse, time
+import numpy as np
+from glob import glob
+from pprint import pprint
+
+# dsm_from_planetscope libraries
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import FilterPCFunc
+#-------------------------------------------------------------------
+# Usage
+#-------------------------------------------------------------------
+__title__=os.path.basename(sys.argv[0]).split('.')[0]
+__author__='Valentin Schmitt'
+__version__=1.0
+parser = argparse.ArgumentParser(description='''
+%s (v%.1f by %s):
+    Main Task
+Benchmark of the point cloud filter engines on synthetic tiles. Tiles
+follow the mss_main layout (1 km, buffered, renamed by km index) with a
+known set of low and high outliers. The native KD-tree engine is timed
+and, if the docker image is available, the PDAL pipeline as well. Both
+classifications are compared to the ground truth.
+
+**************************************************************************
+> Create synthetic tiles
+> Run native engine
+> Run PDAL engine (optional)
+> Compare classifications
+**************************************************************************
+'''% (__title__,__version__,__author__),
+formatter_class=argparse.RawDescriptionHelpFormatter)
+#-----------------------------------------------------------------------
+# Hard arguments
+#-----------------------------------------------------------------------
+nameFull='PC-Full-Tile_#.las'
+nameNative='PC-Native-Tile_{}.las'
+namePdal='PC-Pdal-Tile_{}.las'
+nameTruth='Truth-Tile_{}.npy'
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def SynthTiles(pathDir, nbTile, density, rateNoise, seed=0):
+    '''
+    Create a grid of synthetic tiles: smooth terrain, Gaussian noise,
+    low blunders (ELM targets) and high floating points (outlier targets).
+
+    pathDir (str): output directory
+    nbTile (int): tile number along one side
+    density (float): point density [pts/m2]
+    rateNoise (float): blunder rate
+    seed (int): random seed (default: 0)
+    out:
+        lstPath (list): tile paths
+    '''
+    import laspy
+    rng=np.random.default_rng(seed)
+    buffer=dicFilterPC['buffer']
+    nbPts=int(1000**2*density)
+    lstPath=[]
+    for x in range(nbTile):
+        for y in range(1, nbTile+1):
+            matPts=np.empty([nbPts, 3])
+            matPts[:,0]=rng.uniform(x*1000-buffer, (x+1)*1000+buffer, nbPts)
+            matPts[:,1]=rng.uniform((y-1)*1000-buffer, y*1000+buffer, nbPts)
+            matPts[:,2]=50*np.sin(matPts[:,0]/300)+30*np.cos(matPts[:,1]/200)+rng.normal(0, 0.3, nbPts)
+
+            vectTruth=np.zeros(nbPts, dtype=bool)
+            nbNoise=int(nbPts*rateNoise)
+            iNoise=rng.choice(nbPts, 2*nbNoise, replace=False)
+            matPts[iNoise[:nbNoise],2]-=rng.uniform(5, 50, nbNoise)
+            matPts[iNoise[nbNoise:],2]+=rng.uniform(100, 300, nbNoise)
+            vectTruth[iNoise]=True
+
+            header=laspy.LasHeader(point_format=1, version='1.2')
+            header.offsets=np.floor(np.amin(matPts, axis=0))
+            header.scales=np.array([0.01, 0.01, 0.01])
+            objLas=laspy.LasData(header)
+            objLas.x, objLas.y, objLas.z=matPts.T
+
+            strIndex='%i_%i'% (x, y)
+            pathOut=os.path.join(pathDir, nameFull.replace('#', strIndex))
+            objLas.write(pathOut)
+            np.save(os.path.join(pathDir, nameTruth.format(strIndex)), vectTruth)
+            lstPath.append(pathOut)
+
+    return lstPath
+
+def Compare(pathDir, nameOut):
+    '''
+    Compare filtered tiles with the ground truth.
+
+    pathDir (str): working directory
+    nameOut (str): filtered tile name with '{}'
+    out:
+        dicStat (dict): precision, recall and flagged point number
+    '''
+    tp, fp, fn=0, 0, 0
+    for pathTruth in glob(os.path.join(pathDir, nameTruth.format('*'))):
+        strIndex=os.path.basename(pathTruth).split('_', 1)[1].split('.')[0]
+        vectTruth=np.load(pathTruth)
+        objLas=FilterPCFunc.ReadLas(os.path.join(pathDir, nameOut.format(strIndex)))[0]
+        vectNoise=np.array(objLas.classification)==7
+        tp+=np.sum(vectNoise & vectTruth)
+        fp+=np.sum(vectNoise & ~vectTruth)
+        fn+=np.sum(~vectNoise & vectTruth)
+    return {'precision': tp/max(tp+fp, 1), 'recall': tp/max(tp+fn, 1), 'flagged': int(tp+fp)}
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    try:
+        print()
+        logger = SetupLogger(name=__title__)
+        #---------------------------------------------------------------
+        # Retrieval of arguments
+        #---------------------------------------------------------------
+        #Positional input
+        parser.add_argument('-o', required=True, help='Output working directory')
+
+        #Optional arguments
+        parser.add_argument('-n', type=int, default=3, help='Tile number along one side (default: 3)')
+        parser.add_argument('-d', type=float, default=0.0625, help='Point density [pts/m2] (default: 0.0625 means 1 pt per DSM cell)')
+        parser.add_argument('-noise', type=float, default=0.01, help='Blunder rate per type (default: 0.01)')
+        parser.add_argument('-proc', type=int, default=None, help='Process number (default: None means cpu number)')
+        parser.add_argument('-pdal', action='store_true', help='Run the PDAL docker pipeline as well')
+
+        args = parser.parse_args()
+
+        #---------------------------------------------------------------
+        # Check input
+        #---------------------------------------------------------------
+        if not FilterPCFunc.checkLaspy: raise RuntimeError("laspy is required")
+        if not os.path.isdir(args.o): os.mkdir(args.o)
+        args.o=os.path.abspath(args.o)
+        [os.remove(pathCur) for pathCur in glob(os.path.join(args.o, '*Tile_*'))]
+
+        logger.info("Arguments: " + str(vars(args)))
+        #sys.exit()
+        #---------------------------------------------------------------
+        # Create synthetic tiles
+        #---------------------------------------------------------------
+        logger.info('# Create synthetic tiles')
+        lstTilePath=SynthTiles(args.o, args.n, args.d, args.noise)
+        logger.info('%i tiles of %i points'% (len(lstTilePath), int(1e6*args.d)))
+        dicTime={}
+
+        #---------------------------------------------------------------
+        # Run native engine
+        #---------------------------------------------------------------
+        logger.info('# Run native engine')
+        timeStart=time.time()
+        FilterPCFunc.FilterTilesNative(lstTilePath,
+                                       os.path.join(args.o, nameFull),
+                                       os.path.join(args.o, nameNative),
+                                       nbProc=args.proc)
+        dicTime['native']=time.time()-timeStart
+
+        #---------------------------------------------------------------
+        # Run PDAL engine
+        #---------------------------------------------------------------
+        if args.pdal:
+            logger.info('# Run PDAL engine')
+            from BlockProc import DockerLibs, MSSFunc
+            from multiprocessing import Pool
+            pdal=DockerLibs.PdalPython()
+            objPath=PathCur(args.o, 'Bench', '', checkRoutine=False)
+            os.makedirs(objPath.pPdalDir, exist_ok=True)
+            MSSFunc.PdalJson(objPath)
+
+            def Filtering(pathIn):
+                strIndex=os.path.basename(pathIn).split('_', 1)[1].split('.')[0]
+                subArgs=[objPath.pJsonFilter,
+                        '--readers.las.filename=%s'% pathIn,
+                        '--writers.las.filename=%s'% os.path.join(args.o, namePdal.format(strIndex))]
+                return pdal.pipeline(subArgs)
+
+            timeStart=time.time()
+            with Pool(args.proc) as poolCur:
+                poolCur.map(Filtering, lstTilePath)
+            dicTime['pdal']=time.time()-timeStart
+
+        #---------------------------------------------------------------
+        # Compare classifications
+        #---------------------------------------------------------------
+        logger.info('# Compare classifications')
+        for engine in dicTime:
+            dicStat=Compare(args.o, {'native': nameNative, 'pdal': namePdal}[engine])
+            logger.info('%s: %.2f s, precision %.3f, recall %.3f, %i flagged'% (engine,
+                                                                                dicTime[engine],
+                                                                                dicStat['precision'],
+                                                                                dicStat['recall'],
+                                                                                dicStat['flagged']))
+
+    #---------------------------------------------------------------
+    # Exception management
+    #---------------------------------------------------------------
+    except RuntimeError as msg:
+        logger.critical(msg)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys, argparse, time
+import json
+from subprocess import run as Run
+from subprocess import PIPE
+from pprint import pprint
+
+# dsm_from_planetscope libraries
+from OutLib.LoggerFunc import *
+from VarCur import *
+#-------------------------------------------------------------------
+# Usage
+#-------------------------------------------------------------------
+__title__=os.path.basename(sys.argv[0]).split('.')[0]
+__author__='Valentin Schmitt'
+__version__=1.0
+parser = argparse.ArgumentParser(description='''
+%s (v%.1f by %s):
+    Main Task
+Benchmark of the start-up time of the entry scripts and of the library
+modules. Each command runs in a new interpreter with -X importtime:
+the wall time is the best of several runs, the import profile gives the
+heaviest imports and the heavy libraries loaded (OpenCV, rasterio,
+shapely, sklearn, scipy, pyproj, ...). Heavy libraries are imported at
+their first use (OutLib.LazyFunc), so the help of a script should not
+load any of them.
+
+**************************************************************************
+> Time script start-up (default: -h)
+> Time library module imports
+> Import profile and heavy libraries per command
+> Check the time limit
+**************************************************************************
+'''% (__title__,__version__,__author__),
+formatter_class=argparse.RawDescriptionHelpFormatter)
+#-----------------------------------------------------------------------
+# Hard arguments
+#-----------------------------------------------------------------------
+lstScript=['ssbp_main.py', 'pct_main.py', 'asfm_main.py', 'mss_main.py', 'dag_main.py', 'worker_main.py', 'main.py', 'Visu_Telemetry.py']
+lstModule=['VarCur', 'OutLib.LoggerFunc', 'SSBP.blockFunc', 'PCT.dataFunc']+['BlockProc.%s'% name for name in ('DockerLibs', 'ExecFunc', 'MSSFunc', 'ASfMFunc', 'FilterPCFunc', 'GdalFunc', 'DagFunc', 'QueueFunc')]
+lstHeavy=['cv2', 'rasterio', 'shapely', 'sklearn', 'scipy', 'pyproj', 'matplotlib', 'laspy', 'pdal', 'requests', 'osgeo']
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def ImportProfile(strErr):
+    '''
+    Parse the -X importtime output.
+
+    strErr (str): standard error of the command
+    out:
+        dicImport (dict): cumulative import time [s] per module
+    '''
+    dicImport={}
+    for lineCur in strErr.splitlines():
+        if not lineCur.startswith('import time:') or 'self [us]' in lineCur: continue
+        lstPart=lineCur[12:].split('|')
+        dicImport[lstPart[2].strip()]=int(lstPart[1])*1e-6
+    return dicImport
+
+def TimeCmd(lstCmd, nbRun, dirCur):
+    '''
+    Best wall time of a command and its import profile.
+
+    lstCmd (list): command line
+    nbRun (int): run number
+    dirCur (str): working directory
+    out:
+        dicOut (dict): 'wall' [s], 'code' (exit code), 'top' (heaviest top-level imports), 'heavy' (heavy libraries loaded)
+    '''
+    lstWall=[]
+    for i in range(nbRun):
+        timeStart=time.time()
+        out=Run([sys.executable, '-X', 'importtime']+lstCmd, cwd=dirCur, stdout=PIPE, stderr=PIPE)
+        lstWall.append(time.time()-timeStart)
+    dicImport=ImportProfile(out.stderr.decode('utf-8', 'replace'))
+    lstTop=sorted([(name, t) for name, t in dicImport.items() if not '.' in name], key=lambda tup: -tup[1])
+    return {'wall': min(lstWall),
+            'code': out.returncode,
+            'top': [(name, round(t, 3)) for name, t in lstTop[:args.top]],
+            'heavy': sorted(set([name.split('.')[0] for name in dicImport])&set(lstHeavy)),
+            }
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    try:
+        print()
+        logger = SetupLogger(name=__title__)
+        #---------------------------------------------------------------
+        # Retrieval of arguments
+        #---------------------------------------------------------------
+        #Optional arguments
+        parser.add_argument('-s', nargs='*', default=lstScript, help='Scripts to time (default: all entry scripts)')
+        parser.add_argument('-m', nargs='*', default=lstModule, help='Library modules to time (default: main modules)')
+        parser.add_argument('-args', default='-h', help='Script arguments (default: -h)')
+        parser.add_argument('-n', type=int, default=3, help='Run number, the best time is kept (default: 3)')
+        parser.add_argument('-top', type=int, default=3, help='Heaviest imports reported (default: 3)')
+        parser.add_argument('-limit', type=float, default=1.0, help='Script start-up limit [s] (default: 1.0)')
+        parser.add_argument('-o', default=None, help='Output JSON file (default: None)')
+
+        args = parser.parse_args()
+
+        #---------------------------------------------------------------
+        # Check input
+        #---------------------------------------------------------------
+        dirSrc=os.path.dirname(os.path.abspath(__file__))
+        lstMiss=[name for name in args.s if not os.path.isfile(os.path.join(dirSrc, name))]
+        if lstMiss: raise RuntimeError("Scripts not found: %s"% ', '.join(lstMiss))
+        if args.n<1: raise RuntimeError("Run number must be positive")
+
+        logger.info("Arguments: " + str(vars(args)))
+        #sys.exit()
+        dicOut={'python': sys.version.split()[0], 'baseline': None, 'scripts': {}, 'modules': {}}
+
+        #---------------------------------------------------------------
+        # Interpreter baseline
+        #---------------------------------------------------------------
+        logger.info('# Interpreter baseline')
+        dicOut['baseline']=TimeCmd(['-c', 'pass'], args.n, dirSrc)['wall']
+        logger.info('python -c pass: %.3f s'% dicOut['baseline'])
+
+        #---------------------------------------------------------------
+        # Time script start-up
+        #---------------------------------------------------------------
+        logger.info('# Time script start-up (%s)'% args.args)
+        for nameScript in args.s:
+            dicCur=TimeCmd([nameScript]+args.args.split(), args.n, dirSrc)
+            dicOut['scripts'][nameScript]=dicCur
+            logger.info('%-20s %.3f s (exit %i) heavy: %s | top: %s'% (nameScript,
+                                                                    dicCur['wall'],
+                                                                    dicCur['code'],
+                                                                    ', '.join(dicCur['heavy']) or '-',
+                                                                    ', '.join(['%s %.3f'% tup for tup in dicCur['top']])))
+
+        #---------------------------------------------------------------
+        # Time library module imports
+        #---------------------------------------------------------------
+        logger.info('# Time library module imports')
+        for nameModule in args.m:
+            dicCur=TimeCmd(['-c', 'import %s'% nameModule], args.n, dirSrc)
+            dicOut['modules'][nameModule]=dicCur
+            logger.info('%-25s %.3f s (exit %i) heavy: %s'% (nameModule, dicCur['wall'], dicCur['code'], ', '.join(dicCur['heavy']) or '-'))
+
+        #---------------------------------------------------------------
+        # Check the time limit
+        #---------------------------------------------------------------
+        logger.info('# Check the time limit')
+        lstSlow=[name for name, dicCur in dicOut['scripts'].items() if dicCur['wall']>args.limit]
+        lstFail=[name for name, dicCur in list(dicOut['scripts'].items())+list(dicOut['modules'].items()) if dicCur['code']]
+        if lstFail: logger.error('Failed commands: %s'% ', '.join(lstFail))
+        if lstSlow:
+            logger.error('Start-up above %.1f s: %s'% (args.limit, ', '.join(lstSlow)))
+        else:
+            logger.info('All scripts start below %.1f s'% args.limit)
+
+        if args.o:
+            with open(args.o, 'w') as fileOut:
+                json.dump(dicOut, fileOut, indent=2)
+            logger.info('Results: %s'% args.o)
+
+    #---------------------------------------------------------------
+    # Exception management
+    #---------------------------------------------------------------
+    except RuntimeError as msg:
+        logger.critical(msg)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys, argparse, time
+import numpy as np
+import rasterio
+from glob import glob
+from pprint import pprint
+
+from importlib.util import find_spec
+checkPlanetCommon=find_spec('planet_opencv3') is not None
+if checkPlanetCommon:
+    from planet_opencv3 import cv2 as cv
+else:
+    import cv2 as cv
+
+# dsm_from_planetscope libraries
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import SGMFunc
+#-------------------------------------------------------------------
+# Usage
+#-------------------------------------------------------------------
+__title__=os.path.basename(sys.argv[0]).split('.')[0]
+__author__='Valentin Schmitt'
+__version__=1.0
+parser = argparse.ArgumentParser(description='''
+%s (v%.1f by %s):
+    Main Task
+Benchmark of the dense matching backends. The SGM backend runs either
+on a synthetic epipolar pair with a known disparity surface or on an
+epipolar pair prepared by mss_main (EpipPreProc files). In the second
+case, the ASP disparity (-F.tif from parallel_stereo) must exist and is
+used as reference. Throughput and disparity differences are reported.
+
+**************************************************************************
+> Create synthetic pair or read ASP reference
+> Run SGM backend
+> Compare disparities
+**************************************************************************
+'''% (__title__,__version__,__author__),
+formatter_class=argparse.RawDescriptionHelpFormatter)
+#-----------------------------------------------------------------------
+# Hard arguments
+#-----------------------------------------------------------------------
+prefSynth='Synth'
+extRef='-F_ref.tif'
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def SynthPair(prefOut, size, dispMax, seed=0):
+    '''
+    Create a synthetic epipolar pair: multi-scale random texture on the
+    left, right image warped with a smooth horizontal disparity surface
+    (ASP convention: right=left+dx). Masks are full.
+
+    prefOut (str): output prefix
+    size (int): image side [pxl]
+    dispMax (float): disparity amplitude [pxl]
+    seed (int): random seed (default: 0)
+    out:
+        matTruth (array): true horizontal disparity of the left image
+    '''
+    rng=np.random.default_rng(seed)
+    imgL=np.zeros([size, size], dtype=np.float32)
+    for scale in (1, 4, 16):
+        matNoise=rng.random([size//scale+1, size//scale+1]).astype(np.float32)
+        imgL+=cv.resize(matNoise, (size, size), interpolation=cv.INTER_CUBIC)[:size, :size]/scale
+    imgL=(imgL-imgL.min())/(imgL.max()-imgL.min())
+
+    matRow, matCol=np.mgrid[0:size, 0:size].astype(np.float32)
+    matTruth=(dispMax*np.sin(matCol/size*np.pi)*np.cos(matRow/size*np.pi)-dispMax/2).astype(np.float32)
+    # right(x+dx)=left(x), dx smooth enough to be read at the right position
+    imgR=cv.remap(imgL, matCol-matTruth, matRow, interpolation=cv.INTER_LINEAR, borderMode=cv.BORDER_REFLECT)
+
+    matMask=np.full([size, size], 255, dtype=np.uint8)
+    cv.imwrite(prefOut+'-L.tif', imgL)
+    cv.imwrite(prefOut+'-R.tif', imgR)
+    cv.imwrite(prefOut+'-lMask.tif', matMask)
+    cv.imwrite(prefOut+'-rMask.tif', matMask)
+    return matTruth
+
+def Compare(pathDisp, matRef, maskRef=None):
+    '''
+    Compare a disparity image (-F.tif) with a reference.
+
+    pathDisp (str): disparity path
+    matRef (array): reference horizontal disparity
+    maskRef (array): reference validity (default: None means all)
+    out:
+        dicStat (dict): valid ratio, median and NMAD of the difference, blunder ratio (>1 pxl)
+    '''
+    with rasterio.open(pathDisp) as imgIn:
+        matDx, maskValid=imgIn.read(1), imgIn.read(3)>0
+    if maskRef is not None: maskValid&=maskRef
+    vectDiff=(matDx-matRef)[maskValid]
+    if not vectDiff.size: return {'valid': 0, 'median': np.nan, 'nmad': np.nan, 'blunder': np.nan}
+    med=np.median(vectDiff)
+    return {'valid': vectDiff.size/matRef.size,
+            'median': med,
+            'nmad': 1.4826*np.median(np.abs(vectDiff-med)),
+            'blunder': np.sum(np.abs(vectDiff)>1)/vectDiff.size}
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    try:
+        print()
+        logger = SetupLogger(name=__title__)
+        #---------------------------------------------------------------
+        # Retrieval of arguments
+        #---------------------------------------------------------------
+        #Positional input
+        parser.add_argument('-o', required=True, help='Output working directory')
+
+        #Optional arguments
+        parser.add_argument('-pref', default=None, help='Stereo prefix of an mss_main epipolar pair with ASP -F.tif (default: None means synthetic pair)')
+        parser.add_argument('-s', type=int, default=2048, help='Synthetic image side [pxl] (default: 2048)')
+        parser.add_argument('-d', type=float, default=20, help='Synthetic disparity amplitude [pxl] (default: 20)')
+        parser.add_argument('-proc', type=int, default=None, help='Process number (default: None means cpu number)')
+
+        args = parser.parse_args()
+
+        #---------------------------------------------------------------
+        # Check input
+        #---------------------------------------------------------------
+        if not os.path.isdir(args.o): os.mkdir(args.o)
+        args.o=os.path.abspath(args.o)
+        if args.pref and not os.path.exists(args.pref+'-F.tif'): raise RuntimeError("ASP disparity not found: %s"% (args.pref+'-F.tif'))
+
+        logger.info("Arguments: " + str(vars(args)))
+        #sys.exit()
+        #---------------------------------------------------------------
+        # Create synthetic pair or read ASP reference
+        #---------------------------------------------------------------
+        if args.pref:
+            logger.info('# Read ASP reference')
+            prefIn=os.path.join(args.o, os.path.basename(args.pref))
+            for ext in ('-L.tif', '-R.tif', '-lMask.tif', '-rMask.tif'):
+                os.system('cp %s %s'% (args.pref+ext, prefIn+ext))
+            with rasterio.open(args.pref+'-F.tif') as imgIn:
+                matRef, maskRef=imgIn.read(1), imgIn.read(3)>0
+            lstRange=[np.floor(np.amin(matRef[maskRef])), 0, np.ceil(np.amax(matRef[maskRef])), 0]
+        else:
+            logger.info('# Create synthetic pair')
+            prefIn=os.path.join(args.o, prefSynth)
+            matRef=SynthPair(prefIn, args.s, args.d)
+            maskRef=None
+            lstRange=[np.floor(np.amin(matRef))-2, 0, np.ceil(np.amax(matRef))+2, 0]
+        logger.info('Image: %i x %i, range: %s'% (matRef.shape[1], matRef.shape[0], str(lstRange)))
+
+        #---------------------------------------------------------------
+        # Run SGM backend
+        #---------------------------------------------------------------
+        logger.info('# Run SGM backend')
+        timeStart=time.time()
+        out=SGMFunc.MatchPair(prefIn, corrSearch=lstRange, nbProc=args.proc)
+        timeSgm=time.time()-timeStart
+        if out: raise RuntimeError("SGM matching failed")
+
+        #---------------------------------------------------------------
+        # Compare disparities
+        #---------------------------------------------------------------
+        logger.info('# Compare disparities')
+        dicStat=Compare(prefIn+'-F.tif', matRef, maskRef=maskRef)
+        logger.info('SGM: %.2f s (%.2f Mpxl/s), valid %.3f, median %.3f, NMAD %.3f, blunder %.4f'% (timeSgm,
+                                                                                               matRef.size/timeSgm/1e6,
+                                                                                               dicStat['valid'],
+                                                                                               dicStat['median'],
+                                                                                               dicStat['nmad'],
+                                                                                               dicStat['blunder']))
+
+    #---------------------------------------------------------------
+    # Exception management
+    #---------------------------------------------------------------
+    except RuntimeError as msg:
+        logger.critical(msg)
@@ -8,28 +8,22 @@ from glob import glob
 from math import sin, cos, asin, acos, tan, atan2, pi, ceil
 import numpy as np
 from numpy.linalg import norm, inv, lstsq, det, svd, matrix_rank, qr
-from scipy.linalg import expm
-from scipy.optimize import least_squares
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-import rasterio
-
 from pprint import pprint
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-from mpl_toolkits.mplot3d import Axes3D
+
+from OutLib.LazyFunc import LazyImport
+scipyLinalg=LazyImport('scipy.linalg')
 
 from importlib.util import find_spec
 checkPlanetCommon=find_spec('planet_opencv3') is not None
 if checkPlanetCommon:
     from planet_opencv3 import cv2 as cv
 else:
-    import cv2 as cv
+    cv=LazyImport('cv2')
 
 
 from OutLib.LoggerFunc import *
 from VarCur import *
-from BlockProc import GeomFunc
+from BlockProc import GeomFunc, RasterFunc, DockerLibs
 from PCT import pipelDFunc
 
 #-----------------------------------------------------------------------
@@ -389,7 +383,7 @@ class SubArgs_BunAdj:
         #args[args.index('--num-passes')+1]='2' # iteration number
         return args
 
-def SingleBandImg(pathIn, pathOut, imgType='green'):
+def SingleBandImg(pathIn, pathOut, imgType='green', gdal=None):
     '''
     Convert image to a single band image for further process.
     The single band is extracted accroting to the type argument.
@@ -398,13 +392,16 @@ def SingleBandImg(pathIn, pathOut, imgType='green'):
     pathIn (str): input path
     pathOut (str): output path
     imgType ('green'|'hsv'): extraction mode (default: green)
+    gdal (obj): GDAL python interface for green (default: None means default backend)
     out:
         process output
     '''
     if imgType=='green':
-        cmd='gdal_translate -b 2 -of GTiff -co PROFILE=BASELINE -q %s %s'% (pathIn, pathOut)
-        cmd+=' ; rm {0}RPB ; rm {0}tif.aux.xml'.format(pathOut[:-3])
-        return os.system(cmd)
+        if gdal is None: gdal=DockerLibs.GdalPython()
+        out=gdal.gdal_translate(['-b', '2', '-of', 'GTiff', '-co', 'PROFILE=BASELINE', '-q', pathIn, pathOut])
+        for pathCur in (pathOut[:-3]+'RPB', pathOut+'.aux.xml'):
+            if os.path.exists(pathCur): os.remove(pathCur)
+        return out
     elif imgType=='hsv':
         img = cv.imread(pathIn, cv.IMREAD_LOAD_GDAL+(-1)) # equivalent to 'cv.IMREAD_ANYDEPTH + cv.IMREAD_COLOR'
         
@@ -419,7 +416,7 @@ def SingleBandImg(pathIn, pathOut, imgType='green'):
             imgHSV=np.append(imgHSV_n[:,:,[0]], imgHSV_n[:,:,1:]*65535, axis=2).astype(np.uint16)
         
         # Img[hue, saturation, value]
-        cv.imwrite(pathOut, imgHSV[:,:,-1])
+        RasterFunc.WriteRaster(pathOut, imgHSV[:,:,-1])
 
     elif imgType=='hls':
         img = cv.imread(pathIn, cv.IMREAD_LOAD_GDAL+(-1)) # equivalent to 'cv.IMREAD_ANYDEPTH + cv.IMREAD_COLOR'
@@ -435,7 +432,7 @@ def SingleBandImg(pathIn, pathOut, imgType='green'):
             imgHLS=np.append(imgHLS_n[:,:,[0]], imgHLS_n[:,:,1:]*65535, axis=2).astype(np.uint16)
         
         # Img[hue, lightness, saturation]
-        cv.imwrite(pathOut, imgHLS[:,:,1])
+        RasterFunc.WriteRaster(pathOut, imgHLS[:,:,1])
     else:
         SubLogger('CRITICAL', 'Unknown imgType: %s'% imgType)
 
@@ -671,7 +668,7 @@ def PnP_OCV(sceneId, pathRpcIn, pathCamOut):
     # Old scipy version on planet_common
     #from scipy.spatial.transform import Rotation as R
     #matR=R.from_rotvec(vectR.flatten()).as_matrix()
-    matR=expm(np.cross(np.eye(3), vectR.flatten()))
+    matR=scipyLinalg.expm(np.cross(np.eye(3), vectR.flatten()))
     
     # Update camera
     setattr(objCamOut, 'R', matR.T.flatten())
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import json
+import logging
+import shlex
+import shutil
+from glob import glob
+from math import floor
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+rioTransform=LazyImport('rasterio.transform')
+
+from importlib.util import find_spec
+checkLaspy=find_spec('laspy') is not None
+if checkLaspy:
+    laspy=LazyImport('laspy')
+checkPdal=find_spec('pdal') is not None
+if checkPdal:
+    pdalPy=LazyImport('pdal')
+checkPyproj=find_spec('pyproj') is not None
+if checkPyproj:
+    pyproj=LazyImport('pyproj')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import RasterFunc, GdalFunc
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['lstBackend', 'SplitArgs', 'ParseArgs', 'Function', 'RunFunction']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+lstBackend=('docker', 'native', 'inproc', 'stub')
+# Options without value and options with several values (shell tokens)
+setFlag={'-q', '-quiet', '--quiet', '-overwrite', '-separate', '-nomd', '-stats', '-v', '--summary', '--refine-camera', '--compute-error-vector', '--skip-rough-homography'}
+dicNarg={'-init': 1, '--calc': 1, '-outsize': 2, '-ps': 2, '-srcwin': 4, '-projwin': 4, '-a_ullr': 4, '-ul_lr': 4, '--corr-search': 4}
+# PDAL dimensions in laspy
+dicLasDim={'X': 'x', 'Y': 'y', 'Z': 'z', 'Intensity': 'intensity', 'Classification': 'classification',
+           'PointSourceId': 'point_source_id', 'ScanAngleRank': 'scan_angle_rank'}
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def SplitArgs(subArgs):
+    '''
+    Split an argument list as the shell does (tokens with spaces, quotes)
+    and separate the shell suffix from the first unquoted ';' (e.g.
+    '; rm a ; rm b'). The suffix is kept verbatim for the host shell, as
+    in the docker command line.
+
+    subArgs (list): argument list
+    out:
+        lstTok (list): tokens
+        strShell (str): shell suffix ('' if none)
+    '''
+    strArgs=' '.join(subArgs)
+    charQuote, checkEsc=None, False
+    for i, charCur in enumerate(strArgs):
+        if checkEsc:
+            checkEsc=False
+        elif charQuote:
+            if charCur==charQuote: charQuote=None
+            elif charCur=='\\' and charQuote=='"': checkEsc=True
+        elif charCur in '\'"':
+            charQuote=charCur
+        elif charCur=='\\':
+            checkEsc=True
+        elif charCur==';':
+            return shlex.split(strArgs[:i]), strArgs[i+1:].strip()
+    return shlex.split(strArgs), ''
+
+def _IsNumber(strIn):
+    try:
+        float(strIn)
+    except ValueError:
+        return False
+    return True
+
+def ParseArgs(lstTok):
+    '''
+    Parse command tokens into options and positional arguments.
+
+    lstTok (list): tokens (SplitArgs)
+    out:
+        dicOpt (dict): {option: [[values], ...]} (repeated options kept in order)
+        lstPos (list): positional arguments
+    '''
+    dicOpt, lstPos={}, []
+    i=0
+    while i<len(lstTok):
+        tok=lstTok[i]
+        if not tok.startswith('-') or _IsNumber(tok):
+            lstPos.append(tok)
+            i+=1
+            continue
+        if tok.startswith('--') and '=' in tok:
+            strOpt, strVal=tok.split('=', 1)
+            dicOpt.setdefault(strOpt, []).append([strVal])
+            i+=1
+            continue
+        if tok in setFlag:
+            n=0
+        elif tok in dicNarg:
+            n=dicNarg[tok]
+        else:
+            n=int(i+1<len(lstTok) and (not lstTok[i+1].startswith('-') or _IsNumber(lstTok[i+1])))
+        dicOpt.setdefault(tok, []).append(lstTok[i+1:i+1+n])
+        i+=1+n
+    return dicOpt, lstPos
+
+def _Opt(dicOpt, strOpt, default=None):
+    '''Last value of an option'''
+    if not strOpt in dicOpt or not dicOpt[strOpt][-1]: return default
+    return dicOpt[strOpt][-1][0]
+
+def _ImgShape(pathImg, default=(256, 256)):
+    '''Image shape (rows, cols), default if unreadable'''
+    try:
+        with rasterio.open(pathImg) as imgIn:
+            return imgIn.height, imgIn.width
+    except (rasterio.errors.RasterioError, TypeError):
+        return default
+
+#-----------------------------------------------------------------------
+# Point clouds
+#-----------------------------------------------------------------------
+def _ReadPoints(dicBrick):
+    '''Read a reader stage into {dimension: array} and its srs'''
+    pathIn=dicBrick['filename']
+    if pathIn.endswith('.txt') or dicBrick['type']=='readers.text':
+        with open(pathIn) as fileIn:
+            lstName=fileIn.readline().replace(',', ' ').split()
+        matPts=np.loadtxt(pathIn, skiprows=1, ndmin=2, delimiter=None)
+        dicPts={lstName[i]: matPts[:, i] for i in range(len(lstName))}
+    else:
+        if not checkLaspy: raise RuntimeError('laspy is required to read %s'% pathIn)
+        objLas=laspy.read(pathIn)
+        dicPts={dim: np.asarray(objLas[dicLasDim[dim]], dtype=float) for dim in dicLasDim if dicLasDim[dim] in objLas.point_format.dimension_names or dim in 'XYZ'}
+    return dicPts, dicBrick.get('override_srs', dicBrick.get('spatialreference'))
+
+def _WritePoints(pathOut, dicPts):
+    '''Write {dimension: array} as .las (point format 1)'''
+    if not checkLaspy: raise RuntimeError('laspy is required to write %s'% pathOut)
+    header=laspy.LasHeader(point_format=1, version='1.2')
+    matXyz=np.array([dicPts['X'], dicPts['Y'], dicPts['Z']]).T if len(dicPts['X']) else np.zeros([1, 3])
+    header.offsets=np.floor(np.amin(matXyz, axis=0))
+    header.scales=np.array([0.01, 0.01, 0.01])
+    objLas=laspy.LasData(header)
+    objLas.x, objLas.y, objLas.z=dicPts['X'], dicPts['Y'], dicPts['Z']
+    for dim in ('Intensity', 'Classification', 'PointSourceId', 'ScanAngleRank'):
+        if not dim in dicPts: continue
+        dtypeCur=objLas[dicLasDim[dim]].dtype
+        infoCur=np.iinfo(dtypeCur)
+        objLas[dicLasDim[dim]]=np.clip(np.round(dicPts[dim]), infoCur.min, infoCur.max).astype(dtypeCur)
+    objLas.write(pathOut)
+    return 0
+
+def _PipelineBricks(pathJson, dicOpt):
+    '''
+    Pipeline stages as dictionaries with the command line overrides
+    (--<type>.<option>=value, --stage.<tag>.<option>=value) applied.
+    '''
+    with open(pathJson) as fileIn:
+        jsonPipe=json.load(fileIn)
+    lstIn=jsonPipe['pipeline'] if type(jsonPipe)==dict else jsonPipe
+    dicExt={'.las': 'las', '.laz': 'las', '.txt': 'text', '.tif': 'gdal'}
+    lstBrick=[]
+    for i in range(len(lstIn)):
+        brick=dict(lstIn[i]) if type(lstIn[i])==dict else {'filename': lstIn[i]}
+        if not 'type' in brick:
+            strKind='writers' if i==len(lstIn)-1 and i else 'readers'
+            brick['type']='%s.%s'% (strKind, dicExt.get(os.path.splitext(brick.get('filename', ''))[1], 'las'))
+        lstBrick.append(brick)
+
+    for strOpt in dicOpt:
+        if not strOpt.startswith('--') or not '.' in strOpt: continue
+        lstKey=strOpt[2:].split('.')
+        strVal=dicOpt[strOpt][-1][0] if dicOpt[strOpt][-1] else ''
+        for brick in lstBrick:
+            if lstKey[0]=='stage' and brick.get('tag')==lstKey[1]:
+                brick[lstKey[2]]=strVal
+            elif '.'.join(lstKey[:2])==brick['type']:
+                brick[lstKey[2]]=strVal
+    return lstBrick
+
+def _StubPipeline(lstTok):
+    '''
+    Light point cloud pipeline: readers (las, text), reprojection,
+    crop, ferry and assign filters are applied, other filters pass points
+    through, writers.las writes them and writers.gdal bins them on the
+    output grid (count, mean, stdev, min, max).
+    '''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    lstBrick=_PipelineBricks(lstPos[0], dicOpt)
+    dicPts, srsCur=None, None
+    for brick in lstBrick:
+        strType=brick['type']
+        if strType.startswith('readers'):
+            dicNew, srsNew=_ReadPoints(brick)
+            if dicPts is None:
+                dicPts, srsCur=dicNew, srsNew
+            else:
+                dicPts={dim: np.append(dicPts[dim], dicNew[dim]) for dim in dicPts if dim in dicNew}
+        elif strType=='filters.reprojection':
+            srsOut=brick.get('out_srs', '').strip('"')
+            srsIn=brick.get('in_srs', srsCur)
+            if checkPyproj and srsIn and srsOut and not srsOut=='EPSG:0':
+                objTrans=pyproj.Transformer.from_crs(srsIn, srsOut, always_xy=True)
+                dicPts['X'], dicPts['Y'], dicPts['Z']=objTrans.transform(dicPts['X'], dicPts['Y'], dicPts['Z'])
+            srsCur=srsOut or srsCur
+        elif strType=='filters.crop' and 'bounds' in brick:
+            vectB=[float(v) for v in brick['bounds'].replace('(', ' ').replace(')', ' ').replace('[', ' ').replace(']', ' ').replace(',', ' ').split()]
+            mask=(dicPts['X']>=vectB[0]) & (dicPts['X']<=vectB[1]) & (dicPts['Y']>=vectB[2]) & (dicPts['Y']<=vectB[3])
+            dicPts={dim: dicPts[dim][mask] for dim in dicPts}
+        elif strType=='filters.ferry':
+            for strFerry in brick.get('dimensions', []):
+                strDim=strFerry.split('=>')[-1].strip()
+                if not strDim in dicPts: dicPts[strDim]=np.zeros_like(dicPts['X'])
+        elif strType=='filters.assign' and 'value' in brick:
+            strDim, strExpr=[s.strip() for s in brick['value'].strip('"').split('=', 1)]
+            dicPts[strDim]=np.broadcast_to(eval(strExpr, {'__builtins__': {}}, dict(dicPts)), dicPts['X'].shape).astype(float)
+        elif strType=='writers.las':
+            _WritePoints(brick['filename'], dicPts)
+        elif strType=='writers.gdal':
+            _StubGdalWriter(brick, dicPts, srsCur)
+    return 0, ''
+
+def _StubGdalWriter(brick, dicPts, srsCur):
+    '''writers.gdal with cell binning instead of the radius search'''
+    res=float(brick.get('resolution', gsdDsm))
+    if 'origin_x' in brick and 'width' in brick:
+        xOri, yOri=float(brick['origin_x']), float(brick['origin_y'])
+        nbCol, nbRow=int(brick['width']), int(brick['height'])
+    else:
+        xOri, yOri=np.amin(dicPts['X']), np.amin(dicPts['Y'])
+        nbCol=int((np.amax(dicPts['X'])-xOri)//res)+1
+        nbRow=int((np.amax(dicPts['Y'])-yOri)//res)+1
+    yTop=yOri+nbRow*res
+    nodata=float(brick.get('nodata', -9999))
+    strType=brick.get('output_type', 'mean')
+    lstType=['min', 'max', 'mean', 'idw', 'count', 'stdev'] if strType=='all' else [s.strip() for s in strType.split(',')]
+
+    vectCol=np.floor((dicPts['X']-xOri)/res).astype(int)
+    vectRow=np.floor((yTop-dicPts['Y'])/res).astype(int)
+    mask=(vectCol>=0) & (vectCol<nbCol) & (vectRow>=0) & (vectRow<nbRow)
+    vectIdx=vectRow[mask]*nbCol+vectCol[mask]
+    vectVal=dicPts[brick.get('dimension', 'Z')][mask]
+    vectCount=np.bincount(vectIdx, minlength=nbRow*nbCol).astype(float)
+    vectSum=np.bincount(vectIdx, weights=vectVal, minlength=nbRow*nbCol)
+    vectSq=np.bincount(vectIdx, weights=vectVal**2, minlength=nbRow*nbCol)
+    maskData=vectCount>0
+    lstBand=[]
+    for strCur in lstType:
+        vectOut=np.full(nbRow*nbCol, nodata)
+        if strCur=='count':
+            vectOut=vectCount
+        elif strCur in ('mean', 'idw'):
+            vectOut[maskData]=vectSum[maskData]/vectCount[maskData]
+        elif strCur=='stdev':
+            vectMean=vectSum[maskData]/vectCount[maskData]
+            vectOut[maskData]=np.sqrt(np.maximum(vectSq[maskData]/vectCount[maskData]-vectMean**2, 0))
+        elif strCur in ('min', 'max'):
+            funAt=np.minimum.at if strCur=='min' else np.maximum.at
+            vectTmp=np.full(nbRow*nbCol, np.inf if strCur=='min' else -np.inf)
+            funAt(vectTmp, vectIdx, vectVal)
+            vectOut[maskData]=vectTmp[maskData]
+        lstBand.append(vectOut.reshape(nbRow, nbCol))
+
+    profOut=RasterFunc.Profile(nbCol, nbRow, count=len(lstBand), dtype=brick.get('data_type', 'float32'), nodata=nodata)
+    profOut.update({'transform': rioTransform.from_origin(xOri, yTop, res, res)})
+    if srsCur and not srsCur=='EPSG:0': profOut['crs']=srsCur
+    with rasterio.open(brick['filename'], 'w', **profOut) as imgOut:
+        imgOut.write(np.array(lstBand).astype(profOut['dtype']))
+    return 0
+
+def _PdalInfo(lstTok):
+    '''pdal info --summary from the las header'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    if not checkLaspy: raise RuntimeError('laspy is required by pdal info')
+    with laspy.open(lstPos[0]) as fileIn:
+        header=fileIn.header
+        vectMin, vectMax=header.mins, header.maxs
+        nbPts=header.point_count
+    dicSum={'num_points': int(nbPts),
+            'bounds': {'minx': vectMin[0], 'miny': vectMin[1], 'minz': vectMin[2],
+                       'maxx': vectMax[0], 'maxy': vectMax[1], 'maxz': vectMax[2]}}
+    return 0, json.dumps({'filename': lstPos[0], 'summary': dicSum})
+
+def _StubTile(lstTok):
+    '''pdal tile: points split on the tile grid with buffer ('#' replaced by x_y)'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    length=float(_Opt(dicOpt, '--length', 1000))
+    buffer=float(_Opt(dicOpt, '--buffer', 0))
+    xOri, yOri=float(_Opt(dicOpt, '--origin_x', 0)), float(_Opt(dicOpt, '--origin_y', 0))
+    lstDic=[_ReadPoints({'type': 'readers.las', 'filename': pathIn})[0] for pathIn in sorted(glob(lstPos[0]))]
+    if not lstDic: return 1, ''
+    dicPts={dim: np.concatenate([dicCur[dim] for dicCur in lstDic]) for dim in lstDic[0]}
+    setKey=set(zip(np.floor((dicPts['X']-xOri)/length).astype(int), np.floor((dicPts['Y']-yOri)/length).astype(int)+1))
+    for x, y in setKey:
+        mask=(dicPts['X']>=xOri+x*length-buffer) & (dicPts['X']<xOri+(x+1)*length+buffer) & \
+             (dicPts['Y']>=yOri+(y-1)*length-buffer) & (dicPts['Y']<yOri+y*length+buffer)
+        _WritePoints(lstPos[1].replace('#', '%i_%i'% (x, y)), {dim: dicPts[dim][mask] for dim in dicPts})
+    return 0, ''
+
+def _StubMerge(lstTok):
+    '''pdal merge: concatenation of las files'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    lstDic=[_ReadPoints({'type': 'readers.las', 'filename': pathIn})[0] for pathIn in lstPos[:-1]]
+    _WritePoints(lstPos[-1], {dim: np.concatenate([dicCur[dim] for dicCur in lstDic]) for dim in lstDic[0]})
+    return 0, ''
+
+#-----------------------------------------------------------------------
+# Rasters
+#-----------------------------------------------------------------------
+def _CoList(dicOpt):
+    return [lstV[0] for lstV in dicOpt.get('-co', [])]
+
+def _DType(strType):
+    '''GDAL data type name (Byte, UInt16, Float32 etc) to numpy dtype name'''
+    if not strType: return None
+    return 'uint8' if strType.lower()=='byte' else strType.lower()
+
+def _InGdalTranslate(lstTok):
+    '''gdal_translate (GdalFunc.Translate): -b, -of, -ot, -co, -a_nodata, -outsize, -if, -q'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    nodata=_Opt(dicOpt, '-a_nodata')
+    GdalFunc.Translate(lstPos[-2], lstPos[-1],
+                       lstBand=[int(lstV[0]) for lstV in dicOpt.get('-b', [])],
+                       driver=_Opt(dicOpt, '-of', 'GTiff'),
+                       dtype=_DType(_Opt(dicOpt, '-ot')),
+                       nodata=None if nodata is None else float(nodata),
+                       outSize=dicOpt['-outsize'][-1] if '-outsize' in dicOpt else None,
+                       lstCo=_CoList(dicOpt),
+                       driverIn=_Opt(dicOpt, '-if'))
+    return 0, ''
+
+def _InGdalMerge(lstTok):
+    '''gdal_merge.py (GdalFunc.Merge): -o, -n, -a_nodata, -init, -ot, -co'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    nodataIn, nodata, init=_Opt(dicOpt, '-n'), _Opt(dicOpt, '-a_nodata'), _Opt(dicOpt, '-init')
+    GdalFunc.Merge(lstPos, _Opt(dicOpt, '-o', 'out.tif'),
+                   nodataIn=None if nodataIn is None else float(nodataIn),
+                   nodata=None if nodata is None else float(nodata),
+                   lstInit=None if init is None else [float(v) for v in init.split()],
+                   dtype=_DType(_Opt(dicOpt, '-ot')),
+                   lstCo=_CoList(dicOpt))
+    return 0, ''
+
+def _InGdalCalc(lstTok):
+    '''gdal_calc.py (GdalFunc.Calc): -A..-Z, --A_band, --outfile, --calc, --type, --NoDataValue, --co'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    dicPathIn={strOpt[1]: _Opt(dicOpt, strOpt) for strOpt in dicOpt if len(strOpt)==2 and strOpt[1].isupper()}
+    dicBand={strOpt[2]: _Opt(dicOpt, strOpt) for strOpt in dicOpt if strOpt.endswith('_band')}
+    nodata=_Opt(dicOpt, '--NoDataValue')
+    GdalFunc.Calc(dicPathIn, _Opt(dicOpt, '--outfile'), _Opt(dicOpt, '--calc'),
+                  dicBand=dicBand,
+                  dtype=_DType(_Opt(dicOpt, '--type', 'Float32')),
+                  nodata=None if nodata is None else float(nodata),
+                  lstCo=[lstV[0] for lstV in dicOpt.get('--co', [])])
+    return 0, ''
+
+def _InGdalRetile(lstTok):
+    '''gdal_retile.py (GdalFunc.Retile): -ps, -targetDir, -co'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    lstPs=dicOpt['-ps'][-1] if '-ps' in dicOpt else (256, 256)
+    for pathIn in lstPos:
+        GdalFunc.Retile(pathIn, _Opt(dicOpt, '-targetDir'), sizeTile=(int(lstPs[0]), int(lstPs[1])), lstCo=_CoList(dicOpt))
+    return 0, ''
+
+#-----------------------------------------------------------------------
+# ASP
+#-----------------------------------------------------------------------
+def _StubTsai(pathOut):
+    '''Nominal pinhole camera (nadir, no distortion)'''
+    with open(pathOut, 'w') as fileOut:
+        fileOut.writelines(['VERSION_4\n', 'PINHOLE\n',
+                            'fu = %s\n'% str(camFocal), 'fv = %s\n'% str(camFocal),
+                            'cu = %s\n'% str(camCentre[0]), 'cv = %s\n'% str(camCentre[1]),
+                            'u_direction = 1 0 0\n', 'v_direction = 0 1 0\n', 'w_direction = 0 0 1\n',
+                            'C = 0 0 6871000\n', 'R = 1 0 0 0 -1 0 0 0 -1\n',
+                            'pitch = %s\n'% str(camPitch), 'NULL\n'])
+    return 0
+
+def _StubMapproject(lstTok):
+    '''mapproject: UInt16 ortho with the input image shape'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    shapeImg=_ImgShape(lstPos[1])
+    RasterFunc.WriteRaster(lstPos[3], np.zeros(shapeImg, dtype=np.uint16), nodata=0)
+    return 0, ''
+
+def _StubCamera(lstTok):
+    '''cam_gen, convert_pinhole_model, cam2rpc: output model (-o or last positional)'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    pathOut=_Opt(dicOpt, '-o', lstPos[-1])
+    lstModel=[pathCur for pathCur in lstPos if os.path.splitext(pathCur)[1].lower() in ('.tsai', '.txt', '.xml') and os.path.isfile(pathCur)]
+    if pathOut.endswith('.tsai'):
+        _StubTsai(pathOut)
+    elif lstModel:
+        shutil.copyfile(lstModel[0], pathOut)
+    else:
+        open(pathOut, 'w').close()
+    return 0, ''
+
+def _StubBundleAdjust(lstTok):
+    '''bundle_adjust: input cameras copied as adjusted ones, identity .adjust for RPC, termination from dicDocker['stubConverge']'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    prefOut=_Opt(dicOpt, '-o')
+    os.makedirs(os.path.dirname(prefOut), exist_ok=True)
+    for pathCur in lstPos:
+        if pathCur.endswith('.tsai') and os.path.isfile(pathCur):
+            shutil.copyfile(pathCur, '%s-%s'% (prefOut, os.path.basename(pathCur)))
+        elif pathCur.lower().endswith('.tif'):
+            with open('%s-%s.adjust'% (prefOut, os.path.basename(pathCur)[:-4]), 'w') as fileOut:
+                fileOut.write('0 0 0\n1 0 0 0\n')
+    if dicDocker['stubConverge']: return 0, 'Termination:                      CONVERGENCE\n'
+    return 0, 'Termination:                   NO_CONVERGENCE\n'
+
+def _StubStereo(lstTok):
+    '''stereo: preprocessing, disparity and point cloud files following the entry and stop points'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    prefOut=lstPos[-1]
+    os.makedirs(os.path.dirname(prefOut), exist_ok=True)
+    lstImg=[pathCur for pathCur in lstPos[:-1] if pathCur.lower().endswith('.tif')]
+    entry, stop=int(_Opt(dicOpt, '--entry-point', 0)), int(_Opt(dicOpt, '--stop-point', 6))
+    shapeImg=_ImgShape(prefOut+'-F.tif', default=None) or _ImgShape(lstImg[0])
+
+    if entry<=0<stop:
+        for strSuf in ('-L.tif', '-R.tif'): RasterFunc.WriteRaster(prefOut+strSuf, np.zeros(shapeImg, dtype=np.float32))
+        for strSuf in ('-lMask.tif', '-rMask.tif'): RasterFunc.WriteRaster(prefOut+strSuf, np.ones(shapeImg, dtype=np.uint8))
+    if entry<=1<stop and len(lstImg)>1:
+        open('%s-%s__%s.match'% (prefOut, os.path.basename(lstImg[0])[:-4], os.path.basename(lstImg[1])[:-4]), 'wb').close()
+    if entry<=4<stop:
+        matDisp=np.zeros((3,)+shapeImg, dtype=np.float32)
+        matDisp[2]=1
+        RasterFunc.WriteRaster(prefOut+'-F.tif', matDisp)
+    if entry<=5<stop:
+        matPC=np.zeros((4,)+shapeImg, dtype=np.float32)
+        matPC[2]=1
+        with rasterio.open(prefOut+'-PC.tif', 'w', **RasterFunc.Profile(shapeImg[1], shapeImg[0], count=4)) as imgOut:
+            imgOut.write(matPC)
+            imgOut.update_tags(POINT_OFFSET='4000000 0 4900000')
+    return 0, ''
+
+def _StubPoint2las(lstTok):
+    '''point2las: las file from the valid -PC.tif points (ECEF)'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    with rasterio.open(lstPos[0]) as imgIn:
+        matPts=imgIn.read().reshape(4, -1)
+        vectOff=np.array([float(v) for v in imgIn.tags().get('POINT_OFFSET', '0 0 0').split()])
+    matPts=matPts[:, np.any(matPts[:3]!=0, axis=0)]
+    _WritePoints(_Opt(dicOpt, '-o')+'.las', {'X': matPts[0]+vectOff[0], 'Y': matPts[1]+vectOff[1], 'Z': matPts[2]+vectOff[2]})
+    return 0, ''
+
+def _StubGeneric(lstTok):
+    '''Any other function: empty output (-o) if any'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    pathOut=_Opt(dicOpt, '-o')
+    if pathOut and os.path.splitext(pathOut)[1]: open(pathOut, 'a').close()
+    return 0, ''
+
+dicInProc={'gdal_translate': _InGdalTranslate,
+           'gdal_merge.py': _InGdalMerge,
+           'gdal_calc.py': _InGdalCalc,
+           'gdal_retile.py': _InGdalRetile,
+           'pdal info': _PdalInfo,
+           }
+dicStub={'mapproject': _StubMapproject,
+         'cam_gen': _StubCamera,
+         'convert_pinhole_model': _StubCamera,
+         'cam2rpc': _StubCamera,
+         'bundle_adjust': _StubBundleAdjust,
+         'parallel_bundle_adjust': _StubBundleAdjust,
+         'stereo': _StubStereo,
+         'parallel_stereo': _StubStereo,
+         'stereo_pprc': _StubStereo,
+         'point2las': _StubPoint2las,
+         'pdal pipeline': _StubPipeline,
+         'pdal tile': _StubTile,
+         'pdal merge': _StubMerge,
+         }
+
+def _InPdalPipeline(lstTok):
+    '''pdal pipeline through the python-pdal bindings'''
+    dicOpt, lstPos=ParseArgs(lstTok)
+    lstBrick=_PipelineBricks(lstPos[0], dicOpt)
+    pdalPy.Pipeline(json.dumps({'pipeline': lstBrick})).execute()
+    return 0, ''
+
+if checkPdal: dicInProc['pdal pipeline']=_InPdalPipeline
+
+def Function(backend, fun):
+    '''
+    Python implementation of a tool function.
+
+    backend (str): 'inproc' or 'stub' (other backends run commands)
+    fun (str): tool function (e.g. 'gdal_translate', 'pdal pipeline')
+    out:
+        funPy (function): funPy(lstTok) returning (return code, stdout), None means command
+    '''
+    if backend=='inproc': return dicInProc.get(fun)
+    if backend=='stub': return dicStub.get(fun, dicInProc.get(fun, _StubGeneric))
+    return None
+
+def RunFunction(funPy, fun, subArgs):
+    '''
+    Run a python tool function like a command: errors give a non-zero
+    return code and the shell suffix runs on the host.
+
+    funPy (function): python implementation (Function)
+    fun (str): tool function
+    subArgs (list): argument list
+    out:
+        out (int): return code
+        strOut (str): stdout
+    '''
+    lstTok, strShell=SplitArgs(subArgs)
+    try:
+        out, strOut=funPy(lstTok)
+    except Exception as msg:
+        SubLogger('ERROR', '%s failed (%s): %s'% (fun, type(msg).__name__, str(msg)))
+        out, strOut=1, ''
+    if strShell: os.system(strShell)
+    return out, strOut
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import json
+import logging
+import time
+import shutil
+import hashlib
+from glob import glob
+from subprocess import run as Run
+from importlib import metadata
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import BackendFunc
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['FileHash', 'ToolVersion', 'ToolCache']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+_dicToolVersion={}
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def ToolVersion(nameImage, fun, backend=None):
+    '''
+    Version of the tool running a function: image ID (docker), first
+    line of 'tool --version' (native) or python package versions
+    (inproc, functions without python implementation use the fallback
+    backend). Queried once per process.
+
+    nameImage (str): tool image
+    fun (str): tool function
+    backend (str): tool backend (default: None means dicDocker['backend'])
+    out:
+        strVer (str): version ('' if unknown)
+    '''
+    if backend is None: backend=dicDocker['backend']
+    if backend=='inproc' and not BackendFunc.Function(backend, fun): backend=dicDocker['inprocFallback']
+    keyVer=(nameImage, fun.split()[0], backend)
+    if keyVer in _dicToolVersion: return _dicToolVersion[keyVer]
+
+    strVer=''
+    if backend=='inproc':
+        lstVer=[]
+        for namePkg in ('numpy', 'rasterio', 'pdal', 'laspy', 'pyproj'):
+            try:
+                lstVer.append('%s=%s'% (namePkg, metadata.version(namePkg)))
+            except metadata.PackageNotFoundError:
+                continue
+        strVer=';'.join(lstVer)
+    elif backend in ('docker', 'native'):
+        lstCmd=['docker', 'image', 'inspect', '--format', '{{.Id}}', nameImage] if backend=='docker' else [fun.split()[0], '--version']
+        try:
+            out=Run(lstCmd, capture_output=True, text=True)
+            lstLine=[lineCur.strip() for lineCur in (out.stdout+out.stderr).splitlines() if lineCur.strip()]
+            if not out.returncode and lstLine: strVer=lstLine[0]
+        except OSError:
+            pass
+        if not strVer: SubLogger('WARNING', 'Tool version unknown (%s, %s): cache entries of other versions can be reused'% (nameImage, keyVer[1]))
+
+    _dicToolVersion[keyVer]=strVer
+    return strVer
+
+def FileHash(pathIn):
+    '''
+    Content hash of a file (blake2b, 1 MB chunks).
+
+    pathIn (str): file path
+    out:
+        strHash (str): hexadecimal hash
+    '''
+    objHash=hashlib.blake2b(digest_size=20)
+    with open(pathIn, 'rb') as fileIn:
+        for byteCur in iter(lambda: fileIn.read(1024**2), b''):
+            objHash.update(byteCur)
+    return objHash.hexdigest()
+
+def _CopyAtomic(pathIn, pathOut):
+    '''Copy a file through a temporary name (safe with concurrent readers)'''
+    pathTmp='%s.%i.tmp'% (pathOut, os.getpid())
+    shutil.copyfile(pathIn, pathTmp)
+    os.replace(pathTmp, pathOut)
+
+class ToolCache():
+    '''
+    Content-addressed cache of tool command outputs (mapproject,
+    point2las, pdal pipeline, gdal_translate). The key hashes the tool
+    image and its version (ToolVersion), the function, the arguments with input paths replaced by their
+    content signature and output paths by placeholders (so the same
+    command on the same data is reused across reruns and blocks). PDAL
+    pipeline files are keyed by their normalised content. Outputs are
+    stored as blobs named by their hash, entries are evicted in least
+    recently used order above the disk budget. Only successful commands
+    are stored. Restored outputs are copies of the blobs, so the cache
+    doubles the disk use of cached outputs: main scripts use it only if
+    a cache directory is given (-cache).
+
+    pathDir (str): cache directory
+    budget (float): disk budget [GB] (default: None means dicCache['budget'])
+    out:
+        ToolCache (obj):
+            nbHit (int): hit number
+            nbMiss (int): miss number
+    '''
+    def __init__(self, pathDir, budget=None):
+        self.pathDir=os.path.abspath(pathDir)
+        self.sizeBudget=int((dicCache['budget'] if budget is None else budget)*1024**3)
+        self.pEntry=os.path.join(self.pathDir, 'entries')
+        self.pBlob=os.path.join(self.pathDir, 'blobs')
+        self.pSig=os.path.join(self.pathDir, 'signatures')
+        for pathCur in (self.pEntry, self.pBlob, self.pSig): os.makedirs(pathCur, exist_ok=True)
+        self.nbHit=0
+        self.nbMiss=0
+
+    def __str__(self):
+        lstEntry=os.listdir(self.pEntry)
+        return '%s (%i entries, %.2f GB, %i hits, %i misses)'% (self.pathDir, len(lstEntry), self.Usage()/1024**3, self.nbHit, self.nbMiss)
+
+    def Usage(self):
+        '''Bytes held by blobs'''
+        return sum([os.path.getsize(pathCur) for pathCur in glob(os.path.join(self.pBlob, '*', '*')) if not pathCur.endswith('.tmp')])
+
+    def Signature(self, pathIn):
+        '''
+        Input file signature: content hash (memorised per path, size and
+        mtime) or stat values (path, size, mtime) following dicCache['signature'].
+
+        pathIn (str): file path
+        out:
+            strSig (str): signature
+        '''
+        pathReal=os.path.realpath(pathIn)
+        statIn=os.stat(pathReal)
+        if dicCache['signature']=='stat':
+            return '%s:%i:%i'% (pathReal, statIn.st_size, statIn.st_mtime_ns)
+
+        pathMemo=os.path.join(self.pSig, hashlib.sha1(pathReal.encode()).hexdigest()+'.json')
+        if os.path.exists(pathMemo):
+            with open(pathMemo) as fileIn:
+                try:
+                    dicMemo=json.load(fileIn)
+                except ValueError:
+                    dicMemo={}
+            if dicMemo.get('size')==statIn.st_size and dicMemo.get('mtime')==statIn.st_mtime_ns: return dicMemo['hash']
+
+        dicMemo={'path': pathReal, 'size': statIn.st_size, 'mtime': statIn.st_mtime_ns, 'hash': FileHash(pathReal)}
+        with open(pathMemo+'.%i.tmp'% os.getpid(), 'w') as fileOut:
+            json.dump(dicMemo, fileOut)
+        os.replace(pathMemo+'.%i.tmp'% os.getpid(), pathMemo)
+        return dicMemo['hash']
+
+    def _Value(self, strIn):
+        '''Key value of an argument: input signature if it is a file (relative paths from the working directory)'''
+        strIn=strIn.strip('"')
+        if strIn and not strIn.startswith('-') and os.path.isfile(os.path.abspath(strIn)): return '<in:%s>'% self.Signature(os.path.abspath(strIn))
+        return strIn
+
+    def _Pipeline(self, pathJson, lstOut):
+        '''Normalised PDAL pipeline: readers replaced by signatures, writers by placeholders'''
+        with open(pathJson) as fileIn:
+            jsonPipe=json.load(fileIn)
+        lstBrick=jsonPipe['pipeline'] if type(jsonPipe)==dict else jsonPipe
+        setTagW=set()
+        for i in range(len(lstBrick)):
+            brick=lstBrick[i]
+            if type(brick)==str:
+                brick={'filename': brick, 'type': 'writers' if i==len(lstBrick)-1 else 'readers'}
+            else:
+                brick=dict(brick)
+            if str(brick.get('type', '')).startswith('writers') or (not 'type' in brick and i==len(lstBrick)-1 and i):
+                if 'tag' in brick: setTagW.add(brick['tag'])
+                if 'filename' in brick:
+                    lstOut.append((brick['filename'], 'file'))
+                    brick['filename']='<out%i>'% (len(lstOut)-1)
+            elif 'filename' in brick:
+                brick['filename']=self._Value(brick['filename'])
+            lstBrick[i]=brick
+        return json.dumps(lstBrick, sort_keys=True), setTagW
+
+    def Key(self, nameImage, fun, subArgs, backend=None):
+        '''
+        Build the cache key of a command. The backend and the tool version
+        are part of the key so outputs of different tool implementations
+        or releases are never mixed.
+
+        nameImage (str): tool image
+        fun (str): tool function
+        subArgs (list): argument list (without shell suffix)
+        backend (str): tool backend (default: None)
+        out:
+            strKey (str): key (None if the function is not cached)
+            lstOut (list): output candidates [(path, 'file'|'prefix'), ...]
+        '''
+        if not fun in dicCache['functions']: return None, []
+        lstKey=[nameImage, backend, ToolVersion(nameImage, fun, backend), fun]
+        lstOut=[]
+        setTagW=set()
+        iOut=None
+        if fun=='mapproject':
+            lstPos=[i for i in range(len(subArgs)) if not subArgs[i].startswith('-') and (not i or not subArgs[i-1].startswith('-'))]
+            if len(lstPos)<4: return None, []
+            iOut=lstPos[3]
+        elif fun=='gdal_translate':
+            iOut=len(subArgs)-1
+        elif fun=='point2las':
+            if not '-o' in subArgs: return None, []
+            iOut=subArgs.index('-o')+1
+
+        for i in range(len(subArgs)):
+            argCur=subArgs[i]
+            if i==iOut:
+                lstOut.append((argCur.strip('"'), ['file', 'prefix'][fun=='point2las']))
+                lstKey.append('<out%i>'% (len(lstOut)-1))
+            elif fun=='pdal pipeline' and argCur.strip('"').endswith('.json') and os.path.isfile(argCur.strip('"')):
+                strPipe, setTagW=self._Pipeline(argCur.strip('"'), lstOut)
+                lstKey.append(strPipe)
+            elif fun=='pdal pipeline' and argCur.startswith('--') and '=' in argCur:
+                strOpt, strVal=argCur.split('=', 1)
+                lstOpt=strOpt[2:].split('.')
+                if lstOpt[-1]=='filename' and (lstOpt[0]=='writers' or (lstOpt[0]=='stage' and lstOpt[1] in setTagW)):
+                    lstOut.append((strVal.strip('"'), 'file'))
+                    lstKey.append('%s=<out%i>'% (strOpt, len(lstOut)-1))
+                else:
+                    lstKey.append('%s=%s'% (strOpt, self._Value(strVal)))
+            else:
+                lstKey.append(self._Value(argCur))
+
+        if not lstOut: return None, []
+        return hashlib.sha256(json.dumps(lstKey).encode()).hexdigest(), lstOut
+
+    def _Collect(self, lstOut, timeStart):
+        '''Output files written by the command: [(index, suffix, path), ...]'''
+        lstFile=[]
+        for k in range(len(lstOut)):
+            pathCur, mode=lstOut[k]
+            if mode=='file':
+                lstCand=[pathCur, pathCur+'.aux.xml']
+            else:
+                lstCand=[pathFile for pathFile in glob(pathCur+'*') if not '-log-' in pathFile]
+            for pathFile in lstCand:
+                if not os.path.isfile(pathFile) or os.path.getmtime(pathFile)<timeStart-2: continue
+                lstFile.append((k, pathFile[len(pathCur):], pathFile))
+        return lstFile
+
+    def Get(self, strKey, lstOut):
+        '''
+        Restore the outputs of a cached command.
+
+        strKey (str): cache key
+        lstOut (list): output candidates of the current command
+        out:
+            check (bool): True=hit
+        '''
+        pathEntry=os.path.join(self.pEntry, strKey+'.json')
+        if not os.path.exists(pathEntry): return False
+        try:
+            with open(pathEntry) as fileIn:
+                lstRec=json.load(fileIn)['outputs']
+        except (ValueError, KeyError):
+            return False
+        lstBlob=[os.path.join(self.pBlob, rec['hash'][:2], rec['hash']) for rec in lstRec]
+        if not all([os.path.exists(pathBlob) for pathBlob in lstBlob]): return False
+
+        for rec, pathBlob in zip(lstRec, lstBlob):
+            pathFile=lstOut[rec['index']][0]+rec['suffix']
+            os.makedirs(os.path.dirname(pathFile), exist_ok=True)
+            _CopyAtomic(pathBlob, pathFile)
+            os.utime(pathBlob)
+        os.utime(pathEntry)
+        return True
+
+    def Put(self, strKey, lstOut, timeStart):
+        '''
+        Store the outputs of a successful command.
+
+        strKey (str): cache key
+        lstOut (list): output candidates
+        timeStart (float): command start time
+        out:
+            nbFile (int): stored file number
+        '''
+        lstFile=self._Collect(lstOut, timeStart)
+        if not lstFile: return 0
+        lstRec=[]
+        for k, suffix, pathFile in lstFile:
+            strHash=FileHash(pathFile)
+            pathBlob=os.path.join(self.pBlob, strHash[:2], strHash)
+            if not os.path.exists(pathBlob):
+                os.makedirs(os.path.dirname(pathBlob), exist_ok=True)
+                _CopyAtomic(pathFile, pathBlob)
+            lstRec.append({'index': k, 'suffix': suffix, 'hash': strHash, 'size': os.path.getsize(pathBlob)})
+
+        pathEntry=os.path.join(self.pEntry, strKey+'.json')
+        with open(pathEntry+'.%i.tmp'% os.getpid(), 'w') as fileOut:
+            json.dump({'outputs': lstRec, 'time': time.time()}, fileOut)
+        os.replace(pathEntry+'.%i.tmp'% os.getpid(), pathEntry)
+        self.Evict()
+        return len(lstRec)
+
+    def Evict(self):
+        '''
+        Remove least recently used entries until blobs fit the disk budget,
+        then orphan blobs.
+
+        out:
+            sizeDel (int): removed bytes
+        '''
+        if not self.sizeBudget or self.Usage()<=self.sizeBudget: return 0
+        lstEntry=[]
+        for nameEntry in os.listdir(self.pEntry):
+            pathEntry=os.path.join(self.pEntry, nameEntry)
+            if not nameEntry.endswith('.json'): continue
+            try:
+                with open(pathEntry) as fileIn:
+                    lstRec=json.load(fileIn)['outputs']
+                lstEntry.append((os.path.getmtime(pathEntry), pathEntry, [rec['hash'] for rec in lstRec]))
+            except (OSError, ValueError, KeyError):
+                continue
+        lstEntry.sort()
+
+        dicBlob={os.path.basename(pathCur): os.path.getsize(pathCur) for pathCur in glob(os.path.join(self.pBlob, '*', '*')) if not pathCur.endswith('.tmp')}
+        dicRef={}
+        for _, _, lstHash in lstEntry:
+            for strHash in lstHash: dicRef[strHash]=dicRef.get(strHash, 0)+1
+        sizeUse=sum(dicBlob.values())
+        sizeDel=0
+        for strHash in [strHash for strHash in dicBlob if not strHash in dicRef]:
+            os.remove(os.path.join(self.pBlob, strHash[:2], strHash))
+            sizeUse-=dicBlob[strHash]
+            sizeDel+=dicBlob[strHash]
+
+        for _, pathEntry, lstHash in lstEntry:
+            if sizeUse<=self.sizeBudget: break
+            os.remove(pathEntry)
+            for strHash in lstHash:
+                dicRef[strHash]-=1
+                if dicRef[strHash] or not strHash in dicBlob: continue
+                try:
+                    os.remove(os.path.join(self.pBlob, strHash[:2], strHash))
+                except FileNotFoundError:
+                    continue
+                sizeUse-=dicBlob[strHash]
+                sizeDel+=dicBlob[strHash]
+        return sizeDel
+
+    def Lookup(self, nameImage, fun, subArgs, backend=None):
+        '''
+        Look a tool command up and restore its outputs on hit. A shell
+        suffix (arguments from a token starting with ';') is not part of
+        the key and runs on the host after a hit.
+
+        nameImage (str): tool image
+        fun (str): tool function
+        subArgs (list): argument list
+        backend (str): tool backend (default: None)
+        out:
+            check (bool): True=hit
+            strKey (str): cache key (None if not cached)
+            lstOut (list): output candidates
+        '''
+        lstArgs=list(subArgs)
+        lstShell=[]
+        for i in range(len(lstArgs)):
+            if lstArgs[i].startswith(';'):
+                lstArgs, lstShell=lstArgs[:i], lstArgs[i:]
+                break
+        try:
+            strKey, lstOut=self.Key(nameImage, fun, lstArgs, backend=backend)
+        except (OSError, ValueError) as msg:
+            SubLogger('WARNING', 'Cache key failed (%s): %s'% (fun, str(msg)))
+            return False, None, []
+        if not strKey: return False, None, []
+
+        if not self.Get(strKey, lstOut):
+            self.nbMiss+=1
+            return False, strKey, lstOut
+        
+        self.nbHit+=1
+        SubLogger('INFO', 'Cache hit (%s): %s'% (fun, ', '.join([pathCur for pathCur, _ in lstOut])))
+        if lstShell: Run(' '.join(lstShell)[1:], shell=True)
+        return True, strKey, lstOut
+
+    def Store(self, strKey, lstOut, timeStart):
+        '''Put without failure (storage errors are logged)'''
+        try:
+            return self.Put(strKey, lstOut, timeStart)
+        except OSError as msg:
+            SubLogger('WARNING', 'Cache storage failed: %s'% str(msg))
+            return 0
+
+    def Run(self, nameImage, fun, subArgs, funRun, backend=None):
+        '''
+        Run a tool command through the cache.
+
+        nameImage (str): tool image
+        fun (str): tool function
+        subArgs (list): argument list
+        funRun (function): command runner funRun(fun, subArgs) returning the return code
+        backend (str): tool backend (default: None)
+        out:
+            out (int): return code (0 on hit)
+        '''
+        checkHit, strKey, lstOut=self.Lookup(nameImage, fun, subArgs, backend=backend)
+        if checkHit: return 0
+        timeStart=time.time()
+        out=funRun(fun, subArgs)
+        if strKey and not out: self.Store(strKey, lstOut, timeStart)
+        return out
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
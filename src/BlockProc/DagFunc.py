@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import json
+import logging
+import time
+import shutil
+import hashlib
+import inspect
+import ast
+import threading
+from glob import glob, has_magic
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as WaitFut
+from subprocess import run as Run
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import CacheFunc
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['Task', 'TaskGraph']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+dicScriptHash={}
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+class Task():
+    '''
+    Pipeline task: a python function or a command line with declared
+    inputs and outputs. Paths can be glob patterns and a path ending with
+    os.sep is a directory. Upstream tasks are found from the inputs
+    (output of another task) on top of the explicit dependencies.
+
+    name (str): unique task name (e.g. 'orthoI:B1:<scene id>')
+    stage (str): stage name (one of TaskGraph.lstStage)
+    fun (function|list): python function or command line (list of str)
+    args (tuple): function arguments (default: ())
+    lstIn (list): input paths (default: ())
+    lstOut (list): output paths (default: ())
+    dicParam (dict): parameters included in the signature (default: None)
+    dicScope (dict): scope keys block, scene, pair, tile (default: None)
+    lstDep (list): explicit upstream task names (default: ())
+    clean (bool): remove outputs before a rebuild (default: True)
+    out:
+        Task (obj):
+    '''
+    def __init__(self, name, stage, fun, args=(), lstIn=(), lstOut=(), dicParam=None, dicScope=None, lstDep=(), clean=True):
+        self.name=name
+        self.stage=stage
+        self.fun=fun
+        self.args=tuple(args)
+        self.lstIn=[os.path.abspath(pathCur)+os.sep*pathCur.endswith(os.sep) for pathCur in lstIn]
+        self.lstOut=[os.path.abspath(pathCur)+os.sep*pathCur.endswith(os.sep) for pathCur in lstOut]
+        self.dicParam=dicParam or {}
+        self.dicScope=dicScope or {}
+        self.lstDep=list(lstDep)
+        self.clean=clean
+
+    def __str__(self):
+        return '%s [%s]'% (self.name, self.stage)
+
+    @staticmethod
+    def Expand(lstPath):
+        '''Existing paths of a path list (glob patterns expanded)'''
+        lstOut=[]
+        for pathCur in lstPath:
+            if has_magic(pathCur):
+                lstOut+=sorted(glob(pathCur))
+            elif os.path.exists(pathCur):
+                lstOut.append(pathCur.rstrip(os.sep))
+        return lstOut
+
+    def Missing(self):
+        '''Declared outputs (not patterns) which do not exist'''
+        return [pathCur for pathCur in self.lstOut if not has_magic(pathCur) and not os.path.exists(pathCur)]
+
+    @staticmethod
+    def CodeHash(fun):
+        '''
+        Hash of a function code: source if available, bytecode and
+        constants otherwise (a code edit changes the hash).
+
+        fun (function): python function or method
+        out:
+            strHash (str): hexadecimal hash
+        '''
+        fun=inspect.unwrap(getattr(fun, '__func__', fun))
+        try:
+            byteCode=inspect.getsource(fun).encode()
+        except (OSError, TypeError):
+            objCode=getattr(fun, '__code__', None)
+            byteCode=repr(fun).encode() if objCode is None else objCode.co_code+repr(objCode.co_consts).encode()
+        return hashlib.blake2b(byteCode, digest_size=16).hexdigest()
+
+    @staticmethod
+    def ScriptHash(pathScript):
+        '''
+        Hash of a python script and of the project modules it imports,
+        recursively (modules found next to the script, e.g. BlockProc.*,
+        VarCur): an edit of a library module used by the script changes
+        the hash. Third-party modules are not followed. Hashes are kept
+        per process while the module files keep their size and mtime.
+
+        pathScript (str): script path
+        out:
+            strHash (str): hexadecimal hash
+        '''
+        pathScript=os.path.abspath(pathScript)
+        if pathScript in dicScriptHash:
+            lstStat, strHash=dicScriptHash[pathScript]
+            if all([os.path.isfile(pathCur) and (os.stat(pathCur).st_size, os.stat(pathCur).st_mtime_ns)==tupStat for pathCur, tupStat in lstStat]):
+                return strHash
+        dirRoot=os.path.dirname(pathScript)
+        lstPath, setSeen=[pathScript], set()
+        objHash=hashlib.blake2b(digest_size=20)
+        while lstPath:
+            pathCur=lstPath.pop()
+            if pathCur in setSeen: continue
+            setSeen.add(pathCur)
+            objHash.update(('%s:%s;'% (os.path.relpath(pathCur, dirRoot), CacheFunc.FileHash(pathCur))).encode())
+            with open(pathCur, 'rb') as fileIn:
+                try:
+                    objTree=ast.parse(fileIn.read())
+                except SyntaxError:
+                    continue
+            lstName=[]
+            for nodeCur in ast.walk(objTree):
+                if isinstance(nodeCur, ast.Import):
+                    lstName+=[alias.name for alias in nodeCur.names]
+                elif isinstance(nodeCur, ast.ImportFrom) and nodeCur.module and not nodeCur.level:
+                    lstName+=[nodeCur.module]+['%s.%s'% (nodeCur.module, alias.name) for alias in nodeCur.names]
+            for name in lstName:
+                pathMod=os.path.join(dirRoot, *name.split('.'))
+                for pathCand in (pathMod+'.py', os.path.join(pathMod, '__init__.py')):
+                    if os.path.isfile(pathCand) and not pathCand in setSeen: lstPath.append(pathCand)
+        lstStat=[(pathCur, (os.stat(pathCur).st_size, os.stat(pathCur).st_mtime_ns)) for pathCur in setSeen]
+        dicScriptHash[pathScript]=(lstStat, objHash.hexdigest())
+        return objHash.hexdigest()
+
+    def Code(self):
+        '''
+        Description of the work for the signature: function name and code
+        hash with its arguments, or command line without the executable
+        path (with the hash of a python script and its project modules).
+        '''
+        if isinstance(self.fun, (list, tuple)):
+            lstCode=[os.path.basename(self.fun[0])]+list(self.fun[1:])
+            if len(self.fun)>1 and str(self.fun[1]).endswith('.py') and os.path.isfile(self.fun[1]):
+                lstCode.append(self.ScriptHash(self.fun[1]))
+            return lstCode
+        return ['%s.%s'% (self.fun.__module__, self.fun.__qualname__),
+                self.CodeHash(self.fun),
+                json.loads(json.dumps(self.args, default=lambda objCur: type(objCur).__name__))]
+
+    def Run(self):
+        '''
+        Run the function or the command line.
+
+        out:
+            out (int): process output (0 means success)
+        '''
+        if isinstance(self.fun, (list, tuple)): return Run(list(self.fun)).returncode
+        return self.fun(*self.args)
+
+class TaskGraph():
+    '''
+    Task graph with dependency-aware incremental rebuild. A task signature
+    hashes its function (with its code) or command line, its parameters
+    (e.g. VarCur dictionaries it reads) and the content
+    signature of its inputs (memorised per path, size and mtime, see
+    dicDag['signature']). A task is up-to-date if the signature and its
+    outputs match the last successful run (state file). Stale tasks have
+    their outputs removed and are rebuilt, independent tasks run on a
+    thread pool (limited per stage, see dicDag['limit']). Since inputs are
+    compared by content, a rebuilt task with identical outputs does not
+    invalidate downstream tasks. Tasks can be added after a run (graph
+    expansion once outputs list tiles etc).
+
+    pathState (str): state file (json)
+    lstStage (list): ordered stage names
+    nbWorker (int): worker number (default: None means dicDag['workers'])
+    out:
+        TaskGraph (obj):
+            dicTask: {name: Task}
+            dicStatus: {name: 'skip'|'done'|'fail'|'blocked'} of the current session
+    '''
+    def __init__(self, pathState, lstStage, nbWorker=None):
+        self.pathState=pathState
+        self.lstStage=list(lstStage)
+        self.nbWorker=nbWorker or dicDag['workers']
+        self.dicTask={}
+        self.dicStatus={}
+        self._dicUp={}
+        self._lock=threading.Lock()
+        self._timeSave=0
+        self.dicState={'tasks': {}, 'memo': {}}
+        if os.path.exists(pathState):
+            with open(pathState) as fileIn:
+                try:
+                    self.dicState=json.load(fileIn)
+                except ValueError:
+                    SubLogger('ERROR', 'Corrupt task state, full rebuild: %s'% pathState)
+            self.dicState['memo']={pathCur: self.dicState['memo'][pathCur] for pathCur in self.dicState['memo'] if os.path.exists(pathCur)}
+
+    def __str__(self):
+        lstStatus=list(self.dicStatus.values())
+        return '%i tasks (%s)'% (len(self.dicTask), ', '.join(['%i %s'% (lstStatus.count(strKey), strKey) for strKey in ('skip', 'done', 'fail', 'blocked') if strKey in lstStatus]))
+
+    def Add(self, objTask):
+        '''Add a task (same name replaces the former one)'''
+        if not objTask.stage in self.lstStage: SubLogger('CRITICAL', 'Unknown stage: %s'% objTask.stage)
+        self.dicTask[objTask.name]=objTask
+        self._dicUp={}
+        return objTask
+
+    #---------------------------------------------------------------
+    # Dependencies
+    #---------------------------------------------------------------
+    def _Link(self):
+        '''Upstream task names per task: explicit dependencies and producers of the inputs'''
+        dicExact, dicDir, dicUnder, lstPattern={}, {}, {}, []
+        for name, objTask in self.dicTask.items():
+            for pathOut in objTask.lstOut:
+                if has_magic(pathOut):
+                    lstPattern.append((pathOut, name))
+                    continue
+                if pathOut.endswith(os.sep):
+                    dicDir[pathOut.rstrip(os.sep)]=name
+                else:
+                    dicExact[pathOut]=name
+                # Parent directories (input directory holding outputs)
+                pathDir=os.path.dirname(pathOut.rstrip(os.sep))
+                while len(pathDir)>1:
+                    dicUnder.setdefault(pathDir, set()).add(name)
+                    pathDir=os.path.dirname(pathDir)
+
+        self._dicUp={}
+        for name, objTask in self.dicTask.items():
+            setUp=set([dep for dep in objTask.lstDep if dep in self.dicTask])
+            for pathIn in objTask.lstIn:
+                pathCur=pathIn.rstrip(os.sep)
+                if pathCur in dicExact: setUp.add(dicExact[pathCur])
+                if pathCur in dicDir: setUp.add(dicDir[pathCur])
+                if pathIn.endswith(os.sep): setUp.update(dicUnder.get(pathCur, ()))
+                # Within an output directory
+                pathDir=os.path.dirname(pathCur)
+                while len(pathDir)>1:
+                    if pathDir in dicDir: setUp.add(dicDir[pathDir])
+                    pathDir=os.path.dirname(pathDir)
+                # Patterns
+                setUp.update([nameOut for pathOut, nameOut in lstPattern if fnmatch(pathCur, pathOut) or pathCur==pathOut])
+                if has_magic(pathCur): setUp.update([dicExact[pathOut] for pathOut in dicExact if fnmatch(pathOut, pathCur)])
+            setUp.discard(name)
+            self._dicUp[name]=sorted(setUp)
+        return self._dicUp
+
+    def Upstream(self, name):
+        '''Upstream task names'''
+        if not self._dicUp: self._Link()
+        return self._dicUp[name]
+
+    def Order(self, setName=None):
+        '''
+        Topological order of tasks.
+
+        setName (set): task names (default: None means all)
+        out:
+            lstName (list): ordered task names
+        '''
+        if not self._dicUp: self._Link()
+        setName=set(self.dicTask) if setName is None else set(setName)
+        dicNb={name: len([up for up in self._dicUp[name] if up in setName]) for name in setName}
+        dicDown={}
+        for name in setName:
+            for up in self._dicUp[name]:
+                if up in setName: dicDown.setdefault(up, []).append(name)
+        lstReady=sorted([name for name in setName if not dicNb[name]], key=self._Rank)
+        lstName=[]
+        while lstReady:
+            name=lstReady.pop(0)
+            lstName.append(name)
+            for down in dicDown.get(name, []):
+                dicNb[down]-=1
+                if not dicNb[down]: lstReady.append(down)
+        if not len(lstName)==len(setName): SubLogger('CRITICAL', 'Cycle in task graph: %s'% str(sorted(setName-set(lstName))[:5]))
+        return lstName
+
+    def _Rank(self, name):
+        return (self.lstStage.index(self.dicTask[name].stage), name)
+
+    def Select(self, until=None, lstOnly=None):
+        '''
+        Tasks up to a stage and within blocks, with all their upstream
+        tasks. Tasks without block scope (e.g. the AOI scene search) are
+        shared by all blocks and always selected.
+
+        until (str): last stage (default: None means all)
+        lstOnly (list): block names (default: None means all)
+        out:
+            setName (set): selected task names
+        '''
+        if until and not until in self.lstStage: SubLogger('CRITICAL', 'Unknown stage: %s'% until)
+        iUntil=self.lstStage.index(until) if until else len(self.lstStage)
+        setName=set([name for name, objTask in self.dicTask.items()
+                        if self.lstStage.index(objTask.stage)<=iUntil and (not lstOnly or objTask.dicScope.get('block', None) in [None]+list(lstOnly))])
+        lstStack=list(setName)
+        while lstStack:
+            for up in self.Upstream(lstStack.pop()):
+                if up in setName: continue
+                setName.add(up)
+                lstStack.append(up)
+        return setName
+
+    #---------------------------------------------------------------
+    # Signatures
+    #---------------------------------------------------------------
+    def _FileSig(self, pathIn):
+        '''File signature: content hash memorised per size and mtime (or stat values)'''
+        statIn=os.stat(pathIn)
+        if dicDag['signature']=='stat': return '%i:%i'% (statIn.st_size, statIn.st_mtime_ns)
+        with self._lock:
+            lstMemo=self.dicState['memo'].get(pathIn)
+        if lstMemo and lstMemo[0]==statIn.st_size and lstMemo[1]==statIn.st_mtime_ns: return lstMemo[2]
+        strHash=CacheFunc.FileHash(pathIn)
+        with self._lock:
+            self.dicState['memo'][pathIn]=[statIn.st_size, statIn.st_mtime_ns, strHash]
+        return strHash
+
+    def PathSig(self, pathIn):
+        '''
+        Path signature: file signature or hash of the relative paths and
+        file signatures of a directory.
+
+        pathIn (str): path
+        out:
+            strSig (str): signature (None if missing)
+        '''
+        pathIn=pathIn.rstrip(os.sep)
+        if os.path.isfile(pathIn): return self._FileSig(pathIn)
+        if not os.path.isdir(pathIn): return None
+        objHash=hashlib.blake2b(digest_size=20)
+        for pathDir, lstDir, lstFile in os.walk(pathIn):
+            lstDir.sort()
+            for nameFile in sorted(lstFile):
+                pathCur=os.path.join(pathDir, nameFile)
+                if not os.path.isfile(pathCur): continue
+                objHash.update(('%s:%s;'% (os.path.relpath(pathCur, pathIn), self._FileSig(pathCur))).encode())
+        return objHash.hexdigest()
+
+    def Signature(self, objTask):
+        '''
+        Task signature: code, parameters and input signatures.
+
+        objTask (obj): task
+        out:
+            strSig (str): signature
+        '''
+        dicIn={}
+        for pathIn in objTask.lstIn:
+            lstPath=Task.Expand([pathIn])
+            if not has_magic(pathIn) and not lstPath: dicIn[pathIn]=None
+            for pathCur in lstPath: dicIn[pathCur]=self.PathSig(pathCur)
+        strJson=json.dumps({'code': objTask.Code(), 'param': objTask.dicParam, 'in': dicIn}, sort_keys=True, default=str)
+        return hashlib.blake2b(strJson.encode(), digest_size=20).hexdigest()
+
+    def _OutSig(self, objTask):
+        return {pathCur: self.PathSig(pathCur) for pathCur in Task.Expand(objTask.lstOut)}
+
+    def UpToDate(self, objTask, strSig=None):
+        '''
+        Check a task against its last successful run.
+
+        objTask (obj): task
+        strSig (str): current signature (default: None means computed)
+        out:
+            check (bool): True if the task can be skipped
+        '''
+        dicRec=self.dicState['tasks'].get(objTask.name)
+        if not dicRec or objTask.Missing(): return False
+        if not dicRec['sig']==(strSig or self.Signature(objTask)): return False
+        return dicRec['out']==self._OutSig(objTask)
+
+    def _Clean(self, objTask):
+        '''Remove task outputs'''
+        for pathCur in Task.Expand(objTask.lstOut):
+            if os.path.isdir(pathCur) and not os.path.islink(pathCur):
+                shutil.rmtree(pathCur)
+            else:
+                os.remove(pathCur)
+        with self._lock:
+            self.dicState['tasks'].pop(objTask.name, None)
+
+    def Save(self, period=0):
+        '''
+        Write the state file (atomic).
+
+        period (float): minimum time since the last writing [s] (default: 0)
+        out:
+            0
+        '''
+        if time.time()-self._timeSave<period: return 0
+        self._timeSave=time.time()
+        with self._lock:
+            strJson=json.dumps(self.dicState, indent=1)
+        pathTmp='%s.%i.tmp'% (self.pathState, os.getpid())
+        with open(pathTmp, 'w') as fileOut:
+            fileOut.write(strJson)
+        os.replace(pathTmp, self.pathState)
+        return 0
+
+    #---------------------------------------------------------------
+    # Execution
+    #---------------------------------------------------------------
+    def Plan(self, setName=None):
+        '''
+        Task status without running: 'ok' or 'stale' (stale task or
+        downstream of a stale task).
+
+        setName (set): task names (default: None means all)
+        out:
+            lstPlan (list): [(name, status), ...] in topological order
+        '''
+        dicPlan={}
+        for name in self.Order(setName):
+            if self.dicStatus.get(name) in ('skip', 'done'):
+                dicPlan[name]='ok'
+            elif any([dicPlan.get(up)=='stale' for up in self.Upstream(name)]):
+                dicPlan[name]='stale'
+            else:
+                dicPlan[name]='ok' if self.UpToDate(self.dicTask[name]) else 'stale'
+        return list(dicPlan.items())
+
+    def _Process(self, objTask):
+        '''Check and (re)build a task (worker thread)'''
+        strSig=self.Signature(objTask)
+        if self.UpToDate(objTask, strSig): return 'skip', 0
+
+        if objTask.clean: self._Clean(objTask)
+        for pathOut in objTask.lstOut:
+            pathDir=pathOut.rstrip(os.sep) if pathOut.endswith(os.sep) else os.path.dirname(pathOut)
+            if not has_magic(pathDir) and not pathOut.endswith(os.sep): os.makedirs(pathDir, exist_ok=True)
+
+        timeStart=time.time()
+        try:
+            out=objTask.Run()
+        except (Exception, SystemExit) as msg:
+            SubLogger('ERROR', '%s: %s'% (objTask.name, str(msg) or type(msg).__name__))
+            return 'fail', time.time()-timeStart
+        timeWall=time.time()-timeStart
+
+        if type(out)==int and out:
+            SubLogger('ERROR', '%s: output %i'% (objTask.name, out))
+            return 'fail', timeWall
+        if objTask.Missing():
+            SubLogger('ERROR', '%s: missing outputs %s'% (objTask.name, str(objTask.Missing())))
+            return 'fail', timeWall
+
+        dicRec={'sig': self.Signature(objTask),
+                'out': self._OutSig(objTask),
+                'stage': objTask.stage,
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'wall': round(timeWall, 2),
+                }
+        with self._lock:
+            self.dicState['tasks'][objTask.name]=dicRec
+        return 'done', timeWall
+
+    def Run(self, setName=None):
+        '''
+        Run tasks in dependency order: up-to-date tasks are skipped,
+        stale ones rebuilt in parallel. Downstream tasks of a failure are
+        blocked. Tasks already processed in the session are not rerun.
+
+        setName (set): task names (default: None means all)
+        out:
+            dicOut (dict): {name: status} of the processed tasks
+        '''
+        setName=set(self.dicTask if setName is None else setName)-set(self.dicStatus)
+        if not setName: return {}
+        lstOrder=self.Order(setName)
+        dicNb={name: len([up for up in self.Upstream(name) if up in setName]) for name in lstOrder}
+        dicDown={}
+        for name in lstOrder:
+            for up in self.Upstream(name):
+                if up in setName: dicDown.setdefault(up, []).append(name)
+
+        dicLimit=dicDag['limit']
+        dicRunning={}
+        lstReady=[name for name in lstOrder if not dicNb[name]]
+        dicFut={}
+        dicOut={}
+        procBar=ProcessStdout(name='Task graph', inputCur=len(lstOrder))
+        with ThreadPoolExecutor(self.nbWorker) as poolCur:
+            while lstReady or dicFut:
+                # Submit ready tasks (within stage limits)
+                lstWait=[]
+                for name in lstReady:
+                    objTask=self.dicTask[name]
+                    if any([self.dicStatus.get(up) in ('fail', 'blocked') for up in self.Upstream(name)]):
+                        self.dicStatus[name]=dicOut[name]='blocked'
+                        SubLogger('WARNING', '%s: blocked by upstream failure'% name)
+                        for down in dicDown.get(name, []):
+                            dicNb[down]-=1
+                            if not dicNb[down]: lstWait.append(down)
+                        continue
+                    if dicRunning.get(objTask.stage, 0)>=dicLimit.get(objTask.stage, self.nbWorker):
+                        lstWait.append(name)
+                        continue
+                    dicRunning[objTask.stage]=dicRunning.get(objTask.stage, 0)+1
+                    dicFut[poolCur.submit(self._Process, objTask)]=name
+                lstReady=sorted(lstWait, key=self._Rank)
+                if not dicFut: continue
+
+                setDone=WaitFut(dicFut, return_when=FIRST_COMPLETED)[0]
+                for futCur in setDone:
+                    name=dicFut.pop(futCur)
+                    objTask=self.dicTask[name]
+                    dicRunning[objTask.stage]-=1
+                    strStatus, timeWall=futCur.result()
+                    self.dicStatus[name]=dicOut[name]=strStatus
+                    if strStatus=='done': SubLogger('INFO', '%s: built (%.1f s)'% (name, timeWall))
+                    procBar.ViewBar(len(dicOut))
+                    self.Save(period=dicDag['savePeriod'])
+                    for down in dicDown.get(name, []):
+                        dicNb[down]-=1
+                        if not dicNb[down]: lstReady.append(down)
+        print()
+
+        self.Save()
+        return dicOut
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
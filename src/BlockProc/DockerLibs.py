@@ -4,27 +4,286 @@
 import os, sys
 import json
 import logging
+import re
+import time
+import atexit
+import fcntl
+import shutil
+import tempfile
 from subprocess import run as Run
-from subprocess import PIPE, Popen
+from subprocess import PIPE, DEVNULL, Popen, CompletedProcess
+import shlex
+from uuid import uuid4
 from pprint import pprint
 
 from OutLib.LoggerFunc import *
 from VarCur import *
 from PCT.dataFunc import CheckPC
+from BlockProc import BackendFunc, TelemetryFunc
 
 #-----------------------------------------------------------------------
 # Hard argument
 #-----------------------------------------------------------------------
 __author__='Valentin Schmitt'
 __version__=1.0
-__all__ =['AspPython', 'PdalPython', 'GdalPython']
+__all__ =['DockerSession', 'AspPython', 'PdalPython', 'GdalPython']
 SetupLogger(name=__name__)
 #SubLogger('WARNING', 'jojo')
 checkPC=CheckPC()
-lstDockerImgs=[lineCur.split()[0] for lineCur in os.popen('docker images').readlines()][1:]
+_lstDockerImgs=None
 #-----------------------------------------------------------------------
 # Hard command
 #-----------------------------------------------------------------------
+class DockerSession():
+    '''
+    Long-lived container of a tool image. It is started once (detached,
+    idle entrypoint) and commands run inside with docker exec, which saves
+    the container creation and teardown of each call. The container is
+    shared by all processes using the same image and root folder. Its
+    health is checked before commands (every dicDocker['health'] seconds)
+    and it is restarted when it died. If it cannot be started, the tool
+    falls back to one container per command (docker run). Every process
+    using the session holds a shared lock on it and the last one removes
+    the container at exit (atexit). The container runs the idle
+    entrypoint (sleep) instead of the image entrypoint: environment set
+    up by the image entrypoint script is skipped, only the image ENV
+    applies to the commands.
+
+    Tool interfaces (AspPython, PdalPython, GdalPython) take:
+        session (bool): commands in the tool session (default: None means dicDocker['session'], off)
+        cache (ToolCache): outputs of cacheable functions reused from cache
+            (CacheFunc.ToolCache), except with the stub backend (default: None)
+        backend (str): docker images, host binaries (native), python functions
+            where available (inproc) or fabricated outputs (stub, see BackendFunc)
+            (default: None means dicDocker['backend'])
+
+    nameImage (str): docker image name
+    rootFolder (str): mounted root folder
+    out:
+        DockerSession (obj):
+            name (str): container name
+            cmdExec (str): command prefix
+            lost (bool): True=session unavailable, fallback in use
+    '''
+    def __init__(self, nameImage, rootFolder):
+        self.nameImage=nameImage
+        self.rootFolder=rootFolder
+        self.name='dsmps_'+re.sub('[^a-zA-Z0-9]+', '_', '%s_%s'% (nameImage.split('/')[-1], rootFolder)).strip('_')
+        self.cmdExec='docker exec %s'% self.name
+        self.pathLock=os.path.join(tempfile.gettempdir(), self.name+'.lock')
+        self.lost=False
+        self._timeCheck=0
+        self._fileHold=None
+
+    def __str__(self):
+        return '%s (%s, %s)'% (self.name, self.nameImage, ['running', 'stopped'][not self.Alive()])
+
+    def Alive(self):
+        '''Health check: True if the container is running'''
+        try:
+            out=Run(['docker', 'inspect', '-f', '{{.State.Running}}', self.name], stdout=PIPE, stderr=PIPE)
+        except OSError:
+            return False
+        return not out.returncode and out.stdout.decode('utf-8').strip()=='true'
+
+    def Start(self):
+        '''
+        Start (or restart) the container. A file lock prevents concurrent
+        processes from starting it twice.
+
+        out:
+            0|1 (int): 0=running
+        '''
+        with open(self.pathLock, 'w') as fileLock:
+            fcntl.flock(fileLock, fcntl.LOCK_EX)
+            if self.Alive(): return 0
+            for i in range(dicDocker['restart']*bool(shutil.which('docker'))):
+                Run(['docker', 'rm', '-f', self.name], stdout=PIPE, stderr=PIPE)
+                out=Run(['docker', 'run', '-d', '--rm',
+                         '--name', self.name,
+                         '-v', '{0}:{0}'.format(self.rootFolder),
+                         '--entrypoint', 'sleep',
+                         self.nameImage+':latest', 'infinity'],
+                        stdout=PIPE, stderr=PIPE)
+                if not out.returncode and self.Alive():
+                    SubLogger('INFO', 'Docker session started: %s'% self.name)
+                    self._Hold()
+                    return 0
+                SubLogger('WARNING', 'Docker session start failed (%s): %s'% (self.name, out.stderr.decode('utf-8').strip()))
+        
+        self.lost=True
+        SubLogger('WARNING', 'Docker session unavailable (%s), fallback to one container per command'% self.name)
+        return 1
+
+    def Check(self):
+        '''
+        Check the session before a command and restart it if needed.
+
+        out:
+            check (bool): True=session usable
+        '''
+        if self.lost: return False
+        self._Hold()
+        if time.time()-self._timeCheck<dicDocker['health']: return True
+        if not self.Alive() and self.Start(): return False
+        self._timeCheck=time.time()
+        return True
+
+    def _Hold(self):
+        '''Shared lock of the session for the process lifetime (Stop at exit)'''
+        if self._fileHold: return
+        self._fileHold=open(self.pathLock+'.hold', 'a')
+        fcntl.flock(self._fileHold, fcntl.LOCK_SH)
+        atexit.register(self.Stop)
+
+    def Stop(self):
+        '''
+        Release the session of the process and remove the container if no
+        other process holds it (called at exit).
+
+        out:
+            0|1 (int): 0=container removed
+        '''
+        if self._fileHold:
+            atexit.unregister(self.Stop)
+            self._fileHold.close()
+            self._fileHold=None
+        self._timeCheck=0
+        with open(self.pathLock+'.hold', 'a') as fileHold:
+            try:
+                fcntl.flock(fileHold, fcntl.LOCK_EX|fcntl.LOCK_NB)
+            except BlockingIOError:
+                SubLogger('INFO', 'Docker session kept for other processes: %s'% self.name)
+                return 1
+            try:
+                Run(['docker', 'rm', '-f', self.name], stdout=PIPE, stderr=PIPE)
+            except OSError:
+                pass
+        return 0
+
+def DockerImages():
+    '''Local docker images, queried once at the first docker command'''
+    global _lstDockerImgs
+    if _lstDockerImgs is None:
+        _lstDockerImgs=[lineCur.split()[0] for lineCur in os.popen('docker images').readlines()][1:]
+    return _lstDockerImgs
+
+def _CmdTool(objTool, fun, subArgs, tty=True, idJob=None):
+    '''
+    Build a tool command line: host command (native backend), docker exec
+    in the tool session if usable, docker run otherwise. Background jobs (tty=False) are identified by
+    idJob so they can be killed (_KillTool): the session command writes
+    its pid in the container, the fallback container is named after it.
+    The interactive fallback container is named after idJob if given
+    (telemetry).
+
+    objTool (AspPython|PdalPython|GdalPython): tool object
+    fun (str): tool function
+    subArgs (list): list of arguments
+    tty (bool): interactive docker run fallback (default: True)
+    idJob (str): job identifier (default: None)
+    out:
+        strCmd (str): command line
+    '''
+    objSession=objTool.objSession
+    strArgs='{} {}'.format(fun, ' '.join(subArgs))
+    if objTool.backendCmd=='native': return strArgs
+    if not objTool.nameImage in DockerImages(): SubLogger('CRITICAL', 'sudo docker pull %s'% objTool.nameImage)
+    
+    if objSession and objSession.Check():
+        if tty or not idJob: return '{} {}'.format(objSession.cmdExec, strArgs)
+        strScript='echo $$ > /tmp/{}.pid; exec {}'.format(idJob, strArgs)
+        return '{} sh -c {}'.format(objSession.cmdExec, shlex.quote(strScript))
+    
+    if not idJob: return '{} {}'.format(objTool.cmdDocker, strArgs)
+    if tty: return '{} {}'.format(objTool.cmdDocker.replace('docker run', 'docker run --name %s'% idJob, 1), strArgs)
+    return 'docker run --rm --name {2} -v {0}:{0} {1}:latest {3}'.format(objTool.rootFolder, objTool.nameImage, idJob, strArgs)
+
+def _KillTool(objTool, idJob):
+    '''
+    Kill a background job started with _CmdTool (tool process and its
+    children in the session, or the fallback container).
+
+    objTool (AspPython|PdalPython|GdalPython): tool object
+    idJob (str): job identifier
+    out:
+        0 (int)
+    '''
+    objSession=objTool.objSession
+    if objSession and not objSession.lost:
+        strScript='p=$(cat /tmp/{0}.pid) && pkill -KILL -P $p; kill -KILL $p; rm -f /tmp/{0}.pid'.format(idJob)
+        Run('{} sh -c {}'.format(objSession.cmdExec, shlex.quote(strScript)), shell=True, stdout=DEVNULL, stderr=DEVNULL)
+    Run('docker rm -f {}'.format(idJob), shell=True, stdout=DEVNULL, stderr=DEVNULL)
+    return 0
+
+def _RunTool(objTool, fun, subArgs, check=False, stdout=None, log=False):
+    '''
+    Run a tool command: python function (inproc, stub backends), host
+    command, tool session (docker exec) or new container (docker run,
+    fallback). A command failing because the
+    session died restarts the session and runs once more. Commands are
+    measured and recorded if telemetry is active (TelemetryFunc).
+
+    objTool (AspPython|PdalPython|GdalPython): tool object
+    fun (str): tool function
+    subArgs (list): list of arguments
+    check (bool): raise CalledProcessError on failure (default: False)
+    stdout (int): subprocess stdout (default: None)
+    log (bool): log the command (default: False)
+    out:
+        strCmd (str): command line
+        out (CompletedProcess): process output
+    '''
+    funPy=BackendFunc.Function(objTool.backend, fun)
+    if funPy:
+        strCmd='[{}] {} {}'.format(objTool.backend, fun, ' '.join(subArgs))
+        if log: SubLogger('INFO', strCmd)
+        objProbe=TelemetryFunc.CmdProbe(objTool, python=True) if TelemetryFunc.Active() else None
+        if objProbe:
+            outPy, strOut=objProbe.Call(BackendFunc.RunFunction, funPy, fun, subArgs)
+            TelemetryFunc.Record(objTool, fun, subArgs, outPy, objProbe)
+        else:
+            outPy, strOut=BackendFunc.RunFunction(funPy, fun, subArgs)
+        if stdout is None and strOut: print(strOut)
+        out=CompletedProcess(strCmd, outPy, stdout=strOut.encode('utf-8') if stdout==PIPE else None)
+        if check: out.check_returncode()
+        return strCmd, out
+
+    objSession=objTool.objSession
+    for i in range(2):
+        idJob='dsmps_job_'+uuid4().hex[:12] if TelemetryFunc.Active() else None
+        strCmd=_CmdTool(objTool, fun, subArgs, idJob=idJob)
+        if log: SubLogger('INFO', strCmd)
+        if idJob:
+            objProbe=TelemetryFunc.CmdProbe(objTool, idJob=idJob)
+            out=TelemetryFunc.RunShell(strCmd, objProbe, stdout=stdout)
+            TelemetryFunc.Record(objTool, fun, subArgs, out.returncode, objProbe)
+        else:
+            out=Run(strCmd,
+                    shell=True,
+                    stdout=stdout,
+                    )
+        if not out.returncode or not objSession or objSession.lost or objSession.Alive(): break
+        SubLogger('WARNING', 'Docker session died (%s), command restarted'% objSession.name)
+        objSession._timeCheck=0
+
+    if check: out.check_returncode()
+    return strCmd, out
+
+def _CachedCmd(objTool, funRun, fun, subArgs):
+    '''
+    Run a tool function through the tool cache if any.
+
+    objTool (AspPython|PdalPython|GdalPython): tool object
+    funRun (function): tool runner (_RunCmd or _RunCmd_debug)
+    fun (str): tool function
+    subArgs (list): list of arguments
+    out:
+        out (int): return code
+    '''
+    if objTool.objCache is None: return funRun(fun, subArgs)
+    return objTool.objCache.Run(objTool.nameImage, fun, subArgs, funRun, backend=objTool.backend)
+
 class AspPython():
     '''
     ASP command lines in python env. 
@@ -34,11 +293,14 @@ class AspPython():
         us.gcr.io/planet-ci-prod/stereo_docker2:latest
 
     The class initialistion selct the proper environment (local/planet_common through vagrant)
+    Options session, cache and backend: see DockerSession.
     '''
     nameImage='us.gcr.io/planet-ci-prod/stereo_docker2'
 
-    def __init__(self):
-        if not self.nameImage in lstDockerImgs: SubLogger('CRITICAL', 'sudo docker pull %s'% self.nameImage)  
+    def __init__(self, session=None, cache=None, backend=None):
+        self.backend=backend or dicDocker['backend']
+        if not self.backend in BackendFunc.lstBackend: SubLogger('CRITICAL', 'Unknown backend: %s'% self.backend)
+        self.backendCmd=dicDocker['inprocFallback'] if self.backend=='inproc' else self.backend
 
         # Vagrant or GVM 
         if checkPC:
@@ -55,7 +317,14 @@ class AspPython():
         else:
             self.rootFolder='/home'
         
+        # Host binaries and python functions see all paths
+        if not self.backendCmd=='docker': self.rootFolder='/'
+        
         self.cmdDocker='docker run -it -v {0}:{0} {1}:latest'.format(self.rootFolder, self.nameImage)
+        if session is None: session=dicDocker['session']
+        self.objSession=DockerSession(self.nameImage, self.rootFolder) if session and self.backendCmd=='docker' else None
+        # Stub outputs are fabricated, never cached
+        self.objCache=None if self.backend=='stub' else cache
 
     def _ValidArgs(self, subArgs):
         '''
@@ -80,14 +349,7 @@ class AspPython():
     
     def _RunCmd_debug(self, fun, subArgs, checkCmd=None):
         if self._ValidArgs(subArgs): return 1
-        strCmd='{} {} '.format(self.cmdDocker, fun)
-        strCmd+=' '.join(subArgs)
-        SubLogger('INFO', strCmd)
-        #sys.exit()
-        out=Run(strCmd,
-                shell=True,
-                check=checkCmd is not None,
-                )
+        strCmd, out=_RunTool(self, fun, subArgs, check=checkCmd is not None, log=True)
         
         #if not any([checkCmd in lineCur for lineCur in out.stdout.decode("utf-8").split('\n')]):
         #    print('strCmd:\n', strCmd)
@@ -101,13 +363,7 @@ class AspPython():
         
         '''
         if self._ValidArgs(subArgs): return 1
-        strCmd='{} {} '.format(self.cmdDocker, fun)
-        strCmd+=' '.join(subArgs)
-        out=Run(strCmd,
-                shell=True,
-                check=checkCmd is not None,
-                stdout=PIPE,
-                )
+        strCmd, out=_RunTool(self, fun, subArgs, check=checkCmd is not None, stdout=PIPE)
         
         if checkCmd and not any([checkCmd in lineCur for lineCur in out.stdout.decode("utf-8").split('\n')]):
             print('strCmd:\n', strCmd)
@@ -125,7 +381,7 @@ class AspPython():
         return self._RunCmd('cam2rpc', subArgs)
 
     def mapproject(self, subArgs):
-        return self._RunCmd('mapproject', subArgs)
+        return _CachedCmd(self, self._RunCmd, 'mapproject', subArgs)
 
     def orbitviz(self, subArgs):
         return self._RunCmd('orbitviz', subArgs)
@@ -163,7 +419,7 @@ class AspPython():
         return self._RunCmd_debug('point2dem', subArgs)
 
     def point2las(self, subArgs):
-        return self._RunCmd_debug('point2las', subArgs)
+        return _CachedCmd(self, self._RunCmd_debug, 'point2las', subArgs)
 
 class PdalPython():
     '''
@@ -174,11 +430,14 @@ class PdalPython():
         pdal/pdal:latest
 
     The class initialistion selct the proper environment (local/planet_common through vagrant)
+    Options session, cache and backend: see DockerSession.
     '''
     nameImage='pdal/pdal'
 
-    def __init__(self):
-        if not self.nameImage in lstDockerImgs: SubLogger('CRITICAL', 'sudo docker pull %s'% self.nameImage)  
+    def __init__(self, session=None, cache=None, backend=None):
+        self.backend=backend or dicDocker['backend']
+        if not self.backend in BackendFunc.lstBackend: SubLogger('CRITICAL', 'Unknown backend: %s'% self.backend)
+        self.backendCmd=dicDocker['inprocFallback'] if self.backend=='inproc' else self.backend
 
         # Vagrant or GVM 
         if checkPC:
@@ -195,7 +454,14 @@ class PdalPython():
         else:
             self.rootFolder='/home'
         
+        # Host binaries and python functions see all paths
+        if not self.backendCmd=='docker': self.rootFolder='/'
+        
         self.cmdDocker='docker run -it -v {0}:{0} {1}:latest'.format(self.rootFolder, self.nameImage)
+        if session is None: session=dicDocker['session']
+        self.objSession=DockerSession(self.nameImage, self.rootFolder) if session and self.backendCmd=='docker' else None
+        # Stub outputs are fabricated, never cached
+        self.objCache=None if self.backend=='stub' else cache
 
     def _ValidArgs(self, subArgs):
         '''
@@ -220,14 +486,7 @@ class PdalPython():
     
     def _RunCmd_debug(self, fun, subArgs, checkCmd=None):
         if self._ValidArgs(subArgs): return 1
-        strCmd='{} {} '.format(self.cmdDocker, fun)
-        strCmd+=' '.join(subArgs)
-        SubLogger('INFO', strCmd)
-        #sys.exit()
-        out=Run(strCmd,
-                shell=True,
-                check=checkCmd is not None,
-                )
+        strCmd, out=_RunTool(self, fun, subArgs, check=checkCmd is not None, log=True)
         
         #if not any([checkCmd in lineCur for lineCur in out.stdout.decode("utf-8").split('\n')]):
         #    print('strCmd:\n', strCmd)
@@ -241,13 +500,7 @@ class PdalPython():
         
         '''
         if self._ValidArgs(subArgs): return 1
-        strCmd='{} {} '.format(self.cmdDocker, fun)
-        strCmd+=' '.join(subArgs)
-        out=Run(strCmd,
-                shell=True,
-                check=checkCmd is not None,
-                stdout=PIPE,
-                )
+        strCmd, out=_RunTool(self, fun, subArgs, check=checkCmd is not None, stdout=PIPE)
         
         if checkCmd and not any([checkCmd in lineCur for lineCur in out.stdout.decode("utf-8").split('\n')]):
             print('strCmd:\n', strCmd)
@@ -268,7 +521,7 @@ class PdalPython():
         return self._RunCmd('pdal tile', subArgs)
 
     def pipeline(self, subArgs):
-        return self._RunCmd('pdal pipeline', subArgs)
+        return _CachedCmd(self, self._RunCmd, 'pdal pipeline', subArgs)
 
     def translate(self, subArgs):
         return self._RunCmd('pdal translate', subArgs)
@@ -282,11 +535,16 @@ class GdalPython():
         pdal/pdal:latest
 
     The class initialistion selct the proper environment (local/planet_common through vagrant)
+    Options session, cache and backend: see DockerSession (default
+    backend: dicGdal['backend'], inproc runs translate, merge, calc and
+    retile in GdalFunc).
     '''
     nameImage='osgeo/gdal'
 
-    def __init__(self):
-        if not self.nameImage in lstDockerImgs: SubLogger('CRITICAL', 'sudo docker pull %s'% self.nameImage)  
+    def __init__(self, session=None, cache=None, backend=None):
+        self.backend=backend or dicGdal['backend'] or dicDocker['backend']
+        if not self.backend in BackendFunc.lstBackend: SubLogger('CRITICAL', 'Unknown backend: %s'% self.backend)
+        self.backendCmd=dicDocker['inprocFallback'] if self.backend=='inproc' else self.backend
 
         # Vagrant or GVM 
         if checkPC:
@@ -303,7 +561,14 @@ class GdalPython():
         else:
             self.rootFolder='/home'
         
+        # Host binaries and python functions see all paths
+        if not self.backendCmd=='docker': self.rootFolder='/'
+        
         self.cmdDocker='docker run -it -v {0}:{0} {1}:latest'.format(self.rootFolder, self.nameImage)
+        if session is None: session=dicDocker['session']
+        self.objSession=DockerSession(self.nameImage, self.rootFolder) if session and self.backendCmd=='docker' else None
+        # Stub outputs are fabricated, never cached
+        self.objCache=None if self.backend=='stub' else cache
 
     def _ValidArgs(self, subArgs):
         '''
@@ -328,14 +593,7 @@ class GdalPython():
     
     def _RunCmd_debug(self, fun, subArgs, checkCmd=None):
         if self._ValidArgs(subArgs): return 1
-        strCmd='{} {} '.format(self.cmdDocker, fun)
-        strCmd+=' '.join(subArgs)
-        SubLogger('INFO', strCmd)
-        #sys.exit()
-        out=Run(strCmd,
-                shell=True,
-                check=checkCmd is not None,
-                )
+        strCmd, out=_RunTool(self, fun, subArgs, check=checkCmd is not None, log=True)
         
         #if not any([checkCmd in lineCur for lineCur in out.stdout.decode("utf-8").split('\n')]):
         #    print('strCmd:\n', strCmd)
@@ -349,13 +607,7 @@ class GdalPython():
         
         '''
         if self._ValidArgs(subArgs): return 1
-        strCmd='{} {} '.format(self.cmdDocker, fun)
-        strCmd+=' '.join(subArgs)
-        out=Run(strCmd,
-                shell=True,
-                check=checkCmd is not None,
-                stdout=PIPE,
-                )
+        strCmd, out=_RunTool(self, fun, subArgs, check=checkCmd is not None, stdout=PIPE)
         
         if checkCmd and not any([checkCmd in lineCur for lineCur in out.stdout.decode("utf-8").split('\n')]):
             print('strCmd:\n', strCmd)
@@ -370,7 +622,7 @@ class GdalPython():
         return self._RunCmd('gdalinfo', subArgs, checkInfo=True)
 
     def gdal_translate(self, subArgs):
-        return self._RunCmd('gdal_translate', subArgs)
+        return _CachedCmd(self, self._RunCmd, 'gdal_translate', subArgs)
 
     def gdal_merge(self, subArgs):
         return self._RunCmd('gdal_merge.py', subArgs)
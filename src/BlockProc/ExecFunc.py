@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import logging
+import asyncio
+import threading
+import signal
+import time
+from uuid import uuid4
+from concurrent.futures import Future, wait as WaitFut
+from subprocess import PIPE, DEVNULL
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import DockerLibs, BackendFunc, TelemetryFunc
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['ToolExecutor']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+class ToolExecutor():
+    '''
+    Asynchronous bounded executor of Docker tool commands (AspPython,
+    PdalPython, GdalPython). An asyncio loop runs in a thread: stages
+    submit commands, get futures (concurrent.futures.Future) and await
+    them together with Gather. The concurrency is limited per tool, each
+    command has a timeout and can be cancelled (the process is killed in
+    the container) and its output lines are streamed to the logger.
+    Cacheable commands go through the tool cache if the tool has one.
+    Commands are measured and recorded with the context of their
+    submission if telemetry is active (TelemetryFunc).
+
+    dicLimit (dict): concurrent commands per tool class name (default: None means dicExec['limit'])
+    timeout (float): command timeout [s] (default: None means dicExec['timeout'], 0 means none)
+    out:
+        ToolExecutor (obj):
+    '''
+    def __init__(self, dicLimit=None, timeout=None):
+        self.dicLimit=dict(dicExec['limit'])
+        if dicLimit: self.dicLimit.update(dicLimit)
+        self.timeout=dicExec['timeout'] if timeout is None else timeout
+        self._dicSem={}
+        self._loop=asyncio.new_event_loop()
+        self._thread=threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excVal, excTb):
+        self.Close(cancel=excType is not None)
+
+    def _Sem(self, nameTool):
+        if not nameTool in self._dicSem:
+            self._dicSem[nameTool]=asyncio.Semaphore(self.dicLimit.get(nameTool, os.cpu_count()))
+        return self._dicSem[nameTool]
+
+    async def _Stream(self, streamIn, tag, lvl, lstOut):
+        '''Forward process output lines (\\n or \\r ended) to the logger'''
+        strRest=''
+        while True:
+            byteCur=await streamIn.read(65536)
+            if not byteCur: break
+            lstLine=(strRest+byteCur.decode('utf-8', errors='replace')).replace('\r', '\n').split('\n')
+            strRest=lstLine.pop()
+            for lineCur in lstLine:
+                if not lineCur.strip(): continue
+                if lstOut is not None: lstOut.append(lineCur)
+                if dicExec['stream']: SubLogger(lvl, '%s %s'% (tag, lineCur))
+        if strRest.strip():
+            if lstOut is not None: lstOut.append(strRest)
+            if dicExec['stream']: SubLogger(lvl, '%s %s'% (tag, strRest))
+
+    async def _Run(self, objTool, fun, subArgs, timeout, checkCmd, dicCtx):
+        nameTool=type(objTool).__name__
+        objCache=getattr(objTool, 'objCache', None)
+        async with self._Sem(nameTool):
+            strKey=None
+            if objCache:
+                checkHit, strKey, lstOut=await self._loop.run_in_executor(None, objCache.Lookup, objTool.nameImage, fun, subArgs, objTool.backend)
+                if checkHit: return 0
+            timeStart=time.time()
+            idJob='dsmps_job_'+uuid4().hex[:12]
+            tag='[%s %s]'% (fun, idJob[-6:])
+            funPy=BackendFunc.Function(objTool.backend, fun)
+            if funPy:
+                objProbe=TelemetryFunc.CmdProbe(objTool, python=True) if dicCtx else None
+                out=await self._RunPy(funPy, fun, subArgs, timeout, tag, checkCmd, objProbe)
+                if objProbe and objProbe.dicMeas: TelemetryFunc.Record(objTool, fun, subArgs, out, objProbe, dicCtx=dicCtx)
+                if strKey and not out:
+                    await self._loop.run_in_executor(None, objCache.Store, strKey, lstOut, timeStart)
+                return out
+            strCmd=await self._loop.run_in_executor(None, DockerLibs._CmdTool, objTool, fun, subArgs, False, idJob)
+            procCur=await asyncio.create_subprocess_shell(strCmd,
+                                                          stdin=DEVNULL,
+                                                          stdout=PIPE,
+                                                          stderr=PIPE,
+                                                          start_new_session=True)
+            objProbe=TelemetryFunc.CmdProbe(objTool, idJob=idJob) if dicCtx else None
+            if objProbe: await self._loop.run_in_executor(None, objProbe.Start, procCur.pid)
+            lstLine=[]
+            try:
+                await asyncio.wait_for(asyncio.gather(self._Stream(procCur.stdout, tag, 'INFO', lstLine),
+                                                      self._Stream(procCur.stderr, tag, 'WARNING', None),
+                                                      procCur.wait()),
+                                       timeout or None)
+            except asyncio.TimeoutError:
+                SubLogger('ERROR', 'Command timeout (%i s): %s'% (timeout, strCmd))
+                await self._Kill(objTool, idJob, procCur)
+                if objProbe:
+                    await self._loop.run_in_executor(None, objProbe.Stop)
+                    TelemetryFunc.Record(objTool, fun, subArgs, 1, objProbe, dicCtx=dicCtx)
+                return 1
+            except asyncio.CancelledError:
+                await self._Kill(objTool, idJob, procCur)
+                if objProbe: objProbe.Stop()
+                raise
+            if objProbe:
+                await self._loop.run_in_executor(None, objProbe.Stop)
+                TelemetryFunc.Record(objTool, fun, subArgs, procCur.returncode, objProbe, dicCtx=dicCtx)
+
+        if checkCmd and not any([checkCmd in lineCur for lineCur in lstLine]):
+            SubLogger('ERROR', 'That command returned %i but the process failed: key=%r\n%s'% (procCur.returncode, checkCmd, strCmd))
+            return 1
+        if strKey and not procCur.returncode:
+            await self._loop.run_in_executor(None, objCache.Store, strKey, lstOut, timeStart)
+        return procCur.returncode
+
+    async def _RunPy(self, funPy, fun, subArgs, timeout, tag, checkCmd, objProbe):
+        '''Python tool function in a thread (a timeout stops waiting, the thread ends on its own)'''
+        lstCall=[BackendFunc.RunFunction, funPy, fun, subArgs]
+        if objProbe: lstCall.insert(0, objProbe.Call)
+        try:
+            out, strOut=await asyncio.wait_for(self._loop.run_in_executor(None, *lstCall), timeout or None)
+        except asyncio.TimeoutError:
+            SubLogger('ERROR', 'Function timeout (%i s): %s'% (timeout, tag))
+            return 1
+        lstLine=[lineCur for lineCur in strOut.splitlines() if lineCur.strip()]
+        if dicExec['stream']:
+            for lineCur in lstLine: SubLogger('INFO', '%s %s'% (tag, lineCur))
+        if checkCmd and not any([checkCmd in lineCur for lineCur in lstLine]):
+            SubLogger('ERROR', 'That function returned %i but the process failed: key=%r (%s)'% (out, checkCmd, tag))
+            return 1
+        return out
+
+    async def _Kill(self, objTool, idJob, procCur):
+        '''Kill a job: container side first, then the local docker client'''
+        await self._loop.run_in_executor(None, DockerLibs._KillTool, objTool, idJob)
+        if procCur.returncode is None:
+            try:
+                os.killpg(procCur.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await procCur.wait()
+
+    def Submit(self, objTool, fun, subArgs, timeout=None, checkCmd=None):
+        '''
+        Submit a tool command.
+
+        objTool (AspPython|PdalPython|GdalPython): tool object
+        fun (str): tool function (e.g. 'mapproject', 'pdal pipeline', 'gdal_translate')
+        subArgs (list): list of arguments
+        timeout (float): command timeout [s] (default: None means executor timeout)
+        checkCmd (str): string expected in stdout (default: None)
+        out:
+            futCur (Future): future of the return code
+        '''
+        if objTool._ValidArgs(subArgs):
+            futCur=Future()
+            futCur.set_result(1)
+            return futCur
+        if timeout is None: timeout=self.timeout
+        dicCtx=TelemetryFunc.Context() if TelemetryFunc.Active() else None
+        return asyncio.run_coroutine_threadsafe(self._Run(objTool, fun, subArgs, timeout, checkCmd, dicCtx), self._loop)
+
+    def Map(self, objTool, fun, lstSubArgs, **kwargs):
+        '''
+        Submit the same tool function with several argument lists.
+
+        objTool (AspPython|PdalPython|GdalPython): tool object
+        fun (str): tool function
+        lstSubArgs (list): argument lists
+        kwargs: Submit arguments
+        out:
+            lstFut (list): futures
+        '''
+        return [self.Submit(objTool, fun, subArgs, **kwargs) for subArgs in lstSubArgs]
+
+    def Gather(self, lstFut, timeout=None):
+        '''
+        Wait for futures. Cancelled or failed futures count as 1.
+
+        lstFut (list): futures
+        timeout (float): global timeout [s], remaining futures are cancelled (default: None)
+        out:
+            lstOut (list): return codes in submission order
+        '''
+        setDone, setPending=WaitFut(lstFut, timeout=timeout)
+        if setPending:
+            SubLogger('ERROR', 'Gather timeout: %i commands cancelled'% len(setPending))
+            self.Cancel(setPending)
+            WaitFut(setPending)
+
+        lstOut=[]
+        for futCur in lstFut:
+            if futCur.cancelled() or futCur.exception():
+                lstOut.append(1)
+            else:
+                lstOut.append(futCur.result())
+        return lstOut
+
+    def Cancel(self, lstFut):
+        '''
+        Cancel futures: waiting commands are dropped, running ones killed.
+
+        lstFut (list): futures
+        out:
+            nbCancel (int): cancelled future number
+        '''
+        return sum([futCur.cancel() for futCur in lstFut])
+
+    def Close(self, cancel=False):
+        '''
+        Stop the executor loop.
+
+        cancel (bool): cancel running commands instead of waiting (default: False)
+        out:
+            0 (int)
+        '''
+        if not self._loop.is_running(): return 0
+        lstTask=asyncio.run_coroutine_threadsafe(self._Tasks(), self._loop).result()
+        if cancel:
+            for taskCur in lstTask: self._loop.call_soon_threadsafe(taskCur.cancel)
+        asyncio.run_coroutine_threadsafe(self._Wait(lstTask), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        return 0
+
+    async def _Tasks(self):
+        return [taskCur for taskCur in asyncio.all_tasks(self._loop) if not taskCur is asyncio.current_task()]
+
+    async def _Wait(self, lstTask):
+        if lstTask: await asyncio.gather(*lstTask, return_exceptions=True)
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
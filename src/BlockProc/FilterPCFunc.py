@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import logging
+from multiprocessing import Pool
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+scipySpatial=LazyImport('scipy.spatial')
+
+from importlib.util import find_spec
+checkLaspy=find_spec('laspy') is not None
+if checkLaspy:
+    laspy=LazyImport('laspy')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['ReadLas', 'WriteLas', 'TileBounds', 'FilterElm', 'FilterOutlier', 'FilterTile', 'TileArgs', 'FilterTilesNative']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def ReadLas(pathIn):
+    '''
+    Read a .las point cloud into the laspy object and an (x, y, z) array.
+
+    pathIn (str): point cloud path
+    out:
+        objLas (laspy.LasData): full point cloud (header and dimensions)
+        matPts (array): point coordinates [[X, Y, Z], ...]
+    '''
+    if not checkLaspy: SubLogger('CRITICAL', 'laspy is required by the native filter engine (pip install laspy)')
+    if not os.path.exists(pathIn): SubLogger('CRITICAL', 'Point cloud not found: %s'% pathIn)
+    objLas=laspy.read(pathIn)
+    matPts=np.vstack((objLas.x, objLas.y, objLas.z)).T
+    return objLas, matPts
+
+def WriteLas(objLas, pathOut, vectClass=None):
+    '''
+    Write a laspy object with an optional classification update.
+
+    objLas (laspy.LasData): point cloud to write
+    pathOut (str): output path
+    vectClass (array): new classification values (default: None means unchanged)
+    out:
+        0 (int)
+    '''
+    if not vectClass is None: objLas.classification=vectClass.astype(np.uint8)
+    objLas.write(pathOut)
+    return 0
+
+def TileBounds(pathTile, strTemplate):
+    '''
+    Return the core bounds of a renamed tile (see MSSFunc.FilterTiles).
+    Tile names hold the top-left corner in [km]: PC-Full-Tile_X_Y.las
+
+    pathTile (str): tile path
+    strTemplate (list): tile path template split on the index part
+    out:
+        lstBounds (list): [xMin, yMin, xMax, yMax] in [m]
+    '''
+    strIndex=pathTile.replace(strTemplate[0],'').replace(strTemplate[1],'')
+    x, y=[int(s) for s in strIndex.split('_')]
+    return [x*1000, (y-1)*1000, (x+1)*1000, y*1000]
+
+def FilterElm(matPts, cell=dicFilterPC['elmCell'], threshold=dicFilterPC['elmThreshold']):
+    '''
+    Extended Local Minimum filter (same logic as PDAL filters.elm). Points
+    are binned into a grid, sorted by height and the lowest points of
+    every cell are flagged as long as the height step to the next point
+    is larger than the threshold. The grid is aligned on the absolute
+    coordinates rather than the tile bounds, so neighbour tiles share cells.
+
+    matPts (array): point coordinates [[X, Y, Z], ...]
+    cell (float): cell size [m]
+    threshold (float): height step threshold [m]
+    out:
+        maskNoise (array): boolean mask, True=low noise
+    '''
+    nbPts=matPts.shape[0]
+    maskNoise=np.zeros(nbPts, dtype=bool)
+    if nbPts<2: return maskNoise
+
+    matCell=np.floor(matPts[:,:2]/cell).astype(np.int64)
+    _, vectCell=np.unique(matCell, axis=0, return_inverse=True)
+    vectCell=vectCell.reshape(-1)
+    iSort=np.lexsort((matPts[:,2], vectCell))
+    vectCellS=vectCell[iSort]
+    vectZS=matPts[iSort, 2]
+
+    # Step to the next point in the same cell
+    sameNext=np.append(vectCellS[1:]==vectCellS[:-1], False)
+    stepNext=np.append(np.diff(vectZS), 0)
+    checkStep=sameNext & (stepNext>=threshold)
+
+    # Leading run of large steps per cell: count of small steps must stay 0
+    cumSmall=np.cumsum(~checkStep)
+    iStart=np.append(0, np.where(~(vectCellS[1:]==vectCellS[:-1]))[0]+1)
+    vectLen=np.diff(np.append(iStart, nbPts))
+    cumStart=np.repeat(np.append(0, cumSmall)[iStart], vectLen)
+    maskNoise[iSort]=(cumSmall-cumStart)==0
+
+    return maskNoise
+
+def FilterOutlier(matPts, meanK=dicFilterPC['outMeanK'], multiplier=dicFilterPC['outMulti'], maskStat=None):
+    '''
+    Statistical outlier filter (same logic as PDAL filters.outlier with
+    the statistical method). The mean distance to the k nearest neighbours
+    is computed with a KD-tree and points beyond mean+multiplier*std are
+    flagged.
+
+    matPts (array): point coordinates [[X, Y, Z], ...]
+    meanK (int): neighbour number
+    multiplier (float): standard deviation factor
+    maskStat (array): boolean mask of points used for the statistics (default: None means all)
+    out:
+        maskNoise (array): boolean mask, True=outlier
+    '''
+    nbPts=matPts.shape[0]
+    if nbPts<=meanK: return np.zeros(nbPts, dtype=bool)
+
+    treePts=scipySpatial.cKDTree(matPts)
+    matDist=treePts.query(matPts, k=meanK+1, workers=1)[0]
+    vectMean=np.mean(matDist[:,1:], axis=1)
+    if maskStat is None:
+        vectStat=vectMean
+    else:
+        vectStat=vectMean[maskStat]
+
+    threshDist=np.mean(vectStat)+multiplier*np.std(vectStat)
+    return vectMean>threshDist
+
+def FilterTile(pathIn, pathOut, lstPathNeigh=(), lstBounds=None, buffer=dicFilterPC['buffer']):
+    '''
+    Native replacement of the PDAL filter pipeline (filters.elm +
+    filters.outlier) for one tile. Neighbour points within the buffer
+    around the core bounds are added to the computation but only the
+    tile points are written, so the classification stays seamless.
+    Noise points get the class 7 like PDAL filters do.
+
+    pathIn (str): input tile path
+    pathOut (str): output tile path
+    lstPathNeigh (list): neighbour tile paths (default: ())
+    lstBounds (list): core tile bounds [xMin, yMin, xMax, yMax] (default: None means no neighbours)
+    buffer (float): buffer around the core bounds [m]
+    out:
+        nbNoise (int): number of flagged points
+    '''
+    objLas, matPts=ReadLas(pathIn)
+    nbPts=matPts.shape[0]
+
+    # Buffer points from neighbours
+    lstNeigh=[]
+    if lstBounds and lstPathNeigh:
+        bndsIn=np.array([np.amin(matPts[:,:2], axis=0), np.amax(matPts[:,:2], axis=0)])
+        for pathNeigh in lstPathNeigh:
+            matNeigh=ReadLas(pathNeigh)[1]
+            maskBuff=np.all((lstBounds[0]-buffer<=matNeigh[:,0],
+                             matNeigh[:,0]<=lstBounds[2]+buffer,
+                             lstBounds[1]-buffer<=matNeigh[:,1],
+                             matNeigh[:,1]<=lstBounds[3]+buffer), axis=0)
+            # Skip points already held by the tile buffer
+            maskBuff&=~np.all((bndsIn[0,0]<=matNeigh[:,0],
+                               matNeigh[:,0]<=bndsIn[1,0],
+                               bndsIn[0,1]<=matNeigh[:,1],
+                               matNeigh[:,1]<=bndsIn[1,1]), axis=0)
+            lstNeigh.append(matNeigh[maskBuff])
+    matFull=np.vstack([matPts]+lstNeigh)
+
+    maskNoise=FilterElm(matFull)
+    maskNoise|=FilterOutlier(matFull)
+
+    vectClass=np.array(objLas.classification, dtype=np.uint8)
+    vectClass[maskNoise[:nbPts]]=7
+    WriteLas(objLas, pathOut, vectClass=vectClass)
+
+    return int(np.sum(maskNoise[:nbPts]))
+
+def _FilterTile_Pool(tupIn):
+    '''
+    Pool wrapper of FilterTile.
+    '''
+    pathIn, pathOut, lstPathNeigh, lstBounds=tupIn
+    if os.path.exists(pathOut): return 0
+    return FilterTile(pathIn, pathOut, lstPathNeigh=lstPathNeigh, lstBounds=lstBounds)
+
+def TileArgs(lstTilePath, pathTemplate, pathFltTemplate, neigh=True):
+    '''
+    FilterTile arguments of all tiles. Tile neighbours are selected from
+    the tile indices (8-connexity).
+
+    lstTilePath (list): list of full tile paths
+    pathTemplate (str): full tile path template with '#'
+    pathFltTemplate (str): filtered tile path template with '{}'
+    neigh (bool): add neighbour buffer points (default: True)
+    out:
+        lstArgs (list): (pathIn, pathOut, lstPathNeigh, lstBounds) per tile
+    '''
+    strTemplate=pathTemplate.split('#')
+    dicTile={}
+    for pathIn in lstTilePath:
+        strIndex=pathIn.replace(strTemplate[0],'').replace(strTemplate[1],'')
+        dicTile[tuple(int(s) for s in strIndex.split('_'))]=pathIn
+
+    lstArgs=[]
+    for (x, y), pathIn in sorted(dicTile.items()):
+        pathOut=pathFltTemplate.format('%i_%i'% (x, y))
+        lstBounds, lstPathNeigh=None, []
+        if neigh:
+            lstBounds=TileBounds(pathIn, strTemplate)
+            lstPathNeigh=[dicTile[(x+i, y+j)] for i in (-1, 0, 1) for j in (-1, 0, 1)
+                                if (i or j) and (x+i, y+j) in dicTile]
+        lstArgs.append((pathIn, pathOut, lstPathNeigh, lstBounds))
+    return lstArgs
+
+def FilterTilesNative(lstTilePath, pathTemplate, pathFltTemplate, nbProc=None, neigh=True):
+    '''
+    Filter all tiles in parallel with the native engine (see TileArgs).
+
+    lstTilePath (list): list of full tile paths
+    pathTemplate (str): full tile path template with '#'
+    pathFltTemplate (str): filtered tile path template with '{}'
+    nbProc (int): process number (default: None means cpu number)
+    neigh (bool): add neighbour buffer points (default: True)
+    out:
+        lstNoise (list): number of flagged points per tile
+    '''
+    lstArgs=TileArgs(lstTilePath, pathTemplate, pathFltTemplate, neigh=neigh)
+    with Pool(nbProc) as poolCur:
+        lstNoise=poolCur.map(_FilterTile_Pool, lstArgs)
+    return lstNoise
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
+
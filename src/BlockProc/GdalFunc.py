@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import logging
+import threading
+from math import ceil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+rioWindows=LazyImport('rasterio.windows')
+rioErrors=LazyImport('rasterio.errors')
+rioEnums=LazyImport('rasterio.enums')
+
+from importlib.util import find_spec
+checkPlanetCommon=find_spec('planet_opencv3') is not None
+if checkPlanetCommon:
+    from planet_opencv3 import cv2 as cv
+else:
+    cv=LazyImport('cv2')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['Translate', 'Merge', 'Calc', 'Retile']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+# gdal_calc default nodata per type
+dicCalcNodata={'uint8': 255, 'uint16': 65535, 'int16': -32768, 'uint32': 4294967293, 'int32': -2147483647,
+               'float32': 3.402823466e+38, 'float64': 1.7976931348623157e+308}
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+class _Readers():
+    '''
+    Input handles per worker thread (rasterio datasets are not thread
+    safe). Images GDAL cannot open (e.g. EXR without the driver) are
+    decoded once with OpenCV and shared.
+    '''
+    def __init__(self, driverIn=None):
+        self.driverIn=driverIn
+        self._locData=threading.local()
+        self._lock=threading.Lock()
+        self._lstImg=[]
+        self._dicArray={}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excVal, excTb):
+        [imgCur.close() for imgCur in self._lstImg]
+
+    def Get(self, pathIn):
+        '''Dataset (rasterio) or array [bands, rows, cols] (OpenCV fallback)'''
+        if pathIn in self._dicArray: return self._dicArray[pathIn]
+        if not hasattr(self._locData, 'dic'): self._locData.dic={}
+        if not pathIn in self._locData.dic:
+            try:
+                imgCur=rasterio.open(pathIn, driver=self.driverIn)
+            except (rioErrors.RasterioIOError, rioErrors.DriverRegistrationError):
+                with self._lock:
+                    if not pathIn in self._dicArray: self._dicArray[pathIn]=_ReadCv(pathIn)
+                return self._dicArray[pathIn]
+            with self._lock:
+                self._lstImg.append(imgCur)
+            self._locData.dic[pathIn]=imgCur
+        return self._locData.dic[pathIn]
+
+def _ReadCv(pathIn):
+    '''Whole image with OpenCV as [bands, rows, cols]'''
+    img=cv.imread(pathIn, cv.IMREAD_UNCHANGED)
+    if img is None: SubLogger('CRITICAL', 'Image reading failed: %s'% pathIn)
+    if img.ndim==2: return img[np.newaxis]
+    # OpenCV colour order (BGR[A]) to GDAL band order (RGB[A])
+    if img.shape[2] in (3, 4): img[..., :3]=img[..., 2::-1].copy()
+    return np.moveaxis(img, 2, 0)
+
+def _Info(objIn):
+    '''Profile-like description of a dataset or an OpenCV array'''
+    if isinstance(objIn, np.ndarray):
+        return {'width': objIn.shape[2], 'height': objIn.shape[1], 'count': objIn.shape[0], 'dtype': objIn.dtype.name,
+                'nodata': None, 'crs': None, 'transform': rasterio.Affine.identity(), 'desc': (None,)*objIn.shape[0]}
+    return {'width': objIn.width, 'height': objIn.height, 'count': objIn.count, 'dtype': objIn.dtypes[0],
+            'nodata': objIn.nodata, 'crs': objIn.crs, 'transform': objIn.transform, 'desc': objIn.descriptions}
+
+def _Read(objIn, lstBand, winIn):
+    '''Window read from a dataset or an OpenCV array'''
+    if isinstance(objIn, np.ndarray):
+        return objIn[np.array(lstBand)-1, winIn.row_off:winIn.row_off+winIn.height, winIn.col_off:winIn.col_off+winIn.width]
+    return objIn.read(lstBand, window=winIn)
+
+def _Masked(objIn):
+    '''Dataset with invalid pixels (nodata, mask band or alpha), OpenCV arrays are all valid'''
+    if isinstance(objIn, np.ndarray): return False
+    return not all([rioEnums.MaskFlags.all_valid in lstFlag for lstFlag in objIn.mask_flag_enums])
+
+def _Cast(matIn, dtype):
+    '''Data type conversion with GDAL rules: rounded and clipped to the output range'''
+    dtype=np.dtype(dtype)
+    if matIn.dtype==dtype: return matIn
+    if matIn.dtype.kind=='b': matIn=matIn.astype(np.uint8)
+    if dtype.kind in 'iu' and not matIn.dtype.kind in 'iu':
+        infoType=np.iinfo(dtype)
+        return np.clip(np.round(matIn), infoType.min, infoType.max).astype(dtype)
+    if dtype.kind in 'iu':
+        infoType=np.iinfo(dtype)
+        return np.clip(matIn, infoType.min, infoType.max).astype(dtype)
+    return matIn.astype(dtype)
+
+def _Strips(width, height, nbRow=None):
+    '''Full width row strips'''
+    if nbRow is None: nbRow=dicGdal['stripRows']
+    return [rioWindows.Window(0, i, width, min(nbRow, height-i)) for i in range(0, height, nbRow)]
+
+def _Profile(driver, width, height, count, dtype, lstCo=None, **kwargs):
+    '''
+    Output profile: GDAL creation options (KEY=VALUE) as rasterio keys,
+    compression with dicGdal['numThreads'] threads unless given.
+    '''
+    profOut={'driver': driver, 'width': width, 'height': height, 'count': count, 'dtype': np.dtype(dtype).name}
+    profOut.update({key: val for key, val in kwargs.items() if val is not None})
+    for strCo in lstCo or []:
+        key, val=strCo.split('=', 1)
+        profOut[key.lower()]=val
+    if driver=='GTiff' and profOut.get('compress', 'NONE').upper()!='NONE': profOut.setdefault('num_threads', dicGdal['numThreads'])
+    return profOut
+
+def _Stream(funWin, lstWin, imgOut, nbWorker=None):
+    '''Compute windows in a thread pool and write them (serialised writes)'''
+    if nbWorker is None: nbWorker=dicGdal['workers']
+    locWrite=threading.Lock()
+    def WriteWin(winCur):
+        matWin=funWin(winCur)
+        with locWrite:
+            imgOut.write(matWin, window=winCur)
+        return 0
+    with ThreadPoolExecutor(nbWorker) as poolCur:
+        list(poolCur.map(WriteWin, lstWin))
+    return len(lstWin)
+
+def Translate(pathIn, pathOut, lstBand=None, driver='GTiff', dtype=None, nodata=None, outSize=None, lstCo=None, driverIn=None, rpc=True, nbWorker=None):
+    '''
+    In-process gdal_translate: band selection, format and type conversion,
+    nearest neighbour resize. The image is streamed by row strips read by
+    worker threads. Georeferencing, metadata, band descriptions and (if
+    rpc) RPCs are copied.
+
+    pathIn (str): input path
+    pathOut (str): output path
+    lstBand (list): band indices from 1 (default: None means all)
+    driver (str): output driver (default: 'GTiff')
+    dtype (str): output data type (default: None means input type)
+    nodata (float): output nodata (default: None means input nodata)
+    outSize (tuple): output size (columns, rows), int [pxl] or str ending with % (default: None)
+    lstCo (list): creation options ['KEY=VALUE', ...] (default: None)
+    driverIn (str): input driver (default: None means any)
+    rpc (bool): copy the RPCs (default: True)
+    nbWorker (int): thread number (default: None means dicGdal['workers'])
+    out:
+        0 (int)
+    '''
+    with _Readers(driverIn) as objRead:
+        objIn=objRead.Get(pathIn)
+        dicIn=_Info(objIn)
+        if not lstBand: lstBand=list(range(1, dicIn['count']+1))
+        nbCol, nbRow=dicIn['width'], dicIn['height']
+        if outSize:
+            lstSize=[int(float(str(v)[:-1])*n/100+0.5) if str(v).endswith('%') else int(v) for v, n in zip(outSize, (nbCol, nbRow))]
+            nbCol, nbRow=lstSize
+            if not nbRow: nbRow=int(nbCol*dicIn['height']/dicIn['width']+0.5)
+            if not nbCol: nbCol=int(nbRow*dicIn['width']/dicIn['height']+0.5)
+        dtypeOut=dtype or dicIn['dtype']
+        transOut=dicIn['transform']
+        if not (nbCol, nbRow)==(dicIn['width'], dicIn['height']) and not transOut.is_identity:
+            transOut=transOut*transOut.scale(dicIn['width']/nbCol, dicIn['height']/nbRow)
+        profOut=_Profile(driver, nbCol, nbRow, len(lstBand), dtypeOut, lstCo=lstCo,
+                         nodata=dicIn['nodata'] if nodata is None else nodata,
+                         crs=dicIn['crs'],
+                         transform=None if transOut.is_identity else transOut)
+
+        # Nearest neighbour source indices (pixel centres)
+        vectCol=np.minimum((np.arange(nbCol)+0.5)*dicIn['width']/nbCol, dicIn['width']-1).astype(int)
+        vectRow=np.minimum((np.arange(nbRow)+0.5)*dicIn['height']/nbRow, dicIn['height']-1).astype(int)
+        checkSize=(nbCol, nbRow)==(dicIn['width'], dicIn['height'])
+
+        def TranslateWin(winOut):
+            if checkSize: return _Cast(_Read(objRead.Get(pathIn), lstBand, winOut), dtypeOut)
+            vectRowWin=vectRow[winOut.row_off:winOut.row_off+winOut.height]
+            winIn=rioWindows.Window(0, vectRowWin[0], dicIn['width'], vectRowWin[-1]-vectRowWin[0]+1)
+            matIn=_Read(objRead.Get(pathIn), lstBand, winIn)
+            return _Cast(matIn[:, vectRowWin-vectRowWin[0]][:, :, vectCol], dtypeOut)
+
+        with rasterio.open(pathOut, 'w', **profOut) as imgOut:
+            if not isinstance(objIn, np.ndarray):
+                imgOut.update_tags(**objIn.tags())
+                if rpc and objIn.rpcs: imgOut.rpcs=objIn.rpcs
+            for i, iBand in enumerate(lstBand):
+                if dicIn['desc'][iBand-1]: imgOut.set_band_description(i+1, dicIn['desc'][iBand-1])
+            _Stream(TranslateWin, _Strips(nbCol, nbRow), imgOut, nbWorker=nbWorker)
+    return 0
+
+def Merge(lstPathIn, pathOut, nodataIn=None, nodata=None, lstInit=None, dtype=None, lstCo=None, nbWorker=None):
+    '''
+    In-process gdal_merge: mosaic on the union of the input extents at
+    the first input resolution, later inputs overwrite earlier ones
+    (except their nodataIn pixels, or without nodataIn their masked
+    pixels: own nodata, mask band or alpha, as gdal_merge). Output strips
+    are filled by worker threads.
+
+    lstPathIn (list): input paths
+    pathOut (str): output path
+    nodataIn (float): input value to ignore (-n) (default: None means each input mask)
+    nodata (float): output nodata (-a_nodata) (default: None)
+    lstInit (list): initial value per band, one value for all (-init) (default: None means 0)
+    dtype (str): output data type (default: None means first input type)
+    lstCo (list): creation options ['KEY=VALUE', ...] (default: None)
+    nbWorker (int): thread number (default: None means dicGdal['workers'])
+    out:
+        0 (int)
+    '''
+    if not lstPathIn: SubLogger('CRITICAL', 'No image to merge')
+    with _Readers() as objRead:
+        lstInfo=[_Info(objRead.Get(pathIn)) for pathIn in lstPathIn]
+        infoRef=lstInfo[0]
+        resX, resY=infoRef['transform'].a, infoRef['transform'].e
+        lstBnds=[]
+        for dicIn in lstInfo:
+            transIn=dicIn['transform']
+            lstBnds.append((transIn.c, transIn.f, transIn.c+transIn.a*dicIn['width'], transIn.f+transIn.e*dicIn['height']))
+        matBnds=np.array(lstBnds)
+        left, top=np.amin(matBnds[:,0]), np.amax(matBnds[:,1])
+        right, bottom=np.amax(matBnds[:,2]), np.amin(matBnds[:,3])
+        nbCol, nbRow=int((right-left)/resX+0.5), int((bottom-top)/resY+0.5)
+        nbBand=infoRef['count']
+        dtypeOut=dtype or infoRef['dtype']
+        vectInit=np.zeros(nbBand) if lstInit is None else np.resize(np.array(lstInit, dtype=float), nbBand)
+        # Inputs with invalid pixels (nodata, mask band or alpha)
+        lstMask=[_Masked(objRead.Get(pathIn)) for pathIn in lstPathIn]
+
+        # Input placement (gdal_merge rounding)
+        lstPlace=[]
+        for dicIn, bnds in zip(lstInfo, lstBnds):
+            xOff, yOff=int((bnds[0]-left)/resX+0.1), int((bnds[1]-top)/resY+0.1)
+            xSize, ySize=int((bnds[2]-left)/resX+0.5)-xOff, int((bnds[3]-top)/resY+0.5)-yOff
+            lstPlace.append((xOff, yOff, xSize, ySize))
+
+        def MergeWin(winOut):
+            matOut=np.empty((nbBand, winOut.height, winOut.width), dtype=dtypeOut)
+            matOut[:]=vectInit[:, np.newaxis, np.newaxis].astype(dtypeOut)
+            rowMin, rowMax=winOut.row_off, winOut.row_off+winOut.height
+            for pathIn, dicIn, checkMask, (xOff, yOff, xSize, ySize) in zip(lstPathIn, lstInfo, lstMask, lstPlace):
+                rowIn, rowEnd=max(rowMin, yOff), min(rowMax, yOff+ySize)
+                if rowIn>=rowEnd or xSize<=0: continue
+                # Nearest neighbour source pixels of the placed extent
+                vectRow=np.minimum(((np.arange(rowIn, rowEnd)-yOff+0.5)*dicIn['height']/ySize).astype(int), dicIn['height']-1)
+                vectCol=np.minimum(((np.arange(xSize)+0.5)*dicIn['width']/xSize).astype(int), dicIn['width']-1)
+                winIn=rioWindows.Window(0, vectRow[0], dicIn['width'], vectRow[-1]-vectRow[0]+1)
+                lstBand=list(range(1, nbBand+1))
+                matIn=_Read(objRead.Get(pathIn), lstBand, winIn)[:, vectRow-vectRow[0]][:, :, vectCol]
+                matDst=matOut[:, rowIn-rowMin:rowEnd-rowMin, xOff:xOff+xSize]
+                if nodataIn is not None:
+                    maskIn=~(matIn==nodataIn)
+                elif checkMask:
+                    maskIn=objRead.Get(pathIn).read_masks(lstBand, window=winIn)[:, vectRow-vectRow[0]][:, :, vectCol]>0
+                else:
+                    matDst[:]=_Cast(matIn, dtypeOut)
+                    continue
+                matIn=_Cast(matIn, dtypeOut)
+                matDst[maskIn]=matIn[maskIn]
+            return matOut
+
+        profOut=_Profile('GTiff', nbCol, nbRow, nbBand, dtypeOut, lstCo=lstCo,
+                         nodata=nodata,
+                         crs=infoRef['crs'],
+                         transform=rasterio.Affine(resX, 0, left, 0, resY, top))
+        with rasterio.open(pathOut, 'w', **profOut) as imgOut:
+            for iBand, desc in enumerate(infoRef['desc']):
+                if desc: imgOut.set_band_description(iBand+1, desc)
+            _Stream(MergeWin, _Strips(nbCol, nbRow), imgOut, nbWorker=nbWorker)
+    return 0
+
+def Calc(dicPathIn, pathOut, strExpr, dicBand=None, dtype='float32', nodata=None, lstCo=None, nbWorker=None):
+    '''
+    In-process gdal_calc: numpy expression over named inputs (A, B, ...)
+    evaluated by row strips in worker threads. Pixels where an input
+    equals its nodata are set to the output nodata.
+
+    dicPathIn (dict): input paths {'A': path, ...}
+    pathOut (str): output path
+    strExpr (str): numpy expression (e.g. 'A*(B>0)')
+    dicBand (dict): band per input {'A': 1, ...} (default: None means band 1)
+    dtype (str): output data type (default: 'float32')
+    nodata (float): output nodata (default: None means dicCalcNodata)
+    lstCo (list): creation options ['KEY=VALUE', ...] (default: None)
+    nbWorker (int): thread number (default: None means dicGdal['workers'])
+    out:
+        0 (int)
+    '''
+    if not dicPathIn: SubLogger('CRITICAL', 'No calc input')
+    dicBand=dicBand or {}
+    if nodata is None: nodata=dicCalcNodata[np.dtype(dtype).name]
+    dicNp={name: getattr(np, name) for name in dir(np) if not name.startswith('_')}
+    codeExpr=compile(strExpr, '<calc>', 'eval')
+
+    with _Readers() as objRead:
+        lstName=sorted(dicPathIn)
+        dicInfo={name: _Info(objRead.Get(dicPathIn[name])) for name in lstName}
+        infoRef=dicInfo[lstName[0]]
+        for name in lstName:
+            if not (dicInfo[name]['width'], dicInfo[name]['height'])==(infoRef['width'], infoRef['height']):
+                SubLogger('CRITICAL', 'Calc inputs with different sizes: %s'% dicPathIn[name])
+
+        def CalcWin(winCur):
+            dicVar=dict(dicNp)
+            maskNodata=np.zeros((winCur.height, winCur.width), dtype=bool)
+            for name in lstName:
+                matIn=_Read(objRead.Get(dicPathIn[name]), [int(dicBand.get(name, 1))], winCur)[0]
+                if dicInfo[name]['nodata'] is not None: maskNodata|=matIn==dicInfo[name]['nodata']
+                dicVar[name]=matIn
+            matOut=np.empty((winCur.height, winCur.width), dtype=dtype)
+            matOut[:]=_Cast(np.broadcast_to(np.asarray(eval(codeExpr, {'__builtins__': {}}, dicVar)), matOut.shape), dtype)
+            matOut[maskNodata]=nodata
+            return matOut[np.newaxis]
+
+        profOut=_Profile('GTiff', infoRef['width'], infoRef['height'], 1, dtype, lstCo=lstCo,
+                         nodata=nodata,
+                         crs=infoRef['crs'],
+                         transform=None if infoRef['transform'].is_identity else infoRef['transform'])
+        with rasterio.open(pathOut, 'w', **profOut) as imgOut:
+            _Stream(CalcWin, _Strips(infoRef['width'], infoRef['height']), imgOut, nbWorker=nbWorker)
+    return 0
+
+def Retile(pathIn, dirOut, sizeTile=(256, 256), lstCo=None, nbWorker=None):
+    '''
+    In-process gdal_retile: cut an image into tiles named
+    <name>_<row>_<col>.tif (from 1, zero padded to the digit number of
+    the largest tile count, edge tiles are smaller). Tiles are written by
+    worker threads.
+
+    pathIn (str): input path
+    dirOut (str): tile directory
+    sizeTile (tuple): tile size (columns, rows) [pxl] (default: (256, 256))
+    lstCo (list): creation options ['KEY=VALUE', ...] (default: None)
+    nbWorker (int): thread number (default: None means dicGdal['workers'])
+    out:
+        lstPathOut (list): tile paths
+    '''
+    if nbWorker is None: nbWorker=dicGdal['workers']
+    os.makedirs(dirOut, exist_ok=True)
+    with _Readers() as objRead:
+        dicIn=_Info(objRead.Get(pathIn))
+        nbTileX, nbTileY=ceil(dicIn['width']/sizeTile[0]), ceil(dicIn['height']/sizeTile[1])
+        nbDigit=len(str(max(nbTileX, nbTileY)))
+        nameTile=os.path.join(dirOut, os.path.splitext(os.path.basename(pathIn))[0]+'_%0{0}i_%0{0}i.tif'.format(nbDigit))
+        lstTile=[(j+1, i+1, rioWindows.Window(i*sizeTile[0], j*sizeTile[1],
+                                   min(sizeTile[0], dicIn['width']-i*sizeTile[0]),
+                                   min(sizeTile[1], dicIn['height']-j*sizeTile[1])))
+                 for j in range(nbTileY) for i in range(nbTileX)]
+
+        def WriteTile(tupTile):
+            iRow, iCol, winCur=tupTile
+            objIn=objRead.Get(pathIn)
+            transTile=None
+            if not dicIn['transform'].is_identity: transTile=rioWindows.transform(winCur, dicIn['transform'])
+            profOut=_Profile('GTiff', winCur.width, winCur.height, dicIn['count'], dicIn['dtype'], lstCo=lstCo,
+                             nodata=dicIn['nodata'],
+                             crs=dicIn['crs'],
+                             transform=transTile)
+            pathOut=nameTile% (iRow, iCol)
+            with rasterio.open(pathOut, 'w', **profOut) as imgOut:
+                imgOut.write(_Read(objIn, list(range(1, dicIn['count']+1)), winCur))
+            return pathOut
+
+        with ThreadPoolExecutor(nbWorker) as poolCur:
+            lstPathOut=list(poolCur.map(WriteTile, lstTile))
+    return lstPathOut
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
@@ -9,15 +9,17 @@ import logging
 from pprint import pprint
 import numpy as np
 from numpy.linalg import inv, svd, lstsq, det, norm, matrix_rank
-import rasterio
-from sklearn.preprocessing import PolynomialFeatures
+
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+sklearnPreproc=LazyImport('sklearn.preprocessing')
 
 from importlib.util import find_spec
 checkPlanetCommon=find_spec('planet_opencv3') is not None
 if checkPlanetCommon:
     from planet_opencv3 import cv2 as cv
 else:
-    import cv2 as cv
+    cv=LazyImport('cv2')
 
 from OutLib.LoggerFunc import *
 
@@ -693,7 +695,7 @@ class RPCin:
         nbPts=ptsIn.shape[0]
         
         pts3DN=(ptsIn-self.Offset(d=3))/self.Scale(d=3)
-        poly=PolynomialFeatures(orderPoly)
+        poly=sklearnPreproc.PolynomialFeatures(orderPoly)
         matPoly=poly.fit_transform(pts3DN)
         n=poly.powers_.shape[0] #poly.get_feature_names() not compatible with planet_common env
 
@@ -744,7 +746,7 @@ class RPCin:
         zN=(zIn-self.heiOffset)/self.heiScale
         ptsTripleN=np.append(pts2DN,zN, axis=1)
         
-        poly=PolynomialFeatures(orderPoly)
+        poly=sklearnPreproc.PolynomialFeatures(orderPoly)
         matPoly=poly.fit_transform(ptsTripleN)
         n=poly.powers_.shape[0] #poly.get_feature_names() not compatible with planet_common env
         
@@ -783,7 +785,7 @@ class RPCin:
         if not type(orderPoly)==int and not 0<orderPoly<4: SubLogger('CRITICAL', 'Wrong polynomial order')
         
         nbPts=pts2D.shape[0]
-        nbFeat=PolynomialFeatures(orderPoly).fit(np.array([[1,2,3]])).powers_.shape[0]*2
+        nbFeat=sklearnPreproc.PolynomialFeatures(orderPoly).fit(np.array([[1,2,3]])).powers_.shape[0]*2
         if (1<solver<4 and nbPts<nbFeat-1) or (-1<solver<2 and nbPts<nbFeat):
             SubLogger('CRITICAL', 'Not enough GCP for %i order polynimal: change either polynomial order, point number or solver method'% orderPoly)
         
@@ -815,7 +817,7 @@ class RPCin:
         '''
         nbPts=pts2D.shape[0]
         
-        poly=PolynomialFeatures(orderPoly)
+        poly=sklearnPreproc.PolynomialFeatures(orderPoly)
         matPoly=poly.fit_transform(pts3D)
         n=poly.powers_.shape[0] #poly.get_feature_names() not compatible with planet_common env
 
@@ -1113,13 +1115,13 @@ def MaskedImg(pathImgIn, pathModelIn, pathDemIn, geomIn, pathImgOut=None, buffer
                        1.0, 
                        2*buffer)
     if not np.any(mask): 
-        SubLogger('ERROR', 'Area out of frame boundaries: %s\nCoords Geo:\n%s\nCoords Img:\n%s'% (os.path.basename(pathImgIn), str(matCoordsGeo), str(matCoordsImg)) )
+        SubLogger('ERROR', 'Area out of frame boundaries: %s\nCoords Geo:\n%s\nCoords Img:\n%s'% (os.path.basename(pathImgOut or "array") if type(pathImgIn)==np.ndarray else os.path.basename(pathImgIn), str(matCoordsGeo), str(matCoordsImg)) )
         return 1
     
 
     if pathImgOut: 
         out=cv.imwrite(pathImgOut, img*mask.astype(bool))
-        if not type(out)==bool or not out: SubLogger('CRITICAL', 'Masked image creation error : %s'% os.path.basename(pathImgIn))
+        if not type(out)==bool or not out: SubLogger('CRITICAL', 'Masked image creation error : %s'% os.path.basename(pathImgOut))
     else:
         out=img*mask.astype(bool)
     
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import logging
+from multiprocessing import Pool
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+from importlib.util import find_spec
+checkPlanetCommon=find_spec('planet_opencv3') is not None
+if checkPlanetCommon:
+    from planet_opencv3 import cv2 as cv
+else:
+    cv=LazyImport('cv2')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['ImgStore']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+class ImgStore():
+    '''
+    Decoded image cache shared by processes. Each image (e.g. extFeat1B)
+    is decoded once into an uncompressed .npy file and then read through
+    np.memmap: concurrent workers using the same scene share the page
+    cache instead of holding private decoded copies. Arrays are read-only,
+    processing must write into new arrays. A cached image is rebuilt if
+    the source is newer.
+
+    pathDir (str): cache directory
+    out:
+        ImgStore (obj):
+    '''
+    def __init__(self, pathDir):
+        self.pathDir=os.path.abspath(pathDir)
+        os.makedirs(self.pathDir, exist_ok=True)
+
+    def __str__(self):
+        lstNpy=[name for name in os.listdir(self.pathDir) if name.endswith('.npy')]
+        sizeCache=sum([os.path.getsize(os.path.join(self.pathDir, name)) for name in lstNpy])
+        return '%s (%i images, %.2f GB)'% (self.pathDir, len(lstNpy), sizeCache/1024**3)
+
+    def Path(self, pathImg):
+        '''Cache path of an image'''
+        return os.path.join(self.pathDir, os.path.splitext(os.path.basename(pathImg))[0]+'.npy')
+
+    def Convert(self, pathImg):
+        '''
+        Decode an image into the cache (atomic replace, safe with
+        concurrent workers).
+
+        pathImg (str): image path
+        out:
+            pathNpy (str): cache path
+        '''
+        pathNpy=self.Path(pathImg)
+        if not os.path.exists(pathImg): SubLogger('CRITICAL', 'Image not found: %s'% pathImg)
+        if os.path.exists(pathNpy) and os.path.getmtime(pathNpy)>=os.path.getmtime(pathImg): return pathNpy
+
+        img=cv.imread(pathImg, cv.IMREAD_UNCHANGED)
+        if img is None: SubLogger('CRITICAL', 'Image reading failed: %s'% pathImg)
+        pathTmp=pathNpy[:-4]+'_%i.tmp.npy'% os.getpid()
+        np.save(pathTmp, img)
+        os.replace(pathTmp, pathNpy)
+        return pathNpy
+
+    def Prepare(self, lstPathImg, nbProc=None):
+        '''
+        Decode a list of images in parallel.
+
+        lstPathImg (list): image paths
+        nbProc (int): process number (default: None means cpu number)
+        out:
+            lstNpy (list): cache paths
+        '''
+        with Pool(nbProc) as poolCur:
+            lstNpy=poolCur.map(self.Convert, lstPathImg)
+        return lstNpy
+
+    def Read(self, pathImg):
+        '''
+        Zero-copy read-only access to an image (decoded on first use).
+
+        pathImg (str): image path
+        out:
+            img (np.memmap): image array
+        '''
+        return np.load(self.Convert(pathImg), mmap_mode='r')
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
@@ -6,37 +6,39 @@ import json
 import logging
 from math import pi, sin, cos, ceil, floor
 from copy import copy
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 import numpy as np
 from numpy.linalg import norm, inv, det, matrix_rank
-from scipy.signal import gaussian
-import rasterio
-from shapely.geometry import Polygon
-import pyproj
 from pprint import pprint
 
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+shapelyGeom=LazyImport('shapely.geometry')
+shapelyPrep=LazyImport('shapely.prepared')
+pyproj=LazyImport('pyproj')
+
 
 from importlib.util import find_spec
 checkPlanetCommon=find_spec('planet_opencv3') is not None
 if checkPlanetCommon:
     from planet_opencv3 import cv2 as cv
 else:
-    import cv2 as cv
+    cv=LazyImport('cv2')
 
 from OutLib.LoggerFunc import *
 from VarCur import *
-from BlockProc import GeomFunc, DockerLibs
+from BlockProc import GeomFunc, DockerLibs, ResourceFunc, RasterFunc
 
 #-----------------------------------------------------------------------
 # Hard argument
 #-----------------------------------------------------------------------
 __author__='Valentin Schmitt'
 __version__=1.0
-__all__ =['ReprojGeom', 'FilterDmProces', 'EpipPreProc', 'SubArgs_Stereo', 'MergeDisparities', 'SubArgs_P2D', 'SubArgs_P2L', 'BRratio', 'AspPc2Txt', 'PdalJson', 'PC_Summary', 'FilterTiles', 'PC2Raster']
+__all__ =['ReprojGeom', 'FilterDmProces', 'FilterDmBatch', 'EpipPreProc', 'DispRange', 'PairEstimate', 'SubArgs_Stereo', 'MergeDisparities', 'SparseLRC', 'CompareLRC', 'SubArgs_P2D', 'SubArgs_P2L', 'BRratio', 'AspPc2Txt', 'PdalJson', 'PC_Summary', 'FilterTiles', 'PC2Raster']
 SetupLogger(name=__name__)
 #SubLogger('ERROR', 'Hello')
 
-gdTrans='gdal_translate'
 #-----------------------------------------------------------------------
 # Hard command
 #-----------------------------------------------------------------------
@@ -103,8 +105,8 @@ def FilterDmProces(lstFeat, coupleCur, pathPC, formTsai, geomAoi):
         #if 'ascending' in setSatOri: return False
 
     # Geometry size
-    polyAoi=Polygon(np.array(geomAoi['coordinates']).reshape(-1,2).tolist())
-    polyPair=Polygon(np.array(coupleCur['geometry']['coordinates']).reshape(-1,2).tolist())
+    polyAoi=shapelyGeom.Polygon(np.array(geomAoi['coordinates']).reshape(-1,2).tolist())
+    polyPair=shapelyGeom.Polygon(np.array(coupleCur['geometry']['coordinates']).reshape(-1,2).tolist())
     if not polyPair.intersects(polyAoi): return False
     if polyPair.intersection(polyAoi).area<tolPairArea: return False
 
@@ -121,7 +123,81 @@ def FilterDmProces(lstFeat, coupleCur, pathPC, formTsai, geomAoi):
 
     return True
 
-def EpipPreProc(lstIn, geomIn, pathDem, prefOut, epip=False, geomAoi=None):
+def FilterDmBatch(lstFeat, lstCouple, lstPathPC, formTsai, geomAoi):
+    '''
+    Filter the whole stereo pair dense matching list at once. It returns
+    the same selection as FilterDmProces but scenes are found by an ID map,
+    azimuths and cameras are read once per scene into arrays and the AOI
+    is prepared once.
+
+    lstFeat (lst): list of feature (json)
+    lstCouple (list): list of stereo pair features (json)
+    lstPathPC (list): destination paths for "_pc.tif" per pair
+    formTsai (str): standard name of Tsai file
+    geomAoi (json): 'geometry' part of the AOI feature
+    out:
+        maskRun (array): boolean mask, False=skip that stereo pair
+    '''
+    nbPair=len(lstCouple)
+    maskRun=np.ones(nbPair, dtype=bool)
+    if not nbPair: return maskRun
+
+    # Exists, stereo pair
+    maskRun&=np.array([not os.path.exists(pathPC) for pathPC in lstPathPC])
+    maskRun&=np.array([coupleCur['properties']['nbScene']<=2 for coupleCur in lstCouple])
+
+    # Scene arrays
+    dicScene={}
+    for i, featCur in enumerate(lstFeat): dicScene.setdefault(featCur['id'], i)
+    vectAz=np.array([featCur['properties'].get('sat:satellite_azimuth_mean_deg', np.nan) for featCur in lstFeat]+[np.nan], dtype=float)
+    lstPairId=[sorted(coupleCur['properties']['scenes'].split(';'))[:2] for coupleCur in lstCouple]
+    matIdx=np.array([[dicScene.get(idImg, -1) for idImg in lstId] for lstId in lstPairId]).reshape(-1, 2)
+
+    # Ascending/Descending
+    matAz=vectAz[matIdx]
+    maskAz=maskRun & ~np.isnan(matAz).any(axis=1)
+    if maskAz.any():
+        matAzDiff=(np.abs(matAz[maskAz][:,:,np.newaxis]-np.array(satAz_Val))//satAz_Tol)==0
+        checkInterp=matAzDiff.any(axis=2).all(axis=1)
+        if not checkInterp.all():
+            iErr=np.where(maskAz)[0][np.argmin(checkInterp)]
+            raise RuntimeError('Input satellite azimut not interpreted (stereopair %i): %s (+/-%i)'% (lstCouple[iErr]['id'], str(matAz[iErr].tolist()), satAz_Tol))
+        matOri=np.array(satAz_Name)[np.argmax(matAzDiff, axis=2)]
+        maskRun[np.where(maskAz)[0][matOri[:,0]!=matOri[:,1]]]=False
+
+    # Geometry size
+    polyAoi=shapelyGeom.Polygon(np.array(geomAoi['coordinates']).reshape(-1,2).tolist())
+    prepAoi=shapelyPrep.prep(polyAoi)
+    for j in np.where(maskRun)[0]:
+        polyPair=shapelyGeom.Polygon(np.array(lstCouple[j]['geometry']['coordinates']).reshape(-1,2).tolist())
+        if not prepAoi.intersects(polyPair) or polyPair.intersection(polyAoi).area<tolPairArea: maskRun[j]=False
+
+    # Block cameras
+    setId=set([idImg for j in np.where(maskRun)[0] for idImg in lstPairId[j]])
+    dicCam={}
+    for idImg in setId:
+        if not os.path.exists(formTsai.format(idImg)): continue
+        objCam=GeomFunc.TSAIin(formTsai.format(idImg))
+        dicCam[idImg]=(objCam.vectX0.flatten(), objCam.matR[-1, :])
+    for j in np.where(maskRun)[0]:
+        if not all([idImg in dicCam for idImg in lstPairId[j]]): maskRun[j]=False
+
+    # Epipolar angle
+    lstJ=np.where(maskRun)[0]
+    if not lstJ.size: return maskRun
+    matCamX0=np.array([[dicCam[idImg][0] for idImg in lstPairId[j]] for j in lstJ])
+    matCamZ=np.array([[dicCam[idImg][1] for idImg in lstPairId[j]] for j in lstJ])
+    epipXaxis=matCamX0[:,1]-matCamX0[:,0]
+    epipXaxis/=norm(epipXaxis, axis=1)[:,np.newaxis]
+    epipZaxis=0.5*(matCamZ[:,0]+matCamZ[:,1])
+    epipZaxis/=norm(epipZaxis, axis=1)[:,np.newaxis]
+
+    vectAngle=np.arccos(np.abs(np.sum(epipXaxis*epipZaxis, axis=1)))*180/pi
+    maskRun[lstJ[np.round(vectAngle)<tolAxisAngle]]=False
+
+    return maskRun
+
+def EpipPreProc(lstIn, geomIn, pathDem, prefOut, epip=False, geomAoi=None, crop=False, imgStore=None, shm=None, write=True, quant=False):
     '''
     Packed function for dense matching preparation. It can create 
     epipolar images or simply enhanced images (radiometry).
@@ -131,17 +207,21 @@ def EpipPreProc(lstIn, geomIn, pathDem, prefOut, epip=False, geomAoi=None):
     prefOut (str): output prefix
     epip (bool): create an epipolar image if True
     aoi (json): Json feature of the region of interest to mask it in the image
+    crop (bool): crop the epipolar frame to the projected overlap (default: False)
+    imgStore (ImgStore): shared decoded image cache (default: None means image decoding)
+    shm (ShmChannel): channel receiving the images and masks for in-process
+        stages (default: None means files only)
+    write (bool): write image files with a channel, for external tools (default: True)
+    quant (bool): quantise the full resolution images (dicRasterPolicy['quantRadio']),
+        only if they are read by native stages which apply the scale (default: False)
     out:
         0 (int): 
     '''
     margin=20
-    with os.popen("awk '/MemAvailable/ {print $0}' /proc/meminfo") as meminfo:
-        cmdOut=meminfo.read().split()
-        dicFact={'kB': 1024, 'B':1, 'MB': 1024**2, 'GB': 1024**3}
-        sizeFreeMem=int(cmdOut[1])*dicFact[cmdOut[2]]
+    sizeFreeMem=ResourceFunc.MemAvailable()
 
     def _PrepaRadioImg(i):
-        lstImg[i]=lstImg[i].astype(np.float32, copy=False)
+        lstImg[i]=lstImg[i].astype(np.float32, copy=not lstImg[i].flags.writeable)
 
         ## Copy kernel
         #kernShape=11
@@ -230,11 +310,10 @@ def EpipPreProc(lstIn, geomIn, pathDem, prefOut, epip=False, geomAoi=None):
                                                lstCamIn[i].matK, 
                                                (lstImg[i].shape[1], lstImg[i].shape[0]),
                                                cv.CV_32FC1)
-        cv.remap(src=lstImg[i], 
-                map1=mapx, 
-                map2=mapy, 
-                interpolation=cv.INTER_LINEAR,
-                dst=lstImg[i])
+        lstImg[i]=cv.remap(src=lstImg[i], 
+                           map1=mapx, 
+                           map2=mapy, 
+                           interpolation=cv.INTER_LINEAR)
         
         lstMask[i]=lstMask[i].astype(float, copy=False)
         cv.remap(src=lstMask[i], 
@@ -286,6 +365,25 @@ def EpipPreProc(lstIn, geomIn, pathDem, prefOut, epip=False, geomAoi=None):
         
         return vectOff, vectSize
 
+    def EpipCropParam(vectOff, vectSize):
+        # Overlap vertices on the DEM
+        matGeo=np.array(geomIn['coordinates']).reshape(-1,2)
+        with rasterio.open(pathDem) as demIn:
+            vectH=np.array([v[0] for v in demIn.sample(matGeo.tolist())], dtype=float)
+        matGeo=np.append(matGeo, vectH[:, np.newaxis], axis=1)
+
+        # Projected overlap in both epipolar frames (x, y)=(col, row)
+        matProj=np.vstack([lstCamOut[i].Obj2Img_Geo(matGeo) for i in range(2)])
+        cornMin=np.floor(np.amin(matProj, axis=0)).astype(int)-2*margin
+        cornMax=np.ceil(np.amax(matProj, axis=0)).astype(int)+2*margin
+        
+        # Within the full frame
+        cornMin=np.maximum(cornMin, -vectOff.astype(int))
+        cornMax=np.minimum(cornMax, vectSize-vectOff.astype(int))
+        if np.any(cornMax<=cornMin): return vectOff, vectSize
+
+        return -cornMin.astype(float), cornMax-cornMin
+
     if not len(lstIn)==2: SubLogger('CRITICAL', 'lstIn must be of length 2 (stereo pair)')
     if not os.path.exists(os.path.dirname(prefOut)): os.mkdir(os.path.dirname(prefOut))
     #if glob(prefOut+'-*'): os.system('rm -f %s'% (prefOut+'*'))
@@ -293,7 +391,10 @@ def EpipPreProc(lstIn, geomIn, pathDem, prefOut, epip=False, geomAoi=None):
     nameASP=(('-L.tif', '-L.tsai', '-lMask.tif', '-L_sub.tif', '-lMask_sub.tif'),
              ('-R.tif', '-R.tsai', '-rMask.tif', '-R_sub.tif', '-rMask_sub.tif'))
 
-    lstImg=[cv.imread(lstIn[i][0], cv.IMREAD_GRAYSCALE+(-1)) for i in range(2)]
+    if imgStore is None:
+        lstImg=[cv.imread(lstIn[i][0], cv.IMREAD_GRAYSCALE+(-1)) for i in range(2)]
+    else:
+        lstImg=[imgStore.Read(lstIn[i][0]) for i in range(2)]
     lstMask=[np.ones(img.shape, dtype=bool) for img in lstImg]
     lstCamIn=[GeomFunc.TSAIin(lstIn[i][1]) for i in range(2)]
 
@@ -322,7 +423,11 @@ def EpipPreProc(lstIn, geomIn, pathDem, prefOut, epip=False, geomAoi=None):
         lstCamOut=[_PrepaEpipCam(i) for i in range(2)]
         
         epipOff, epipSize=EpipFrameParam()
-        if epipSize[0]*epipSize[1]*32>sizeFreeMem/2:
+        if crop: 
+            sizeFull=epipSize[0]*epipSize[1]
+            epipOff, epipSize=EpipCropParam(epipOff, epipSize)
+            SubLogger('INFO', 'Epipolar frame cropped to %.1f%%'% (100*epipSize[0]*epipSize[1]/sizeFull))
+        if sizeFreeMem and epipSize[0]*epipSize[1]*32>sizeFreeMem/2:
             SubLogger('ERROR', 'Epipolar image too large: %.2f GB'% (epipSize[0]*epipSize[1]*32/1024**3))
             return 1
         # S: Shift
@@ -345,33 +450,115 @@ def EpipPreProc(lstIn, geomIn, pathDem, prefOut, epip=False, geomAoi=None):
     # Radiometry
     [_PrepaRadioImg(i) for i in range(2)]
     
-    # Record
-    cmd=''
-    for i in range(2):
-        cv.imwrite(prefOut+nameASP[i][0], lstImg[i].astype(np.float32))
-        cv.imwrite(prefOut+nameASP[i][2], 255*lstMask[i].astype(np.uint8))
+    # Record: full and subsampled (1/4, gdal_translate -outsize 25% rounding) from memory
+    def _WriteImg(tupIn):
+        pathOut, matOut, nodata, radio=tupIn
+        return RasterFunc.WriteRaster(pathOut, matOut, nodata=nodata, radio=radio)
 
-        cmd+='{gd} -q -outsize 25% 25% -r average -a_nodata 0 {src} {dst} ; '.format(gd=gdTrans,
-                src=prefOut+nameASP[i][0],
-                dst=prefOut+nameASP[i][3],)
-        cmd+='{gd} -q -outsize 25% 25% -r nearest -a_nodata 0 {src} {dst} ; '.format(gd=gdTrans,
-                src=prefOut+nameASP[i][2],
-                dst=prefOut+nameASP[i][4],)
+    lstWrite=[]
+    for i in range(2):
+        matImg=lstImg[i].astype(np.float32, copy=False)
+        matMask=255*lstMask[i].astype(np.uint8)
+        if shm is not None:
+            shm.Put(prefOut+nameASP[i][0], matImg)
+            shm.Put(prefOut+nameASP[i][2], matMask)
+            if not write: continue
+        sizeSub=tuple(int(0.5+0.25*n) for n in matImg.shape[::-1])
+        # Subsampled images are for ASP only (never quantised)
+        lstWrite+=[(prefOut+nameASP[i][0], matImg, None, quant),
+                   (prefOut+nameASP[i][2], matMask, None, False),
+                   (prefOut+nameASP[i][3], cv.resize(matImg, sizeSub, interpolation=cv.INTER_AREA), 0, False),
+                   (prefOut+nameASP[i][4], cv.resize(matMask, sizeSub, interpolation=cv.INTER_NEAREST), 0, False)]
 
     del lstImg
     del lstMask
     del lstCamIn
-    os.system(cmd)
+    if not lstWrite: return 0
+    with ThreadPoolExecutor(len(lstWrite)) as poolCur:
+        lstOut=list(poolCur.map(_WriteImg, lstWrite))
+    if not all(lstOut): 
+        SubLogger('ERROR', 'Image writing failed: %s'% prefOut)
+        return 1
     
     return 0
 
-def SubArgs_Stereo(lstPath, prefOut, epip=False):
+def DispRange(lstPathCam, geomIn, pathDem, margin=dicDispRange['margin']):
+    '''
+    Predict the disparity search range of an epipolar pair from the DEM.
+    A DEM grid over the pair overlap (+/- a height margin for DEM and 
+    geoid errors) is projected into both epipolar cameras and the 
+    disparity bounds are extended by a margin. The range follows ASP
+    convention (right=left+disparity) and --corr-search format.
+
+    lstPathCam (list): epipolar camera paths (left, right), e.g. -L.tsai and -R.tsai
+    geomIn (json): overlap footprint as geojson['geometry'] object
+    pathDem (str): DEM path (EPSG:4326)
+    margin (int): margin [pxl]
+    out:
+        lstRange (list): [hmin, vmin, hmax, vmax] [pxl] or empty list if no DEM point
+    '''
+    lstCam=[GeomFunc.TSAIin(pathCam) for pathCam in lstPathCam]
+    polyIn=shapelyGeom.Polygon(np.array(geomIn['coordinates']).reshape(-1,2).tolist())
+    prepIn=shapelyPrep.prep(polyIn)
+
+    # DEM grid
+    with rasterio.open(pathDem) as demIn:
+        winDem=rasterio.windows.from_bounds(*polyIn.bounds, transform=demIn.transform).round_offsets().round_lengths()
+        matDem=demIn.read(1, window=winDem, boundless=True, fill_value=demIn.nodata if demIn.nodata is not None else -32767)
+        transWin=demIn.window_transform(winDem)
+        nodataDem=demIn.nodata
+
+    step=max(1, ceil(max(matDem.shape)/dicDispRange['nbPts']))
+    matRow, matCol=np.mgrid[0:matDem.shape[0]:step, 0:matDem.shape[1]:step]
+    vectH=matDem[matRow, matCol].flatten().astype(float)
+    matLong, matLat=rasterio.transform.xy(transWin, matRow.flatten(), matCol.flatten())
+    matPts=np.array([matLong, matLat, vectH]).T.reshape(-1,3)
+    maskIn=np.array([prepIn.contains(shapelyGeom.Point(pt[:2])) for pt in matPts], dtype=bool)
+    if not nodataDem is None: maskIn&=~(vectH==nodataDem)
+    matPts=matPts[maskIn]
+    if not matPts.shape[0]: return []
+
+    matPts=np.vstack([matPts+[0, 0, dh] for dh in (-dicDispRange['heightMargin'], dicDispRange['heightMargin'])])
+
+    # Disparities
+    lstPtsImg=[objCam.Obj2Img_Geo(matPts) for objCam in lstCam]
+    matDisp=lstPtsImg[1]-lstPtsImg[0]
+    lstRange=np.floor(np.amin(matDisp, axis=0)-margin).astype(int).tolist()
+    lstRange+=np.ceil(np.amax(matDisp, axis=0)+margin).astype(int).tolist()
+    
+    return lstRange
+
+def PairEstimate(lstPathCam, geomIn, geomFrame, pathDem):
+    '''
+    Estimate the resource model features of a stereo pair before its
+    epipolar images exist: the frame size from the frame footprint at
+    gsdOrth and the disparity range width from the DEM projected into the
+    scene cameras (DispRange). The epipolar warp aligns disparities with
+    rows, the wider axis of the scene frame range stands for it.
+
+    lstPathCam (list): scene camera paths (left, right)
+    geomIn (json): overlap footprint as geojson['geometry'] object
+    geomFrame (json): epipolar frame footprint (left scene or overlap if cropped)
+    pathDem (str): DEM path (EPSG:4326)
+    out:
+        dicFeat (dict): pair features (see ResourceFunc.PairFeatures)
+    '''
+    dispRange=None
+    if all([os.path.exists(pathCam) for pathCam in lstPathCam]):
+        lstRange=DispRange(lstPathCam, geomIn, pathDem)
+        if lstRange: dispRange=max(lstRange[2]-lstRange[0], lstRange[3]-lstRange[1])
+    return ResourceFunc.PairFeatures(ResourceFunc.PairArea(geomIn),
+                                     nbPxl=ResourceFunc.PairArea(geomFrame)*1e6/gsdOrth**2,
+                                     dispRange=dispRange)
+
+def SubArgs_Stereo(lstPath, prefOut, epip=False, corrSearch=None):
     '''
     Create a list of stereo parameters.
 
     lstPath (list of list): list (2 items) with list (2 items) of image and tsai path
     prefOut (str): output prefix
     epip (bool): apply an epipolar transformation
+    corrSearch (list): disparity search range [hmin, vmin, hmax, vmax] (default: None means ASP estimation)
     out:
         subArgs (list): list of parameters
     '''
@@ -408,6 +595,9 @@ def SubArgs_Stereo(lstPath, prefOut, epip=False):
                  #Increase --corr-tile-size so the entire image fits in one tile, or use parallel_stereo. Not that making --corr-tile-size larger than 9000 or so may cause GDAL to crash.
              #'disparity map initialization' #1:box filter-like accumulator; 2:coarse-to-fine pyramid based; 3:disparity search space into sub-regions with similar values of disparity
              ]
+    if corrSearch:
+        subArgs+=['--corr-seed-mode', '0', # use the given search range
+                  '--corr-search']+[str(v) for v in corrSearch]
     ## Subpixel Refinement
     subArgs+=[#'--subpixel-mode', '1' # subprixel function fitted
              #'--phase-subpixel-accuracy', '20' # max pixel division denominator (1/x)
@@ -519,6 +709,117 @@ def MergeDisparities(prefLeft, prefRight, gdalDock):
         gdalDock.gdal_translate(['-if', '"EXR"', pathDispLeft.replace('.tif','.exr'), pathDispLeft])
     return pathDispLeft
  
+def SparseLRC(prefIn, write=True, shm=None):
+    '''
+    Left-right consistency from the forward disparity only. Left pixels
+    are sampled on a grid, the right patch pointed by the disparity is
+    matched back into the left epipolar image (NCC along the epipolar 
+    line, subpixel parabola) and samples which do not come back within
+    tolDispDiff are rejected. Each rejection invalidates its grid cell
+    in the disparity image (ASP -F.tif: dx, dy, valid).
+
+    prefIn (str): stereo prefix holding -L.tif, -R.tif and -F.tif
+    write (bool): update -F.tif (default: True)
+    shm (ShmChannel): shared arrays of the pair, the disparity array is
+        updated in place (default: None means files)
+    out:
+        dicStat (dict): sample, rejected numbers
+        maskReject (array): full resolution rejection mask
+    '''
+    step, halfWin, search=dicLRC['step'], dicLRC['halfWin'], dicLRC['search']
+    pathDisp=prefIn+'-F.tif'
+    if shm is not None and all([prefIn+ext in shm for ext in ('-L.tif', '-R.tif', '-F.tif')]):
+        imgL, imgR, matDisp=[shm.Get(prefIn+ext) for ext in ('-L.tif', '-R.tif', '-F.tif')]
+    else:
+        imgL=RasterFunc.ReadRaster(prefIn+'-L.tif', band=1).astype(np.float32, copy=False)
+        imgR=RasterFunc.ReadRaster(prefIn+'-R.tif', band=1).astype(np.float32, copy=False)
+        with rasterio.open(pathDisp) as imgIn:
+            matDisp=imgIn.read()
+    nbRow, nbCol=matDisp.shape[1:]
+
+    # Sample grid
+    border=halfWin+search
+    vectRow=np.arange(border, nbRow-border, step)
+    vectCol=np.arange(border, nbCol-border, step)
+    matReject=np.zeros([vectRow.size, vectCol.size], dtype=bool)
+    matI, matJ=np.meshgrid(np.arange(vectRow.size), np.arange(vectCol.size), indexing='ij')
+    matI, matJ=matI.flatten(), matJ.flatten()
+    ptsRow, ptsCol=vectRow[matI], vectCol[matJ]
+    maskValid=matDisp[2, ptsRow, ptsCol]>0
+    ptsR=np.array([ptsCol+matDisp[0, ptsRow, ptsCol], ptsRow+matDisp[1, ptsRow, ptsCol]]).T
+    ptsRint=np.round(ptsR).astype(int)
+    maskValid&=np.all((ptsRint[:,0]>=halfWin, ptsRint[:,0]<imgR.shape[1]-halfWin,
+                       ptsRint[:,1]>=halfWin, ptsRint[:,1]<imgR.shape[0]-halfWin), axis=0)
+    lstI=np.where(maskValid)[0]
+
+    # Reverse matching per chunk
+    vectWin=np.arange(-halfWin, halfWin+1)
+    vectSearch=np.arange(-search, search+1)
+    def _Norm(matPatch):
+        matPatch=matPatch-np.mean(matPatch, axis=-1)[...,np.newaxis]
+        return matPatch/(norm(matPatch, axis=-1)[...,np.newaxis]+1e-6)
+
+    for iStart in range(0, lstI.size, dicLRC['chunk']):
+        iCur=lstI[iStart:iStart+dicLRC['chunk']]
+        rowR=ptsRint[iCur,1][:,np.newaxis,np.newaxis]+vectWin[np.newaxis,:,np.newaxis]
+        colR=ptsRint[iCur,0][:,np.newaxis,np.newaxis]+vectWin[np.newaxis,np.newaxis,:]
+        patchR=_Norm(imgR[rowR, colR].reshape(iCur.size, -1))
+
+        rowL=ptsRow[iCur][:,np.newaxis,np.newaxis,np.newaxis]+vectWin[np.newaxis,np.newaxis,:,np.newaxis]
+        colL=(ptsCol[iCur][:,np.newaxis,np.newaxis,np.newaxis]+vectSearch[np.newaxis,:,np.newaxis,np.newaxis]
+                +vectWin[np.newaxis,np.newaxis,np.newaxis,:])
+        patchL=_Norm(imgL[rowL, colL].reshape(iCur.size, vectSearch.size, -1))
+
+        matNcc=np.einsum('nkp,np->nk', patchL, patchR)
+        kBest=np.argmax(matNcc, axis=1)
+        nccBest=matNcc[np.arange(iCur.size), kBest]
+
+        # Subpixel parabola
+        kIn=np.clip(kBest, 1, vectSearch.size-2)
+        c0, c1, c2=[matNcc[np.arange(iCur.size), kIn+d] for d in (-1, 0, 1)]
+        vectDen=c0-2*c1+c2
+        kSub=vectSearch[kIn]+np.where(np.abs(vectDen)>1e-6, 0.5*(c0-c2)/np.where(np.abs(vectDen)>1e-6, vectDen, 1), 0)
+
+        # Expected offset: right patch taken at the rounded position
+        vectOff=ptsRint[iCur,0]-ptsR[iCur,0]
+        checkReject=(np.abs(kSub-vectOff)>tolDispDiff) | (nccBest<dicLRC['nccMin']) | (np.abs(vectSearch[kBest])==search)
+        matReject[matI[iCur[checkReject]], matJ[iCur[checkReject]]]=True
+
+    # Dense mask: nearest sample
+    iRow=np.clip(np.rint((np.arange(nbRow)-border)/step).astype(int), 0, vectRow.size-1)
+    iCol=np.clip(np.rint((np.arange(nbCol)-border)/step).astype(int), 0, vectCol.size-1)
+    maskReject=matReject[iRow[:,np.newaxis], iCol[np.newaxis,:]] & (matDisp[2]>0)
+
+    if write:
+        matDisp[:, maskReject]=0
+        if os.path.exists(pathDisp):
+            with rasterio.open(pathDisp, 'r+') as imgOut:
+                imgOut.write(matDisp)
+
+    dicStat={'samples': int(lstI.size), 'rejected': int(np.sum(matReject))}
+    return dicStat, maskReject
+
+def CompareLRC(maskValid, maskSparse, pathMerged):
+    '''
+    Compare the sparse left-right rejection with the full path (forward
+    and reverse runs merged by MergeDisparities).
+
+    maskValid (array): valid pixels of the forward disparity
+    maskSparse (array): rejection mask from SparseLRC
+    pathMerged (str): merged disparity path (rejected pixels are 0)
+    out:
+        dicStat (dict): rejected pixel ratios and agreement
+    '''
+    with rasterio.open(pathMerged) as imgIn:
+        maskFull=maskValid & ~np.any(imgIn.read()!=0, axis=0)
+    nbValid=max(int(np.sum(maskValid)), 1)
+    nbFull, nbSparse=int(np.sum(maskFull)), int(np.sum(maskSparse))
+    nbBoth=int(np.sum(maskFull & maskSparse))
+    return {'rejFull': round(nbFull/nbValid, 4),
+            'rejSparse': round(nbSparse/nbValid, 4),
+            'recall': round(nbBoth/max(nbFull, 1), 4),
+            'precision': round(nbBoth/max(nbSparse, 1), 4)}
+
 def SubArgs_P2D(pathPCIn, epsgCur):
     '''
     Create a list of point2dem parameters.
@@ -584,24 +885,31 @@ def BRratio(path1, path2, atype=False):
     else:
         SubLogger('CRITICAL', 'Unknown atype (angle type): %s'% atype)
 
-def AspPc2Txt(pathIn):
+def AspPc2Txt(pathIn, shm=None):
     '''
     Convert -PC.tif (ASP format) into a .las point cloud in geopgarphic 
     coordinates. It includes 'intersection error'*100 [m*100] as "Intensity"
 
     pathIn (str): -PC.tif path
+    shm (ShmChannel): shared arrays of the pair (default: None means file)
     out:
         0 (int): done
 
     '''
     pathTxt=pathIn.replace('.tif', '.txt')
     
-    with rasterio.open(pathIn) as imgIn:
-        tagsCur=imgIn.tags()
+    if shm is not None and pathIn in shm:
+        tagsCur=shm.Desc(pathIn)['meta']
         if not 'POINT_OFFSET' in tagsCur: return 1
-
         matOffset=np.array([float(off) for off in tagsCur['POINT_OFFSET'].split()])
-        matPtsFull=imgIn.read().reshape(4,-1).T
+        matPtsFull=shm.Get(pathIn).reshape(4,-1).T
+    else:
+        with rasterio.open(pathIn) as imgIn:
+            tagsCur=imgIn.tags()
+            if not 'POINT_OFFSET' in tagsCur: return 1
+
+            matOffset=np.array([float(off) for off in tagsCur['POINT_OFFSET'].split()])
+            matPtsFull=imgIn.read().reshape(4,-1).T
           
     # logical OR on (x, y, z)
     maskPts=np.bool_(np.sum(np.abs(matPtsFull), axis=1))
@@ -819,7 +1127,7 @@ def FilterTiles(lstMid, lstTilePath, pathTemplate, featAoi):
     '''
     matOrigin=(np.array(lstMid)*1e-3).astype(int)
     
-    geomAoi=Polygon(featAoi['geometry']['coordinates'][0][0])
+    geomAoi=shapelyGeom.Polygon(featAoi['geometry']['coordinates'][0][0])
     cornerTile=np.array([[0,0],[0,1],[1,1],[1,0], [0,0]])
 
     strTemplate=pathTemplate.split('#')
@@ -828,7 +1136,7 @@ def FilterTiles(lstMid, lstTilePath, pathTemplate, featAoi):
         strIndexIn=pathTile.replace(strTemplate[0],'').replace(strTemplate[1],'')
         indexIn=np.array(strIndexIn.split('_')).astype(int)
         indexOut=matOrigin+indexIn
-        geomTile=Polygon((indexOut+cornerTile)*1e3)
+        geomTile=shapelyGeom.Polygon((indexOut+cornerTile)*1e3)
         if not geomTile.intersects(geomAoi):
             code+=os.system('rm %s'% pathTile)
             continue
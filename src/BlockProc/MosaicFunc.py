@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import json
+import logging
+import threading
+from math import floor, ceil
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+rioWindows=LazyImport('rasterio.windows')
+rioEnums=LazyImport('rasterio.enums')
+rioShutil=LazyImport('rasterio.shutil')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['GridInfo', 'BuildVrt', 'RenderMosaic']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def GridInfo(lstTilePath):
+    '''
+    Read tile profiles and compute the common mosaic grid. All tiles
+    must share the resolution, band number, data type and CRS.
+
+    lstTilePath (list): tile path list
+    out:
+        dicGrid (dict): mosaic grid {'transform', 'width', 'height', 'count',
+                        'dtype', 'nodata', 'crs', 'desc', 'tiles': {path: Window}}
+    '''
+    if not lstTilePath: SubLogger('CRITICAL', 'No tile to mosaic')
+
+    lstProf=[]
+    for pathTile in lstTilePath:
+        with rasterio.open(pathTile) as imgIn:
+            lstProf.append((pathTile, imgIn.profile, imgIn.bounds, imgIn.descriptions))
+
+    profRef=lstProf[0][1]
+    resX, resY=profRef['transform'].a, -profRef['transform'].e
+    for pathTile, prof, _, _ in lstProf:
+        if not (prof['count']==profRef['count'] and prof['dtype']==profRef['dtype'] and prof['crs']==profRef['crs']):
+            SubLogger('CRITICAL', 'Tile not compatible with the mosaic: %s'% pathTile)
+        if not (abs(prof['transform'].a-resX)<1e-6 and abs(-prof['transform'].e-resY)<1e-6):
+            SubLogger('CRITICAL', 'Tile resolution differs: %s'% pathTile)
+
+    matBnds=np.array([tup[2] for tup in lstProf])
+    left, top=np.amin(matBnds[:,0]), np.amax(matBnds[:,3])
+    right, bottom=np.amax(matBnds[:,2]), np.amin(matBnds[:,1])
+
+    dicGrid={'transform': rasterio.Affine(resX, 0, left, 0, -resY, top),
+             'width': int(round((right-left)/resX)),
+             'height': int(round((top-bottom)/resY)),
+             'count': profRef['count'],
+             'dtype': profRef['dtype'],
+             'nodata': -32767 if profRef['nodata'] is None else profRef['nodata'],
+             'crs': profRef['crs'],
+             'desc': lstProf[0][3],
+             'tiles': {}}
+
+    for pathTile, prof, bnds, _ in lstProf:
+        dicGrid['tiles'][pathTile]=rioWindows.Window(int(round((bnds.left-left)/resX)),
+                                          int(round((top-bnds.top)/resY)),
+                                          prof['width'],
+                                          prof['height'])
+
+    return dicGrid
+
+def BuildVrt(lstTilePath, pathVrt, dicGrid=None, lstNodata=None):
+    '''
+    Write a VRT mosaic over the tiles (gdalbuildvrt equivalent). Tile
+    paths are stored relatively to the VRT if they are in the same folder.
+    Uncovered pixels read the band nodata value.
+
+    lstTilePath (list): tile path list
+    pathVrt (str): output VRT path
+    dicGrid (dict): mosaic grid from GridInfo (default: None means computed)
+    lstNodata (list): nodata value per band (default: None means the grid nodata)
+    out:
+        dicGrid (dict): mosaic grid
+    '''
+    if dicGrid is None: dicGrid=GridInfo(lstTilePath)
+    if lstNodata is None: lstNodata=[]
+    lstNodata=list(lstNodata)[:dicGrid['count']]+[dicGrid['nodata']]*(dicGrid['count']-len(lstNodata))
+    dirVrt=os.path.dirname(os.path.abspath(pathVrt))
+    nameType={'float32': 'Float32', 'float64': 'Float64', 'uint8': 'Byte', 'uint16': 'UInt16',
+              'int16': 'Int16', 'int32': 'Int32', 'uint32': 'UInt32'}[dicGrid['dtype']]
+
+    xmlRoot=ET.Element('VRTDataset', rasterXSize=str(dicGrid['width']), rasterYSize=str(dicGrid['height']))
+    ET.SubElement(xmlRoot, 'SRS').text=dicGrid['crs'].to_wkt() if dicGrid['crs'] else ''
+    ET.SubElement(xmlRoot, 'GeoTransform').text=', '.join(['%.16g'% v for v in dicGrid['transform'].to_gdal()])
+
+    for iBand in range(1, dicGrid['count']+1):
+        xmlBand=ET.SubElement(xmlRoot, 'VRTRasterBand', dataType=nameType, band=str(iBand))
+        if dicGrid['desc'][iBand-1]: ET.SubElement(xmlBand, 'Description').text=dicGrid['desc'][iBand-1]
+        ET.SubElement(xmlBand, 'NoDataValue').text='%.16g'% lstNodata[iBand-1]
+        for pathTile in sorted(dicGrid['tiles']):
+            winTile=dicGrid['tiles'][pathTile]
+            checkRel=os.path.dirname(os.path.abspath(pathTile))==dirVrt
+            xmlSrc=ET.SubElement(xmlBand, 'ComplexSource')
+            ET.SubElement(xmlSrc, 'SourceFilename', relativeToVRT=str(int(checkRel))).text=os.path.basename(pathTile) if checkRel else os.path.abspath(pathTile)
+            ET.SubElement(xmlSrc, 'SourceBand').text=str(iBand)
+            strWin={'xOff': '0', 'yOff': '0', 'xSize': str(winTile.width), 'ySize': str(winTile.height)}
+            ET.SubElement(xmlSrc, 'SrcRect', **strWin)
+            strWin.update({'xOff': str(winTile.col_off), 'yOff': str(winTile.row_off)})
+            ET.SubElement(xmlSrc, 'DstRect', **strWin)
+            ET.SubElement(xmlSrc, 'NODATA').text='%.16g'% dicGrid['nodata']
+
+    with open(pathVrt, 'w') as fileOut:
+        fileOut.write(ET.tostring(xmlRoot, encoding='unicode'))
+
+    return dicGrid
+
+def _TileTag(dicGrid):
+    '''Tile windows of the mosaic as tag value: {path: [col, row, width, height]}'''
+    return json.dumps({os.path.abspath(pathTile): [int(win.col_off), int(win.row_off), int(win.width), int(win.height)]
+                            for pathTile, win in dicGrid['tiles'].items()}, sort_keys=True)
+
+def _LstWindow(dicGrid, blockSize, lstWinTile=None):
+    '''
+    List output blocks, restricted to the blocks touched by tile windows.
+
+    dicGrid (dict): mosaic grid
+    blockSize (int): block size [pxl]
+    lstWinTile (list): updated tile windows (default: None means all blocks)
+    out:
+        lstWin (list): block windows
+    '''
+    setBlock=set()
+    if lstWinTile is None:
+        setBlock={(i, j) for i in range(ceil(dicGrid['height']/blockSize)) for j in range(ceil(dicGrid['width']/blockSize))}
+    else:
+        for winTile in lstWinTile:
+            for i in range(winTile.row_off//blockSize, (winTile.row_off+winTile.height-1)//blockSize+1):
+                for j in range(winTile.col_off//blockSize, (winTile.col_off+winTile.width-1)//blockSize+1):
+                    setBlock.add((i, j))
+
+    lstWin=[rioWindows.Window(j*blockSize, i*blockSize,
+                   min(blockSize, dicGrid['width']-j*blockSize),
+                   min(blockSize, dicGrid['height']-i*blockSize)) for i, j in sorted(setBlock)]
+    return lstWin
+
+def RenderMosaic(pathVrt, pathOut, dicGrid, lstUpdate=None, nbThread=None, cog=True):
+    '''
+    Render the VRT mosaic into a tiled and compressed GeoTiff with
+    internal overviews. Blocks are read and compressed by a thread pool,
+    writes are serialised. If the output already exists on the same grid,
+    only blocks touched by updated tiles are rewritten and the overviews
+    rebuilt, otherwise the full mosaic is rendered. Blocks of tiles
+    removed or moved since the last render (tile windows stored in the
+    MOSAIC_TILES tag) are rewritten as well, without that tag the full
+    mosaic is rendered. A full render is finally copied with its
+    overviews first (Cloud-Optimized layout).
+
+    pathVrt (str): VRT mosaic path
+    pathOut (str): output path
+    dicGrid (dict): mosaic grid from BuildVrt
+    lstUpdate (list): updated tile paths (default: None means full render)
+    nbThread (int): thread number (default: None means cpu number)
+    cog (bool): Cloud-Optimized layout of full render (default: True)
+    out:
+        nbWin (int): number of written blocks
+    '''
+    blockSize=dicMosaic['blockSize']
+    if nbThread is None: nbThread=os.cpu_count()
+
+    # Update possible
+    checkUpdate=False
+    if lstUpdate is not None and os.path.exists(pathOut):
+        with rasterio.open(pathOut) as imgIn:
+            checkUpdate=(imgIn.width==dicGrid['width'] and imgIn.height==dicGrid['height'] and
+                         imgIn.count==dicGrid['count'] and imgIn.transform.almost_equals(dicGrid['transform']))
+            dicTilePrev=json.loads(imgIn.tags().get('MOSAIC_TILES', 'null'))
+        checkUpdate&=dicTilePrev is not None
+    lstWinTile=None
+    if checkUpdate:
+        # Updated tiles, removed or moved tiles (old window)
+        dicTileCur={os.path.abspath(pathTile): win for pathTile, win in dicGrid['tiles'].items()}
+        lstWinTile=[dicTileCur[pathTile] for pathTile in map(os.path.abspath, lstUpdate) if pathTile in dicTileCur]
+        for pathTile, lstPrev in dicTilePrev.items():
+            if pathTile in dicTileCur and list(dicTileCur[pathTile].flatten())==lstPrev: continue
+            lstWinTile.append(rioWindows.Window(*lstPrev))
+            if pathTile in dicTileCur: lstWinTile.append(dicTileCur[pathTile])
+        lstWinTile+=[dicTileCur[pathTile] for pathTile in dicTileCur if not pathTile in dicTilePrev]
+    lstWin=_LstWindow(dicGrid, blockSize, lstWinTile)
+
+    pathWrite=pathOut if checkUpdate else '_tmp'.join(os.path.splitext(pathOut))
+    if not checkUpdate:
+        profOut={'driver': 'GTiff',
+                 'width': dicGrid['width'],
+                 'height': dicGrid['height'],
+                 'count': dicGrid['count'],
+                 'dtype': dicGrid['dtype'],
+                 'nodata': dicGrid['nodata'],
+                 'crs': dicGrid['crs'],
+                 'transform': dicGrid['transform'],
+                 'tiled': True,
+                 'blockxsize': blockSize,
+                 'blockysize': blockSize,
+                 'compress': dicMosaic['compress'],
+                 'predictor': dicMosaic['predictor'],
+                 'bigtiff': 'IF_SAFER',
+                 'num_threads': 'ALL_CPUS'}
+        with rasterio.open(pathWrite, 'w', **profOut) as imgOut:
+            for iBand, desc in enumerate(dicGrid['desc']):
+                if desc: imgOut.set_band_description(iBand+1, desc)
+
+    # Windowed copy, 1 VRT handle per thread
+    locWrite=threading.Lock()
+    locData=threading.local()
+    lstImgVrt=[]
+    # Updates break the Cloud-Optimized layout (overviews stay internal)
+    with rasterio.open(pathWrite, 'r+', num_threads='ALL_CPUS', IGNORE_COG_LAYOUT_BREAK='YES') as imgOut:
+        def CopyWin(winCur):
+            if not hasattr(locData, 'img'):
+                locData.img=rasterio.open(pathVrt)
+                lstImgVrt.append(locData.img)
+            matWin=locData.img.read(window=winCur)
+            with locWrite:
+                imgOut.write(matWin, window=winCur)
+            return 0
+
+        with ThreadPoolExecutor(nbThread) as poolCur:
+            list(poolCur.map(CopyWin, lstWin))
+        [imgVrt.close() for imgVrt in lstImgVrt]
+
+        # Overviews down to 1 block
+        lstOvr=[]
+        while max(dicGrid['width'], dicGrid['height'])/2**(len(lstOvr)+1)>=blockSize/2:
+            lstOvr.append(2**(len(lstOvr)+1))
+        if lstOvr:
+            imgOut.build_overviews(lstOvr, rioEnums.Resampling.average)
+            imgOut.update_tags(ns='rio_overview', resampling='average')
+        imgOut.update_tags(MOSAIC_TILES=_TileTag(dicGrid))
+
+    if not checkUpdate:
+        if cog:
+            rioShutil.copy(pathWrite, pathOut, driver='GTiff', copy_src_overviews=True,
+                    tiled=True, blockxsize=blockSize, blockysize=blockSize,
+                    compress=dicMosaic['compress'], predictor=dicMosaic['predictor'], bigtiff='IF_SAFER')
+            os.remove(pathWrite)
+        else:
+            os.replace(pathWrite, pathOut)
+
+    return len(lstWin)
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
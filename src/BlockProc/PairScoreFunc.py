@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import json
+import logging
+from math import pi
+import numpy as np
+from numpy.linalg import norm
+
+from OutLib.LazyFunc import LazyImport
+shapelyGeom=LazyImport('shapely.geometry')
+shapelyOps=LazyImport('shapely.ops')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import GeomFunc
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['PairHistory', 'PairScore', 'Redundancy']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def PairHistory(lstFeatJournal, prefPC, extPC):
+    '''
+    Read the outcome of previous runs from the dense matching journal
+    (stereopair_DM.geojson) and return success/attempt counts per scene.
+    A pair is a success if its point cloud exists and is a binary file,
+    a failure if it is a text file ('Failed').
+
+    lstFeatJournal (list): journal features
+    prefPC (str): point cloud prefix (objPath.prefStereoDM)
+    extPC (str): point cloud extension template (objPath.extPC)
+    out:
+        dicHist (dict): {sceneId: [success, attempt]}
+    '''
+    dicHist={}
+    for featCur in lstFeatJournal:
+        pathPC=prefPC+extPC.format(str(featCur['id']).rjust(5,'0'))
+        if not os.path.exists(pathPC): continue
+        with open(pathPC, 'rb') as fileIn:
+            checkOk=not fileIn.read(6)==b'Failed'
+        for idImg in featCur['properties']['scenes'].split(';'):
+            dicHist.setdefault(idImg, [0, 0])
+            dicHist[idImg][0]+=int(checkOk)
+            dicHist[idImg][1]+=1
+    return dicHist
+
+def PairScore(lstFeat, lstCouple, formTsai, geomAoi, dicHist=None):
+    '''
+    Estimate the expected yield and accuracy of stereo pairs before
+    matching. The matching probability combines the intersection angle,
+    the epipolar axis angle, sun elevation and cloud differences and
+    the scene history. The score is the AOI overlap weighted by that
+    probability and divided by the predicted height error.
+
+    lstFeat (lst): list of feature (json)
+    lstCouple (list): list of stereo pair features (json), already filtered
+    formTsai (str): standard name of Tsai file
+    geomAoi (json): 'geometry' part of the AOI feature
+    dicHist (dict): scene history from PairHistory (default: None means no history)
+    out:
+        matScore (array): [score, AOI area, intersection angle [°], axis angle [°], match probability, height error [m]] per pair
+    '''
+    if dicHist is None: dicHist={}
+    nbPair=len(lstCouple)
+    matScore=np.zeros([nbPair, 6])
+    if not nbPair: return matScore
+
+    dicScene={featCur['id']: featCur for featCur in lstFeat}
+    lstPairId=[sorted(coupleCur['properties']['scenes'].split(';'))[:2] for coupleCur in lstCouple]
+
+    # Cameras, once per scene
+    dicCam={}
+    for idImg in set(sum(lstPairId, [])):
+        objCam=GeomFunc.TSAIin(formTsai.format(idImg))
+        dicCam[idImg]=(objCam.vectX0.flatten(), objCam.matR[-1, :])
+    matCamX0=np.array([[dicCam[idImg][0] for idImg in lstId] for lstId in lstPairId])
+    matCamZ=np.array([[dicCam[idImg][1] for idImg in lstId] for lstId in lstPairId])
+
+    # Intersection angle (see MSSFunc.BRratio)
+    vectBase=norm(matCamX0[:,1]-matCamX0[:,0], axis=1)
+    vectHeight=np.mean(GeomFunc.Cart2Geo_Elli(matCamX0.reshape(-1,3))[:,2].reshape(-1,2), axis=1)
+    vectBH=vectBase/vectHeight
+    vectAngle=2*np.arctan(vectBH/2)*180/pi
+
+    # Epipolar axis angle (see MSSFunc.FilterDmProces)
+    epipXaxis=(matCamX0[:,1]-matCamX0[:,0])/vectBase[:,np.newaxis]
+    epipZaxis=0.5*(matCamZ[:,0]+matCamZ[:,1])
+    epipZaxis/=norm(epipZaxis, axis=1)[:,np.newaxis]
+    vectAxis=np.arccos(np.abs(np.sum(epipXaxis*epipZaxis, axis=1)))*180/pi
+
+    # AOI overlap
+    polyAoi=shapelyGeom.Polygon(np.array(geomAoi['coordinates']).reshape(-1,2).tolist())
+    vectArea=np.array([shapelyGeom.Polygon(np.array(coupleCur['geometry']['coordinates']).reshape(-1,2).tolist()).intersection(polyAoi).area
+                            for coupleCur in lstCouple])
+
+    # Radiometry and history
+    vectSun=np.zeros(nbPair)
+    vectCloud=np.zeros(nbPair)
+    vectHist=np.ones(nbPair)
+    for j, lstId in enumerate(lstPairId):
+        lstProp=[dicScene[idImg]['properties'] if idImg in dicScene else {} for idImg in lstId]
+        if all(['sun_elevation' in prop for prop in lstProp]):
+            vectSun[j]=abs(lstProp[0]['sun_elevation']-lstProp[1]['sun_elevation'])
+        if all(['cloud_percent' in prop for prop in lstProp]):
+            vectCloud[j]=max([prop['cloud_percent'] for prop in lstProp])/100
+        elif all(['cloud_cover' in prop for prop in lstProp]):
+            vectCloud[j]=max([prop['cloud_cover'] for prop in lstProp])
+        # Success rate with a uniform Beta prior, 1 without history
+        lstHist=[dicHist[idImg] for idImg in lstId if idImg in dicHist]
+        if lstHist: vectHist[j]=(sum([hist[0] for hist in lstHist])+1)/(sum([hist[1] for hist in lstHist])+2)
+
+    # Match probability
+    vectProb=np.exp(-vectAngle/dicPairScore['angleScale'])
+    vectProb*=np.clip((vectAxis-tolAxisAngle)/(90-tolAxisAngle), 0, 1)*0.5+0.5
+    vectProb*=np.exp(-vectSun/dicPairScore['sunScale'])
+    vectProb*=np.clip(1-vectCloud, 0, 1)
+    vectProb*=vectHist
+
+    # Height error from B/H and matching precision
+    vectErrZ=dicPairScore['sigMatch']*gsdOrth/np.clip(vectBH, 1e-3, None)
+
+    matScore[:,0]=vectArea*vectProb/vectErrZ
+    matScore[:,1]=vectArea
+    matScore[:,2]=vectAngle
+    matScore[:,3]=vectAxis
+    matScore[:,4]=vectProb
+    matScore[:,5]=vectErrZ
+    return matScore
+
+class Redundancy():
+    '''
+    Track the AOI redundancy reached by processed stereo pairs. Layer k
+    holds the area covered by at least k+1 pairs. The target is reached
+    once a coverage fraction of the AOI has the target redundancy (AOI
+    edges and gaps between scenes are seldom fully covered).
+
+    geomAoi (json): 'geometry' part of the AOI feature
+    red (int): target redundancy
+    cover (float): AOI fraction to reach (default: None means dicPairScore['redCover'])
+    out:
+        Redundancy (obj):
+    '''
+    def __init__(self, geomAoi, red, cover=None):
+        self.polyAoi=shapelyGeom.Polygon(np.array(geomAoi['coordinates']).reshape(-1,2).tolist())
+        self.red=red
+        self.cover=dicPairScore['redCover'] if cover is None else cover
+        self.lstCover=[shapelyGeom.Polygon() for k in range(red)]
+
+    def __str__(self):
+        return ' '.join(['r%i: %.1f%%'% (k+1, self.Ratio(k)*100) for k in range(self.red)])
+
+    def Add(self, geomPair):
+        '''Add a pair footprint (geojson 'geometry')'''
+        polyPair=shapelyGeom.Polygon(np.array(geomPair['coordinates']).reshape(-1,2).tolist()).intersection(self.polyAoi)
+        for k in range(self.red-1, 0, -1):
+            self.lstCover[k]=shapelyOps.unary_union([self.lstCover[k], self.lstCover[k-1].intersection(polyPair)])
+        self.lstCover[0]=shapelyOps.unary_union([self.lstCover[0], polyPair])
+
+    def Ratio(self, k=None):
+        '''AOI ratio covered by at least k+1 pairs (default: target redundancy)'''
+        if k is None: k=self.red-1
+        return self.lstCover[k].area/self.polyAoi.area
+
+    def Reached(self):
+        '''Target redundancy reached on the coverage fraction'''
+        return self.Ratio()>=self.cover
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
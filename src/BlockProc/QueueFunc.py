@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import json
+import logging
+import time
+import socket
+import fcntl
+import threading
+from contextlib import contextmanager
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['FileLock', 'WorkerName', 'JobQueue', 'Worker']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+@contextmanager
+def FileLock(pathLock):
+    '''
+    Exclusive lock on a file (POSIX lock, also held across NFS clients).
+
+    pathLock (str): lock file path (created if needed)
+    '''
+    with open(pathLock, 'a') as fileLock:
+        fcntl.lockf(fileLock, fcntl.LOCK_EX)
+        try:
+            yield fileLock
+        finally:
+            fcntl.lockf(fileLock, fcntl.LOCK_UN)
+
+def WorkerName():
+    '''Worker identifier: host name and process id'''
+    return '%s:%i'% (socket.gethostname(), os.getpid())
+
+class JobQueue():
+    '''
+    Work queue in a job directory on shared storage. Each job is a JSON
+    record moved between the state folders pending, leased, done and
+    failed; every move happens under the queue lock file. A worker leases
+    a job for a limited time and renews the lease while it runs: a job
+    whose lease expired (dead worker, lost host) goes back to pending
+    until its try number reaches maxTry. Lease times use the host clocks,
+    which must be synchronised (NTP). Job ids are chosen by the submitter,
+    a job that is already pending or leased is not submitted twice.
+
+    pathDir (str): job directory
+    lease (float): lease duration [s] (default: None means dicQueue['lease'])
+    maxTry (int): default try number per job (default: None means dicQueue['maxTry'])
+    out:
+        JobQueue (obj):
+    '''
+    lstState=('pending', 'leased', 'done', 'failed')
+
+    def __init__(self, pathDir, lease=None, maxTry=None):
+        self.pathDir=os.path.abspath(pathDir)
+        self.lease=lease or dicQueue['lease']
+        self.maxTry=maxTry or dicQueue['maxTry']
+        for state in self.lstState: os.makedirs(os.path.join(self.pathDir, state), exist_ok=True)
+        self.pLock=os.path.join(self.pathDir, 'queue.lock')
+
+    def __str__(self):
+        return '%s (%s)'% (self.pathDir, ', '.join(['%i %s'% (nb, state) for state, nb in self.Status().items()]))
+
+    def _Path(self, state, idJob):
+        return os.path.join(self.pathDir, state, idJob+'.json')
+
+    def _Read(self, state, idJob):
+        pathJob=self._Path(state, idJob)
+        if not os.path.exists(pathJob): return None
+        with open(pathJob) as fileIn:
+            return json.load(fileIn)
+
+    def _Write(self, state, dicJob):
+        pathJob=self._Path(state, dicJob['id'])
+        pathTmp='%s.%s.tmp'% (pathJob, WorkerName().replace(':', '_'))
+        with open(pathTmp, 'w') as fileOut:
+            json.dump(dicJob, fileOut)
+        os.replace(pathTmp, pathJob)
+
+    def _Move(self, stateIn, stateOut, dicJob):
+        self._Write(stateOut, dicJob)
+        os.remove(self._Path(stateIn, dicJob['id']))
+
+    def _List(self, state):
+        return sorted([name[:-5] for name in os.listdir(os.path.join(self.pathDir, state)) if name.endswith('.json')])
+
+    def _State(self, idJob):
+        for state in self.lstState:
+            if os.path.exists(self._Path(state, idJob)): return state
+        return None
+
+    def _Expire(self):
+        '''Release expired leases (lock held)'''
+        timeCur=time.time()
+        for idJob in self._List('leased'):
+            dicJob=self._Read('leased', idJob)
+            if dicJob is None or dicJob['lease']>timeCur: continue
+            SubLogger('WARNING', 'Lease expired: %s (%s, try %i)'% (idJob, dicJob['worker'], dicJob['try']))
+            dicJob['history'].append([dicJob['worker'], dicJob['try'], 'lease expired'])
+            dicJob['lease'], dicJob['worker']=None, None
+            self._Move('leased', 'failed' if dicJob['try']>=dicJob['maxTry'] else 'pending', dicJob)
+
+    #---------------------------------------------------------------
+    # Submitter side
+    #---------------------------------------------------------------
+    def Submit(self, idJob, kind, payload, maxTry=None, force=False):
+        '''
+        Add a job to the queue.
+
+        idJob (str): job id (file name safe, e.g. 'dm_B1_00012')
+        kind (str): job kind (worker handler name)
+        payload (dict): job content (JSON), payload['out'] lists the expected output paths
+        maxTry (int): try number (default: None means queue default)
+        force (bool): resubmit a done job (default: False)
+        out:
+            state (str): job state after submission
+        '''
+        with FileLock(self.pLock):
+            state=self._State(idJob)
+            if state in ('pending', 'leased') or (state=='done' and not force): return state
+            if state: os.remove(self._Path(state, idJob))
+            self._Write('pending', {'id': idJob,
+                                    'kind': kind,
+                                    'payload': payload,
+                                    'maxTry': maxTry or self.maxTry,
+                                    'try': 0,
+                                    'submit': time.time(),
+                                    'lease': None,
+                                    'worker': None,
+                                    'history': [],
+                                    })
+        return 'pending'
+
+    def Cancel(self, lstId):
+        '''
+        Move pending jobs to failed (leased jobs run to the end).
+
+        lstId (list): job ids
+        out:
+            nbCancel (int): cancelled job number
+        '''
+        nbCancel=0
+        with FileLock(self.pLock):
+            for idJob in lstId:
+                dicJob=self._Read('pending', idJob)
+                if dicJob is None: continue
+                dicJob['history'].append([None, dicJob['try'], 'cancelled'])
+                self._Move('pending', 'failed', dicJob)
+                nbCancel+=1
+        return nbCancel
+
+    def Result(self, idJob):
+        '''Final record of a job (done or failed) or None'''
+        for state in ('done', 'failed'):
+            try:
+                dicJob=self._Read(state, idJob)
+            except (OSError, ValueError):
+                dicJob=None
+            if dicJob:
+                dicJob['state']=state
+                return dicJob
+        return None
+
+    def Collect(self, lstId, timeout=None, fun=None, name=None):
+        '''
+        Wait for jobs and gather their final records. Expired leases are
+        released while waiting, so jobs of dead workers are retried
+        (or failed) even if no other worker polls the queue.
+
+        lstId (list): job ids
+        timeout (float): maximum waiting time [s] (default: None means until all jobs are final)
+        fun (function): called with each new final record, a True return stops waiting (default: None)
+        name (str): progress bar name (default: None means no bar)
+        out:
+            dicRec (dict): final records per job id (done records have 'state'='done')
+        '''
+        dicRec={}
+        setWait=set(lstId)
+        procBar=ProcessStdout(name=name, inputCur=len(setWait)) if name and setWait else None
+        timeStart=time.time()
+        while setWait:
+            for idJob in sorted(setWait):
+                dicJob=self.Result(idJob)
+                if dicJob is None: continue
+                dicRec[idJob]=dicJob
+                setWait.remove(idJob)
+                if procBar: procBar.ViewBar(len(dicRec)-1)
+                if fun and fun(dicJob): return dicRec
+            if not setWait: break
+            if timeout is not None and time.time()-timeStart>timeout: break
+            with FileLock(self.pLock):
+                self._Expire()
+            time.sleep(dicQueue['period'])
+        if procBar: print()
+        return dicRec
+
+    def Status(self):
+        '''Job number per state'''
+        return {state: len(self._List(state)) for state in self.lstState}
+
+    #---------------------------------------------------------------
+    # Worker side
+    #---------------------------------------------------------------
+    def Lease(self, worker, lstKind=None):
+        '''
+        Lease the oldest pending job.
+
+        worker (str): worker name
+        lstKind (list): accepted job kinds (default: None means all)
+        out:
+            dicJob (dict): leased job record or None
+        '''
+        with FileLock(self.pLock):
+            self._Expire()
+            lstJob=[self._Read('pending', idJob) for idJob in self._List('pending')]
+            lstJob=[dicJob for dicJob in lstJob if dicJob and (not lstKind or dicJob['kind'] in lstKind)]
+            if not lstJob: return None
+            dicJob=min(lstJob, key=lambda dicCur: dicCur['submit'])
+            dicJob['try']+=1
+            dicJob['worker']=worker
+            dicJob['lease']=time.time()+self.lease
+            self._Move('pending', 'leased', dicJob)
+        return dicJob
+
+    def _Owned(self, dicJob):
+        '''Current leased record if the lease still belongs to the job holder (lock held)'''
+        dicCur=self._Read('leased', dicJob['id'])
+        if dicCur is None or not dicCur['worker']==dicJob['worker'] or not dicCur['try']==dicJob['try']: return None
+        return dicCur
+
+    def Renew(self, dicJob):
+        '''
+        Extend the lease of a running job.
+
+        dicJob (dict): leased job record
+        out:
+            check (bool): False if the lease was lost (expired and released)
+        '''
+        with FileLock(self.pLock):
+            dicCur=self._Owned(dicJob)
+            if dicCur is None: return False
+            dicCur['lease']=time.time()+self.lease
+            self._Write('leased', dicCur)
+        return True
+
+    def Complete(self, dicJob, dicRes):
+        '''
+        Store the result of a successful job. Only the current lease
+        holder completes the job: a worker whose lease expired (job back
+        to pending, or leased again by another worker) is ignored, its
+        outputs may be overwritten by the running try.
+
+        dicJob (dict): leased job record
+        dicRes (dict): result (JSON)
+        out:
+            check (bool): False if the lease was lost
+        '''
+        with FileLock(self.pLock):
+            dicCur=self._Owned(dicJob)
+            if dicCur is None: return False
+            dicCur['history'].append([dicJob['worker'], dicJob['try'], 'done'])
+            dicCur.update({'lease': None, 'result': dicRes})
+            self._Move('leased', 'done', dicCur)
+        return True
+
+    def Fail(self, dicJob, msg, dicRes=None):
+        '''
+        Report a failed try: the job goes back to pending or to failed
+        once the try number is reached.
+
+        dicJob (dict): leased job record
+        msg (str): failure message
+        dicRes (dict): result (JSON, default: None)
+        out:
+            state (str): new job state (None if the lease was lost)
+        '''
+        with FileLock(self.pLock):
+            dicCur=self._Owned(dicJob)
+            if dicCur is None: return None
+            dicCur['history'].append([dicJob['worker'], dicJob['try'], msg])
+            dicCur.update({'lease': None, 'worker': None, 'result': dicRes})
+            state='failed' if dicCur['try']>=dicCur['maxTry'] else 'pending'
+            self._Move('leased', state, dicCur)
+        return state
+
+class Worker():
+    '''
+    Queue worker: lease jobs, run the handler of the job kind while
+    renewing the lease (heartbeat thread), check the outputs and report
+    the result. Outputs listed in payload['out'] are removed before each
+    try (partial files or failure markers of a former try) and a job
+    fails if one is missing or holds a 'Failed' marker afterwards.
+
+    objQueue (obj): JobQueue
+    dicHandler (dict): job handler per kind, function(payload) returning 0 on success
+    name (str): worker name (default: None means WorkerName)
+    out:
+        Worker (obj):
+            nbDone (int): successful job number
+            nbFail (int): failed try number
+    '''
+    def __init__(self, objQueue, dicHandler, name=None):
+        self.objQueue=objQueue
+        self.dicHandler=dicHandler
+        self.name=name or WorkerName()
+        self.nbDone=0
+        self.nbFail=0
+
+    def __str__(self):
+        return '%s (%i done, %i failed)'% (self.name, self.nbDone, self.nbFail)
+
+    @staticmethod
+    def _Missing(lstOut):
+        '''Missing or failed outputs'''
+        lstMiss=[]
+        for pathOut in lstOut:
+            if not os.path.exists(pathOut):
+                lstMiss.append(pathOut)
+            elif os.path.isfile(pathOut) and os.path.getsize(pathOut)==6:
+                with open(pathOut, 'rb') as fileIn:
+                    if fileIn.read()==b'Failed': lstMiss.append(pathOut)
+        return lstMiss
+
+    def _Heartbeat(self, dicJob, evtStop):
+        while not evtStop.wait(self.objQueue.lease/3):
+            if not self.objQueue.Renew(dicJob):
+                SubLogger('WARNING', 'Lease lost: %s'% dicJob['id'])
+                return
+
+    def Process(self, dicJob):
+        '''
+        Run one leased job and report it.
+
+        dicJob (dict): leased job record
+        out:
+            out (int): 0 on success
+        '''
+        lstOut=dicJob['payload'].get('out', [])
+        for pathOut in lstOut:
+            if os.path.isfile(pathOut): os.remove(pathOut)
+
+        evtStop=threading.Event()
+        thrBeat=threading.Thread(target=self._Heartbeat, args=(dicJob, evtStop), daemon=True)
+        thrBeat.start()
+        timeStart=time.time()
+        try:
+            if not dicJob['kind'] in self.dicHandler: raise RuntimeError('Unknown job kind: %s'% dicJob['kind'])
+            out=self.dicHandler[dicJob['kind']](dicJob['payload'])
+            msg='exit %s'% str(out) if out else None
+        except (Exception, SystemExit) as excCur:
+            out, msg=1, '%s: %s'% (type(excCur).__name__, str(excCur))
+        evtStop.set()
+        thrBeat.join()
+
+        if not out:
+            lstMiss=self._Missing(lstOut)
+            if lstMiss: out, msg=1, 'missing outputs: %s'% ', '.join(lstMiss)
+        dicRes={'out': int(bool(out)), 'wall': round(time.time()-timeStart, 2), 'worker': self.name}
+
+        if out:
+            self.nbFail+=1
+            state=self.objQueue.Fail(dicJob, msg, dicRes)
+            SubLogger('ERROR', 'Job %s try %i failed (%s): %s'% (dicJob['id'], dicJob['try'], state, msg))
+        else:
+            self.nbDone+=1
+            if not self.objQueue.Complete(dicJob, dicRes): SubLogger('WARNING', 'Job %s try %i result dropped: lease lost'% (dicJob['id'], dicJob['try']))
+        return int(bool(out))
+
+    def Run(self, lstKind=None, idle=None, nbJob=0):
+        '''
+        Worker loop.
+
+        lstKind (list): accepted job kinds (default: None means all handlers)
+        idle (float): stop after an idle time [s] (default: None means dicQueue['idle'], 0 means never)
+        nbJob (int): stop after N jobs (default: 0 means no limit)
+        out:
+            0
+        '''
+        lstKind=lstKind or list(self.dicHandler)
+        idle=dicQueue['idle'] if idle is None else idle
+        timeIdle=time.time()
+        while not nbJob or self.nbDone+self.nbFail<nbJob:
+            dicJob=self.objQueue.Lease(self.name, lstKind)
+            if dicJob is None:
+                if idle and time.time()-timeIdle>idle: break
+                time.sleep(dicQueue['period'])
+                continue
+            SubLogger('INFO', '%s: %s (try %i)'% (self.name, dicJob['id'], dicJob['try']))
+            self.Process(dicJob)
+            timeIdle=time.time()
+        return 0
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
+
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import logging
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['Profile', 'CreationOptions', 'Quantise', 'WriteRaster', 'ReadRaster']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def _Predictor(dtype):
+    '''Predictor adapted to the data type (3: floating point, 2: horizontal)'''
+    if not dicRasterPolicy['predictor'] or dicRasterPolicy['compress'].upper() in ('NONE', 'JPEG', 'LERC'): return None
+    return 3 if np.dtype(dtype).kind=='f' else 2
+
+def Profile(width, height, count=1, dtype='float32', nodata=None):
+    '''
+    Rasterio GeoTiff profile following the raster policy (dicRasterPolicy).
+
+    width (int): column number
+    height (int): row number
+    count (int): band number (default: 1)
+    dtype (str): data type (default: 'float32')
+    nodata (float): nodata value (default: None)
+    out:
+        profOut (dict): rasterio profile
+    '''
+    profOut={'driver': 'GTiff',
+             'width': width,
+             'height': height,
+             'count': count,
+             'dtype': np.dtype(dtype).name,
+             'nodata': nodata,
+             'bigtiff': dicRasterPolicy['bigtiff'],
+             'num_threads': dicRasterPolicy['numThreads']}
+    if dicRasterPolicy['tiled']:
+        profOut.update({'tiled': True,
+                        'blockxsize': dicRasterPolicy['blockSize'],
+                        'blockysize': dicRasterPolicy['blockSize']})
+    if not dicRasterPolicy['compress'].upper()=='NONE':
+        profOut['compress']=dicRasterPolicy['compress']
+        predictor=_Predictor(dtype)
+        if predictor: profOut['predictor']=predictor
+    return profOut
+
+def CreationOptions(dtype='float32'):
+    '''
+    GDAL command line creation options following the raster policy.
+
+    dtype (str): data type (default: 'float32')
+    out:
+        lstCo (list): ['-co', 'KEY=VALUE', ...]
+    '''
+    dicCo={'BIGTIFF': dicRasterPolicy['bigtiff'], 'NUM_THREADS': dicRasterPolicy['numThreads']}
+    if dicRasterPolicy['tiled']:
+        dicCo.update({'TILED': 'YES',
+                      'BLOCKXSIZE': dicRasterPolicy['blockSize'],
+                      'BLOCKYSIZE': dicRasterPolicy['blockSize']})
+    if not dicRasterPolicy['compress'].upper()=='NONE':
+        dicCo['COMPRESS']=dicRasterPolicy['compress']
+        predictor=_Predictor(dtype)
+        if predictor: dicCo['PREDICTOR']=predictor
+    return sum([['-co', '%s=%s'% (key, str(dicCo[key]))] for key in dicCo], [])
+
+def Quantise(matIn, mode=None):
+    '''
+    Optional quantisation of radiometric intermediates. 'uint16' stores
+    value/scale (0 stays 0 for nodata) with the scale in the metadata,
+    'float16' rounds the mantissa to half precision and keeps float32
+    storage (GTiff float16 support depends on GDAL) which compresses far
+    better with the floating point predictor.
+
+    matIn (array): image array
+    mode (None|'uint16'|'float16'): quantisation mode (default: None means no change)
+    out:
+        matOut (array): quantised array
+        scale (float): scale to apply at reading (1 if none)
+    '''
+    if mode is None: return matIn, 1
+    if mode=='float16':
+        return matIn.astype(np.float16).astype(np.float32), 1
+    if mode=='uint16':
+        valMax=float(np.amax(matIn)) if matIn.size else 0
+        scale=valMax/65535 if valMax>0 else 1
+        return np.clip(np.round(matIn/scale), 0, 65535).astype(np.uint16), scale
+    SubLogger('CRITICAL', 'Unknown quantisation mode: %s'% mode)
+
+def WriteRaster(pathOut, matIn, nodata=None, radio=False):
+    '''
+    Write an image (single or multi band) following the raster policy.
+    Radiometric intermediates use the policy quantisation. The uint16
+    scale is stored as GDAL band scale metadata which external tools
+    (ASP, GDAL utilities) do not apply: quantised files must only be read
+    with ReadRaster.
+
+    pathOut (str): output path
+    matIn (array): image [rows, cols] or [bands, rows, cols]
+    nodata (float): nodata value (default: None)
+    radio (bool): radiometric intermediate, quantisation allowed (default: False)
+    out:
+        check (bool): True=written
+    '''
+    scale=1
+    if radio: matIn, scale=Quantise(matIn, dicRasterPolicy['quantRadio'])
+    if matIn.ndim==2: matIn=matIn[np.newaxis]
+    profOut=Profile(matIn.shape[2], matIn.shape[1], count=matIn.shape[0], dtype=matIn.dtype, nodata=nodata)
+
+    try:
+        with rasterio.open(pathOut, 'w', **profOut) as imgOut:
+            imgOut.write(matIn)
+            if not scale==1: imgOut.scales=[scale]*matIn.shape[0]
+    except rasterio.errors.RasterioError as msg:
+        SubLogger('ERROR', 'Raster writing failed (%s): %s'% (pathOut, str(msg)))
+        return False
+    return True
+
+def ReadRaster(pathIn, band=None, window=None):
+    '''
+    Read an image with the stored scales applied (quantised intermediates).
+
+    pathIn (str): input path
+    band (int): band index from 1 (default: None means all bands)
+    window (Window): rasterio window (default: None means full image)
+    out:
+        matOut (array): image [rows, cols] if band else [bands, rows, cols]
+    '''
+    with rasterio.open(pathIn) as imgIn:
+        matOut=imgIn.read(band, window=window)
+        vectScale=np.array(imgIn.scales)
+    if np.all(vectScale==1): return matOut
+    if band: return matOut.astype(np.float32)*vectScale[band-1]
+    return matOut.astype(np.float32)*vectScale[:, np.newaxis, np.newaxis]
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
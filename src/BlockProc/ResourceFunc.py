@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import json
+import logging
+import time
+import threading
+from math import ceil, cos, pi
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+shapelyGeom=LazyImport('shapely.geometry')
+scipyOpt=LazyImport('scipy.optimize')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['MemAvailable', 'TreeRss', 'PairArea', 'PairFeatures', 'ResourceMonitor', 'ResourceModel']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def MemAvailable():
+    '''
+    Read the available memory from /proc/meminfo.
+
+    out:
+        sizeMem (int): available memory [B] (0 if unknown)
+    '''
+    dicFact={'kB': 1024, 'B':1, 'MB': 1024**2, 'GB': 1024**3}
+    if not os.path.exists('/proc/meminfo'): return 0
+    with open('/proc/meminfo') as fileIn:
+        for lineCur in fileIn:
+            if not lineCur.startswith('MemAvailable'): continue
+            words=lineCur.split()
+            return int(words[1])*dicFact[words[2]]
+    return 0
+
+def TreeRss(pidRoot=None):
+    '''
+    Resident memory of a process tree from /proc (process and all its
+    descendants, e.g. pool workers and host tools).
+
+    pidRoot (int): root process id (default: None means current process)
+    out:
+        sizeRss (int): resident memory [B] (0 if unknown)
+    '''
+    if pidRoot is None: pidRoot=os.getpid()
+    if not os.path.isdir('/proc'): return 0
+    dicParent, dicRss={}, {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit(): continue
+        try:
+            with open('/proc/%s/stat'% name) as fileIn:
+                words=fileIn.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        dicParent[int(name)]=int(words[1])
+        dicRss[int(name)]=int(words[21])
+    setTree={pidRoot} if pidRoot in dicParent else set()
+    nbTree=0
+    while not nbTree==len(setTree):
+        nbTree=len(setTree)
+        setTree|={pid for pid in dicParent if dicParent[pid] in setTree}
+    return sum([dicRss[pid] for pid in setTree])*os.sysconf('SC_PAGE_SIZE')
+
+def PairArea(geomIn):
+    '''
+    Approximate area of a geographic footprint (local equirectangular).
+
+    geomIn (json): footprint as geojson['geometry'] object (EPSG:4326)
+    out:
+        area (float): area [km2]
+    '''
+    matCoords=np.array(geomIn['coordinates']).reshape(-1,2)
+    latMid=np.mean(matCoords[:,1])*pi/180
+    return shapelyGeom.Polygon(matCoords.tolist()).area*111.32**2*cos(latMid)
+
+def PairFeatures(area, nbPxl=None, dispRange=None):
+    '''
+    Build the resource model features of a stereo pair. Records hold the
+    measured epipolar frame and disparity range, admission uses their
+    estimates (MSSFunc.PairEstimate).
+
+    area (float): overlap area [km2]
+    nbPxl (int): epipolar frame pixel number (default: None means estimated)
+    dispRange (float): horizontal disparity range width [pxl] (default: None means dicResource['dispDefault'])
+    out:
+        dicFeat (dict): {'area': km2, 'mpxl': Mpxl, 'disp': pxl}
+    '''
+    if nbPxl is None: nbPxl=area*1e6/gsdOrth**2
+    if dispRange is None: dispRange=dicResource['dispDefault']
+    return {'area': float(area), 'mpxl': float(nbPxl)/1e6, 'disp': float(dispRange)}
+
+class ResourceMonitor():
+    '''
+    Measure the wall time and the peak memory use of a process step. The
+    resident memory of the process tree (TreeRss) is sampled in a thread,
+    so it covers child processes (pool workers, native tools) but not the
+    tool containers of the docker backend (hence the backend in the model
+    tag). Other jobs of the host do not count.
+
+    out:
+        ResourceMonitor (obj):
+            peak (int): peak memory use [B]
+            wall (float): wall time [s]
+    '''
+    def __init__(self):
+        self.peak=0
+        self.wall=0
+        self._thread=None
+
+    def _Sample(self):
+        while not self._stop.wait(dicResource['sample']):
+            self._memMax=max(self._memMax, TreeRss())
+
+    def Start(self):
+        '''Start (or restart) a measure'''
+        if self._thread: self.Stop()
+        self._memMax=TreeRss()
+        self._timeStart=time.time()
+        self._stop=threading.Event()
+        self._thread=threading.Thread(target=self._Sample, daemon=True)
+        self._thread.start()
+
+    def Stop(self):
+        '''
+        Stop the measure.
+
+        out:
+            peak (int): peak memory use [B]
+            wall (float): wall time [s]
+        '''
+        if not self._thread: return self.peak, self.wall
+        self._stop.set()
+        self._thread.join()
+        self._thread=None
+        self._memMax=max(self._memMax, TreeRss())
+        self.wall=time.time()-self._timeStart
+        self.peak=self._memMax
+        return self.peak, self.wall
+
+class ResourceModel():
+    '''
+    Linear model of the peak memory [GB] and wall time [s] of a stereo
+    pair: c0 + c1*Mpxl + c2*Mpxl*disp/100 + c3*km2. Coefficients are fitted
+    by non-negative least squares on recorded runs (JSONL, measured
+    epipolar features) with the same tag and fall back to dicResource
+    defaults with too few records.
+
+    pathRecord (str): record file path (.jsonl)
+    tag (str): process configuration tag (default: '')
+    out:
+        ResourceModel (obj):
+            lstRec (list): records
+            dicCoef (dict): {'rss': coefficients, 'wall': coefficients}
+    '''
+    def __init__(self, pathRecord, tag=''):
+        self.pathRecord=pathRecord
+        self.tag=tag
+        self.lstRec=[]
+        if os.path.exists(pathRecord):
+            with open(pathRecord) as fileIn:
+                for lineCur in fileIn:
+                    if not lineCur.strip(): continue
+                    recCur=json.loads(lineCur)
+                    if recCur.get('tag', '')==tag: self.lstRec.append(recCur)
+        self.Fit()
+
+    def __str__(self):
+        return '%i records, rss: %s, wall: %s'% (len(self.lstRec),
+                                                 str(np.round(self.dicCoef['rss'], 3).tolist()),
+                                                 str(np.round(self.dicCoef['wall'], 1).tolist()))
+
+    @staticmethod
+    def _Design(lstFeat):
+        return np.array([[1, feat['mpxl'], feat['mpxl']*feat['disp']/100, feat['area']] for feat in lstFeat])
+
+    def Record(self, dicFeat, peak, wall, **kwargs):
+        '''
+        Append a run to the record file and refit.
+
+        dicFeat (dict): pair features from PairFeatures
+        peak (int): peak memory use [B]
+        wall (float): wall time [s]
+        kwargs: additional record values (e.g. pair id)
+        out:
+            0 (int)
+        '''
+        recCur=dict(dicFeat)
+        recCur.update({'tag': self.tag, 'rss': peak/1024**3, 'wall': wall})
+        recCur.update(kwargs)
+        self.lstRec.append(recCur)
+        with open(self.pathRecord, 'a') as fileOut:
+            fileOut.write(json.dumps(recCur)+'\n')
+        self.Fit()
+        return 0
+
+    def Fit(self):
+        '''Fit coefficients on records (non-negative, defaults below dicResource['nbFit'] records)'''
+        self.dicCoef={'rss': np.array(dicResource['coefRss'], dtype=float),
+                      'wall': np.array(dicResource['coefWall'], dtype=float)}
+        if len(self.lstRec)<dicResource['nbFit']: return 0
+
+        matA=self._Design(self.lstRec)
+        for key in self.dicCoef:
+            vectB=np.array([rec[key] for rec in self.lstRec])
+            self.dicCoef[key]=scipyOpt.nnls(matA, vectB)[0]
+        return 0
+
+    def Predict(self, lstFeat):
+        '''
+        Predict the resources of pairs with the safety factor on memory.
+
+        lstFeat (list|dict): pair features from PairFeatures
+        out:
+            matPred (array): [[peak memory [B], wall time [s]], ...]
+        '''
+        if type(lstFeat)==dict: lstFeat=[lstFeat]
+        matA=self._Design(lstFeat)
+        matPred=np.array([matA@self.dicCoef['rss']*1024**3*dicResource['safety'],
+                          matA@self.dicCoef['wall']]).T
+        return matPred
+
+    def Admit(self, dicFeat, sizeMem=None):
+        '''
+        Admission control: the predicted peak memory must fit in the
+        available memory.
+
+        dicFeat (dict): pair features from PairFeatures
+        sizeMem (int): memory budget [B] (default: None means MemAvailable)
+        out:
+            check (bool): True=admitted
+        '''
+        if sizeMem is None: sizeMem=MemAvailable()
+        if not sizeMem: return True
+        return self.Predict(dicFeat)[0,0]<sizeMem
+
+    def SizeBlock(self, lstFeat, wallTarget=None):
+        '''
+        Size the compute of a block before launching.
+
+        lstFeat (list): pair features
+        wallTarget (float): target wall time [s] (default: None means sequential)
+        out:
+            dicSize (dict): pair number, sequential wall time [h], peak memory of
+                the largest pair [GB], worker number and node memory [GB] for the target
+        '''
+        matPred=self.Predict(lstFeat)
+        if not matPred.shape[0]: return {'pairs': 0, 'wall': 0, 'rssMax': 0, 'workers': 0, 'memNode': 0}
+        wallSum=float(np.sum(matPred[:,1]))
+        nbWorker=1 if not wallTarget else max(1, ceil(wallSum/wallTarget))
+        nbWorker=min(nbWorker, matPred.shape[0])
+        rssTop=np.sort(matPred[:,0])[::-1][:nbWorker]
+        return {'pairs': int(matPred.shape[0]),
+                'wall': round(wallSum/3600, 2),
+                'rssMax': round(float(rssTop[0])/1024**3, 2),
+                'workers': int(nbWorker),
+                'memNode': round(float(np.sum(rssTop))/1024**3, 2)}
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import logging
+from math import floor, ceil
+from multiprocessing import Pool
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+rioWindows=LazyImport('rasterio.windows')
+
+from importlib.util import find_spec
+checkPlanetCommon=find_spec('planet_opencv3') is not None
+if checkPlanetCommon:
+    from planet_opencv3 import cv2 as cv
+else:
+    cv=LazyImport('cv2')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import RasterFunc, ShmFunc
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['TileGrid', 'MatchTile', 'MatchPair']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def TileGrid(nbRow, nbCol, tileSize=dicSGM['tileSize']):
+    '''
+    Split an image into tile cores.
+
+    nbRow (int): image row number
+    nbCol (int): image column number
+    tileSize (int): tile core size [pxl]
+    out:
+        lstTile (list): tile cores [(rowMin, rowMax, colMin, colMax), ...]
+    '''
+    return [(i, min(i+tileSize, nbRow), j, min(j+tileSize, nbCol))
+                for i in range(0, nbRow, tileSize)
+                    for j in range(0, nbCol, tileSize)]
+
+def MatchTile(tupIn):
+    '''
+    Semi-global matching of one tile with OpenCV StereoSGBM. The tile is
+    read with an overlap and a margin holding the disparity range, only
+    the core is returned. Disparities follow ASP convention
+    (right=left+disparity) and pixels outside the masks are invalid. With
+    shared arrays, the tile is read from the epipolar arrays and the core
+    is written into the disparity array (-F.tif: dx, dy, valid).
+
+    tupIn (tuple): stereo prefix, tile core (rowMin, rowMax, colMin, colMax),
+        horizontal disparity range [dxMin, dxMax] [pxl], optional shared
+        array descriptors {ext: descriptor} (see ShmFunc)
+    out:
+        tupTile (tuple): tile core, horizontal disparity (array), valid mask (array),
+            None for both with shared arrays
+    '''
+    prefIn, tupCore, lstRange=tupIn[:3]
+    dicDesc=tupIn[3] if len(tupIn)>3 else None
+    cv.setNumThreads(1)
+    rowMin, rowMax, colMin, colMax=tupCore
+    dxMin, dxMax=floor(lstRange[0]), ceil(lstRange[1])
+    numDisp=16*ceil((dxMax-dxMin+1)/16)
+    # OpenCV convention: right=left-d
+    minDisp=-dxMax
+
+    # Read window
+    ovl=dicSGM['overlap']
+    marg=ovl+numDisp+max(abs(dxMin), abs(dxMax))
+    if dicDesc:
+        nbRow, nbCol=dicDesc['-L.tif']['shape']
+    else:
+        with rasterio.open(prefIn+'-L.tif') as imgIn:
+            nbRow, nbCol=imgIn.height, imgIn.width
+    r0, r1=max(rowMin-ovl, 0), min(rowMax+ovl, nbRow)
+    c0, c1=max(colMin-marg, 0), min(colMax+marg, nbCol)
+    winRead=rioWindows.Window(c0, r0, c1-c0, r1-r0)
+
+    if dicDesc:
+        lstImg=[ShmFunc.Attach(dicDesc[ext])[r0:r1, c0:c1] for ext in ('-L.tif', '-R.tif', '-lMask.tif', '-rMask.tif')]
+    else:
+        lstImg=[RasterFunc.ReadRaster(prefIn+ext, band=1, window=winRead) for ext in ('-L.tif', '-R.tif', '-lMask.tif', '-rMask.tif')]
+    imgL, imgR, maskL, maskR=lstImg
+    imgL=np.clip(imgL*255, 0, 255).astype(np.uint8)
+    imgR=np.clip(imgR*255, 0, 255).astype(np.uint8)
+
+    # Matching
+    bs=dicSGM['blockSize']
+    objSgm=cv.StereoSGBM_create(minDisparity=minDisp,
+                                numDisparities=numDisp,
+                                blockSize=bs,
+                                P1=dicSGM['p1']*bs**2,
+                                P2=dicSGM['p2']*bs**2,
+                                disp12MaxDiff=int(ceil(tolDispDiff)),
+                                uniquenessRatio=dicSGM['uniqueness'],
+                                speckleWindowSize=dicSGM['speckleWin'],
+                                speckleRange=dicSGM['speckleRange'],
+                                mode=cv.STEREO_SGBM_MODE_SGBM_3WAY)
+    matDisp=objSgm.compute(imgL, imgR)
+
+    # Core, ASP convention
+    matDisp=matDisp[rowMin-r0:rowMax-r0, colMin-c0:colMax-c0]
+    maskValid=matDisp>=minDisp*16
+    matDx=-matDisp.astype(np.float32)/16
+    maskValid&=maskL[rowMin-r0:rowMax-r0, colMin-c0:colMax-c0]>0
+
+    # Right mask at the matched position
+    matRow, matCol=np.nonzero(maskValid)
+    vectColR=np.round(matCol+colMin-c0+matDx[matRow, matCol]).astype(int)
+    checkIn=(vectColR>=0) & (vectColR<c1-c0)
+    checkIn[checkIn]=maskR[matRow[checkIn]+rowMin-r0, vectColR[checkIn]]>0
+    maskValid[matRow[~checkIn], matCol[~checkIn]]=False
+
+    matDx[~maskValid]=0
+    if dicDesc:
+        matOut=ShmFunc.Attach(dicDesc['-F.tif'])
+        matOut[0, rowMin:rowMax, colMin:colMax]=matDx
+        matOut[2, rowMin:rowMax, colMin:colMax]=maskValid
+        return tupCore, None, None
+    return tupCore, matDx, maskValid
+
+def MatchPair(prefIn, corrSearch=None, nbProc=None, shm=None, write=True):
+    '''
+    Container-free dense matching of an epipolar pair (EpipPreProc output)
+    with tiled semi-global matching on a process pool. It writes the
+    disparity image like ASP after filtering (-F.tif: dx, dy, valid) so
+    MergeDisparities and ASP triangulation (--entry-point 5) run unchanged.
+    With a shared memory channel holding the epipolar arrays, workers read
+    them and write the disparity in place (no tile transfer).
+
+    prefIn (str): stereo prefix holding -L.tif, -R.tif, -lMask.tif and -rMask.tif
+    corrSearch (list): disparity range [hmin, vmin, hmax, vmax] (default: None means
+        centred range of dicSGM['numDisp'])
+    nbProc (int): process number (default: None means cpu number)
+    shm (ShmChannel): shared arrays of the pair (default: None means files)
+    write (bool): write -F.tif with shared arrays, for external tools (default: True)
+    out:
+        0|1 (int): 0=success
+    '''
+    checkShm=shm is not None and all([prefIn+ext in shm for ext in ('-L.tif', '-R.tif', '-lMask.tif', '-rMask.tif')])
+    for ext in ('-L.tif', '-R.tif', '-lMask.tif', '-rMask.tif'):
+        if not checkShm and not os.path.exists(prefIn+ext):
+            SubLogger('ERROR', 'Epipolar file not found: %s'% (prefIn+ext))
+            return 1
+
+    if corrSearch is None:
+        lstRange=[-dicSGM['numDisp']//2, dicSGM['numDisp']//2]
+    else:
+        lstRange=[corrSearch[0], corrSearch[2]]
+
+    pathOut=prefIn+'-F.tif'
+    if checkShm:
+        nbRow, nbCol=shm.Desc(prefIn+'-L.tif')['shape']
+        lstTile=TileGrid(nbRow, nbCol)
+        matOut=shm.New(pathOut, (3, nbRow, nbCol), np.float32)
+        dicDesc={ext: shm.Desc(prefIn+ext) for ext in ('-L.tif', '-R.tif', '-lMask.tif', '-rMask.tif', '-F.tif')}
+        with Pool(nbProc) as poolCur:
+            poolCur.map(MatchTile, [(prefIn, tupCore, lstRange, dicDesc) for tupCore in lstTile])
+        nbValid=int(np.count_nonzero(matOut[2]))
+        del matOut
+        if write and nbValid and not shm.Write(pathOut): return 1
+    else:
+        with rasterio.open(prefIn+'-L.tif') as imgIn:
+            nbRow, nbCol=imgIn.height, imgIn.width
+        lstTile=TileGrid(nbRow, nbCol)
+
+        profOut=RasterFunc.Profile(nbCol, nbRow, count=3)
+        nbValid=0
+        with rasterio.open(pathOut, 'w', **profOut) as imgOut:
+            with Pool(nbProc) as poolCur:
+                for tupCore, matDx, maskValid in poolCur.imap_unordered(MatchTile, [(prefIn, tupCore, lstRange) for tupCore in lstTile]):
+                    rowMin, rowMax, colMin, colMax=tupCore
+                    winOut=rioWindows.Window(colMin, rowMin, colMax-colMin, rowMax-rowMin)
+                    imgOut.write(np.array([matDx, np.zeros(matDx.shape, dtype=np.float32), maskValid.astype(np.float32)]), window=winOut)
+                    nbValid+=int(np.sum(maskValid))
+
+    SubLogger('INFO', 'SGM: %i tiles, %.1f%% valid'% (len(lstTile), 100*nbValid/(nbRow*nbCol)))
+    if not nbValid:
+        SubLogger('ERROR', 'SGM: no valid disparity')
+        return 1
+    return 0
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import logging
+import shutil
+from glob import glob
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['RemovePrefix', 'ScratchDir']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def RemovePrefix(lstPref, sep='-'):
+    '''
+    Remove files of stereo prefixes (shell 'rm pref-*' equivalent).
+
+    lstPref (list): prefix list
+    sep (str): separator after the prefix (default: '-')
+    out:
+        sizeDel (int): removed bytes
+    '''
+    sizeDel=0
+    for prefCur in lstPref:
+        for pathCur in glob(prefCur+sep+'*'):
+            if os.path.isdir(pathCur):
+                shutil.rmtree(pathCur, ignore_errors=True)
+                continue
+            sizeDel+=os.path.getsize(pathCur)
+            os.remove(pathCur)
+    return sizeDel
+
+class ScratchDir():
+    '''
+    Scratch directory for short-lived dense matching intermediates. It is
+    created once and emptied between pairs, so it can sit on a fast local
+    volume (tmpfs, NVMe). A disk budget is enforced before each pair.
+    Docker tools only see their mounted root folder (see DockerLibs), so
+    the directory must be under it as long as ASP, PDAL or GDAL
+    containers read the intermediates.
+
+    pathDir (str): scratch directory
+    budget (float): disk budget [GB] (default: 0 means free disk space only)
+    rootFolder (str): Docker root folder to check (default: None)
+    out:
+        ScratchDir (obj):
+            pathDir (str): scratch directory
+            sizeBudget (int): disk budget [B]
+    '''
+    def __init__(self, pathDir, budget=0, rootFolder=None):
+        self.pathDir=os.path.abspath(pathDir)
+        self.sizeBudget=int(budget*1024**3)
+        self._dicMark={}
+        os.makedirs(self.pathDir, exist_ok=True)
+
+        if rootFolder and not self.pathDir.startswith(rootFolder):
+            SubLogger('WARNING', 'Scratch directory outside the Docker root folder (%s): %s'% (rootFolder, self.pathDir))
+
+    def __str__(self):
+        return '%s (%.2f GB used, %.2f GB free)'% (self.pathDir, self.Usage()/1024**3, self.Free()/1024**3)
+
+    def Prefix(self, name):
+        '''Return a file prefix in the scratch directory'''
+        return os.path.join(self.pathDir, name)
+
+    def Usage(self):
+        '''Bytes currently held by the scratch directory'''
+        sizeUse=0
+        for pathCur, _, lstFile in os.walk(self.pathDir):
+            for nameFile in lstFile:
+                try:
+                    sizeUse+=os.path.getsize(os.path.join(pathCur, nameFile))
+                except OSError:
+                    continue
+        return sizeUse
+
+    def _Files(self):
+        '''Size and modification time of the scratch files'''
+        dicFile={}
+        for pathCur, _, lstFile in os.walk(self.pathDir):
+            for nameFile in lstFile:
+                try:
+                    statCur=os.stat(os.path.join(pathCur, nameFile))
+                except OSError:
+                    continue
+                dicFile[os.path.join(pathCur, nameFile)]=(statCur.st_size, statCur.st_mtime_ns)
+        return dicFile
+
+    def Mark(self):
+        '''Start counting written bytes (see Written)'''
+        self._dicMark=self._Files()
+
+    def Written(self):
+        '''
+        Bytes written in the scratch directory since the last Mark: sum of
+        the sizes of files created or modified since then. Files removed
+        before the call are not counted.
+
+        out:
+            sizeWrite (int): written bytes
+        '''
+        return sum([tupCur[0] for pathCur, tupCur in self._Files().items()
+                        if not self._dicMark.get(pathCur)==tupCur])
+
+    def Free(self):
+        '''Bytes available for the next pair (budget and disk)'''
+        sizeFree=shutil.disk_usage(self.pathDir).free
+        if self.sizeBudget: sizeFree=min(sizeFree, self.sizeBudget-self.Usage())
+        return sizeFree
+
+    def Check(self, sizeNeed):
+        '''
+        Check whether a pair fits in the scratch space.
+
+        sizeNeed (int): predicted bytes
+        out:
+            check (bool): True=fits
+        '''
+        return sizeNeed<=self.Free()
+
+    def Clean(self):
+        '''
+        Empty the scratch directory (kept for reuse).
+
+        out:
+            sizeDel (int): removed bytes (held at the end of the last pair)
+        '''
+        sizeDel=0
+        with os.scandir(self.pathDir) as lstEntry:
+            for entryCur in lstEntry:
+                if entryCur.is_dir(follow_symlinks=False):
+                    sizeDel+=sum([os.path.getsize(os.path.join(pathCur, nameFile))
+                                    for pathCur, _, lstFile in os.walk(entryCur.path) for nameFile in lstFile])
+                    shutil.rmtree(entryCur.path, ignore_errors=True)
+                else:
+                    sizeDel+=entryCur.stat(follow_symlinks=False).st_size
+                    os.remove(entryCur.path)
+        return sizeDel
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import logging
+import shutil
+from uuid import uuid4
+from multiprocessing import shared_memory
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import RasterFunc
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['Descriptor', 'Attach', 'Release', 'ShmChannel']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+dicAttach={}
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def Descriptor(name, shape, dtype, transform=None, nodata=None, meta=None):
+    '''
+    Shared array descriptor: it is small and picklable so it goes to pool
+    workers in place of the array.
+
+    name (str): shared memory segment name
+    shape (tuple): array shape
+    dtype (str): array data type
+    transform (tuple): geotransform (default: None means image frame)
+    nodata (float): nodata value (default: None)
+    meta (dict): raster tags, e.g. POINT_OFFSET (default: None)
+    out:
+        dicDesc (dict): descriptor
+    '''
+    return {'name': name,
+            'shape': tuple(int(n) for n in shape),
+            'dtype': np.dtype(dtype).str,
+            'transform': None if transform is None else tuple(transform),
+            'nodata': nodata,
+            'meta': dict(meta or {}),
+            }
+
+def _Open(name):
+    '''Existing segment without resource tracking (Python>=3.13), the owner unlinks it'''
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+def Attach(dicDesc):
+    '''
+    Zero-copy access to a shared array from a worker process. Segments
+    stay attached in the process (one mapping per segment), workers of a
+    pool reuse them from one task to the next. Processes must belong to
+    the channel owner (Pool or Process children) as older Python versions
+    track attached segments per process tree.
+
+    dicDesc (dict): descriptor
+    out:
+        matOut (array): shared array
+    '''
+    if not dicDesc['name'] in dicAttach:
+        dicAttach[dicDesc['name']]=_Open(dicDesc['name'])
+    return np.ndarray(dicDesc['shape'], dtype=dicDesc['dtype'], buffer=dicAttach[dicDesc['name']].buf)
+
+def Release(dicDesc=None):
+    '''
+    Detach shared arrays from the current process (arrays returned by
+    Attach must not be used afterwards).
+
+    dicDesc (dict): descriptor (default: None means all segments)
+    out:
+        None
+    '''
+    lstName=list(dicAttach) if dicDesc is None else [dicDesc['name']]
+    for name in lstName:
+        if not name in dicAttach: continue
+        try:
+            dicAttach.pop(name).close()
+        except BufferError:
+            SubLogger('WARNING', 'Shared array still in use: %s'% name)
+
+class ShmChannel():
+    '''
+    In-memory hand-off of large arrays between in-process stages
+    (radiometric preparation, masking, epipolar warp, native matching and
+    triangulation). Arrays are keyed by the path of the file they stand
+    for (e.g. prefix+'-L.tif') and live in shared memory segments: pool
+    workers attach them through their descriptor instead of reading a
+    file or receiving a pickled copy. A file is written only when an
+    external tool needs it (Write). The channel owns its segments and
+    unlinks them at Close.
+
+    budget (float): memory budget [GB] (default: 0 means shared memory free space only)
+    out:
+        ShmChannel (obj):
+            dicSeg (dict): key: (segment, descriptor)
+    '''
+    def __init__(self, budget=0):
+        self.sizeBudget=int(budget*1024**3)
+        self.dicSeg={}
+
+    def __str__(self):
+        return 'ShmChannel (%i arrays, %.2f GB, %.2f GB free)'% (len(self.dicSeg), self.Usage()/1024**3, self.Free()/1024**3)
+
+    def __contains__(self, key):
+        return key in self.dicSeg
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+    def Usage(self):
+        '''Bytes held by the channel'''
+        return sum([segCur.size for segCur, _ in self.dicSeg.values()])
+
+    def Free(self):
+        '''Bytes available for new arrays (budget and shared memory space)'''
+        sizeFree=shutil.disk_usage(dicShm['dir']).free if os.path.isdir(dicShm['dir']) else 0
+        if self.sizeBudget: sizeFree=min(sizeFree, self.sizeBudget-self.Usage())
+        return sizeFree
+
+    def Check(self, sizeNeed):
+        '''
+        Check whether arrays fit in the channel (e.g. Docker containers
+        have a small /dev/shm).
+
+        sizeNeed (int): predicted bytes
+        out:
+            check (bool): True=fits
+        '''
+        return sizeNeed<=self.Free()
+
+    def New(self, key, shape, dtype, transform=None, nodata=None, meta=None):
+        '''
+        Allocate a shared array (filled with 0), stages write directly
+        into it. An existing key is replaced.
+
+        key (str): array key (stand-in file path)
+        shape (tuple): array shape
+        dtype (str): array data type
+        transform (tuple): geotransform (default: None)
+        nodata (float): nodata value (default: None)
+        meta (dict): raster tags (default: None)
+        out:
+            matOut (array): shared array
+        '''
+        self.Drop(key)
+        sizeArr=max(1, int(np.prod(shape))*np.dtype(dtype).itemsize)
+        try:
+            segCur=shared_memory.SharedMemory(name='%s_%i_%s'% (dicShm['prefix'], os.getpid(), uuid4().hex[:8]), create=True, size=sizeArr)
+        except OSError as msg:
+            SubLogger('CRITICAL', 'Shared memory allocation failed (%.2f GB): %s'% (sizeArr/1024**3, str(msg)))
+        self.dicSeg[key]=(segCur, Descriptor(segCur.name, shape, dtype, transform=transform, nodata=nodata, meta=meta))
+        matOut=self.Get(key)
+        matOut.fill(0)
+        return matOut
+
+    def Put(self, key, matIn, transform=None, nodata=None, meta=None):
+        '''
+        Copy an array into the channel.
+
+        key (str): array key (stand-in file path)
+        matIn (array): array
+        transform (tuple): geotransform (default: None)
+        nodata (float): nodata value (default: None)
+        meta (dict): raster tags (default: None)
+        out:
+            dicDesc (dict): descriptor
+        '''
+        matOut=self.New(key, matIn.shape, matIn.dtype, transform=transform, nodata=nodata, meta=meta)
+        np.copyto(matOut, matIn)
+        return self.dicSeg[key][1]
+
+    def Get(self, key):
+        '''Shared array of a key (zero-copy)'''
+        segCur, dicDesc=self.dicSeg[key]
+        return np.ndarray(dicDesc['shape'], dtype=dicDesc['dtype'], buffer=segCur.buf)
+
+    def Desc(self, key):
+        '''Descriptor of a key (for pool workers)'''
+        return self.dicSeg[key][1]
+
+    def Write(self, key, pathOut=None, radio=False):
+        '''
+        Write an array to a raster file for an external tool (raster
+        policy, see RasterFunc.WriteRaster). Descriptor tags are kept.
+
+        key (str): array key
+        pathOut (str): output path (default: None means key)
+        radio (bool): radiometric intermediate, quantisation allowed (default: False)
+        out:
+            check (bool): True=written
+        '''
+        if pathOut is None: pathOut=key
+        dicDesc=self.Desc(key)
+        if not RasterFunc.WriteRaster(pathOut, self.Get(key), nodata=dicDesc['nodata'], radio=radio): return False
+        if dicDesc['meta'] or dicDesc['transform']:
+            with rasterio.open(pathOut, 'r+') as imgOut:
+                if dicDesc['meta']: imgOut.update_tags(**dicDesc['meta'])
+                if dicDesc['transform']: imgOut.transform=rasterio.Affine.from_gdal(*dicDesc['transform'])
+        return True
+
+    def Drop(self, key):
+        '''Release the array of a key (arrays from Get must not be used afterwards)'''
+        if not key in self.dicSeg: return
+        segCur, dicDesc=self.dicSeg.pop(key)
+        Release(dicDesc)
+        try:
+            segCur.close()
+        except BufferError:
+            SubLogger('WARNING', 'Shared array still in use: %s'% key)
+        segCur.unlink()
+
+    def Close(self):
+        '''
+        Release all arrays (the channel stays usable).
+
+        out:
+            sizeDel (int): released bytes
+        '''
+        sizeDel=self.Usage()
+        for key in list(self.dicSeg): self.Drop(key)
+        return sizeDel
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import json
+import logging
+import time
+import threading
+import fcntl
+import resource
+from glob import glob
+from subprocess import run as Run
+from subprocess import PIPE, DEVNULL, Popen, CompletedProcess
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['SetContext', 'Context', 'Telemetry', 'Open', 'Close', 'Active', 'CmdProbe', 'RunShell', 'Record', 'ReadRecords', 'Report']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+_objTelem=None
+_dicContext={'stage': None, 'block': None, 'pair': None}
+_dicContainer={}
+_dicShared={}
+_lockShared=threading.Lock()
+setInfra=('DockerLibs', 'ExecFunc', 'CacheFunc', 'BackendFunc', 'TelemetryFunc')
+lstCounter=('user', 'sys', 'read', 'write')
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def SetContext(**kwargs):
+    '''
+    Update the command context (stage, block, pair) attached to records.
+    Forked workers inherit it, executor commands take it at submission.
+
+    kwargs: context values (e.g. stage='Epipolar images', pair='00012')
+    out:
+        dicPrev (dict): previous context
+    '''
+    dicPrev=dict(_dicContext)
+    _dicContext.update(kwargs)
+    return dicPrev
+
+def Context():
+    '''Current command context with the calling function (first frame outside the tool infrastructure)'''
+    dicCtx=dict(_dicContext)
+    frameCur=sys._getframe(1)
+    while frameCur and frameCur.f_globals.get('__name__', '').split('.')[-1] in setInfra:
+        frameCur=frameCur.f_back
+    dicCtx['caller']=None
+    if frameCur: dicCtx['caller']='%s.%s'% (frameCur.f_globals.get('__name__', '').split('.')[-1], frameCur.f_code.co_name)
+    return dicCtx
+
+class Telemetry():
+    '''
+    Command record file (JSONL). Appends are locked so processes of the
+    same run (pool workers) share the file. Each run gets an identifier
+    to separate it in reports.
+
+    pathRecord (str): record file path (.jsonl)
+    out:
+        Telemetry (obj):
+            idRun (str): run identifier
+    '''
+    def __init__(self, pathRecord):
+        self.pathRecord=os.path.abspath(pathRecord)
+        self.idRun='%s_%i'% (time.strftime('%Y%m%dT%H%M%S'), os.getpid())
+        os.makedirs(os.path.dirname(self.pathRecord), exist_ok=True)
+
+    def __str__(self):
+        return '%s (run %s)'% (self.pathRecord, self.idRun)
+
+    def Write(self, recCur):
+        '''Append a record'''
+        recCur['run']=self.idRun
+        with open(self.pathRecord, 'a') as fileOut:
+            fcntl.flock(fileOut, fcntl.LOCK_EX)
+            fileOut.write(json.dumps(recCur)+'\n')
+        return 0
+
+def Open(pathRecord):
+    '''
+    Start recording tool commands.
+
+    pathRecord (str): record file path (.jsonl)
+    out:
+        objTelem (Telemetry): active record file
+    '''
+    global _objTelem
+    _objTelem=Telemetry(pathRecord)
+    SubLogger('INFO', 'Telemetry: %s'% str(_objTelem))
+    return _objTelem
+
+def Close():
+    '''Stop recording'''
+    global _objTelem
+    _objTelem=None
+    return 0
+
+def Active():
+    '''Active record file or None'''
+    return _objTelem
+
+def _ReadKey(pathFile):
+    '''Key-value file (cpu.stat, /proc/<pid>/io, /proc/<pid>/status), None if unreadable'''
+    dicOut={}
+    try:
+        with open(pathFile) as fileIn:
+            for lineCur in fileIn:
+                words=lineCur.replace(':', ' ').split()
+                if len(words)>1: dicOut[words[0]]=words[1]
+    except OSError:
+        return None
+    return dicOut
+
+def _ReadInt(pathFile):
+    try:
+        with open(pathFile) as fileIn:
+            return int(fileIn.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _StatProc(pidRoot):
+    '''
+    Counters of a host process tree from /proc. CPU times include the
+    reaped children (cutime, cstime) so the sum over the living tree
+    covers the processes already gone.
+
+    pidRoot (int): root process id
+    out:
+        dicProc (dict): {pid: {'user': s, 'sys': s, 'mem': B, 'read': B, 'write': B}}
+    '''
+    dicStat={}
+    for name in os.listdir('/proc'):
+        if not name.isdigit(): continue
+        try:
+            with open('/proc/%s/stat'% name) as fileIn:
+                words=fileIn.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        dicStat[int(name)]=words
+
+    setTree={pidRoot} if pidRoot in dicStat else set()
+    nbTree=0
+    while not nbTree==len(setTree):
+        nbTree=len(setTree)
+        setTree|={pid for pid in dicStat if int(dicStat[pid][1]) in setTree}
+
+    tick=os.sysconf('SC_CLK_TCK')
+    page=os.sysconf('SC_PAGE_SIZE')
+    dicProc={}
+    for pid in setTree:
+        dicIo=_ReadKey('/proc/%i/io'% pid) or {}
+        dicProc[pid]={'user': (int(dicStat[pid][11])+int(dicStat[pid][13]))/tick,
+                      'sys': (int(dicStat[pid][12])+int(dicStat[pid][14]))/tick,
+                      'mem': int(dicStat[pid][21])*page,
+                      'read': int(dicIo.get('read_bytes', 0)),
+                      'write': int(dicIo.get('write_bytes', 0))}
+    return dicProc
+
+def _StatThread(cpu=True):
+    '''Counters of the calling thread (CPU) and of the current process (memory, IO)'''
+    dicOut={}
+    if cpu:
+        objUsage=resource.getrusage(resource.RUSAGE_THREAD)
+        dicIo=_ReadKey('/proc/self/io') or {}
+        dicOut.update({'user': objUsage.ru_utime,
+                       'sys': objUsage.ru_stime,
+                       'read': int(dicIo.get('read_bytes', 0)),
+                       'write': int(dicIo.get('write_bytes', 0))})
+    dicStatus=_ReadKey('/proc/self/status') or {}
+    if 'VmRSS' in dicStatus: dicOut['mem']=int(dicStatus['VmRSS'])*1024
+    return dicOut
+
+def _ContainerCgroup(nameCont, reset=False):
+    '''Cgroup directories of a running container (cached by name, see _CgroupDir)'''
+    if reset or not nameCont in _dicContainer:
+        try:
+            out=Run(['docker', 'inspect', '-f', '{{.Id}}', nameCont], stdout=PIPE, stderr=DEVNULL)
+        except OSError:
+            return {}
+        if out.returncode: return {}
+        _dicContainer[nameCont]=_CgroupDir(out.stdout.decode('utf-8').strip())
+    return _dicContainer[nameCont]
+
+def _CgroupDir(idCont):
+    '''
+    Cgroup directories of a container, cgroup v2 (unified) or v1 (per
+    controller), for the systemd and cgroupfs drivers.
+
+    idCont (str): full container id
+    out:
+        dicDir (dict): {'v2': dir} or {'cpu': dir, 'memory': dir, 'blkio': dir}, {} if not found
+    '''
+    lstForm=('system.slice/docker-%s.scope', 'docker/%s')
+    if os.path.exists('/sys/fs/cgroup/cgroup.controllers'):
+        for formCur in lstForm:
+            pathCur=os.path.join('/sys/fs/cgroup', formCur% idCont)
+            if os.path.isdir(pathCur): return {'v2': pathCur}
+        lstPath=glob('/sys/fs/cgroup/*/docker-%s.scope'% idCont)
+        return {'v2': lstPath[0]} if lstPath else {}
+
+    dicDir={}
+    for ctrl, lstSub in (('cpu', ('cpuacct', 'cpu,cpuacct')), ('memory', ('memory',)), ('blkio', ('blkio',))):
+        for sub in lstSub:
+            for formCur in lstForm:
+                pathCur=os.path.join('/sys/fs/cgroup', sub, formCur% idCont)
+                if os.path.isdir(pathCur): dicDir[ctrl]=pathCur
+    return dicDir
+
+def _StatCgroup(nameCont):
+    '''
+    Counters of a container from its cgroup.
+
+    nameCont (str): container name
+    out:
+        dicOut (dict): {'user': s, 'sys': s, 'mem': B, 'peak': B, 'read': B, 'write': B}, None if not found
+    '''
+    dicDir=_ContainerCgroup(nameCont)
+    if dicDir and not all([os.path.isdir(pathCur) for pathCur in dicDir.values()]):
+        # Restarted session: new id
+        dicDir=_ContainerCgroup(nameCont, reset=True)
+    if not dicDir: return None
+
+    dicOut={'read': 0, 'write': 0}
+    if 'v2' in dicDir:
+        dicCpu=_ReadKey(os.path.join(dicDir['v2'], 'cpu.stat')) or {}
+        if 'user_usec' in dicCpu: dicOut['user']=int(dicCpu['user_usec'])/1e6
+        if 'system_usec' in dicCpu: dicOut['sys']=int(dicCpu['system_usec'])/1e6
+        dicOut['mem']=_ReadInt(os.path.join(dicDir['v2'], 'memory.current'))
+        dicOut['peak']=_ReadInt(os.path.join(dicDir['v2'], 'memory.peak'))
+        try:
+            with open(os.path.join(dicDir['v2'], 'io.stat')) as fileIn:
+                for lineCur in fileIn:
+                    dicIo=dict([word.split('=') for word in lineCur.split()[1:] if '=' in word])
+                    dicOut['read']+=int(dicIo.get('rbytes', 0))
+                    dicOut['write']+=int(dicIo.get('wbytes', 0))
+        except OSError:
+            pass
+        return dicOut
+
+    if 'cpu' in dicDir:
+        dicCpu=_ReadKey(os.path.join(dicDir['cpu'], 'cpuacct.stat')) or {}
+        tick=os.sysconf('SC_CLK_TCK')
+        if 'user' in dicCpu: dicOut['user']=int(dicCpu['user'])/tick
+        if 'system' in dicCpu: dicOut['sys']=int(dicCpu['system'])/tick
+    if 'memory' in dicDir:
+        dicOut['mem']=_ReadInt(os.path.join(dicDir['memory'], 'memory.usage_in_bytes'))
+        dicOut['peak']=_ReadInt(os.path.join(dicDir['memory'], 'memory.max_usage_in_bytes'))
+    if 'blkio' in dicDir:
+        try:
+            with open(os.path.join(dicDir['blkio'], 'blkio.throttle.io_service_bytes')) as fileIn:
+                for lineCur in fileIn:
+                    words=lineCur.split()
+                    if len(words)==3 and words[1] in ('Read', 'Write'): dicOut[words[1].lower()]+=int(words[2])
+        except OSError:
+            pass
+    return dicOut
+
+class CmdProbe():
+    '''
+    Resource measure of one tool command. The source follows where the
+    command runs: the tool session container (cgroup), the command
+    container (docker run fallback), the host process tree (native
+    backend) or the calling thread (python functions, memory and IO of
+    the process). Counters are read at start and stop, the memory is
+    sampled every dicTelemetry['sample'] seconds. Values the source does
+    not expose are None. Session counters cover the whole container,
+    including the commands of other processes (pool workers, other
+    scripts): they are marked scope='container' and Report leaves them
+    out of the command sums.
+
+    objTool (AspPython|PdalPython|GdalPython): tool object
+    idJob (str): command container name (docker run fallback, default: None)
+    python (bool): python function run in the calling thread (default: False)
+    out:
+        CmdProbe (obj):
+            mode (str): session|container|native|python
+            scope (str): container (whole session container) or command
+            dicMeas (dict): wall [s], user and sys CPU [s], peak memory, read and write [B], scope, shared commands of the process (session)
+    '''
+    def __init__(self, objTool, idJob=None, python=False):
+        self.nameCont=None
+        if python:
+            self.mode='python'
+        elif objTool.backendCmd=='native':
+            self.mode='native'
+        elif objTool.objSession and not objTool.objSession.lost:
+            self.mode='session'
+            self.nameCont=objTool.objSession.name
+        else:
+            self.mode='container'
+            self.nameCont=idJob
+        self.scope='container' if self.mode=='session' else 'command'
+        self.pid=None
+        self.timeStart=None
+        self.dicMeas={}
+        self._thread=None
+
+    def _Read(self, cpu=True):
+        '''Read the source once'''
+        if self.mode=='python': return _StatThread(cpu=cpu)
+        if self.mode=='native':
+            if not self.pid: return None
+            dicProc=_StatProc(self.pid)
+            if not dicProc: return None
+            self._dicProc.update(dicProc)
+            dicOut={key: sum([dicCur[key] for dicCur in self._dicProc.values()]) for key in ('read', 'write')}
+            for key in ('user', 'sys'):
+                dicOut[key]=max(sum([dicCur[key] for dicCur in dicProc.values()]), (self._dicLast or {}).get(key, 0))
+            dicOut['mem']=sum([dicCur['mem'] for dicCur in dicProc.values()])
+            return dicOut
+        if not self.nameCont: return None
+        return _StatCgroup(self.nameCont)
+
+    def _Update(self, cpu=True):
+        dicCur=self._Read(cpu=cpu)
+        if self.nameCont:
+            self._shared=max(self._shared, _dicShared.get(self.nameCont, 0))
+        if not dicCur: return
+        self._peak=max(self._peak, dicCur.get('mem') or 0)
+        if self.mode=='container': self._peak=max(self._peak, dicCur.get('peak') or 0)
+        if not cpu: return
+        if self._dicFirst is None: self._dicFirst=dicCur
+        self._dicLast=dicCur
+
+    def _Sample(self):
+        while not self._stop.wait(dicTelemetry['sample']):
+            self._Update(cpu=not self.mode=='python')
+
+    def Start(self, pid=None):
+        '''
+        Start the measure.
+
+        pid (int): host process of the command (native backend, default: None)
+        out:
+            0 (int)
+        '''
+        self.pid=pid
+        self.timeStart=time.time()
+        self._dicProc={}
+        self._dicFirst=None
+        self._dicLast=None
+        self._peak=0
+        self._shared=0
+        if self.nameCont:
+            with _lockShared:
+                _dicShared[self.nameCont]=_dicShared.get(self.nameCont, 0)+1
+        self._Update()
+        self._stop=threading.Event()
+        self._thread=threading.Thread(target=self._Sample, daemon=True)
+        self._thread.start()
+        return 0
+
+    def Stop(self, rusage=None):
+        '''
+        Stop the measure.
+
+        rusage (struct_rusage): exact usage of the host process (wait4, native backend, default: None)
+        out:
+            dicMeas (dict): measures
+        '''
+        if not self._thread: return self.dicMeas
+        self._stop.set()
+        self._thread.join()
+        self._thread=None
+        self._Update()
+        if self.nameCont:
+            with _lockShared:
+                _dicShared[self.nameCont]-=1
+            if self.mode=='container': _dicContainer.pop(self.nameCont, None)
+
+        self.dicMeas={'wall': time.time()-self.timeStart}
+        self.dicMeas.update({key: None for key in lstCounter})
+        if self._dicLast:
+            # Session and thread counters run before the command
+            dicFirst=self._dicFirst if self.mode in ('session', 'python') else {}
+            for key in lstCounter:
+                if self._dicLast.get(key) is None: continue
+                self.dicMeas[key]=self._dicLast[key]-dicFirst.get(key, 0)
+        self.dicMeas['peak']=self._peak or None
+        if rusage and self.mode=='native':
+            self.dicMeas['user']=rusage.ru_utime
+            self.dicMeas['sys']=rusage.ru_stime
+            self.dicMeas['peak']=max(self._peak, rusage.ru_maxrss*1024)
+            if not self.dicMeas['read']: self.dicMeas['read']=rusage.ru_inblock*512
+            if not self.dicMeas['write']: self.dicMeas['write']=rusage.ru_oublock*512
+        self.dicMeas['scope']=self.scope
+        if self.mode=='session': self.dicMeas['shared']=self._shared
+        return self.dicMeas
+
+    def Call(self, fun, *args):
+        '''Measure a python function call (start and stop in the calling thread)'''
+        self.Start()
+        try:
+            return fun(*args)
+        finally:
+            self.Stop()
+
+def RunShell(strCmd, objProbe, stdout=None):
+    '''
+    subprocess.run(strCmd, shell=True) measured by a probe. The process
+    is reaped with wait4 which gives the exact usage of host commands.
+
+    strCmd (str): command line
+    objProbe (CmdProbe): probe
+    stdout (int): subprocess stdout (default: None)
+    out:
+        out (CompletedProcess): process output
+    '''
+    procCur=Popen(strCmd, shell=True, stdout=stdout)
+    objProbe.Start(procCur.pid)
+    byteOut=None
+    try:
+        if procCur.stdout: byteOut=procCur.stdout.read()
+        status, rusage=os.wait4(procCur.pid, 0)[1:]
+    except BaseException:
+        procCur.kill()
+        procCur.wait()
+        objProbe.Stop()
+        raise
+    procCur.returncode=os.waitstatus_to_exitcode(status)
+    if procCur.stdout: procCur.stdout.close()
+    objProbe.Stop(rusage)
+    return CompletedProcess(strCmd, procCur.returncode, stdout=byteOut)
+
+def Record(objTool, fun, subArgs, out, objProbe, dicCtx=None):
+    '''
+    Write the record of a tool command.
+
+    objTool (AspPython|PdalPython|GdalPython): tool object
+    fun (str): tool function
+    subArgs (list): list of arguments
+    out (int): return code
+    objProbe (CmdProbe): stopped probe
+    dicCtx (dict): command context (default: None means Context())
+    out:
+        0 (int)
+    '''
+    if _objTelem is None: return 0
+    recCur={'time': round(objProbe.timeStart, 3),
+            'tool': type(objTool).__name__,
+            'fun': fun,
+            'backend': objTool.backend,
+            'mode': objProbe.mode,
+            }
+    recCur.update(dicCtx or Context())
+    recCur['rc']=out
+    recCur.update({key: (round(val, 3) if type(val)==float else val) for key, val in objProbe.dicMeas.items()})
+    recCur['args']=' '.join(subArgs)[:dicTelemetry['argLen']]
+    return _objTelem.Write(recCur)
+
+def _Wide(recCur):
+    '''Record with container-wide counters (session, records without scope use the mode)'''
+    return recCur.get('scope', 'container' if recCur.get('mode')=='session' else 'command')=='container'
+
+def ReadRecords(pathRecord, run=None):
+    '''
+    Read command records.
+
+    pathRecord (str): record file path (.jsonl)
+    run (str): run identifier, 'last' or None for all runs (default: None)
+    out:
+        lstRec (list): records
+    '''
+    lstRec=[]
+    with open(pathRecord) as fileIn:
+        for lineCur in fileIn:
+            if not lineCur.strip(): continue
+            lstRec.append(json.loads(lineCur))
+    if run=='last' and lstRec: run=lstRec[-1]['run']
+    if run: lstRec=[recCur for recCur in lstRec if recCur['run']==run]
+    return lstRec
+
+def Report(pathRecord, run=None, nbTop=None, lstKey=('stage', 'fun')):
+    '''
+    Summary of command records: groups (stage without context falls back
+    to the calling function) ranked by total wall time with CPU time,
+    peak memory and IO, then the slowest individual calls. Container-wide
+    counters (session commands, scope='container') are not per command:
+    they are left out of CPU, peak and IO, which only cover
+    command-scoped records (Cmd column).
+
+    pathRecord (str): record file path (.jsonl)
+    run (str): run identifier, 'last' or None for all runs (default: None)
+    nbTop (int): slowest call number (default: None means dicTelemetry['top'])
+    lstKey (tuple): record keys to group by (default: ('stage', 'fun'))
+    out:
+        strOut (str): report
+    '''
+    if nbTop is None: nbTop=dicTelemetry['top']
+    lstRec=ReadRecords(pathRecord, run=run)
+    if not lstRec: return 'No command record: %s'% pathRecord
+    wallTot=sum([recCur['wall'] for recCur in lstRec])
+    lstStr=['%i commands, %.1f h in tools (%s)'% (len(lstRec), wallTot/3600, run or 'all runs')]
+    nbWide=len([recCur for recCur in lstRec if _Wide(recCur)])
+    if nbWide: lstStr.append('%i session commands with container-wide counters, not included in CPU, peak and IO'% nbWide)
+
+    for key in lstKey:
+        dicGrp={}
+        for recCur in lstRec:
+            nameGrp=recCur.get(key) or '(%s)'% recCur.get('caller')
+            dicGrp.setdefault(nameGrp, []).append(recCur)
+        lstGrp=sorted(dicGrp, key=lambda name: -sum([recCur['wall'] for recCur in dicGrp[name]]))
+        lstStr.append('')
+        lstStr.append('{:<32} {:>6} {:>10} {:>6} {:>10} {:>6} {:>10} {:>9} {:>9} {:>5}'.format(key.capitalize(), 'Calls', 'Wall [s]', 'Wall%', 'Mean [s]', 'Cmd', 'CPU [s]', 'Peak [GB]', 'IO [GB]', 'Fail'))
+        for nameGrp in lstGrp:
+            lstCur=dicGrp[nameGrp]
+            lstCmd=[recCur for recCur in lstCur if not _Wide(recCur)]
+            wallGrp=sum([recCur['wall'] for recCur in lstCur])
+            cpuGrp=sum([(recCur.get('user') or 0)+(recCur.get('sys') or 0) for recCur in lstCmd])
+            peakGrp=max([recCur.get('peak') or 0 for recCur in lstCmd]+[0])
+            ioGrp=sum([(recCur.get('read') or 0)+(recCur.get('write') or 0) for recCur in lstCmd])
+            lstStr.append('{:<32} {:>6} {:>10.1f} {:>6.1f} {:>10.2f} {:>6} {:>10.1f} {:>9.2f} {:>9.2f} {:>5}'.format(str(nameGrp)[:32],
+                                                                                                          len(lstCur),
+                                                                                                          wallGrp,
+                                                                                                          100*wallGrp/max(wallTot, 1e-9),
+                                                                                                          wallGrp/len(lstCur),
+                                                                                                          len(lstCmd),
+                                                                                                          cpuGrp,
+                                                                                                          peakGrp/1024**3,
+                                                                                                          ioGrp/1024**3,
+                                                                                                          sum([bool(recCur['rc']) for recCur in lstCur])))
+
+    lstStr.append('')
+    lstStr.append('Slowest calls:')
+    for recCur in sorted(lstRec, key=lambda rec: -rec['wall'])[:nbTop]:
+        lstStr.append('{:>10.1f} s  {:<16} {:<24} block={} pair={} peak={:.2f} GB{} {}'.format(recCur['wall'],
+                                                                                             recCur['fun'][:16],
+                                                                                             str(recCur.get('stage') or recCur.get('caller'))[:24],
+                                                                                             recCur.get('block'),
+                                                                                             recCur.get('pair'),
+                                                                                             (recCur.get('peak') or 0)/1024**3,
+                                                                                             ' (container)' if _Wide(recCur) else ' ',
+                                                                                             recCur['args'][:80]))
+    return '\n'.join(lstStr)
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
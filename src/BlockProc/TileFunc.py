@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import json
+import logging
+from math import floor
+import numpy as np
+
+from OutLib.LazyFunc import LazyImport
+shapelyGeom=LazyImport('shapely.geometry')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['TileIndex', 'TileKeys', 'NeighbourKeys', 'TileInAoi', 'CropTileJson']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def TileKeys(lstBounds, buffer):
+    '''
+    List 1 km tiles touched by a footprint. Tile keys follow the
+    renamed tiles (see MSSFunc.FilterTiles): 'x_y' with the top-left
+    corner in [km].
+
+    lstBounds (list): footprint bounds [xMin, yMin, xMax, yMax] in [m]
+    buffer (float): tile buffer [m]
+    out:
+        lstKey (list): tile keys
+    '''
+    xMin, yMin=floor((lstBounds[0]-buffer)/1000), floor((lstBounds[1]-buffer)/1000)+1
+    xMax, yMax=floor((lstBounds[2]+buffer)/1000), floor((lstBounds[3]+buffer)/1000)+1
+    return ['%i_%i'% (x, y) for x in range(xMin, xMax+1) for y in range(yMin, yMax+1)]
+
+def NeighbourKeys(setKey):
+    '''
+    List the 8-connexity neighbours of tiles (native filtering reads
+    neighbour tiles, see FilterPCFunc.TileArgs).
+
+    setKey (set): tile keys 'x_y'
+    out:
+        setNeigh (set): neighbour keys, input keys excluded
+    '''
+    setNeigh=set()
+    for strKey in setKey:
+        x, y=[int(s) for s in strKey.split('_')]
+        setNeigh.update(['%i_%i'% (x+i, y+j) for i in (-1, 0, 1) for j in (-1, 0, 1)])
+    return setNeigh-set(setKey)
+
+def TileInAoi(strKey, featAoi):
+    '''
+    Check whether a tile intersects the AOI (projected).
+
+    strKey (str): tile key 'x_y'
+    featAoi (json): AOI feature in the tile projection
+    out:
+        check (bool): True=tile in AOI
+    '''
+    x, y=[int(s) for s in strKey.split('_')]
+    geomAoi=shapelyGeom.Polygon(featAoi['geometry']['coordinates'][0][0])
+    geomTile=shapelyGeom.Polygon(np.array([[x,y-1],[x,y],[x+1,y],[x+1,y-1],[x,y-1]])*1e3)
+    return geomTile.intersects(geomAoi)
+
+def CropTileJson(pathJson, lstPathPC, strKey, buffer, pathOut):
+    '''
+    Write the PDAL pipeline creating one buffered tile from the stereo
+    pair point clouds (same content as 'pdal tile' for that tile).
+
+    pathJson (str): output pipeline path
+    lstPathPC (list): contributing point cloud paths
+    strKey (str): tile key 'x_y'
+    buffer (float): tile buffer [m]
+    pathOut (str): output tile path
+    out:
+        0 (int)
+    '''
+    x, y=[int(s) for s in strKey.split('_')]
+    strBounds='([%.3f, %.3f], [%.3f, %.3f])'% (x*1000-buffer, (x+1)*1000+buffer,
+                                              (y-1)*1000-buffer, y*1000+buffer)
+    lstPipe=[{"type": "readers.las", "filename": pathPC} for pathPC in lstPathPC]
+    lstPipe+=[{"type": "filters.merge"},
+              {"type": "filters.crop", "bounds": strBounds},
+              {"type": "writers.las", "filename": pathOut}]
+
+    with open(pathJson, 'w') as fileOut:
+        fileOut.writelines(json.dumps({"pipeline": lstPipe}, indent=2))
+    return 0
+
+class TileIndex():
+    '''
+    Tile dependency index: which stereo pair point cloud contributes to
+    which 1 km tile. Pair footprints come from the point cloud bounds
+    (pdal info) and pair signatures (file size, modification time) detect
+    changed clouds. The index is stored in json next to the full tiles.
+
+    pathIndex (str): index path
+    buffer (float): tile buffer [m]
+    out:
+        TileIndex (obj):
+            dicPair: {pathPC: {'sig': [size, mtime], 'bounds': [...], 'tiles': [...]}}
+    '''
+    def __init__(self, pathIndex, buffer):
+        self.pathIndex=pathIndex
+        self.buffer=buffer
+        self.dicPair={}
+        if os.path.exists(pathIndex):
+            with open(pathIndex) as fileIn:
+                jsonIn=json.load(fileIn)
+            if jsonIn['buffer']==buffer: self.dicPair=jsonIn['pairs']
+
+    def __str__(self):
+        return '%i pairs, %i tiles'% (len(self.dicPair), len(self.Tiles()))
+
+    @staticmethod
+    def Signature(pathPC):
+        '''Point cloud signature: [size, mtime]'''
+        statPC=os.stat(pathPC)
+        return [statPC.st_size, int(statPC.st_mtime)]
+
+    def Tiles(self):
+        '''
+        Return tile dependencies.
+
+        out:
+            dicTile (dict): {key: [pathPC, ...]}
+        '''
+        dicTile={}
+        for pathPC in sorted(self.dicPair):
+            for strKey in self.dicPair[pathPC]['tiles']:
+                dicTile.setdefault(strKey, []).append(pathPC)
+        return dicTile
+
+    def Update(self, dicBounds):
+        '''
+        Update the index with the current point clouds and return tiles
+        touched by added, removed or changed pairs.
+
+        dicBounds (dict): current point clouds {pathPC: [xMin, yMin, xMax, yMax]}
+        out:
+            setDirty (set): dirty tile keys
+        '''
+        setDirty=set()
+        for pathPC in list(self.dicPair):
+            if pathPC in dicBounds: continue
+            setDirty.update(self.dicPair.pop(pathPC)['tiles'])
+
+        for pathPC in dicBounds:
+            lstSig=self.Signature(pathPC)
+            if pathPC in self.dicPair and self.dicPair[pathPC]['sig']==lstSig: continue
+            if pathPC in self.dicPair: setDirty.update(self.dicPair[pathPC]['tiles'])
+
+            lstKey=TileKeys(dicBounds[pathPC], self.buffer)
+            self.dicPair[pathPC]={'sig': lstSig,
+                                  'bounds': list(dicBounds[pathPC]),
+                                  'tiles': lstKey}
+            setDirty.update(lstKey)
+
+        return setDirty
+
+    def Save(self):
+        with open(self.pathIndex, 'w') as fileOut:
+            fileOut.writelines(json.dumps({'buffer': self.buffer, 'pairs': self.dicPair}, indent=1))
+        return 0
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys
+import logging
+from multiprocessing import Pool
+import numpy as np
+from numpy.linalg import inv
+
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+rioWindows=LazyImport('rasterio.windows')
+
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import GeomFunc, RasterFunc, ShmFunc
+
+#-----------------------------------------------------------------------
+# Hard argument
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['RayDir', 'TriangMidpoint', 'Triangulate']
+SetupLogger(name=__name__)
+#SubLogger('WARNING', 'jojo')
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def RayDir(objCam, ptsImg):
+    '''
+    Compute the ray directions of image points (camera without distortion,
+    e.g. epipolar cameras).
+
+    objCam (TSAIin): camera object
+    ptsImg (array): image points [[x, y], ...]
+    out:
+        matDir (array): ray directions in ECEF [[dX, dY, dZ], ...]
+    '''
+    ptsImg_h=np.append(ptsImg, np.ones([ptsImg.shape[0], 1]), axis=1)
+    return (inv(objCam.matP[:, :3])@ptsImg_h.T).T
+
+def TriangMidpoint(vectC1, matD1, vectC2, matD2):
+    '''
+    Midpoint intersection of ray pairs: the point is the middle of the
+    shortest segment between both rays and the intersection error its
+    length (same definition as ASP).
+
+    vectC1 (array): left camera centre [X, Y, Z]
+    matD1 (array): left ray directions [[dX, dY, dZ], ...]
+    vectC2 (array): right camera centre [X, Y, Z]
+    matD2 (array): right ray directions [[dX, dY, dZ], ...]
+    out:
+        matPts (array): intersected points [[X, Y, Z], ...]
+        vectErr (array): intersection error [m]
+        maskFront (array): True=point in front of both cameras
+    '''
+    vectW=vectC1-vectC2
+    a=np.sum(matD1*matD1, axis=1)
+    b=np.sum(matD1*matD2, axis=1)
+    c=np.sum(matD2*matD2, axis=1)
+    d=matD1@vectW
+    e=matD2@vectW
+    vectDen=a*c-b**2
+    vectDen[np.abs(vectDen)<1e-12]=np.nan
+    s=(b*e-c*d)/vectDen
+    t=(a*e-b*d)/vectDen
+
+    matPts1=vectC1+s[:, np.newaxis]*matD1
+    matPts2=vectC2+t[:, np.newaxis]*matD2
+    matPts=0.5*(matPts1+matPts2)
+    vectErr=np.linalg.norm(matPts1-matPts2, axis=1)
+    maskFront=(s>0) & (t>0)
+    return matPts, vectErr, maskFront
+
+def _TriangStrip(tupIn):
+    '''
+    Pool function triangulating a disparity strip.
+
+    tupIn (tuple): stereo prefix, camera paths, strip rows (rowMin, rowMax), point offset,
+        optional shared array descriptors {ext: descriptor} (see ShmFunc)
+    out:
+        tupStrip (tuple): strip rows, point cloud strip (array [4, rows, cols]),
+            None with shared arrays (written in place)
+    '''
+    prefIn, lstPathCam, tupRow, vectOff=tupIn[:4]
+    dicDesc=tupIn[4] if len(tupIn)>4 else None
+    lstCam=[GeomFunc.TSAIin(pathCam) for pathCam in lstPathCam]
+    rowMin, rowMax=tupRow
+    if dicDesc:
+        matDisp=ShmFunc.Attach(dicDesc['-F.tif'])[:, rowMin:rowMax]
+        matPC=ShmFunc.Attach(dicDesc['-PC.tif'])[:, rowMin:rowMax]
+    else:
+        with rasterio.open(prefIn+'-F.tif') as imgIn:
+            matDisp=imgIn.read(window=rioWindows.Window(0, rowMin, imgIn.width, rowMax-rowMin))
+        matPC=np.zeros([4]+list(matDisp.shape[1:]), dtype=np.float32)
+
+    matRow, matCol=np.nonzero(matDisp[2]>0)
+    if not matRow.size: return tupRow, None if dicDesc else matPC
+
+    ptsL=np.array([matCol, matRow+rowMin], dtype=float).T
+    ptsR=ptsL+matDisp[:2, matRow, matCol].T
+    matPts, vectErr, maskFront=TriangMidpoint(lstCam[0].vectX0.flatten(), RayDir(lstCam[0], ptsL),
+                                              lstCam[1].vectX0.flatten(), RayDir(lstCam[1], ptsR))
+    maskFront&=np.isfinite(vectErr)
+
+    matPC[:3, matRow[maskFront], matCol[maskFront]]=(matPts[maskFront]-vectOff).T
+    matPC[3, matRow[maskFront], matCol[maskFront]]=vectErr[maskFront]
+    return tupRow, None if dicDesc else matPC
+
+def Triangulate(prefIn, lstPathCam, nbProc=None, stripSize=256, shm=None, write=True):
+    '''
+    Native triangulation of a filtered/merged disparity (-F.tif) with the
+    epipolar TSAI cameras. Strips are triangulated in parallel and written
+    as ASP point cloud (-PC.tif: X, Y, Z relative to POINT_OFFSET and
+    intersection error) so AspPc2Txt runs unchanged. With a shared memory
+    channel holding the disparity, workers read it and write the point
+    cloud array in place.
+
+    prefIn (str): stereo prefix holding -F.tif
+    lstPathCam (list): epipolar camera paths (left, right)
+    nbProc (int): process number (default: None means cpu number)
+    stripSize (int): strip row number (default: 256)
+    shm (ShmChannel): shared arrays of the pair (default: None means files)
+    write (bool): write -PC.tif with shared arrays, for external tools (default: True)
+    out:
+        0|1 (int): 0=success
+    '''
+    pathDisp=prefIn+'-F.tif'
+    checkShm=shm is not None and pathDisp in shm
+    if not checkShm and not os.path.exists(pathDisp):
+        SubLogger('ERROR', 'Disparity not found: %s'% pathDisp)
+        return 1
+    lstCam=[GeomFunc.TSAIin(pathCam) for pathCam in lstPathCam]
+    if not all([objCam.distoType=='NULL' for objCam in lstCam]):
+        SubLogger('ERROR', 'Native triangulation needs cameras without distortion (epipolar)')
+        return 1
+
+    # Point offset: image centre with the median disparity of a pixel
+    # subsample (every factSub pixel, same in both modes)
+    if checkShm:
+        nbRow, nbCol=shm.Desc(pathDisp)['shape'][1:]
+        factSub=max(1, max(nbRow, nbCol)//1000)
+        matSub=shm.Get(pathDisp)[:, ::factSub, ::factSub]
+    else:
+        with rasterio.open(pathDisp) as imgIn:
+            nbRow, nbCol=imgIn.height, imgIn.width
+            factSub=max(1, max(nbRow, nbCol)//1000)
+            nbRowRead=factSub*max(1, stripSize//factSub)
+            matSub=np.concatenate([imgIn.read(window=rioWindows.Window(0, i, nbCol, min(nbRowRead, nbRow-i)))[:, ::factSub, ::factSub]
+                                    for i in range(0, nbRow, nbRowRead)], axis=1)
+    maskSub=matSub[2]>0
+    if not np.any(maskSub):
+        SubLogger('ERROR', 'No valid disparity: %s'% pathDisp)
+        return 1
+    ptsL=np.array([[nbCol/2, nbRow/2]])
+    ptsR=ptsL+np.median(matSub[:2, maskSub], axis=1)
+    vectOff=TriangMidpoint(lstCam[0].vectX0.flatten(), RayDir(lstCam[0], ptsL),
+                           lstCam[1].vectX0.flatten(), RayDir(lstCam[1], ptsR))[0][0]
+
+    del matSub
+    lstArgs=[(prefIn, lstPathCam, (i, min(i+stripSize, nbRow)), vectOff) for i in range(0, nbRow, stripSize)]
+    dicTags={'POINT_OFFSET': ' '.join(['%.6f'% v for v in vectOff])}
+    pathOut=prefIn+'-PC.tif'
+    nbPts=0
+    if checkShm:
+        matPC=shm.New(pathOut, (4, nbRow, nbCol), np.float32, meta=dicTags)
+        dicDesc={'-F.tif': shm.Desc(pathDisp), '-PC.tif': shm.Desc(pathOut)}
+        with Pool(nbProc) as poolCur:
+            poolCur.map(_TriangStrip, [tupArgs+(dicDesc,) for tupArgs in lstArgs])
+        nbPts=int(np.count_nonzero(np.any(matPC[:3]!=0, axis=0)))
+        del matPC
+        if write and nbPts and not shm.Write(pathOut): return 1
+    else:
+        profOut=RasterFunc.Profile(nbCol, nbRow, count=4)
+        with rasterio.open(pathOut, 'w', **profOut) as imgOut:
+            imgOut.update_tags(**dicTags)
+            with Pool(nbProc) as poolCur:
+                for (rowMin, rowMax), matPC in poolCur.imap_unordered(_TriangStrip, lstArgs):
+                    imgOut.write(matPC, window=rioWindows.Window(0, rowMin, nbCol, rowMax-rowMin))
+                    nbPts+=int(np.sum(np.any(matPC[:3]!=0, axis=0)))
+
+    SubLogger('INFO', 'Triangulation: %i points'% nbPts)
+    if not nbPts: return 1
+    return 0
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    print('\nFunctions and classes available in %s:'% __title__)
+    print([i for i in dir() if not '__' in i])
@@ -4,10 +4,20 @@
 '''
 Block process functions
 '''
+from importlib import import_module
+
 #-----------------------------------------------------------------------
 # Hard arguments
 #-----------------------------------------------------------------------
 __author__='Valentin Schmitt'
 __version__=1.0
-__all__ =['ASfMFunc', 'GeomFunc', 'MSSFunc', 'DockerLibs']
+__all__ =['ASfMFunc', 'GeomFunc', 'MSSFunc', 'DockerLibs', 'FilterPCFunc', 'MosaicFunc', 'TileFunc', 'PairScoreFunc', 'SGMFunc', 'TriangFunc', 'ResourceFunc', 'ScratchFunc', 'RasterFunc', 'ImgStoreFunc', 'ExecFunc', 'CacheFunc', 'BackendFunc', 'TelemetryFunc', 'GdalFunc', 'DagFunc', 'QueueFunc', 'ShmFunc']
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def __getattr__(name):
+    '''Submodules are imported at their first access (e.g. BlockProc.MSSFunc)'''
+    if name in __all__: return import_module('.'+name, __name__)
+    raise AttributeError('module %s has no attribute %s'% (__name__, name))
 
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+# Copyright PythonValentinLibrary
+
+import sys
+import types
+from importlib import import_module
+
+#-----------------------------------------------------------------------
+# Hard arguments
+#-----------------------------------------------------------------------
+__author__='Valentin Schmitt'
+__version__=1.0
+__all__ =['LazyImport', 'ImportedFrom']
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+class _LazyModule(types.ModuleType):
+    '''
+    Module placeholder: the module is imported at the first attribute
+    access and attributes are then read from it (and kept).
+    '''
+    def __getattr__(self, key):
+        if key.startswith('__') and key.endswith('__'): raise AttributeError(key)
+        valAttr=getattr(import_module(self.__name__), key)
+        setattr(self, key, valAttr)
+        return valAttr
+
+def LazyImport(name):
+    '''
+    Deferred module import. The module is loaded at its first use so
+    command line help, info actions and pool workers only pay for the
+    libraries they call. Access the content through the module (e.g.
+    windows.Window, not from ... import Window), exception classes in
+    except clauses as well. Optional modules are still checked with
+    find_spec on the top-level package.
+
+    name (str): module name (e.g. 'rasterio.windows')
+    out:
+        module (module): module if already imported, placeholder otherwise
+    '''
+    if name in sys.modules: return sys.modules[name]
+    return _LazyModule(name)
+
+def ImportedFrom(lstName):
+    '''
+    Already imported modules out of a list (import-time checks).
+
+    lstName (list): top-level module names
+    out:
+        lstOut (list): imported module names
+    '''
+    return [name for name in lstName if name in sys.modules]
+
@@ -4,6 +4,8 @@
 '''
 Planet_Common Tools
 '''
+from importlib import import_module
+
 #-----------------------------------------------------------------------
 # Hard arguments
 #-----------------------------------------------------------------------
@@ -11,4 +13,12 @@ __author__='Valentin Schmitt'
 __version__=1.0
 __all__ =['dataFunc', 'metaDFunc', 'pipelDFunc']
 
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def __getattr__(name):
+    '''Submodules are imported at their first access (e.g. PCT.dataFunc)'''
+    if name in __all__: return import_module('.'+name, __name__)
+    raise AttributeError('module %s has no attribute %s'% (__name__, name))
+
 
@@ -6,12 +6,13 @@ import json
 import numpy as np
 from pprint import pprint
 
+from OutLib.LazyFunc import LazyImport
 from importlib.util import find_spec
 checkPlanetCommon=find_spec('planet_opencv3') is not None
 if checkPlanetCommon:
     from planet_opencv3 import cv2 as cv
 else:
-    import cv2 as cv
+    cv=LazyImport('cv2')
 
 from OutLib.LoggerFunc import *
 from VarCur import *
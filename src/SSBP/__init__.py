@@ -4,6 +4,8 @@
 '''
 Stereo-Scene Block Parsing
 '''
+from importlib import import_module
+
 #-----------------------------------------------------------------------
 # Hard arguments
 #-----------------------------------------------------------------------
@@ -11,3 +13,11 @@ __author__='Valentin Schmitt'
 __version__=1.0
 __all__ =['searchFunc', 'blockFunc', 'filterFunc']
 
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def __getattr__(name):
+    '''Submodules are imported at their first access (e.g. SSBP.blockFunc)'''
+    if name in __all__: return import_module('.'+name, __name__)
+    raise AttributeError('module %s has no attribute %s'% (__name__, name))
+
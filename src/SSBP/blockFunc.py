@@ -4,16 +4,17 @@
 import os, sys, time, logging
 from datetime import datetime, date
 from math import pi
-from dateutil.relativedelta import relativedelta
 import numpy as np
 import json
 from glob import glob
-from shapely.geometry import Polygon
-from shapely.errors import TopologicalError as shapelyTopoE
-import rasterio
-from rasterio.features import geometry_mask
-from rasterio.transform import from_origin
-from rasterio.crs import CRS
+
+from OutLib.LazyFunc import LazyImport
+shapelyGeom=LazyImport('shapely.geometry')
+shapelyErrors=LazyImport('shapely.errors')
+rasterio=LazyImport('rasterio')
+rioFeatures=LazyImport('rasterio.features')
+rioTransform=LazyImport('rasterio.transform')
+rioCrs=LazyImport('rasterio.crs')
 
 from OutLib.LoggerFunc import *
 from VarCur import *
@@ -399,15 +400,15 @@ def Coverage(pathIn,  featAoi, lstBName=False):
         objCur=SceneBlocks(pathIn, meth='dir', b=nameB)
           
         geomAoiJson=featAoi['features'][0]['geometry']
-        geomAoi=Polygon(np.array(geomAoiJson['coordinates']).reshape(-1,2).tolist())
+        geomAoi=shapelyGeom.Polygon(np.array(geomAoiJson['coordinates']).reshape(-1,2).tolist())
 
         boundsGeomAoi=geomAoi.bounds
         boundsAoi=[item//imageGsd*imageGsd+k//2*imageGsd for k,item in enumerate(boundsGeomAoi)]
         shapeAoi=(int((boundsAoi[3]-boundsAoi[1])/imageGsd), int((boundsAoi[2]-boundsAoi[0])/imageGsd))
-        transfAoi=from_origin(boundsAoi[0],boundsAoi[-1],imageGsd,imageGsd)
+        transfAoi=rioTransform.from_origin(boundsAoi[0],boundsAoi[-1],imageGsd,imageGsd)
         
         # Mask to AOI
-        frameMask=geometry_mask((geomAoiJson,), 
+        frameMask=rioFeatures.geometry_mask((geomAoiJson,), 
                                 shapeAoi,
                                 transfAoi,
                                 all_touched=True,
@@ -418,7 +419,7 @@ def Coverage(pathIn,  featAoi, lstBName=False):
         profileImg=profileCoverTif.copy()
         profileImg['height'],profileImg['width']=shapeAoi
         profileImg['transform']=transfAoi
-        profileImg['crs']=CRS.from_epsg(4326)
+        profileImg['crs']=rioCrs.CRS.from_epsg(4326)
 
         # Compute scene pair count
         frameGeomStack=Geometry_Stack(shapeAoi, transfAoi, objCur.lstBFeat[0])
@@ -464,8 +465,8 @@ def StereoCoupling(pathIn, lstBName=False, moreComb=False):
 
         # Geometry check
         try:
-            lstCheckGeom=[Polygon(np.array(feat['geometry']['coordinates']).reshape(-1,2).tolist()).is_valid for feat in objCur.lstBFeat[0]]
-        except shapelyTopoE as msg:
+            lstCheckGeom=[shapelyGeom.Polygon(np.array(feat['geometry']['coordinates']).reshape(-1,2).tolist()).is_valid for feat in objCur.lstBFeat[0]]
+        except shapelyErrors.TopologicalError as msg:
             SubLogger('CRITICAL','%s footprint error:\n%s'% (feat['id'], msg))
         if not all(lstCheckGeom): SubLogger('CRITICAL','%s footprint error, please correct it manually'% objCur.lstBFeat[0][lstCheckGeom.index(False)]['id'])
 
@@ -489,17 +490,17 @@ def StereoCoupling(pathIn, lstBName=False, moreComb=False):
         for i in range(nbFeat):
             feat1=objCur.lstBFeat[0][i]
             coords1=np.array(feat1['geometry']['coordinates']).reshape(-1,2).tolist()
-            geom1=Polygon(coords1)
+            geom1=shapelyGeom.Polygon(coords1)
 
             for j in range(i+1,nbFeat):
                 feat2=objCur.lstBFeat[0][j]
                 coords2=np.array(feat2['geometry']['coordinates']).reshape(-1,2).tolist()
-                geom2=Polygon(coords2)
+                geom2=shapelyGeom.Polygon(coords2)
 
                 if not geom1.intersects(geom2): continue
                 try:
                     geomInters=geom1.intersection(geom2)
-                except shapelyTopoE:
+                except shapelyErrors.TopologicalError:
                     continue                    
 
                 # New intersection
@@ -551,14 +552,14 @@ def StereoCoupling(pathIn, lstBName=False, moreComb=False):
             for i in range(lstK[-2], lstK[-1]+1):
                 comb1=lstBCouple[i]
                 coords1=np.array(comb1['geometry']['coordinates']).reshape(-1,2).tolist()
-                geom1=Polygon(coords1)
+                geom1=shapelyGeom.Polygon(coords1)
                 i0=[int(j) for j in comb1['properties']['scenesI'].split(';')]
                 
                 for j in range(max(i0),nbFeat):
                     if j in i0: continue
                     feat2=objCur.lstBFeat[0][j]
                     coords2=np.array(feat2['geometry']['coordinates']).reshape(-1,2).tolist()
-                    geom2=Polygon(coords2)
+                    geom2=shapelyGeom.Polygon(coords2)
                     if not geom1.intersects(geom2): continue
 
                     keepComb=True
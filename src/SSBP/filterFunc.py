@@ -5,10 +5,12 @@ import os, sys
 import json
 import logging
 import numpy as np
-from shapely.geometry import Polygon, MultiPolygon, Point
-from shapely.errors import TopologicalError as shapelyTopoE
 from pprint import pprint
 
+from OutLib.LazyFunc import LazyImport
+shapelyGeom=LazyImport('shapely.geometry')
+shapelyErrors=LazyImport('shapely.errors')
+
 from OutLib.LoggerFunc import *
 from VarCur import *
 from SSBP.blockFunc import SceneBlocks 
@@ -137,11 +139,11 @@ def QGeomDiff(feat1, feat2, tol):
         jsonGeomFeat=featIn['geometry']
         if jsonGeomFeat['type']=='Polygon':
             coordFeat=np.array(jsonGeomFeat['coordinates']).reshape(-1, 2).tolist()
-            lstGeom.append([Polygon(coordFeat),])
+            lstGeom.append([shapelyGeom.Polygon(coordFeat),])
             
         elif jsonGeomFeat['type']=='MultiPolygon':
             coordFeat=[np.array(poly).reshape(-1, 2).tolist() for poly in jsonGeomFeat['coordinates']]
-            lstGeom.append([Polygon(poly) for poly in coordFeat])
+            lstGeom.append([shapelyGeom.Polygon(poly) for poly in coordFeat])
             
         else:
             SubLogger('CRITICAL', 'Footprints cannot be transformed into Shapley.Polygon:\nGeometry 1:\n%s\nGeometry 2:\n%s'% (str(jsonGeomFeat), str(jsonGeomFeat)))
@@ -262,7 +264,7 @@ def Filter_BHratio(lstBFeatCur, lstBCoupleCur, aoiIn, red, pathOut, disp=False):
         objBlock (class): updated object
             lstBFeatCur (list): Updated list of scene descriptors
     '''
-    geomAoi=Polygon(np.array(aoiIn['features'][0]['geometry']['coordinates']).reshape(-1,2).tolist())
+    geomAoi=shapelyGeom.Polygon(np.array(aoiIn['features'][0]['geometry']['coordinates']).reshape(-1,2).tolist())
 
     lstPair=sorted([pair for pair in lstBCoupleCur if pair['properties']['nbScene']==2], key=SortBH, reverse=True)
     nbPair=len(lstPair)
@@ -277,7 +279,7 @@ def Filter_BHratio(lstBFeatCur, lstBCoupleCur, aoiIn, red, pathOut, disp=False):
     i=-1
     while True in [poly.area>0 for poly in lstGeomRemain] and i<nbPair-1 :
         i+=1
-        geomPair=Polygon(lstPair[i]['geometry']['coordinates'][0])
+        geomPair=shapelyGeom.Polygon(lstPair[i]['geometry']['coordinates'][0])
 
         # Pair filtering  
         if geomPair.area<dicTolerance['bhAreaPair']: continue
@@ -293,8 +295,8 @@ def Filter_BHratio(lstBFeatCur, lstBCoupleCur, aoiIn, red, pathOut, disp=False):
             if not geomPair.intersects(lstGeomRemain[k]): continue
             try:
                 geomInter=geomPair.intersection(lstGeomRemain[k])
-                if not geomInter.is_valid: raise shapelyTopoE()
-            except shapelyTopoE:
+                if not geomInter.is_valid: raise shapelyErrors.TopologicalError()
+            except shapelyErrors.TopologicalError:
                 continue
             if geomInter.geom_type in dicTolerance['bhBadGeom']: continue
             if geomInter.geom_type=='GeometryCollection':
@@ -329,9 +331,9 @@ def Filter_BHratio(lstBFeatCur, lstBCoupleCur, aoiIn, red, pathOut, disp=False):
                                     }, 
                      "geometry": {"type": 'MultiPolygon', 'coordinates':[[]]}}
             if lstGeomRemain[k].geom_type=='Polygon':
-                lstGeomRemain[k]=MultiPolygon([lstGeomRemain[k],])
+                lstGeomRemain[k]=shapelyGeom.MultiPolygon([lstGeomRemain[k],])
             elif lstGeomRemain[k].geom_type=='GeometryCollection' and lstGeomRemain[k].area==0:
-                lstGeomRemain[k]=Point(0,0)
+                lstGeomRemain[k]=shapelyGeom.Point(0,0)
                 continue
             elif not lstGeomRemain[k].geom_type=='MultiPolygon':
                 print(lstGeomRemain[k])
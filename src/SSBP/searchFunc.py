@@ -3,7 +3,9 @@
 
 import os, sys
 import json
-import requests
+
+from OutLib.LazyFunc import LazyImport
+requests=LazyImport('requests')
 
 from OutLib.LoggerFunc import *
 from VarCur import *
@@ -42,6 +42,14 @@ __all__ =[# SSBP
           'nameJobFile',
           # BlockProc
           'PathCur',
+          'dicDocker',
+          'dicExec',
+          'dicCache',
+          'dicTelemetry',
+          'dicGdal',
+          'dicDag',
+          'dicQueue',
+          'dicShm',
           # ASfM
           'camCentre',
           'camFocal',
@@ -55,6 +63,15 @@ __all__ =[# SSBP
           'gsdOrth',
           ## MSS
           'gsdDsm',
+          'dicFilterPC',
+          'dicMosaic',
+          'dicPairScore',
+          'dicDispRange',
+          'dicLRC',
+          'dicSGM',
+          'dicResource',
+          'dicScratch',
+          'dicRasterPolicy',
 
           ]
 
@@ -174,14 +191,18 @@ class PathCur:
         self.pOrtho=os.path.join(self.pB, 'ASP_Ortho{1}', '{0}_Ortho{1}.tif')
         #   MSS
         self.pStereoDM=os.path.join(self.pB, '{}_StereoDM.geojson'.format(bId))
+        self.pResRecord=os.path.join(pathDir, 'MSS_Resources.jsonl')
         self.pJsonSource=os.path.join(self.pPdalDir, 'Pdal_SourceID.json')
         self.pJsonRast_WA=os.path.join(self.pPdalDir, 'Pdal_Rasterize-WeightedAve.json')
         self.pJsonFilter=os.path.join(self.pPdalDir, 'Pdal_Filter.json')
         self.pPcFullTile=os.path.join(self.pPcFullDir, 'PC-Full-Tile_#.las')
         self.pPcFullList=os.path.join(self.pPcFullDir, 'PC-Full-List.txt')
+        self.pTileIndex=os.path.join(self.pPcFullDir, 'PC-Tile-Index.json')
+        self.pJsonCrop=os.path.join(self.pPdalDir, 'Pdal_Crop-Tile_{}.json')
         self.pPcFltTile=os.path.join(self.pPcFltDir, 'PC-Filtered-Tile_{}.las')
         self.pDsmTile=os.path.join(self.pDsmDir, 'DSM-Tile_{}.tif')
         self.pDsmFinal=os.path.join(self.pDsmDir, 'DSM-Final.tif')
+        self.pDsmVrt=os.path.join(self.pDsmDir, 'DSM-Final.vrt')
 
         # Extention
         #   ASfM
@@ -210,6 +231,8 @@ class PathCur:
         #   MSS
         self.prefStereoDM= os.path.join(pathDir, bId, 'ASP_StereoDenseMatch', 'SDM')
         self.prefProcDM= os.path.join(pathDir, bId, 'ASP_StereoDenseMatch', 'DMproc')  
+        self.pScratchDM= os.path.join(pathDir, bId, 'ASP_StereoDenseMatch', 'DMscratch')
+        self.pImgStore= os.path.join(pathDir, bId, 'ImgStore')
 
 
     def __str__(self):
@@ -233,5 +256,121 @@ gsdOrth=4
 
 ## MSS
 gsdDsm=4
-
-
+# Native point cloud filter (PDAL filters.elm and filters.outlier defaults)
+dicFilterPC={'elmCell': 10.0, # ELM cell size [m]
+             'elmThreshold': 1.0, # ELM height step [m]
+             'outMeanK': 8, # outlier neighbour number
+             'outMulti': 2.0, # outlier std factor
+             'buffer': 2*gsdDsm+gsdDsm/2, # neighbour buffer [m]
+             }
+# Stereo pair scoring
+dicPairScore={'angleScale': 30, # intersection angle decay of the match probability [°]
+              'sunScale': 20, # sun elevation difference decay [°]
+              'sigMatch': 0.5, # matching precision [pxl]
+              'redCover': 0.95, # AOI fraction at the target redundancy for the redundancy budget
+              }
+# DEM-predicted disparity range
+dicDispRange={'nbPts': 100, # DEM grid points per side
+              'heightMargin': 50, # DEM and geoid error [m]
+              'margin': 10, # disparity margin [pxl]
+              }
+# Sparse left-right consistency
+dicLRC={'step': 8, # sample grid step [pxl]
+        'halfWin': 4, # NCC half window [pxl]
+        'search': 3, # reverse search half range [pxl]
+        'nccMin': 0.5, # minimum NCC peak
+        'chunk': 20000, # samples per vectorised chunk
+        }
+# Semi-global matching backend (OpenCV StereoSGBM)
+dicSGM={'blockSize': 5, # matching window [pxl]
+        'p1': 8, # small disparity change penalty (x blockSize^2)
+        'p2': 32, # large disparity change penalty (x blockSize^2)
+        'uniqueness': 10, # best cost margin [%]
+        'speckleWin': 100, # speckle region size [pxl]
+        'speckleRange': 2, # speckle disparity variation [pxl]
+        'numDisp': 128, # search range without prior [pxl]
+        'tileSize': 1024, # tile core size [pxl]
+        'overlap': 32, # tile overlap [pxl]
+        }
+# Stereo pair resource model: c0 + c1*Mpxl + c2*Mpxl*disp/100 + c3*km2
+dicResource={'coefRss': [1.0, 0.3, 0.1, 0.0], # default peak memory coefficients [GB]
+             'coefWall': [30, 10, 10, 0], # default wall time coefficients [s]
+             'nbFit': 5, # record number before fitting
+             'safety': 1.3, # memory prediction factor
+             'dispDefault': 128, # disparity range without prediction [pxl]
+             'sample': 0.5, # memory sampling period [s]
+             }
+# Dense matching scratch space
+dicScratch={'bytePxl': 80, # intermediate bytes per epipolar pixel (images, masks, disparities, point cloud)
+            }
+# Intermediate raster writing policy (see BlockProc.RasterFunc)
+dicRasterPolicy={'tiled': True,
+                 'blockSize': 256, # tile size [pxl]
+                 'compress': 'DEFLATE', # LZW|ZSTD|DEFLATE|NONE
+                 'predictor': True, # 3 for float, 2 for integer
+                 'bigtiff': 'IF_SAFER',
+                 'numThreads': 'ALL_CPUS', # compression threads
+                 'quantRadio': None, # None|float16|uint16 for radiometric intermediates read by native stages only (ASP ignores the uint16 scale)
+                 }
+# DSM mosaic
+dicMosaic={'blockSize': 512, # internal tile size [pxl]
+           'compress': 'DEFLATE',
+           'predictor': 3, # floating point predictor
+           'nodata': (-32767, -32767, 0), # band values of uncovered pixels (gdal_merge -init, the VRT band nodata)
+           }
+# Docker tool sessions (see BlockProc.DockerLibs)
+dicDocker={'session': False, # True: one persistent container per tool image (docker exec, the image entrypoint is skipped), False: docker run per command
+           'health': 30, # session health check period [s]
+           'restart': 2, # session start attempts before the docker run fallback
+           'backend': 'docker', # docker|native (host binaries)|inproc (python functions)|stub (fabricated outputs)
+           'inprocFallback': 'docker', # docker|native, functions without python implementation in inproc
+           'stubConverge': True, # stub bundle_adjust outcome, False: NO_CONVERGENCE termination
+           }
+# Asynchronous tool executor (see BlockProc.ExecFunc)
+dicExec={'limit': {'AspPython': max(1, os.cpu_count()//4), # concurrent commands per tool (ASP tools are multithreaded)
+                   'PdalPython': os.cpu_count(),
+                   'GdalPython': os.cpu_count()},
+         'timeout': 0, # command timeout [s], 0 means none
+         'stream': True, # forward stdout (INFO) and stderr (WARNING) lines to the logger
+         }
+# Tool output cache (see BlockProc.CacheFunc)
+dicCache={'budget': 50, # disk budget [GB]
+          'signature': 'hash', # input signature, hash (content, reused across blocks) or stat (path, size, mtime)
+          'functions': ('mapproject', 'point2las', 'pdal pipeline', 'gdal_translate'),
+          }
+# Tool command telemetry (see BlockProc.TelemetryFunc)
+dicTelemetry={'sample': 0.5, # memory sampling period [s]
+              'argLen': 300, # recorded argument length [char]
+              'top': 10, # slowest calls in the report
+              }
+# In-process GDAL operations (see BlockProc.GdalFunc)
+dicGdal={'backend': None, # GdalPython default backend, None means dicDocker['backend'] (docker), inproc runs translate, merge, calc and retile in python
+         'workers': os.cpu_count(), # reading threads
+         'stripRows': 512, # rows per streamed window
+         'numThreads': 'ALL_CPUS', # compression threads
+         }
+# Task graph orchestrator (see BlockProc.DagFunc and dag_main)
+dicDag={'workers': os.cpu_count(), # worker threads
+        'signature': 'hash', # input signature, hash (content, memorised per size and mtime) or stat (size, mtime)
+        'limit': {'ssbp': 1, # concurrent tasks per stage (default: workers)
+                  'pct': 1,
+                  'orthoI': max(1, os.cpu_count()//4),
+                  'orthoF': max(1, os.cpu_count()//4),
+                  'kp': 1,
+                  'eo': 1,
+                  'io': 1,
+                  'dm': 1,
+                  'tile': 1},
+        'savePeriod': 5, # minimum time between state writings [s]
+        }
+# Distributed work queue (see BlockProc.QueueFunc and worker_main)
+dicQueue={'lease': 600, # job lease [s], renewed by running workers every third of it
+          'maxTry': 3, # tries per job (lease expiry included)
+          'period': 2, # polling period [s]
+          'idle': 0, # worker stop after an idle time [s], 0 means never
+          }
+# Shared memory hand-off between in-process stages (see BlockProc.ShmFunc)
+dicShm={'dir': '/dev/shm', # shared memory file system (free space check)
+        'prefix': 'dsmps', # segment name prefix
+        'bytePxl': 40, # bytes per epipolar pixel (images, masks, disparity, point cloud)
+        }
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys, argparse
+from pprint import pprint
+
+# dsm_from_planetscope libraries
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import TelemetryFunc
+
+#-------------------------------------------------------------------
+# Usage
+#-------------------------------------------------------------------
+__title__=os.path.basename(sys.argv[0]).split('.')[0]
+__author__='Valentin Schmitt'
+__version__=1.0
+parser = argparse.ArgumentParser(description='''
+%s (v%.1f by %s):
+    Main Task
+Summary of tool command records (JSONL written by mss_main and asfm_main
+with -telemetry). Stages and tool functions are ranked by total wall time with
+CPU time, peak memory and IO, followed by the slowest individual calls.
+**************************************************************************
+> -run: one run (identifier or last)
+> -by: record keys to rank (stage, fun, block, pair, tool, caller)
+**************************************************************************
+'''% (__title__,__version__,__author__),
+formatter_class=argparse.RawDescriptionHelpFormatter)
+#-----------------------------------------------------------------------
+# Hard arguments
+#-----------------------------------------------------------------------
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    try:
+        print()
+        logger = SetupLogger(name=__title__)
+        #---------------------------------------------------------------
+        # Retrieval of arguments
+        #---------------------------------------------------------------
+        #Positional input
+        parser.add_argument('-i', required=True, help='Record file or directory holding Telemetry.jsonl')
+
+        #Optional arguments
+        parser.add_argument('-run', default=None, help='Run identifier or last (default: None means all runs)')
+        parser.add_argument('-by', nargs='+', default=['stage', 'fun'], help='Record keys to rank (default: stage fun)')
+        parser.add_argument('-n', type=int, default=None, help='Slowest call number (default: None means dicTelemetry)')
+        parser.add_argument('-runs', action='store_true', help='List run identifiers')
+
+        args = parser.parse_args()
+
+        #---------------------------------------------------------------
+        # Check input
+        #---------------------------------------------------------------
+        if os.path.isdir(args.i): args.i=os.path.join(args.i, 'Telemetry.jsonl')
+        if not os.path.isfile(args.i): raise RuntimeError("Record file not found")
+
+        logger.info("Arguments: " + str(vars(args)))
+        #sys.exit()
+        #---------------------------------------------------------------
+        # Report
+        #---------------------------------------------------------------
+        if args.runs:
+            lstRec=TelemetryFunc.ReadRecords(args.i)
+            dicRun={}
+            for recCur in lstRec: dicRun[recCur['run']]=dicRun.get(recCur['run'], 0)+1
+            for idRun in dicRun: print('%s: %i commands'% (idRun, dicRun[idRun]))
+        else:
+            print(TelemetryFunc.Report(args.i, run=args.run, nbTop=args.n, lstKey=args.by))
+
+    #---------------------------------------------------------------
+    # Exception management
+    #---------------------------------------------------------------
+    except RuntimeError as msg:
+        logger.critical(msg)
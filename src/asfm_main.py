@@ -4,15 +4,16 @@
 import os, sys, argparse, time
 from glob import glob
 import json
-import rasterio
 from pprint import pprint
 
 
 # dsm_from_planetscope libraries
 from OutLib.LoggerFunc import *
 from VarCur import *
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
 from SSBP.blockFunc import SceneBlocks 
-from BlockProc import DockerLibs, ASfMFunc
+from BlockProc import DockerLibs, ASfMFunc, ImgStoreFunc, CacheFunc, TelemetryFunc
 
 #-------------------------------------------------------------------
 # Usage
@@ -84,6 +85,11 @@ if __name__ == "__main__":
         parser.add_argument('-b',nargs='+', default=[], help='Block name to process (default: False means all)')
         parser.add_argument('-ortho',action='store_true', help='Compute orthophoto of itermediate steps (default: False)')
         parser.add_argument('-io',action='store_false', help='Adjust intrinsic parameter during BA, only principal point (default: True)')
+        parser.add_argument('-cache', default=None, help='Tool output cache directory, shared by blocks, e.g. working directory/ToolCache (default: None means no cache)')
+        parser.add_argument('-cacheBudget', type=float, default=None, help='Tool output cache disk budget [GB] (default: None means dicCache)')
+        parser.add_argument('-noCache', action='store_true', help='Run all tool commands without cache')
+        parser.add_argument('-telemetry', default=None, help='Tool command record file (JSONL) with resource use per command, e.g. next to the outputs (default: None means no records)')
+        parser.add_argument('-backend', choices=['docker', 'native', 'inproc', 'stub'], default=None, help='Tool backend: docker images, host binaries, python functions or fabricated outputs for offline runs (default: None means dicDocker)')
         
 
         args = parser.parse_args()
@@ -119,8 +125,10 @@ if __name__ == "__main__":
         # Docker Python interface
         #---------------------------------------------------------------
         logger.info('# Docker Python interface')        
-        asp=DockerLibs.AspPython()
-        gdal=DockerLibs.GdalPython()
+        objCache=None if args.noCache or not args.cache else CacheFunc.ToolCache(args.cache, budget=args.cacheBudget)
+        asp=DockerLibs.AspPython(cache=objCache, backend=args.backend)
+        gdal=DockerLibs.GdalPython(cache=objCache, backend=args.backend)
+        if args.telemetry: TelemetryFunc.Open(args.telemetry)
         
         #---------------------------------------------------------------
         # Read Repo
@@ -148,6 +156,7 @@ if __name__ == "__main__":
             logger.info('%s (%i scenes)'% objInfo.lstBId[iB])
             objBlocks=SceneBlocks(args.i, meth='dir', b=nameB)
             objPath=PathCur(args.i, nameB, geomAoi['properties']['NAME'])
+            TelemetryFunc.SetContext(block=nameB, stage='Block setup')
             
 
 
@@ -157,6 +166,7 @@ if __name__ == "__main__":
             # Process data 
             #---------------------------------------------------------------
             logger.info('# Process data')
+            TelemetryFunc.SetContext(stage='Process data')
 
             procBar=ProcessStdout(name='Single band data creation',inputCur=nbFeat)
             for j in range(nbFeat):
@@ -166,7 +176,7 @@ if __name__ == "__main__":
                 pathImgIn=os.path.join(objPath.pData, objPath.extFeat.format(idImg))
                 pathImgOut=os.path.join(objPath.pProcData, objPath.extFeat1B.format(idImg))
                                 
-                if not os.path.exists(pathImgOut): ASfMFunc.SingleBandImg(pathImgIn, pathImgOut, imgType='green')
+                if not os.path.exists(pathImgOut): ASfMFunc.SingleBandImg(pathImgIn, pathImgOut, imgType='green', gdal=gdal)
 
             if iProc <= lstProcLvl.index('data'): continue
 
@@ -174,6 +184,7 @@ if __name__ == "__main__":
             # Initial ortho
             #---------------------------------------------------------------
             logger.info('# Initial ortho')
+            TelemetryFunc.SetContext(stage='Initial ortho')
             
             procBar=ProcessStdout(name='Initial ortho creation',inputCur=nbFeat)
             for j in range(nbFeat):
@@ -200,6 +211,7 @@ if __name__ == "__main__":
                 logger.warning('PM-BA mode')
                 
                 logger.info('# Camera creation')
+                TelemetryFunc.SetContext(stage='Camera creation')
                 procBar=ProcessStdout(name='PnP per camera',inputCur=nbFeat)
                 
                 for j in range(nbFeat):
@@ -254,6 +266,7 @@ if __name__ == "__main__":
             #---------------------------------------------------------------
             if not os.path.exists(objPath.prefKP+'-cnet.csv'):
                 logger.info('# Key point')
+                TelemetryFunc.SetContext(stage='Key point')
                 folderKP=os.path.dirname(objPath.prefKP)
                 if not os.path.exists(folderKP): os.mkdir(folderKP)
                 folderSKP=os.path.dirname(objPath.prefStereoKP)
@@ -264,6 +277,18 @@ if __name__ == "__main__":
                 lstIPair=[j for j in range(nbComb) 
                             if objBlocks.lstBCouple[0][j]['properties']['nbScene']==2]
 
+                # Shared decoded cache: images of the pairs without matches
+                setIdStore=set()
+                for j in lstIPair:
+                    basenameMatch='__'.join([objPath.extFeat1B.format(idCur).split('.')[0] for idCur in sorted(objBlocks.lstBCouple[0][j]['properties']['scenes'].split(';'))])
+                    pathMatch=objPath.prefKP+'-'+basenameMatch+'.match'
+                    if os.path.exists(pathMatch) or os.path.exists(pathMatch+'null'): continue
+                    setIdStore.update(objBlocks.lstBCouple[0][j]['properties']['scenes'].split(';'))
+                objStore=ImgStoreFunc.ImgStore(objPath.pImgStore)
+                if setIdStore:
+                    objStore.Prepare([os.path.join(objPath.pProcData, objPath.extFeat1B.format(idCur)) for idCur in sorted(setIdStore)])
+                    logger.info('Image store: %s'% str(objStore))
+
                 procBar=ProcessStdout(name='Feature extraction',inputCur=len(lstIPair))
                 #logger.error('No KP extraction')
                 #for i in ():
@@ -284,7 +309,7 @@ if __name__ == "__main__":
                         pathImgOut=os.path.join(objPath.pProcData, objPath.extFeatKP.format(idCur))
                         pathRpcIn=os.path.join(objPath.pData, objPath.extRpc.format(idCur))
                         pathRpcOut=os.path.join(objPath.pProcData, objPath.extRpcKP.format(idCur))
-                        out=ASfMFunc.MaskedImg_KP( pathImgIn, 
+                        out=ASfMFunc.MaskedImg_KP( objStore.Read(pathImgIn), 
                                                     pathRpcIn, 
                                                     args.dem, 
                                                     objBlocks.lstBCouple[0][j]['geometry'],
@@ -320,7 +345,9 @@ if __name__ == "__main__":
                     os.system(cmd)
                     if os.path.exists(folderSKP): os.system('rm -r %s'% folderSKP)
                     # Clean Docker system /!\ If parallel process, it prunes all existing containers
-                    os.popen('sudo docker container prune --force ; sudo docker volume prune --force')
+                    # (only needed without session: docker run leaves one stopped container per call)
+                    if asp.backendCmd=='docker' and (not asp.objSession or asp.objSession.lost):
+                        os.popen('sudo docker container prune --force ; sudo docker volume prune --force')
 
                 print()
                 # Fixed bundle adjustment: Initial residuals
@@ -343,6 +370,7 @@ if __name__ == "__main__":
                 #---------------------------------------------------------------
                 if not ASfMFunc.CopyPrevBA(objPath.prefKP, objPath.prefEO):
                     logger.info('# EO adjustment')
+                    TelemetryFunc.SetContext(stage='EO adjustment')
                     asp.parallel_bundle_adjust(subArgs.EO_RPC(objPath.prefKP, objPath.prefEO))
                     ASfMFunc.KpCsv2Geojson(objPath.prefEO)
 
@@ -376,6 +404,7 @@ if __name__ == "__main__":
                 # Export model
                 #---------------------------------------------------------------
                 logger.info('# RPC export')
+                TelemetryFunc.SetContext(stage='RPC export')
                 if args.io:
                     lstIn=glob(objPath.prefIO+objPath.extRpc1B.format('*'))
                 else:
@@ -395,6 +424,7 @@ if __name__ == "__main__":
                 # Final ortho
                 #---------------------------------------------------------------
                 logger.info('# Final ortho')
+                TelemetryFunc.SetContext(stage='Final ortho')
                 procBar=ProcessStdout(name='Final ortho creation',inputCur=nbFeat)
                 for j in range(nbFeat):
                     procBar.ViewBar(j)
@@ -419,6 +449,7 @@ if __name__ == "__main__":
                 #---------------------------------------------------------------
                 if not ASfMFunc.CopyPrevBA(objPath.prefKP, objPath.prefEO):
                     logger.info('# EO adjustment')
+                    TelemetryFunc.SetContext(stage='EO adjustment')
                     pathCnetIn=objPath.prefKP+'-cnet.csv'
                     pathCnetOut=ASfMFunc.KpCsv2Gcp(pathCnetIn, objPath.prefEO, accuXYZ=10, accuI=1, nbPts=int(round(nbFeat*0.1)))
 
@@ -446,6 +477,7 @@ if __name__ == "__main__":
                 #---------------------------------------------------------------
                 if args.io and not ASfMFunc.CopyPrevBA(objPath.prefEO, objPath.prefIO, kp='clean'):
                     logger.info('# IO adjustment')
+                    TelemetryFunc.SetContext(stage='IO adjustment')
                     pathCnetIn=glob(objPath.prefEO+'*.gcp')[0]
                     pathCnetOut=pathCnetIn.replace(objPath.prefEO, objPath.prefIO)
                     os.system('cp %s %s'% (pathCnetIn, pathCnetOut))
@@ -473,6 +505,7 @@ if __name__ == "__main__":
                 # Export cam
                 #---------------------------------------------------------------
                 logger.info('# PM export')
+                TelemetryFunc.SetContext(stage='PM export')
                 procBar=ProcessStdout(name='Camera copy',inputCur=nbFeat)
                 lstCtlCam=[]
                 for j in range(nbFeat):
@@ -494,6 +527,7 @@ if __name__ == "__main__":
                 # Final ortho
                 #---------------------------------------------------------------
                 logger.info('# Final ortho')
+                TelemetryFunc.SetContext(stage='Final ortho')
                 procBar=ProcessStdout(name='Final ortho creation',inputCur=nbFeat)
                 for j in range(nbFeat):
                     procBar.ViewBar(j)
@@ -506,6 +540,13 @@ if __name__ == "__main__":
                     asp.mapproject(ASfMFunc.SubArgs_Ortho(pathImgIn, pathCamIn, args.dem, pathOrthoOut, args.epsg))
                     
                 if iProc <= lstProcLvl.index('orthoF'): continue
+        
+        #---------------------------------------------------------------
+        # Tool command report
+        #---------------------------------------------------------------
+        objTelem=TelemetryFunc.Active()
+        if objTelem and os.path.exists(objTelem.pathRecord):
+            logger.info('# Tool command report\n'+TelemetryFunc.Report(objTelem.pathRecord, run=objTelem.idRun))
               
     #---------------------------------------------------------------
     # Exception management
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys, argparse, time
+import shlex
+from glob import glob
+import json
+from pprint import pprint
+
+# dsm_from_planetscope libraries
+from OutLib.LoggerFunc import *
+from VarCur import *
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
+from SSBP.blockFunc import SceneBlocks
+from BlockProc import DockerLibs, ASfMFunc, MSSFunc, FilterPCFunc, MosaicFunc, CacheFunc, DagFunc
+
+#-------------------------------------------------------------------
+# Usage
+#-------------------------------------------------------------------
+__title__=os.path.basename(sys.argv[0]).split('.')[0]
+__author__='Valentin Schmitt'
+__version__=1.0
+parser = argparse.ArgumentParser(description='''
+%s (v%.1f by %s):
+    Main Task
+Run the whole chain (SSBP, PCT, ASfM, MSS) as a task graph. Tasks declare
+inputs and outputs per AOI, block, scene and tile; a task is rebuilt only
+if its code, parameters or input contents changed since its last
+successful run (state file), so a rerun after a parameter change redoes
+the affected subgraph only. Independent tasks run on a local worker pool.
+Block steps (bundle adjustment, dense matching, tiling) run the main
+scripts, scene and tile steps call the libraries directly. The graph is
+expanded once block, scene and tile lists are known.
+
+**************************************************************************
+> ssbp: scene search and blocks (ssbp_main)
+> pct: bucket creation and download per block (pct_main)
+> data, orthoI, camI: single band image, initial ortho and camera per scene
+> kp, eo, io, exp: key points, adjustments and camera export per block (asfm_main)
+> orthoF: final ortho per scene
+> dm, tile: dense matching and point cloud tiling per block (mss_main)
+> filter, raster: point cloud filtering and rasterisation per tile
+> mosaic: DSM mosaic per block
+**************************************************************************
+> -until: last stage, -only: block names
+> -dry: list stale tasks without running
+**************************************************************************
+'''% (__title__,__version__,__author__),
+formatter_class=argparse.RawDescriptionHelpFormatter)
+#-----------------------------------------------------------------------
+# Hard arguments
+#-----------------------------------------------------------------------
+lstStage=('ssbp', 'pct', 'data', 'orthoI', 'camI', 'kp', 'eo', 'io', 'exp', 'orthoF', 'dm', 'tile', 'filter', 'raster', 'mosaic')
+# VarCur parameters read per stage (task signature): a change reruns the stage
+lstParamCam=['camCentre', 'camFocal', 'camPitch', 'gsdOrth']
+lstParamDm=['tolPairArea', 'tolAxisAngle', 'tolDispDiff', 'gsdOrth', 'gsdDsm', 'satAz_Val', 'satAz_Name', 'satAz_Tol',
+            'dicDispRange', 'dicLRC', 'dicSGM', 'dicPairScore', 'dicRasterPolicy']
+dicStageParam={'ssbp': ['methodB', 'rdpEpsi', 'dicTolerance', 'tempGeojson', 'tempDescripPair', 'profileCoverTif', 'imageGsd'],
+               'pct': ['dicLevel'],
+               'data': [],
+               'orthoI': ['gsdOrth'],
+               'camI': lstParamCam,
+               'kp': lstParamCam,
+               'eo': lstParamCam,
+               'io': lstParamCam,
+               'exp': lstParamCam,
+               'orthoF': ['gsdOrth'],
+               'dm': lstParamDm,
+               'tile': ['gsdDsm'],
+               'filter': ['dicFilterPC'],
+               'raster': ['gsdDsm', 'dicRasterPolicy'],
+               'mosaic': ['dicMosaic', 'dicRasterPolicy'],
+               }
+
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def Param(stage):
+    '''VarCur parameters of a stage task (see dicStageParam)'''
+    return {name: globals()[name] for name in dicStageParam[stage]}
+
+def PyCmd(nameScript, lstArgs):
+    '''Command line of a main script next to that one'''
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), nameScript)]+lstArgs
+
+def CacheArgs(args):
+    '''Tool cache arguments of the main scripts (the cache is opt-in)'''
+    if args.noCache or not args.cache: return []
+    return ['-cache', os.path.abspath(args.cache)]
+
+def Ortho(asp, pathImgIn, pathModIn, pathDemIn, pathOrthoOut, epsg):
+    '''Ortho of one scene (arguments built at run time: SubArgs_Ortho copies the RPC next to the image)'''
+    return asp.mapproject(ASfMFunc.SubArgs_Ortho(pathImgIn, pathModIn, pathDemIn, pathOrthoOut, epsg))
+
+def FilterNative(pathIn, pathOut, lstPathNeigh, strTemplate):
+    '''Native filter of one tile with neighbour buffer points'''
+    FilterPCFunc.FilterTile(pathIn, pathOut, lstPathNeigh=lstPathNeigh, lstBounds=FilterPCFunc.TileBounds(pathIn, strTemplate))
+    return 0
+
+def Mosaic(lstTilePath, pathVrt, pathOut, mode, gdal):
+    '''DSM mosaic of the raster tiles (see mss_main)'''
+    if mode=='merge':
+        return gdal.gdal_merge(['-init', '"%s"'% ' '.join(map(str, dicMosaic['nodata'])), '-a_nodata', '-32767', '-o', pathOut]+lstTilePath)
+    dicGrid=MosaicFunc.BuildVrt(lstTilePath, pathVrt, lstNodata=dicMosaic['nodata'])
+    if mode=='cog': MosaicFunc.RenderMosaic(pathVrt, pathOut, dicGrid)
+    return 0
+
+def AoiTasks(objGraph, args):
+    '''
+    Scene search and block creation task.
+
+    objGraph (obj): task graph
+    args (obj): arguments
+    out:
+        0
+    '''
+    objGraph.Add(DagFunc.Task('ssbp', 'ssbp',
+                              PyCmd('ssbp_main.py', ['-i', args.i, '-o', args.o]+shlex.split(args.ssbpArgs)),
+                              dicParam=Param('ssbp'),
+                              lstIn=[args.i],
+                              lstOut=[os.path.join(args.o, fileAoi.format('*')),
+                                      os.path.join(args.o, nameBlock.format('*'), fileSelec.format(nameBlock.format('*'))),
+                                      os.path.join(args.o, nameBlock.format('*'), fileStereo.format(nameBlock.format('*')))],
+                              clean=False))
+    return 0
+
+def BlockTasks(objGraph, args, nameB):
+    '''
+    Bucket creation and download task of a block.
+
+    objGraph (obj): task graph
+    args (obj): arguments
+    nameB (str): block name
+    out:
+        0
+    '''
+    pathData=os.path.join(args.o, nameB, nameBucket.format(args.n, nameB, args.l))
+    objGraph.Add(DagFunc.Task('pct:%s'% nameB, 'pct',
+                              PyCmd('pct_main.py', ['-i', args.o, '-n', args.n, '-b', nameB, '-l', args.l, '-a', 'create', 'download']),
+                              dicParam=Param('pct'),
+                              lstIn=[os.path.join(args.o, nameB, fileSelec.format(nameB))],
+                              lstOut=[pathData+os.sep],
+                              dicScope={'block': nameB},
+                              clean=False))
+    return 0
+
+def AsfmTasks(objGraph, args, nameB, asp, gdal):
+    '''
+    Bundle adjustment tasks of a block: per scene (single band image,
+    orthos, initial camera) and per block (asfm_main steps).
+
+    objGraph (obj): task graph
+    args (obj): arguments
+    nameB (str): block name
+    asp (obj): ASP python interface
+    gdal (obj): GDAL python interface
+    out:
+        objPath (obj): block paths (PathCur)
+    '''
+    objPath=PathCur(args.o, nameB, args.n)
+    lstId=[featCur['id'] for featCur in SceneBlocks(args.o, meth='dir', b=nameB).lstBFeat[0]]
+    lstArgs=['-i', args.o, '-dem', args.dem, '-epsg', args.epsg, '-b', nameB]+(['-backend', args.backend] if args.backend else [])+CacheArgs(args)
+    lstArgsBa=lstArgs+([] if args.io else ['-io'])
+    pathStereo=os.path.join(objPath.pB, fileStereo.format(nameB))
+
+    dicPath={idImg: {'img': os.path.join(objPath.pData, objPath.extFeat.format(idImg)),
+                     'rpc': os.path.join(objPath.pData, objPath.extRpc.format(idImg)),
+                     '1b': os.path.join(objPath.pProcData, objPath.extFeat1B.format(idImg)),
+                     'camI': os.path.join(objPath.pProcData, objPath.nTsai[1].format(idImg)),
+                     'camF': os.path.join(objPath.pProcData, objPath.nTsai[2].format(idImg)),
+                     } for idImg in lstId}
+
+    # Per scene
+    for idImg in lstId:
+        dicScope={'block': nameB, 'scene': idImg}
+        dicCur=dicPath[idImg]
+        objGraph.Add(DagFunc.Task('data:%s:%s'% (nameB, idImg), 'data',
+                                  ASfMFunc.SingleBandImg, args=(dicCur['img'], dicCur['1b'], 'green', gdal),
+                                  dicParam=Param('data'), lstIn=[dicCur['img']], lstOut=[dicCur['1b']], dicScope=dicScope))
+        pathOrtho=objPath.pOrtho.format(idImg, '-Init')
+        objGraph.Add(DagFunc.Task('orthoI:%s:%s'% (nameB, idImg), 'orthoI',
+                                  Ortho, args=(asp, dicCur['1b'], dicCur['rpc'], args.dem, pathOrtho, args.epsg),
+                                  dicParam=Param('orthoI'), lstIn=[dicCur['1b'], dicCur['rpc'], args.dem], lstOut=[pathOrtho], dicScope=dicScope))
+        objGraph.Add(DagFunc.Task('camI:%s:%s'% (nameB, idImg), 'camI',
+                                  ASfMFunc.PnP_OCV, args=(idImg, dicCur['rpc'], dicCur['camI']),
+                                  dicParam=Param('camI'), lstIn=[dicCur['rpc']], lstOut=[dicCur['camI']], dicScope=dicScope))
+        pathOrtho=objPath.pOrtho.format(idImg, '-Final')
+        objGraph.Add(DagFunc.Task('orthoF:%s:%s'% (nameB, idImg), 'orthoF',
+                                  Ortho, args=(asp, dicCur['1b'], dicCur['camF'], args.dem, pathOrtho, args.epsg),
+                                  dicParam=Param('orthoF'), lstIn=[dicCur['1b'], dicCur['camF'], args.dem], lstOut=[pathOrtho], dicScope=dicScope))
+
+    # Per block (asfm_main skips existing scene outputs, initial orthos are explicit dependencies)
+    dicScope={'block': nameB}
+    dirKP, dirEO, dirIO=[os.path.dirname(prefCur)+os.sep for prefCur in (objPath.prefKP, objPath.prefEO, objPath.prefIO)]
+    objGraph.Add(DagFunc.Task('kp:%s'% nameB, 'kp',
+                              PyCmd('asfm_main.py', lstArgsBa+['-p', 'kp']),
+                              dicParam=Param('kp'),
+                              lstIn=[pathStereo, args.dem]+[dicPath[idImg][strKey] for idImg in lstId for strKey in ('1b', 'rpc', 'camI')],
+                              lstOut=[dirKP, objPath.pStereoLst],
+                              lstDep=['orthoI:%s:%s'% (nameB, idImg) for idImg in lstId],
+                              dicScope=dicScope))
+    objGraph.Add(DagFunc.Task('eo:%s'% nameB, 'eo',
+                              PyCmd('asfm_main.py', lstArgsBa+['-p', 'eo']),
+                              dicParam=Param('eo'), lstIn=[dirKP, args.dem], lstOut=[dirEO], dicScope=dicScope))
+    if args.io:
+        objGraph.Add(DagFunc.Task('io:%s'% nameB, 'io',
+                                  PyCmd('asfm_main.py', lstArgsBa+['-p', 'io']),
+                                  dicParam=Param('io'), lstIn=[dirEO], lstOut=[dirIO], dicScope=dicScope))
+    objGraph.Add(DagFunc.Task('exp:%s'% nameB, 'exp',
+                              PyCmd('asfm_main.py', lstArgsBa+['-p', 'exp']),
+                              dicParam=Param('exp'), lstIn=[dirIO if args.io else dirEO], lstOut=[dicPath[idImg]['camF'] for idImg in lstId], dicScope=dicScope))
+    return objPath
+
+def MssTasks(objGraph, args, nameB, objPath):
+    '''
+    Dense matching and point cloud tiling tasks of a block (mss_main
+    steps).
+
+    objGraph (obj): task graph
+    args (obj): arguments
+    nameB (str): block name
+    objPath (obj): block paths (PathCur)
+    out:
+        0
+    '''
+    lstId=[featCur['id'] for featCur in SceneBlocks(args.o, meth='dir', b=nameB).lstBFeat[0]]
+    lstArgs=['-i', args.o, '-dem', args.dem, '-epsg', args.epsg, '-b', nameB]+(['-backend', args.backend] if args.backend else [])+CacheArgs(args)+shlex.split(args.mssArgs)
+    dicScope={'block': nameB}
+    grepPC=objPath.prefStereoDM+objPath.extPC.format('*')
+
+    objGraph.Add(DagFunc.Task('dm:%s'% nameB, 'dm',
+                              PyCmd('mss_main.py', lstArgs+['-p', 'dm']),
+                              dicParam=Param('dm'),
+                              lstIn=[os.path.join(objPath.pB, fileStereo.format(nameB)), args.dem]+
+                                    [os.path.join(objPath.pProcData, strForm.format(idImg)) for idImg in lstId for strForm in (objPath.extFeat1B, objPath.nTsai[2])],
+                              lstOut=[grepPC, objPath.pStereoDM],
+                              dicScope=dicScope,
+                              clean=False)) # mss_main resumes from the pair journal, matched pairs are kept
+    objGraph.Add(DagFunc.Task('tile:%s'% nameB, 'tile',
+                              PyCmd('mss_main.py', lstArgs+['-p', 'tile']),
+                              dicParam=Param('tile'),
+                              lstIn=[grepPC],
+                              lstOut=[objPath.pPcFullTile.replace('#', '*'), objPath.pTileIndex],
+                              lstDep=['dm:%s'% nameB],
+                              dicScope=dicScope))
+    return 0
+
+def TileTasks(objGraph, args, nameB, objPath, pdal, gdal):
+    '''
+    Filtering and rasterisation tasks per point cloud tile and mosaic
+    task of a block (tiles from the tiling step).
+
+    objGraph (obj): task graph
+    args (obj): arguments
+    nameB (str): block name
+    objPath (obj): block paths (PathCur)
+    pdal (obj): PDAL python interface
+    gdal (obj): GDAL python interface
+    out:
+        nbTile (int): tile number
+    '''
+    strTemplate=objPath.pPcFullTile.split('#')
+    dicTile={}
+    for pathIn in sorted(glob(objPath.pPcFullTile.replace('#', '*'))):
+        dicTile[pathIn.replace(strTemplate[0], '').replace(strTemplate[1], '')]=pathIn
+
+    lstDsm=[]
+    for strKey in dicTile:
+        dicScope={'block': nameB, 'tile': strKey}
+        pathIn=dicTile[strKey]
+        pathFlt=objPath.pPcFltTile.format(strKey)
+        pathDsm=objPath.pDsmTile.format(strKey)
+        lstIndex=[int(s) for s in strKey.split('_')]
+
+        if args.fltEngine=='native':
+            lstPathNeigh=[objPath.pPcFullTile.replace('#', '%i_%i'% (lstIndex[0]+i, lstIndex[1]+j)) for i in (-1, 0, 1) for j in (-1, 0, 1)
+                                if (i or j) and '%i_%i'% (lstIndex[0]+i, lstIndex[1]+j) in dicTile]
+            objGraph.Add(DagFunc.Task('filter:%s:%s'% (nameB, strKey), 'filter',
+                                      FilterNative, args=(pathIn, pathFlt, lstPathNeigh, strTemplate),
+                                      dicParam=Param('filter'), lstIn=[pathIn]+lstPathNeigh, lstOut=[pathFlt], dicScope=dicScope))
+        else:
+            objGraph.Add(DagFunc.Task('filter:%s:%s'% (nameB, strKey), 'filter',
+                                      pdal.pipeline, args=([objPath.pJsonFilter, '--readers.las.filename=%s'% pathIn, '--writers.las.filename=%s'% pathFlt],),
+                                      dicParam=Param('filter'), lstIn=[pathIn, objPath.pJsonFilter], lstOut=[pathFlt], dicScope=dicScope))
+
+        objGraph.Add(DagFunc.Task('raster:%s:%s'% (nameB, strKey), 'raster',
+                                  MSSFunc.PC2Raster, args=(pathFlt, pathDsm, lstIndex, objPath.pJsonRast_WA, pdal),
+                                  dicParam=Param('raster'), lstIn=[pathFlt, objPath.pJsonRast_WA], lstOut=[pathDsm], dicScope=dicScope))
+        lstDsm.append(pathDsm)
+
+    if lstDsm:
+        lstOut=[objPath.pDsmFinal]*(not args.mosaic=='vrt')+[objPath.pDsmVrt]*(not args.mosaic=='merge')
+        objGraph.Add(DagFunc.Task('mosaic:%s'% nameB, 'mosaic',
+                                  Mosaic, args=(lstDsm, objPath.pDsmVrt, objPath.pDsmFinal, args.mosaic, gdal),
+                                  dicParam=Param('mosaic'), lstIn=lstDsm, lstOut=lstOut, dicScope={'block': nameB}))
+    return len(dicTile)
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    try:
+        print()
+        logger = SetupLogger(name=__title__)
+        #---------------------------------------------------------------
+        # Retrieval of arguments
+        #---------------------------------------------------------------
+        parser.add_argument('-i', required=True, help='Input geometry (geojson)')
+        parser.add_argument('-o', required=True, help='Working directory for outputs')
+        parser.add_argument('-n', required=True, help='Aoi Name')
+        parser.add_argument('-dem', required=True, help='Reference DEM path (SRTM) with ellipsoidal height (WGS84)')
+        parser.add_argument('-epsg', required=True, help='Current ESPG used by orthos and output projection')
+
+        # Optional arguments
+        parser.add_argument('-until', '--until', choices=lstStage, default=None, help='Last stage (default: None means all)')
+        parser.add_argument('-only', '--only', nargs='+', default=[], help='Block name to process (default: [] means all)')
+        parser.add_argument('-dry', action='store_true', help='List stale tasks without running')
+        parser.add_argument('-workers', type=int, default=None, help='Worker number (default: None means dicDag)')
+        parser.add_argument('-state', default=None, help='Task state file (default: None means working directory/DagState.json)')
+        parser.add_argument('-l', default=sorted(list(dicLevel.keys()))[0], help='Product process level (default: first of VarCur)')
+        parser.add_argument('-io', action='store_false', help='Adjust intrinsic parameter during BA, only principal point (default: True)')
+        parser.add_argument('-fltEngine', choices=['pdal', 'native'], default='pdal', help='Point cloud filter engine, PDAL docker or in-process KD-tree (default: pdal)')
+        parser.add_argument('-mosaic', choices=['merge', 'vrt', 'cog'], default='merge', help='Final DSM mosaic: gdal_merge, VRT only or VRT rendered into a tiled and compressed GeoTiff with overviews (default: merge)')
+        parser.add_argument('-ssbpArgs', default='', help='Additional ssbp_main arguments, e.g. -ssbpArgs="-fBH -fBHred 2" (default: none)')
+        parser.add_argument('-mssArgs', default='', help='Additional mss_main arguments for dense matching and tiling, e.g. -mssArgs="-matcher sgm" (default: none)')
+        parser.add_argument('-cache', default=None, help='Tool output cache directory, shared by blocks, e.g. working directory/ToolCache (default: None means no cache)')
+        parser.add_argument('-noCache', action='store_true', help='Run all tool commands without cache')
+        parser.add_argument('-backend', choices=['docker', 'native', 'inproc', 'stub'], default=None, help='Tool backend: docker images, host binaries, python functions or fabricated outputs for offline runs (default: None means dicDocker)')
+
+        args = parser.parse_args()
+
+        #---------------------------------------------------------------
+        # Check input
+        #---------------------------------------------------------------
+        args.i, args.o, args.dem=[os.path.abspath(pathCur) for pathCur in (args.i, args.o, args.dem)]
+        if not os.path.isfile(args.i) or not args.i.endswith('geojson'): raise RuntimeError("-i file not found")
+        if not os.path.isdir(args.o): raise RuntimeError("-o working directory not found")
+        if any([l.isupper() for l in args.n]): raise RuntimeError("Name AOI must be low case")
+        if '_' in args.n or '-' in args.n: raise RuntimeError("Name AOI cannot contain '_' or '-'")
+        if not os.path.isfile(args.dem): raise RuntimeError("DEM file not found")
+        with rasterio.open(args.dem) as fileIn:
+            if not fileIn.crs==4326: raise RuntimeError("DEM EPSG must be 4326 (WGS 84, geographic)")
+        if not args.l in dicLevel: raise RuntimeError("Product level unknown")
+
+        logger.info("Arguments: " + str(vars(args)))
+        #sys.exit()
+        print()
+
+        #---------------------------------------------------------------
+        # Setup
+        #---------------------------------------------------------------
+        logger.info('# Task graph setup')
+        objCache=None if args.noCache or not args.cache else CacheFunc.ToolCache(args.cache)
+        asp=DockerLibs.AspPython(cache=objCache, backend=args.backend)
+        pdal=DockerLibs.PdalPython(cache=objCache, backend=args.backend)
+        gdal=DockerLibs.GdalPython(cache=objCache, backend=args.backend)
+        objGraph=DagFunc.TaskGraph(args.state or os.path.join(args.o, 'DagState.json'), lstStage, nbWorker=args.workers)
+        iUntil=lstStage.index(args.until) if args.until else len(lstStage)
+        setPlan=set()
+
+        def RunPhase(strPhase):
+            '''Run (or plan) the selected tasks of the graph'''
+            logger.info('# %s: %i tasks'% (strPhase, len(objGraph.dicTask)))
+            setName=objGraph.Select(until=args.until, lstOnly=args.only)
+            if not args.dry:
+                dicOut=objGraph.Run(setName)
+                lstFail=[name for name in dicOut if dicOut[name] in ('fail', 'blocked')]
+                if lstFail: logger.error('%i failed or blocked tasks: %s'% (len(lstFail), ', '.join(lstFail[:10])))
+                logger.info(str(objGraph))
+                return 0
+            for name, strStatus in objGraph.Plan(setName):
+                if name in setPlan: continue
+                setPlan.add(name)
+                if strStatus=='stale': logger.info('stale: %s'% name)
+            return 0
+
+        #---------------------------------------------------------------
+        # Scene search and blocks
+        #---------------------------------------------------------------
+        AoiTasks(objGraph, args)
+        RunPhase('Scene blocks')
+
+        #---------------------------------------------------------------
+        # Data per block
+        #---------------------------------------------------------------
+        if iUntil>lstStage.index('ssbp'):
+            objInfo=SceneBlocks(args.o)
+            if not objInfo.nbB: raise RuntimeError('No block available')
+            lstBlock=[nameB for nameB, nbFeat in objInfo.lstBId if not args.only or nameB in args.only]
+            [BlockTasks(objGraph, args, nameB) for nameB in lstBlock]
+            RunPhase('Block data')
+
+        #---------------------------------------------------------------
+        # Bundle adjustment and dense matching per block
+        #---------------------------------------------------------------
+        dicPath={}
+        if iUntil>lstStage.index('pct'):
+            for nameB in lstBlock:
+                if not len(glob(os.path.join(args.o, nameB, nameBucket.format(args.n, nameB, '???'))))==1:
+                    logger.error('%s: no downloaded data (skipped)'% nameB)
+                    continue
+                dicPath[nameB]=AsfmTasks(objGraph, args, nameB, asp, gdal)
+                MssTasks(objGraph, args, nameB, dicPath[nameB])
+            RunPhase('Block process')
+
+        #---------------------------------------------------------------
+        # Point cloud tiles per block
+        #---------------------------------------------------------------
+        if iUntil>lstStage.index('tile'):
+            for nameB in dicPath:
+                logger.info('%s: %i tiles'% (nameB, TileTasks(objGraph, args, nameB, dicPath[nameB], pdal, gdal)))
+            RunPhase('Tile process')
+
+    #---------------------------------------------------------------
+    # Exception management
+    #---------------------------------------------------------------
+    except RuntimeError as msg:
+        logger.critical(msg)
@@ -3,20 +3,12 @@
 
 import os, sys, argparse, time
 import json
-import rasterio
 
 # dsm_from_planetscope libraries
 from OutLib.LoggerFunc import *
 from VarCur import *
-from SSBP import *
-from PCT import *
-from BlockProc import *
-
-# dsm_from_planetscope main scripts
-import ssbp_main
-import pct_main 
-import asfm_main
-import mss_main 
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
 #-------------------------------------------------------------------
 # Usage
 #-------------------------------------------------------------------
@@ -127,6 +119,9 @@ if __name__ == "__main__":
         print()
         logger.info('# Command line MSS')
         print('./src/mss_main.py -i %s -dem %s -epsg %s'% (args.o, args.dem, args.epsg))
+        print()
+        logger.info('# Command line task graph (whole chain, incremental)')
+        print('./src/dag_main.py -i %s -o %s -n %s -dem %s -epsg %s -ssbpArgs="-fBH -fBHred 2"'% (args.i, args.o, args.n, args.dem, args.epsg))
 
         
     #---------------------------------------------------------------
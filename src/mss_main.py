@@ -3,16 +3,19 @@
 
 import os, sys, argparse, time, copy
 from glob import glob
-import rasterio
+from contextlib import nullcontext
 import json
+import numpy as np
 from multiprocessing import Pool
 from pprint import pprint
 
 # PyValLib packages
 from OutLib.LoggerFunc import *
 from VarCur import *
+from OutLib.LazyFunc import LazyImport
+rasterio=LazyImport('rasterio')
 from SSBP.blockFunc import SceneBlocks 
-from BlockProc import DockerLibs, MSSFunc
+from BlockProc import DockerLibs, MSSFunc, FilterPCFunc, MosaicFunc, TileFunc, PairScoreFunc, SGMFunc, TriangFunc, ResourceFunc, ScratchFunc, ImgStoreFunc, ExecFunc, CacheFunc, TelemetryFunc, QueueFunc, ShmFunc
 
 #-------------------------------------------------------------------
 # Usage
@@ -32,10 +35,12 @@ all tiles.
 **************************************************************************
 > Read existing blocks
 > Select stereo pair to match (preparation)
+> Predict pair resources (admission control, block sizing with -plan)
 > Create epipolar images of the current stereo pair
+> Predict the disparity search range from the DEM
 > Match epipolar images
 > Match the inverse pair (left image becomes right image and right becomes left)
-> Merge disparity results
+> Merge disparity results (or sparse reverse check of the forward disparity only)
 > Triangulate points
 > Convert point cloud into .las format
 > Record the computed geometry
@@ -43,8 +48,11 @@ all tiles.
 > Tile gathering clouds
 > Filter tiles
 > Rasterize tiles
-> Merge raster tiles
+> Merge raster tiles (VRT and Cloud-Optimized GeoTiff)
 
+**************************************************************************
+> -queue: pairs, tile filtering and rasterisation are submitted to a job
+  directory on shared storage and run by worker_main on every host
 **************************************************************************
 '''% (__title__,__version__,__author__),
 formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -56,18 +64,84 @@ global procBar
 # Hard command
 #-----------------------------------------------------------------------
 
-def FailedDM(pathFile, j,lstPrefClean=None):
+def FailedDM(pathFile, j,lstPrefClean=None, objMon=None):
     logger.warning('Error occured with stereopair ID %s'% j)
+    if objMon: objMon.Stop()
     with open(pathFile, 'w') as fileOut:
         fileOut.write('Failed')
 
-    if lstPrefClean: os.system('rm ' +'-* '.join(lstPrefClean)+'-* ')
+    if lstPrefClean: ScratchFunc.RemovePrefix(lstPrefClean)
+
+def WriteJournal(pathJournal, lstFeat):
+    '''
+    Update the stereo pair journal: current pair features replace former
+    ones with the same id. The journal is locked and read again before
+    writing, so queue workers can update the same block.
+
+    pathJournal (str): journal path (geojson)
+    lstFeat (list): current pair features
+    out:
+        0
+    '''
+    with QueueFunc.FileLock(pathJournal+'.lock'):
+        if not os.path.exists(pathJournal):
+            objGeojson=copy.deepcopy(tempGeojson)
+            objGeojson["name"]=os.path.basename(pathJournal).split('.')[0]
+        else:
+            with open(pathJournal) as fileIn:
+                objGeojson=json.load(fileIn)
+        setId=set([feat['id'] for feat in lstFeat])
+        lstFeatOut=[feat for feat in objGeojson["Features"] if not feat['id'] in setId]+lstFeat
+
+        pathTmp='%s.%i.tmp'% (pathJournal, os.getpid())
+        with open(pathTmp,'w') as fileGeojson:
+            fileGeojson.write(json.dumps({key:objGeojson[key] for key in objGeojson if not key=="Features"}, indent=2)[:-2])
+            fileGeojson.write(',\n  "Features":[\n')
+            for k in range(len(lstFeatOut)):
+                lineEnd=',\n'
+                if not k: lineEnd=''
+                fileGeojson.write(lineEnd+json.dumps(lstFeatOut[k]))
+            fileGeojson.write(']\n}')
+        os.replace(pathTmp, pathJournal)
+    return 0
+
+def QueueJobs(objQueue, lstJob, name, fun=None):
+    '''
+    Submit jobs to the work queue and wait for the workers (worker_main).
+    If fun stops the waiting, pending jobs are cancelled and leased ones
+    are still waited for.
+
+    objQueue (obj): work queue
+    lstJob (list): (job id, kind, payload) per job
+    name (str): progress bar name
+    fun (function): called with each final record, True stops the waiting (default: None)
+    out:
+        dicRec (dict): final records per job id
+    '''
+    if not lstJob: return {}
+    lstId=[]
+    for idJob, kind, payload in lstJob:
+        objQueue.Submit(idJob, kind, payload, force=True)
+        lstId.append(idJob)
+    logger.info('Queue: %s'% str(objQueue))
+
+    dicRec=objQueue.Collect(lstId, fun=fun, name=name)
+    if len(dicRec)<len(lstId):
+        logger.info('%i queued jobs cancelled'% objQueue.Cancel([idJob for idJob in lstId if not idJob in dicRec]))
+        dicRec.update(objQueue.Collect([idJob for idJob in lstId if not idJob in dicRec]))
+
+    lstFail=[idJob for idJob in lstId if not dicRec[idJob]['state']=='done']
+    logger.info('%i jobs done, %i failed'% (len(lstId)-len(lstFail), len(lstFail)))
+    for idJob in lstFail:
+        logger.warning('%s: %s'% (idJob, ' | '.join([str(item[-1]) for item in dicRec[idJob]['history']])))
+    return dicRec
 
     
 #=======================================================================
 #main
 #-----------------------------------------------------------------------
 if __name__ == "__main__":
+    objExec=None
     try:
         print()
         logger = SetupLogger(name=__title__)
@@ -79,9 +153,33 @@ if __name__ == "__main__":
         #parser.add_argument('-m', required=True, help='Dense matching method (pw|mvs)')
         parser.add_argument('-dem', required=True, help='Reference DEM path (SRTM)')
         parser.add_argument('-epsg', required=True, help='Current ESPG used by output projection')
+        parser.add_argument('-p', default='mosaic', help='Process last step (dm, tile, filter, raster, mosaic)')
         
         #Optional arguments
         parser.add_argument('-b',nargs='+', default=[], help='Block name to process (default: [] means all')
+        parser.add_argument('-order', choices=['file', 'score'], default='file', help='Stereo pair processing order, file order or expected yield (default: file)')
+        parser.add_argument('-budgetN', type=int, default=0, help='Stop after N successfully matched stereo pairs (default: 0 means no limit)')
+        parser.add_argument('-budgetRed', type=int, default=0, help='Stop when k successful pairs cover the AOI fraction dicPairScore[redCover] (default: 0 means no limit)')
+        parser.add_argument('-epipFrame', choices=['full', 'overlap'], default='full', help='Epipolar frame, full warped images or cropped to the projected overlap (default: full)')
+        parser.add_argument('-corrSearch', choices=['asp', 'dem'], default='asp', help='Disparity search range, ASP estimation or DEM prediction (default: asp)')
+        parser.add_argument('-matcher', choices=['asp', 'sgm'], default='asp', help='Epipolar pair matching backend, ASP parallel_stereo or in-process tiled SGM (default: asp)')
+        parser.add_argument('-triang', choices=['asp', 'native'], default='asp', help='Triangulation engine, ASP stereo entry-point 5 or in-process midpoint intersection (default: asp)')
+        parser.add_argument('-lrc', choices=['full', 'sparse', 'both'], default='full', help='Left-right consistency: reverse stereo run, sparse reverse check on a grid or both with comparison (default: full)')
+        parser.add_argument('-scratch', default=None, help='Scratch directory for pair intermediates, e.g. tmpfs or local NVMe (default: None means in the block)')
+        parser.add_argument('-scratchBudget', type=float, default=0, help='Scratch disk budget [GB] (default: 0 means free disk space)')
+        parser.add_argument('-noStore', action='store_true', help='Decode 1B images per pair instead of the shared memory-mapped cache')
+        parser.add_argument('-shm', action='store_true', help='Pass epipolar images, disparities and point clouds between in-process stages through shared memory, files only for external tools (needs -matcher sgm, -triang native and -lrc sparse)')
+        parser.add_argument('-cache', default=None, help='Tool output cache directory, shared by blocks, e.g. working directory/ToolCache (default: None means no cache)')
+        parser.add_argument('-cacheBudget', type=float, default=None, help='Tool output cache disk budget [GB] (default: None means dicCache)')
+        parser.add_argument('-noCache', action='store_true', help='Run all tool commands without cache')
+        parser.add_argument('-backend', choices=['docker', 'native', 'inproc', 'stub'], default=None, help='Tool backend: docker images, host binaries, python functions or fabricated outputs for offline runs (default: None means dicDocker)')
+        parser.add_argument('-telemetry', default=None, help='Tool command record file (JSONL) with resource use per command, e.g. next to the outputs (default: None means no records)')
+        parser.add_argument('-plan', action='store_true', help='Predict pair resources and block sizing from recorded runs, then stop')
+        parser.add_argument('-planWall', type=float, default=0, help='Target wall time for the block sizing [h] (default: 0 means sequential)')
+        parser.add_argument('-mosaic', choices=['merge', 'vrt', 'cog'], default='merge', help='Final DSM mosaic: gdal_merge, VRT only or VRT rendered into a tiled and compressed GeoTiff with overviews (default: merge)')
+        parser.add_argument('-fltEngine', choices=['pdal', 'native'], default='pdal', help='Point cloud filter engine, PDAL docker or in-process KD-tree (default: pdal)')
+        parser.add_argument('-queue', default=None, help='Job directory on shared storage: pairs and tiles are run by worker_main processes (default: None means local)')
+        parser.add_argument('-pair', nargs='+', type=int, default=[], help='Stereo pair ids to match (default: [] means all, used by queue workers)')
         #parser.add_argument('-debug',action='store_true',help='Debug mode: avoid planet_common check')
 
         args = parser.parse_args()
@@ -103,6 +201,15 @@ if __name__ == "__main__":
             geomAoiLoc=copy.deepcopy(geomAoi)
             MSSFunc.ReprojGeom(geomAoiLoc, args.epsg)
             
+        if args.shm and not (args.matcher=='sgm' and args.triang=='native' and args.lrc=='sparse'): raise RuntimeError("Shared memory hand-off needs -matcher sgm, -triang native and -lrc sparse (in-process pair stages)")
+        if args.queue:
+            args.i, args.dem=os.path.abspath(args.i), os.path.abspath(args.dem)
+            if args.cache: args.cache=os.path.abspath(args.cache)
+            if args.telemetry: args.telemetry=os.path.abspath(args.telemetry)
+
+        lstProcLvl=('dm', 'tile', 'filter', 'raster', 'mosaic')
+        if not args.p in lstProcLvl: raise RuntimeError("Last process step unknown")
+        iProc=lstProcLvl.index(args.p)
 
         logger.info("Arguments: " + str(vars(args)))
         #sys.exit()
@@ -111,9 +218,18 @@ if __name__ == "__main__":
         # Docker Python interface
         #---------------------------------------------------------------
         logger.info('# Docker Python interface')        
-        asp=DockerLibs.AspPython()
-        pdal=DockerLibs.PdalPython()
-        gdal=DockerLibs.GdalPython()
+        objCache=None if args.noCache or not args.cache else CacheFunc.ToolCache(args.cache, budget=args.cacheBudget)
+        asp=DockerLibs.AspPython(cache=objCache, backend=args.backend)
+        pdal=DockerLibs.PdalPython(cache=objCache, backend=args.backend)
+        gdal=DockerLibs.GdalPython(cache=objCache, backend=args.backend)
+        objExec=ExecFunc.ToolExecutor()
+        if args.telemetry: TelemetryFunc.Open(args.telemetry)
+        if args.queue:
+            objQueue=QueueFunc.JobQueue(args.queue)
+            logger.info('Queue: %s'% str(objQueue))
+            dicQueueTool={'cache': None if args.noCache else args.cache,
+                          'backend': args.backend,
+                          'telemetry': args.telemetry}
         
         #---------------------------------------------------------------
         # Read Repo
@@ -139,6 +255,7 @@ if __name__ == "__main__":
             #---------------------------------------------------------------
             nameB, nbFeat=objInfo.lstBId[iB]
             logger.info('%s (%i scenes)'% objInfo.lstBId[iB])
+            TelemetryFunc.SetContext(block=nameB, pair=None, stage='Block setup')
             objBlocks=SceneBlocks(args.i, meth='dir', b=nameB)
             objPath=PathCur(args.i, nameB, geomAoi['properties']['NAME'])
 
@@ -148,20 +265,15 @@ if __name__ == "__main__":
             # Dense matching preparation, filtering
             #---------------------------------------------------------------
             logger.info('# Stereo pair dense matching ')
-            lstIPair=[]
+            TelemetryFunc.SetContext(stage='Dense matching preparation')
             nbPair=len(objBlocks.lstBCouple[0]) 
-            procBar=ProcessStdout(name='Dense maching preparation',inputCur=nbPair)
-            for j in range(nbPair) :
-                procBar.ViewBar(j)
-                strJ=str(j).rjust(5,'0')
-                pathPcLas=objPath.prefStereoDM+objPath.extPC.format(strJ)
-                if not MSSFunc.FilterDmProces(objBlocks.lstBFeat[0],
-                                              objBlocks.lstBCouple[0][j],
-                                              pathPcLas,
-                                              os.path.join(objPath.pProcData, objPath.nTsai[2]), 
-                                              geomAoi['geometry']): continue          
-
-                lstIPair.append(j)
+            maskPair=MSSFunc.FilterDmBatch(objBlocks.lstBFeat[0],
+                                           objBlocks.lstBCouple[0],
+                                           [objPath.prefStereoDM+objPath.extPC.format(str(j).rjust(5,'0')) for j in range(nbPair)],
+                                           os.path.join(objPath.pProcData, objPath.nTsai[2]), 
+                                           geomAoi['geometry'])
+            if args.pair: maskPair&=np.array([feat['id'] in args.pair for feat in objBlocks.lstBCouple[0]], dtype=bool)
+            lstIPair=np.where(maskPair)[0].tolist()
 
             lstCouple=[objBlocks.lstBCouple[0][j] for j in lstIPair]
             del objBlocks.lstBCouple[0]
@@ -173,196 +285,344 @@ if __name__ == "__main__":
             for j in range(nbPair):
                 objBlocks.lstBCouple[0][j]['properties']['DmProcess']=False
             
-            if not os.path.exists(objPath.pStereoDM):
-                objGeojsonSDM=tempGeojson.copy()
-                objGeojsonSDM["name"]=os.path.basename(objPath.pStereoDM).split('.')[0]
-            else:
-                with open(objPath.pStereoDM) as fileIn:
-                    objGeojsonSDM=json.load(fileIn)
-                lstJnew=[feat['id'] for feat in objBlocks.lstBCouple[0]]
-                lstJdel=[]
-                for j in range(len(objGeojsonSDM["Features"])):
-                    if not objGeojsonSDM["Features"][j]['id'] in lstJnew: continue
-                    lstJdel.append(j)
-                [objGeojsonSDM["Features"].pop(j-i) for i, j in enumerate(lstJdel)]
-
-            with open(objPath.pStereoDM,'w') as fileGeojson:
-                fileGeojson.write(json.dumps({key:objGeojsonSDM[key] for key in objGeojsonSDM if not key=="Features"}, indent=2)[:-2])
-                fileGeojson.write(',\n  "Features":[\n')
-                for k in range(len(objGeojsonSDM["Features"])):
-                    lineEnd=',\n'
-                    if not k: lineEnd=''
-                    fileGeojson.write(lineEnd+json.dumps(objGeojsonSDM["Features"][k]))
-
-                for k in range(nbPair):
-                    lineEnd=',\n'
-                    if not k and not objGeojsonSDM["Features"]: lineEnd=''
-                    fileGeojson.write(lineEnd+json.dumps(objBlocks.lstBCouple[0][k]))
-
-                fileGeojson.write(']\n}')
-            #sys.exit()
             #---------------------------------------------------------------
-            # Dense matching pairwise
+            # Stereo pair priority
             #---------------------------------------------------------------
-            if nbPair: procBar=ProcessStdout(name='Dense maching',inputCur=len(lstIPair))
-            
-            # Clean Docker system /!\ If parallel process, it prunes all existing containers
-            #os.popen('sudo docker container prune --force ; sudo docker volume prune --force')
-
-            j=0
-            #while j<nbPair//2:
-            #j=nbPair//2+1
-            while j<nbPair:
-                procBar.ViewBar(j)
-                strJ=str(objBlocks.lstBCouple[0][j]['id']).rjust(5,'0')
+            lstFeatJournal=[]
+            if os.path.exists(objPath.pStereoDM):
+                with open(objPath.pStereoDM) as fileIn:
+                    lstFeatJournal=json.load(fileIn)["Features"]
+
+            if args.order=='score' and nbPair:
+                dicHist=PairScoreFunc.PairHistory(lstFeatJournal, objPath.prefStereoDM, objPath.extPC)
+                matScore=PairScoreFunc.PairScore(objBlocks.lstBFeat[0],
+                                                 objBlocks.lstBCouple[0],
+                                                 os.path.join(objPath.pProcData, objPath.nTsai[2]),
+                                                 geomAoi['geometry'],
+                                                 dicHist=dicHist)
+                for j in range(nbPair):
+                    objBlocks.lstBCouple[0][j]['properties']['score']=round(float(matScore[j,0]), 9)
+                    objBlocks.lstBCouple[0][j]['properties']['errZ']=round(float(matScore[j,5]), 2)
+                lstOrder=np.argsort(-matScore[:,0], kind='stable')
+                objBlocks.lstBCouple[0]=[objBlocks.lstBCouple[0][j] for j in lstOrder]
+                logger.info('Score range: %.3e - %.3e'% (np.amax(matScore[:,0]), np.amin(matScore[:,0])))
 
-                pathPcLas=objPath.prefStereoDM+objPath.extPC.format(strJ)
-                if os.path.exists(pathPcLas): os.system('rm %s'% pathPcLas)
+            #---------------------------------------------------------------
+            # Resource model
+            #---------------------------------------------------------------
+            objRes=ResourceFunc.ResourceModel(objPath.pResRecord, tag='%s-%s-%s-%s'% (args.matcher, args.lrc, args.triang, args.backend or dicDocker['backend']))
+            dicSceneGeom={feat['id']: feat['geometry'] for feat in objBlocks.lstBFeat[0]}
+            lstFeatRes=[]
+            for feat in objBlocks.lstBCouple[0]:
+                lstId=sorted(feat['properties']['scenes'].split(';'))
+                lstFeatRes.append(MSSFunc.PairEstimate([os.path.join(objPath.pProcData, objPath.nTsai[2].format(idImg)) for idImg in lstId[:2]],
+                                                       feat['geometry'],
+                                                       feat['geometry'] if args.epipFrame=='overlap' else dicSceneGeom.get(lstId[0], feat['geometry']),
+                                                       args.dem))
+            if args.plan:
+                logger.info('Resource model: %s'% str(objRes))
+                lstPlan=lstFeatRes[:args.budgetN] if args.budgetN else lstFeatRes
+                dicSize=objRes.SizeBlock(lstPlan, wallTarget=args.planWall*3600)
+                logger.info('Block sizing: %s'% str(dicSize))
+                continue
+            objMon=ResourceFunc.ResourceMonitor()
 
-                lstId=sorted(objBlocks.lstBCouple[0][j]['properties']['scenes'].split(';'))
-                
-                #if not objBlocks.lstBCouple[0][j]['id']==262: 
-                #    j+=1
-                #    continue
-                #logger.info('j: %s'% strJ)
-                #if not input('Ready? (1/0)'): continue
+            #---------------------------------------------------------------
+            # Scratch space
+            #---------------------------------------------------------------
+            objScratch=ScratchFunc.ScratchDir(os.path.join(args.scratch, nameB) if args.scratch else objPath.pScratchDM,
+                                              budget=args.scratchBudget,
+                                              rootFolder=asp.rootFolder)
+            objPath.prefProcDM=objScratch.Prefix('DMproc')
+            objStore=None if args.noStore else ImgStoreFunc.ImgStore(objPath.pImgStore)
+            objScratch.Clean()
+            logger.info('Scratch: %s'% str(objScratch))
+            with (ShmFunc.ShmChannel() if args.shm else nullcontext()) as objShm:
+                if objShm: logger.info('Shared memory: %s'% str(objShm))
+
+                if args.budgetRed:
+                    objRed=PairScoreFunc.Redundancy(geomAoi['geometry'], args.budgetRed)
+                    [objRed.Add(feat['geometry']) for feat in lstFeatJournal if feat['properties'].get('DmProcess')]
+                    logger.info('Initial redundancy: %s'% str(objRed))
+            
+                WriteJournal(objPath.pStereoDM, objBlocks.lstBCouple[0])
+                #sys.exit()
                 #---------------------------------------------------------------
-                # Left or Right Ref
+                # Dense matching pairwise
                 #---------------------------------------------------------------
-                tupPref=(objPath.prefProcDM+'Left', objPath.prefProcDM+'Right')
-                tupLstPath=([(os.path.join(objPath.pProcData, objPath.extFeat1B.format(idImg)),
-                              os.path.join(objPath.pProcData, objPath.nTsai[2].format(idImg)),
+                if nbPair and not args.queue: procBar=ProcessStdout(name='Dense maching',inputCur=len(lstIPair))
+            
+                # Clean Docker system /!\ If parallel process, it prunes all existing containers
+                #os.popen('sudo docker container prune --force ; sudo docker volume prune --force')
+
+                if args.queue:
+                    lstArgsPair=['-i', args.i, '-dem', args.dem, '-epsg', args.epsg, '-b', nameB, '-p', 'dm', '-order', 'file',
+                                 '-epipFrame', args.epipFrame, '-corrSearch', args.corrSearch, '-matcher', args.matcher,
+                                 '-triang', args.triang, '-lrc', args.lrc, '-scratchBudget', str(args.scratchBudget)]
+                    if args.noStore: lstArgsPair.append('-noStore')
+                    if args.shm: lstArgsPair.append('-shm')
+                    if args.noCache: lstArgsPair.append('-noCache')
+                    elif args.cache: lstArgsPair+=['-cache', args.cache]
+                    if args.cacheBudget is not None: lstArgsPair+=['-cacheBudget', str(args.cacheBudget)]
+                    if args.backend: lstArgsPair+=['-backend', args.backend]
+                    if args.telemetry: lstArgsPair+=['-telemetry', args.telemetry]
+
+                    lstJob, dicGeom=[], {}
+                    for feat in objBlocks.lstBCouple[0]:
+                        strJ=str(feat['id']).rjust(5,'0')
+                        idJob='dm_%s_%s'% (nameB, strJ)
+                        dicGeom[idJob]=feat['geometry']
+                        lstJob.append((idJob, 'pair', {'args': lstArgsPair+['-pair', str(feat['id'])],
+                                                       'out': [objPath.prefStereoDM+objPath.extPC.format(strJ)],
+                                                       'block': nameB}))
+
+                    dicBudget={'done': 0}
+                    def BudgetReached(dicJob):
+                        if dicJob['state']=='done':
+                            dicBudget['done']+=1
+                            if args.budgetRed: objRed.Add(dicGeom[dicJob['id']])
+                        return bool(args.budgetN and dicBudget['done']>=args.budgetN) or bool(args.budgetRed and objRed.Reached())
+
+                    QueueJobs(objQueue, lstJob, 'Dense matching (queue)', fun=BudgetReached if args.budgetN or args.budgetRed else None)
+                    if args.budgetRed: logger.info('Redundancy: %s'% str(objRed))
+
+                j=nbPair if args.queue else 0
+                nbDone=0
+                #while j<nbPair//2:
+                #j=nbPair//2+1
+                while j<nbPair:
+                    if args.budgetN and nbDone>=args.budgetN: 
+                        logger.info('Pair budget reached (%i)'% nbDone)
+                        break
+                    if args.budgetRed and objRed.Reached():
+                        logger.info('Redundancy budget reached: %s'% str(objRed))
+                        break
+                    procBar.ViewBar(j)
+                    strJ=str(objBlocks.lstBCouple[0][j]['id']).rjust(5,'0')
+                    TelemetryFunc.SetContext(pair=strJ, stage='Dense matching preparation')
+
+                    pathPcLas=objPath.prefStereoDM+objPath.extPC.format(strJ)
+                    if os.path.exists(pathPcLas): os.remove(pathPcLas)
+
+                    lstId=sorted(objBlocks.lstBCouple[0][j]['properties']['scenes'].split(';'))
+
+                    # Admission
+                    if not objRes.Admit(lstFeatRes[j]):
+                        logger.warning('Pair %s not admitted: %.1f GB predicted'% (strJ, objRes.Predict(lstFeatRes[j])[0,0]/1024**3))
+                        objBlocks.lstBCouple[0][j]['properties']['admitted']=False
+                        j+=1
+                        continue
+                    objScratch.Clean()
+                    if not objScratch.Check(lstFeatRes[j]['mpxl']*1e6*dicScratch['bytePxl']):
+                        logger.warning('Pair %s not admitted: scratch space too small (%.2f GB free)'% (strJ, objScratch.Free()/1024**3))
+                        objBlocks.lstBCouple[0][j]['properties']['admitted']=False
+                        j+=1
+                        continue
+                    pairShm=objShm
+                    if objShm:
+                        objShm.Close()
+                        if not objShm.Check(lstFeatRes[j]['mpxl']*1e6*dicShm['bytePxl']):
+                            logger.warning('Pair %s: shared memory too small (%.2f GB free), files used'% (strJ, objShm.Free()/1024**3))
+                            pairShm=None
+                    objScratch.Mark()
+                    objMon.Start()
+                
+                    #if not objBlocks.lstBCouple[0][j]['id']==262: 
+                    #    j+=1
+                    #    continue
+                    #logger.info('j: %s'% strJ)
+                    #if not input('Ready? (1/0)'): continue
+                    #---------------------------------------------------------------
+                    # Left or Right Ref
+                    #---------------------------------------------------------------
+                    tupPref=(objPath.prefProcDM+'Left', objPath.prefProcDM+'Right')
+                    tupLstPath=([(os.path.join(objPath.pProcData, objPath.extFeat1B.format(idImg)),
+                                  os.path.join(objPath.pProcData, objPath.nTsai[2].format(idImg)),
+                                    )
+                                        for idImg in lstId],
+                                [(os.path.join(objPath.pProcData, objPath.extFeat1B.format(idImg)),
+                                  os.path.join(objPath.pProcData, objPath.nTsai[2].format(idImg)),
+                                   )
+                                       for idImg in sorted(lstId, reverse=True)]
                                 )
-                                    for idImg in lstId],
-                            [(os.path.join(objPath.pProcData, objPath.extFeat1B.format(idImg)),
-                              os.path.join(objPath.pProcData, objPath.nTsai[2].format(idImg)),
-                               )
-                                   for idImg in sorted(lstId, reverse=True)]
-                            )
-                #---------------------------------------------------------------
-                # Epipolar images
-                #---------------------------------------------------------------
-                epipMode=True
-                if glob(objPath.prefProcDM+'*'): os.system('rm %s*'% objPath.prefProcDM)
-                prepaProc=MSSFunc.EpipPreProc( tupLstPath[0], 
-                                            objBlocks.lstBCouple[0][j]['geometry'], 
-                                            args.dem,  
-                                            tupPref[0],
-                                            epip=epipMode,
-                                            geomAoi=geomAoi['geometry'],
-                                            )
+                    #---------------------------------------------------------------
+                    # Epipolar images
+                    #---------------------------------------------------------------
+                    epipMode=True
+                    TelemetryFunc.SetContext(stage='Epipolar images')
+                    prepaProc=MSSFunc.EpipPreProc( tupLstPath[0], 
+                                                objBlocks.lstBCouple[0][j]['geometry'], 
+                                                args.dem,  
+                                                tupPref[0],
+                                                epip=epipMode,
+                                                geomAoi=geomAoi['geometry'],
+                                                crop=args.epipFrame=='overlap',
+                                                imgStore=objStore,
+                                                shm=pairShm,
+                                                write=pairShm is None,
+                                                quant=args.matcher=='sgm' and args.triang=='native',
+                                                )
                     
-                # Does not attempt though matches yet
-                if prepaProc:
-                    FailedDM(pathPcLas, strJ)
-                    j+=1
-                    continue
-
-                #---------------------------------------------------------------
-                # Disparities
-                #---------------------------------------------------------------
-                out=0
-                for i in range(2):
-                    prefOut=tupPref[i]
-                    lstPath=tupLstPath[i]
+                    # Does not attempt though matches yet
+                    if prepaProc:
+                        FailedDM(pathPcLas, strJ, objMon=objMon)
+                        j+=1
+                        continue
+                    if pairShm:
+                        nbPxlEpip=int(np.prod(pairShm.Desc(tupPref[0]+'-L.tif')['shape']))
+                    else:
+                        with rasterio.open(tupPref[0]+'-L.tif') as imgIn:
+                            nbPxlEpip=imgIn.width*imgIn.height
+                    dispRes=None
+
+                    #---------------------------------------------------------------
+                    # Disparity search range
+                    #---------------------------------------------------------------
+                    TelemetryFunc.SetContext(stage='Disparity search range')
+                    lstCorrSearch=[None, None]
+                    if epipMode:
+                        lstRange=MSSFunc.DispRange((tupPref[0]+'-L.tsai', tupPref[0]+'-R.tsai'), 
+                                                   objBlocks.lstBCouple[0][j]['geometry'], 
+                                                   args.dem)
+                        if lstRange: dispRes=lstRange[2]-lstRange[0]
+                        if args.corrSearch=='dem':
+                            if lstRange: lstCorrSearch=[lstRange, [-lstRange[2], -lstRange[3], -lstRange[0], -lstRange[1]]]
+                            objBlocks.lstBCouple[0][j]['properties']['corrSearch']=lstRange
+
+                    #---------------------------------------------------------------
+                    # Disparities
+                    #---------------------------------------------------------------
+                    TelemetryFunc.SetContext(stage='Disparities')
+                    out=0
+                    nbRun=1+(not args.lrc=='sparse')
+                    for i in range(nbRun):
+                        prefOut=tupPref[i]
+                        lstPath=tupLstPath[i]
                     
-                    out+=asp.parallel_stereo(MSSFunc.SubArgs_Stereo(lstPath, prefOut, epip=epipMode)+['--stop-point', '5',]) 
-                    #os.system('cp %s %s'% (prefOut+'-F.tif', prefOut+'-F_init.tif'))
-                    if out: break
+                        if args.matcher=='sgm' and epipMode:
+                            out+=SGMFunc.MatchPair(prefOut, corrSearch=lstCorrSearch[i], shm=pairShm, write=pairShm is None)
+                        else:
+                            out+=asp.parallel_stereo(MSSFunc.SubArgs_Stereo(lstPath, prefOut, epip=epipMode, corrSearch=lstCorrSearch[i])+['--stop-point', '5',]) 
+                        #os.system('cp %s %s'% (prefOut+'-F.tif', prefOut+'-F_init.tif'))
+                        if out: break
+                        if nbRun==1: break
+
+                        # Sparse check on the forward disparity for comparison
+                        if not i and args.lrc=='both':
+                            dicLrc, maskSparse=MSSFunc.SparseLRC(tupPref[0], write=False)
+                            with rasterio.open(tupPref[0]+'-F.tif') as imgIn:
+                                maskFwd=imgIn.read(3)>0
                     
-                    # Switch epipolar images
-                    nameImgASP=(('-L.tif', '-L.tsai', '-lMask.tif', '-L_sub.tif', '-lMask_sub.tif'),
-                             ('-R.tif', '-R.tsai', '-rMask.tif', '-R_sub.tif', '-rMask_sub.tif'))[::1-2*i]
-                    cmd=[]
-                    for k in range(2):
-                        for l in range(5):
-                            ext=''
-                            if not k: ext='tmp'
-                            cmd.append('mv %s %s'% (tupPref[i]+nameImgASP[k][l], tupPref[(i-1)%2]+nameImgASP[(k-1)%2][l]+ext))
-                    cmd+=['mv %s %s'% (cmd[l].split()[-1], cmd[l].split()[-1][:-3]) for l in range(5)]
-                    os.system(' ; '.join(cmd))
+                        # Switch epipolar images
+                        nameImgASP=(('-L.tif', '-L.tsai', '-lMask.tif', '-L_sub.tif', '-lMask_sub.tif'),
+                                 ('-R.tif', '-R.tsai', '-rMask.tif', '-R_sub.tif', '-rMask_sub.tif'))[::1-2*i]
+                        cmd=[]
+                        for k in range(2):
+                            for l in range(5):
+                                ext=''
+                                if not k: ext='tmp'
+                                cmd.append('mv %s %s'% (tupPref[i]+nameImgASP[k][l], tupPref[(i-1)%2]+nameImgASP[(k-1)%2][l]+ext))
+                        cmd+=['mv %s %s'% (cmd[l].split()[-1], cmd[l].split()[-1][:-3]) for l in range(5)]
+                        os.system(' ; '.join(cmd))
                     
-                if out: 
-                    logger.error('ASP stereo Failed at %i'% i)
-                    FailedDM(pathPcLas, strJ, lstPrefClean=[tupPref[0], ])
-                    if i: FailedDM(pathPcLas, strJ, lstPrefClean=[tupPref[1],])
-                    j+=1
-                    continue
-
-                #---------------------------------------------------------------
-                # merge Disparities
-                #---------------------------------------------------------------
-                prefOut=tupPref[0]
-                lstPath=tupLstPath[0]
-
-                pathDispMean=MSSFunc.MergeDisparities(tupPref[0], tupPref[1], gdal)
-                if not pathDispMean: 
-                    FailedDM(pathPcLas, strJ, lstPrefClean=tupPref)
-                    j+=1
-                    continue
+                    if out: 
+                        logger.error('ASP stereo Failed at %i'% i)
+                        FailedDM(pathPcLas, strJ, lstPrefClean=[tupPref[0], ], objMon=objMon)
+                        if i: FailedDM(pathPcLas, strJ, lstPrefClean=[tupPref[1],], objMon=objMon)
+                        j+=1
+                        continue
+
+                    #---------------------------------------------------------------
+                    # merge Disparities
+                    #---------------------------------------------------------------
+                    TelemetryFunc.SetContext(stage='Merge disparities')
+                    prefOut=tupPref[0]
+                    lstPath=tupLstPath[0]
+
+                    if args.lrc=='sparse':
+                        dicLrc=MSSFunc.SparseLRC(tupPref[0], shm=pairShm)[0]
+                        objBlocks.lstBCouple[0][j]['properties']['lrc']=dicLrc
+                    else:
+                        pathDispMean=MSSFunc.MergeDisparities(tupPref[0], tupPref[1], gdal)
+                        if not pathDispMean: 
+                            FailedDM(pathPcLas, strJ, lstPrefClean=tupPref, objMon=objMon)
+                            j+=1
+                            continue
+                        if args.lrc=='both':
+                            dicLrc.update(MSSFunc.CompareLRC(maskFwd, maskSparse, pathDispMean))
+                            objBlocks.lstBCouple[0][j]['properties']['lrc']=dicLrc
+                            logger.info('LRC sparse vs full: %s'% str(dicLrc))
+                            del maskFwd, maskSparse
                 
-                out=asp.parallel_stereo(MSSFunc.SubArgs_Stereo(lstPath, prefOut, epip=epipMode)+['--entry-point', '5',])
-                pathPcTif=prefOut+'-PC.tif'
-                if not os.path.exists(pathPcTif): 
-                    FailedDM(pathPcLas, strJ, lstPrefClean=tupPref)
-                    j+=1
-                    continue
-
-                #asp.point2dem(MSSFunc.SubArgs_P2D(pathPcTif, args.epsg))     
-                #os.system('mv %s %s'% (prefOut+'-DEM.tif', objPath.prefStereoDM+'-DEM-%i.tif'% j,))
-                #sys.exit()  
+                    TelemetryFunc.SetContext(stage='Triangulation')
+                    if args.triang=='native' and epipMode:
+                        out=TriangFunc.Triangulate(prefOut, (prefOut+'-L.tsai', prefOut+'-R.tsai'), shm=pairShm, write=pairShm is None)
+                    else:
+                        out=asp.parallel_stereo(MSSFunc.SubArgs_Stereo(lstPath, prefOut, epip=epipMode)+['--entry-point', '5',])
+                    pathPcTif=prefOut+'-PC.tif'
+                    if out or not (os.path.exists(pathPcTif) or (pairShm and pathPcTif in pairShm)): 
+                        FailedDM(pathPcLas, strJ, lstPrefClean=tupPref, objMon=objMon)
+                        j+=1
+                        continue
+
+                    #asp.point2dem(MSSFunc.SubArgs_P2D(pathPcTif, args.epsg))     
+                    #os.system('mv %s %s'% (prefOut+'-DEM.tif', objPath.prefStereoDM+'-DEM-%i.tif'% j,))
+                    #sys.exit()  
                 
-                #---------------------------------------------------------------
-                # Save Process
-                #---------------------------------------------------------------
-                pathTxt=MSSFunc.AspPc2Txt(pathPcTif)
-                if type(pathTxt)==int: 
-                    FailedDM(pathPcLas, strJ, lstPrefClean=tupPref)
-                    j+=1
-                    continue
+                    #---------------------------------------------------------------
+                    # Save Process
+                    #---------------------------------------------------------------
+                    TelemetryFunc.SetContext(stage='Save process')
+                    pathTxt=MSSFunc.AspPc2Txt(pathPcTif, shm=pairShm)
+                    if type(pathTxt)==int: 
+                        FailedDM(pathPcLas, strJ, lstPrefClean=tupPref, objMon=objMon)
+                        j+=1
+                        continue
                 
-                subArgs=[objPath.pJsonSource,
-                         '--readers.text.filename=%s'% pathTxt,
-                         '--writers.las.filename=%s'% pathPcLas,
-                         '--filters.reprojection.out_srs="EPSG:%s"'% args.epsg,
-                         '--stage.source.value="PointSourceId=%i"'% (objBlocks.lstBCouple[0][j]['id']+1),
-                         '--stage.angle.value="ScanAngleRank=%i"'% int(round(MSSFunc.BRratio(lstPath[0][1], lstPath[1][1], atype='deg'))),
-                         ]
-                pdal.pipeline(subArgs)
+                    subArgs=[objPath.pJsonSource,
+                             '--readers.text.filename=%s'% pathTxt,
+                             '--writers.las.filename=%s'% pathPcLas,
+                             '--filters.reprojection.out_srs="EPSG:%s"'% args.epsg,
+                             '--stage.source.value="PointSourceId=%i"'% (objBlocks.lstBCouple[0][j]['id']+1),
+                             '--stage.angle.value="ScanAngleRank=%i"'% int(round(MSSFunc.BRratio(lstPath[0][1], lstPath[1][1], atype='deg'))),
+                             ]
+                    pdal.pipeline(subArgs)
                 
-                #---------------------------------------------------------------
-                # Save geometry
-                #---------------------------------------------------------------
-                objBlocks.lstBCouple[0][j]['properties']['DmProcess']=True
+                    #---------------------------------------------------------------
+                    # Save geometry
+                    #---------------------------------------------------------------
+                    objBlocks.lstBCouple[0][j]['properties']['DmProcess']=True
+                    nbDone+=1
+                    peakRes, wallRes=objMon.Stop()
+                    # Scratch written by the pair
+                    sizeScratch=objScratch.Written()
+                    objBlocks.lstBCouple[0][j]['properties']['scratchWrite']=round(sizeScratch/1024**2, 1)
+                    # Measured epipolar features (admission uses their estimates)
+                    objRes.Record(ResourceFunc.PairFeatures(lstFeatRes[j]['area'], nbPxl=nbPxlEpip, dispRange=dispRes or lstFeatRes[j]['disp']),
+                                  peakRes, wallRes, id=strJ, scratchWrite=sizeScratch, mpxlEst=lstFeatRes[j]['mpxl'], dispEst=lstFeatRes[j]['disp'])
+                    objBlocks.lstBCouple[0][j]['properties']['resources']=[round(peakRes/1024**3, 2), round(wallRes)]
+                    if args.budgetRed: objRed.Add(objBlocks.lstBCouple[0][j]['geometry'])
                 
-                with open(objPath.pStereoDM,'w') as fileGeojson:
-                    fileGeojson.write(json.dumps({key:objGeojsonSDM[key] for key in objGeojsonSDM if not key=="Features"}, indent=2)[:-2])
-                    fileGeojson.write(',\n  "Features":[\n')
-                    for k in range(len(objGeojsonSDM["Features"])):
-                        lineEnd=',\n'
-                        if not k: lineEnd=''
-                        fileGeojson.write(lineEnd+json.dumps(objGeojsonSDM["Features"][k]))
-
-                    for k in range(nbPair):
-                        lineEnd=',\n'
-                        if not k and not objGeojsonSDM["Features"]: lineEnd=''
-                        fileGeojson.write(lineEnd+json.dumps(objBlocks.lstBCouple[0][k]))
-
-                    fileGeojson.write(']\n}')
-
-                #---------------------------------------------------------------
-                # Clean folder
-                #---------------------------------------------------------------
-                cmd='rm -r '+objPath.prefProcDM+'*'
-                os.system(cmd)
-                j+=1
+                    WriteJournal(objPath.pStereoDM, objBlocks.lstBCouple[0])
+
+                    #---------------------------------------------------------------
+                    # Clean folder
+                    #---------------------------------------------------------------
+                    objScratch.Clean()
+                    logger.info('Scratch: %.1f MB written by pair %s'% (sizeScratch/1024**2, strJ))
+                    if pairShm: logger.info('Shared memory: %.1f MB released by pair %s'% (pairShm.Close()/1024**2, strJ))
+                    j+=1
+                objMon.Stop()
             
             # Clean Docker system /!\ If parallel process, it prunes all existing containers
             #os.popen('sudo docker container prune --force ; sudo docker volume prune --force')
+            if iProc <= lstProcLvl.index('dm'): continue
+
             #---------------------------------------------------------------
             # Point cloud summary
             #---------------------------------------------------------------
             logger.info('# Point cloud summary')
+            TelemetryFunc.SetContext(pair=None, stage='Point cloud summary')
 
             lstPCpath=glob(objPath.prefStereoDM+objPath.extPC.format('*'))
             if not lstPCpath: raise RuntimeError("No created point clouds")
@@ -372,6 +632,7 @@ if __name__ == "__main__":
             procBar=ProcessStdout(name='Summary computation',inputCur=len(lstPCpath))
             lstPCiEmpty=[]
             nbPts, lstBounds=0, False
+            dicPcBounds={}
             for i in range(nbFile):
                 procBar.ViewBar(i)
                 
@@ -392,6 +653,7 @@ if __name__ == "__main__":
 
                 # Boundaries
                 bnds=jsonInfo['summary']['bounds']
+                dicPcBounds[pathPc]=[bnds['minx'], bnds['miny'], bnds['maxx'], bnds['maxy']]
                 if not lstBounds:
                     lstBounds=[bnds['minx'], bnds['miny'], bnds['maxx'], bnds['maxy']]
                 else:
@@ -405,16 +667,31 @@ if __name__ == "__main__":
             checkMerged, coordMid=MSSFunc.PC_Summary(lstPCpath, lstPCiEmpty, lstBounds, nbPts, objPath.pPcFullList)
             
             #---------------------------------------------------------------
-            # Point cloud tiling
+            # Tile dependencies
             #---------------------------------------------------------------
             grepTile=objPath.pPcFullTile.replace('#', '*')
-            if not checkMerged:
+            bufferTile=2*gsdDsm+gsdDsm/2
+            objTileIdx=TileFunc.TileIndex(objPath.pTileIndex, bufferTile)
+            checkIncrem=bool(objTileIdx.dicPair) and bool(glob(grepTile))
+            setDirty=objTileIdx.Update(dicPcBounds)
+            # Native filtering reads neighbour tiles: their filtered and DSM tiles are stale too
+            setStale=set(setDirty)
+            if args.fltEngine=='native': setStale|=TileFunc.NeighbourKeys(setDirty)
+            lstDsmUpdate=[objPath.pDsmTile.format(strKey) for strKey in setStale] if checkIncrem else None
+            logger.info('Tile index: %s (%i dirty)'% (str(objTileIdx), len(setDirty)))
+
+            #---------------------------------------------------------------
+            # Point cloud tiling
+            #---------------------------------------------------------------
+            if not checkMerged and not checkIncrem:
                 logger.info('# Point cloud tiling')
+                TelemetryFunc.SetContext(stage='Point cloud tiling')
                 with open(objPath.pPcFullList, 'w') as fileOut:
                     fileOut.writelines([line+'\n' for line in lstPCpath])
 
                 # Clear folder
                 if glob(grepTile): os.system('rm %s'% grepTile)
+                [os.remove(pathCur) for pathCur in glob(objPath.pPcFltTile.format('*'))+glob(objPath.pDsmTile.format('*'))]
                 
                 # Link to correct files
                 prefLink=os.path.join(objPath.pPcFullDir, os.path.basename(objPath.prefStereoDM))
@@ -425,7 +702,7 @@ if __name__ == "__main__":
                          '"%s"'% objPath.pPcFullTile,
                          '--out_srs="EPSG:%s"'% args.epsg,
                          '--length', '1000', # cell length
-                         '--buffer', str(2*gsdDsm+gsdDsm/2),
+                         '--buffer', str(bufferTile),
                          '--origin_x', str(coordMid[0]),
                          '--origin_y', str(coordMid[1]),
                          ]
@@ -433,6 +710,40 @@ if __name__ == "__main__":
                 
                 os.system('rm %s*'% prefLink)
             
+            elif setDirty:
+                logger.info('# Point cloud tiling (%i dirty tiles)'% len(setDirty))
+                TelemetryFunc.SetContext(stage='Point cloud tiling')
+                with open(objPath.pPcFullList, 'w') as fileOut:
+                    fileOut.writelines([line+'\n' for line in lstPCpath])
+
+                dicTile=objTileIdx.Tiles()
+                lstKey=[]
+                for strKey in sorted(setDirty):
+                    [os.remove(pathCur) for pathCur in (objPath.pPcFullTile.replace('#', strKey), 
+                                                        objPath.pPcFltTile.format(strKey), 
+                                                        objPath.pDsmTile.format(strKey)) if os.path.exists(pathCur)]
+                    if not strKey in dicTile or not TileFunc.TileInAoi(strKey, geomAoiLoc): continue
+                    lstKey.append(strKey)
+                for strKey in sorted(setStale-setDirty):
+                    [os.remove(pathCur) for pathCur in (objPath.pPcFltTile.format(strKey), 
+                                                        objPath.pDsmTile.format(strKey)) if os.path.exists(pathCur)]
+
+                lstJson=[]
+                for strKey in lstKey:
+                    pathJsonCur=objPath.pJsonCrop.format(strKey)
+                    TileFunc.CropTileJson(pathJsonCur, 
+                                          dicTile[strKey], 
+                                          strKey, 
+                                          bufferTile, 
+                                          objPath.pPcFullTile.replace('#', strKey))
+                    lstJson.append(pathJsonCur)
+
+                lstOut=objExec.Gather(objExec.Map(pdal, 'pdal pipeline', [[pathJsonCur] for pathJsonCur in lstJson]))
+                if any(lstOut): logger.error('%i tile crops failed'% sum([bool(out) for out in lstOut]))
+                [os.remove(pathJsonCur) for pathJsonCur in lstJson]
+
+            objTileIdx.Save()
+
             if os.path.exists(objPath.pPcFullTile.replace('#', '0_0')):
                 MSSFunc.FilterTiles(coordMid, 
                                     glob(grepTile), 
@@ -444,41 +755,61 @@ if __name__ == "__main__":
             nbTile=len(lstTilePath)
             logger.info('%i point cloud tiles'% nbTile)
             
+            if iProc <= lstProcLvl.index('tile'): continue
+
             #---------------------------------------------------------------
             # Point cloud filtering
             #---------------------------------------------------------------
             logger.info('# Point cloud filtering')
-
-            strTemplate=objPath.pPcFullTile.split('#')
-            procBar=ProcessStdout(name='filtering per tile',inputCur=nbTile//os.cpu_count()+nbTile%os.cpu_count())
-            def Filtering(i):
-                procBar.ViewBar(i)
-                pathIn=lstTilePath[i]
-                strIndexIn=pathIn.replace(strTemplate[0],'').replace(strTemplate[1],'')
-                pathOut=objPath.pPcFltTile.format(strIndexIn)
-                if os.path.exists(pathOut): return 0
-
-                subArgs=[objPath.pJsonFilter,
-                        '--readers.las.filename=%s'% pathIn,
-                        '--writers.las.filename=%s'% pathOut]
-                return pdal.pipeline(subArgs)
-            
-            with Pool(None) as poolCur:
-                poolCur.map(Filtering, list(range(nbTile)))
-                print()
+            TelemetryFunc.SetContext(stage='Point cloud filtering')
+
+            if args.queue:
+                strTemplate=objPath.pPcFltTile.split('{}')
+                lstJob=[]
+                for pathIn, pathOut, lstPathNeigh, lstBounds in FilterPCFunc.TileArgs(lstTilePath, objPath.pPcFullTile, objPath.pPcFltTile, neigh=args.fltEngine=='native'):
+                    if os.path.exists(pathOut): continue
+                    strIndexIn=pathOut.replace(strTemplate[0],'').replace(strTemplate[1],'')
+                    if args.fltEngine=='native':
+                        payload={'engine': 'native', 'in': pathIn, 'out': [pathOut], 'neigh': lstPathNeigh, 'bounds': lstBounds, 'block': nameB}
+                    else:
+                        payload={'engine': 'pdal', 'in': pathIn, 'out': [pathOut], 'json': objPath.pJsonFilter, 'block': nameB}
+                        payload.update(dicQueueTool)
+                    lstJob.append(('flt_%s_%s'% (nameB, strIndexIn), 'filter', payload))
+                QueueJobs(objQueue, lstJob, 'Filtering (queue)')
+            elif args.fltEngine=='native':
+                lstNoise=FilterPCFunc.FilterTilesNative(lstTilePath, 
+                                                        objPath.pPcFullTile, 
+                                                        objPath.pPcFltTile)
+                logger.info('%i noise points'% sum(lstNoise))
+            else:
+                strTemplate=objPath.pPcFullTile.split('#')
+                lstSubArgs=[]
+                for pathIn in lstTilePath:
+                    strIndexIn=pathIn.replace(strTemplate[0],'').replace(strTemplate[1],'')
+                    pathOut=objPath.pPcFltTile.format(strIndexIn)
+                    if os.path.exists(pathOut): continue
+
+                    lstSubArgs.append([objPath.pJsonFilter,
+                                       '--readers.las.filename=%s'% pathIn,
+                                       '--writers.las.filename=%s'% pathOut])
+                
+                lstOut=objExec.Gather(objExec.Map(pdal, 'pdal pipeline', lstSubArgs))
+                logger.info('%i tiles filtered (%i failed)'% (len(lstOut), sum([bool(out) for out in lstOut])))
 
             lstTilePath=glob(objPath.pPcFltTile.format('*'))
             lstTilePath.sort()
             nbTile=len(lstTilePath)
             
+            if iProc <= lstProcLvl.index('filter'): continue
+
             #---------------------------------------------------------------
             # Point cloud rasterize
             #---------------------------------------------------------------
             logger.warning('# Point cloud merging')
+            TelemetryFunc.SetContext(stage='Point cloud rasterize')
             
             strTemplate=objPath.pPcFltTile.split('{}')
             
-            procBar=ProcessStdout(name='Rasterizing per tile',inputCur=nbTile//os.cpu_count()+nbTile%os.cpu_count())
             def RasterizeTiles(i):
                 procBar.ViewBar(i)
                 pathIn=lstTilePath[i]
@@ -493,21 +824,52 @@ if __name__ == "__main__":
                                           objPath.pJsonRast_WA,
                                           pdal)
 
-            with Pool(None) as poolCur:
-                poolCur.map(RasterizeTiles, list(range(nbTile)))
-                print()
+            if args.queue:
+                lstJob=[]
+                for pathIn in lstTilePath:
+                    strIndexIn=pathIn.replace(strTemplate[0],'').replace(strTemplate[1],'')
+                    pathOut=objPath.pDsmTile.format(strIndexIn)
+                    if os.path.exists(pathOut): continue
+                    payload={'in': pathIn, 'out': [pathOut], 'index': [int(s) for s in strIndexIn.split('_')], 'json': objPath.pJsonRast_WA, 'block': nameB}
+                    payload.update(dicQueueTool)
+                    lstJob.append(('rast_%s_%s'% (nameB, strIndexIn), 'raster', payload))
+                QueueJobs(objQueue, lstJob, 'Rasterizing (queue)')
+            else:
+                procBar=ProcessStdout(name='Rasterizing per tile',inputCur=nbTile//os.cpu_count()+nbTile%os.cpu_count())
+                with Pool(None) as poolCur:
+                    poolCur.map(RasterizeTiles, list(range(nbTile)))
+                    print()
+
+            if iProc <= lstProcLvl.index('raster'): continue
 
             #---------------------------------------------------------------
             # Tile merge
             #---------------------------------------------------------------
+            logger.info('# Tile merge')
+            TelemetryFunc.SetContext(stage='Tile merge')
             lstTilePath=glob(objPath.pDsmTile.format('???_????'))
-            gdal.gdal_merge(['-init', '"-32767 -32767 0"',
-                             '-a_nodata', '-32767', 
-                             '-o', objPath.pDsmFinal,
-                             ]+lstTilePath)
+            if args.mosaic=='merge':
+                gdal.gdal_merge(['-init', '"%s"'% ' '.join(map(str, dicMosaic['nodata'])),
+                                 '-a_nodata', '-32767', 
+                                 '-o', objPath.pDsmFinal,
+                                 ]+lstTilePath)
+            else:
+                dicGrid=MosaicFunc.BuildVrt(lstTilePath, objPath.pDsmVrt, lstNodata=dicMosaic['nodata'])
+                if args.mosaic=='cog' and not lstDsmUpdate==[]:
+                    MosaicFunc.RenderMosaic(objPath.pDsmVrt, objPath.pDsmFinal, dicGrid, lstUpdate=lstDsmUpdate)
+        
+        #---------------------------------------------------------------
+        # Tool command report
+        #---------------------------------------------------------------
+        objTelem=TelemetryFunc.Active()
+        if objTelem and os.path.exists(objTelem.pathRecord):
+            logger.info('# Tool command report\n'+TelemetryFunc.Report(objTelem.pathRecord, run=objTelem.idRun))
             
     #---------------------------------------------------------------
     # Exception management
     #---------------------------------------------------------------
     except RuntimeError as msg:
         logger.critical(msg)
+    finally:
+        # Executor loop thread
+        if objExec: objExec.Close()
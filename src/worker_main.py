@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+
+import os, sys, argparse, time
+import logging
+import tempfile
+from functools import partial
+from multiprocessing import Process
+from subprocess import run as Run
+from pprint import pprint
+
+# dsm_from_planetscope libraries
+from OutLib.LoggerFunc import *
+from VarCur import *
+from BlockProc import DockerLibs, MSSFunc, FilterPCFunc, CacheFunc, TelemetryFunc, QueueFunc
+
+#-------------------------------------------------------------------
+# Usage
+#-------------------------------------------------------------------
+__title__=os.path.basename(sys.argv[0]).split('.')[0]
+__author__='Valentin Schmitt'
+__version__=1.0
+parser = argparse.ArgumentParser(description='''
+%s (v%.1f by %s):
+    Main Task
+Run jobs of a distributed work queue (job directory on shared storage,
+see mss_main -queue). Start it on every host of the cluster with the
+same queue, working directory and DEM paths (same mount points). Jobs
+are leased, the lease is renewed while the job runs and a job of a dead
+worker goes back to the queue after the lease time. Several local
+workers (-n) test the distribution on one machine.
+
+**************************************************************************
+> pair: dense matching of one stereo pair (mss_main -pair, local scratch)
+> filter: point cloud filtering of one tile (native or PDAL)
+> raster: rasterisation of one filtered tile
+> cmd: generic command line
+**************************************************************************
+'''% (__title__,__version__,__author__),
+formatter_class=argparse.RawDescriptionHelpFormatter)
+#-----------------------------------------------------------------------
+# Hard arguments
+#-----------------------------------------------------------------------
+dicTool={}
+#-----------------------------------------------------------------------
+# Hard command
+#-----------------------------------------------------------------------
+def Pdal(payload):
+    '''PDAL interface of the job cache and backend (one per worker process)'''
+    keyTool=(payload.get('cache'), payload.get('backend'))
+    if not keyTool in dicTool:
+        objCache=CacheFunc.ToolCache(keyTool[0]) if keyTool[0] else None
+        dicTool[keyTool]=DockerLibs.PdalPython(cache=objCache, backend=keyTool[1])
+    if payload.get('telemetry') and not TelemetryFunc.Active(): TelemetryFunc.Open(payload['telemetry'])
+    return dicTool[keyTool]
+
+def PairJob(payload, scratch=None):
+    '''Dense matching of one stereo pair in the worker scratch (scratch: scratch directory)'''
+    if scratch is None: scratch=os.path.join(tempfile.gettempdir(), 'dsmps_scratch')
+    pathScratch=os.path.join(scratch, QueueFunc.WorkerName().replace(':', '_'))
+    lstCmd=[sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mss_main.py')]
+    return Run(lstCmd+payload['args']+['-scratch', pathScratch]).returncode
+
+def FilterJob(payload):
+    '''Point cloud filtering of one tile'''
+    TelemetryFunc.SetContext(block=payload.get('block'), stage='Point cloud filtering')
+    if payload['engine']=='native':
+        FilterPCFunc.FilterTile(payload['in'], payload['out'][0], lstPathNeigh=payload['neigh'], lstBounds=payload['bounds'])
+        return 0
+    return Pdal(payload).pipeline([payload['json'],
+                                   '--readers.las.filename=%s'% payload['in'],
+                                   '--writers.las.filename=%s'% payload['out'][0]])
+
+def RasterJob(payload):
+    '''Rasterisation of one filtered tile'''
+    TelemetryFunc.SetContext(block=payload.get('block'), stage='Point cloud rasterize')
+    return MSSFunc.PC2Raster(payload['in'], payload['out'][0], payload['index'], payload['json'], Pdal(payload))
+
+def CmdJob(payload):
+    '''Generic command line'''
+    return Run(payload['cmd'], cwd=payload.get('cwd')).returncode
+
+def RunWorker(i, dicSet):
+    '''
+    Worker loop of one local process. Settings are passed as argument:
+    processes started with spawn or forkserver do not see the main
+    script globals.
+
+    i (int): local worker index
+    dicSet (dict): worker settings (q, lease, kind, idle, nbJob, scratch)
+    out:
+        0 (int)
+    '''
+    logger=logging.getLogger(__title__)
+    if not logger.handlers: logger=SetupLogger(name=__title__)
+    objQueue=QueueFunc.JobQueue(dicSet['q'], lease=dicSet['lease'])
+    objWorker=QueueFunc.Worker(objQueue, dict(dicHandler, pair=partial(PairJob, scratch=dicSet['scratch'])))
+    logger.info('Worker %i: %s'% (i, objWorker.name))
+    objWorker.Run(lstKind=dicSet['kind'], idle=dicSet['idle'], nbJob=dicSet['nbJob'])
+    logger.info('Worker %i: %s'% (i, str(objWorker)))
+    return 0
+
+dicHandler={'pair': PairJob,
+            'filter': FilterJob,
+            'raster': RasterJob,
+            'cmd': CmdJob,
+            }
+
+#=======================================================================
+#main
+#-----------------------------------------------------------------------
+if __name__ == "__main__":
+    try:
+        print()
+        logger = SetupLogger(name=__title__)
+        #---------------------------------------------------------------
+        # Retrieval of arguments
+        #---------------------------------------------------------------
+        #Positional input
+        parser.add_argument('-q', required=True, help='Job directory (shared storage)')
+
+        #Optional arguments
+        parser.add_argument('-n', type=int, default=1, help='Local worker processes (default: 1)')
+        parser.add_argument('-kind', nargs='+', choices=list(dicHandler), default=None, help='Job kinds to run (default: None means all)')
+        parser.add_argument('-scratch', default=os.path.join(tempfile.gettempdir(), 'dsmps_scratch'), help='Local scratch directory for pair jobs, one folder per worker (default: system temporary directory)')
+        parser.add_argument('-idle', type=float, default=None, help='Stop after an idle time [s] (default: None means dicQueue, 0 means never)')
+        parser.add_argument('-nbJob', type=int, default=0, help='Stop each worker after N jobs (default: 0 means no limit)')
+        parser.add_argument('-lease', type=float, default=None, help='Job lease [s] (default: None means dicQueue)')
+        parser.add_argument('-status', action='store_true', help='Print the queue state and stop')
+
+        args = parser.parse_args()
+
+        #---------------------------------------------------------------
+        # Check input
+        #---------------------------------------------------------------
+        if not os.path.isdir(args.q): raise RuntimeError("Job directory not found")
+        if args.n<1: raise RuntimeError("Worker number must be positive")
+
+        logger.info("Arguments: " + str(vars(args)))
+        #sys.exit()
+
+        #---------------------------------------------------------------
+        # Queue state
+        #---------------------------------------------------------------
+        logger.info('# Queue state')
+        logger.info(str(QueueFunc.JobQueue(args.q)))
+        if args.status: sys.exit()
+
+        #---------------------------------------------------------------
+        # Workers
+        #---------------------------------------------------------------
+        logger.info('# Workers')
+        dicSet={key: getattr(args, key) for key in ('q', 'lease', 'kind', 'idle', 'nbJob', 'scratch')}
+        if args.n==1:
+            RunWorker(0, dicSet)
+        else:
+            lstProc=[Process(target=RunWorker, args=(i, dicSet)) for i in range(args.n)]
+            [procCur.start() for procCur in lstProc]
+            [procCur.join() for procCur in lstProc]
+        logger.info(str(QueueFunc.JobQueue(args.q)))
+
+    #---------------------------------------------------------------
+    # Exception management
+    #---------------------------------------------------------------
+    except RuntimeError as msg:
+        logger.critical(msg)
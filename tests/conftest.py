@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Test configuration: the libraries are imported from src/ as the entry
+scripts do (from BlockProc import ...).
+'''
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Tool backends (BlockProc.BackendFunc).
+'''
+from BlockProc import BackendFunc
+
+def test_split_shell_suffix():
+    assert BackendFunc.SplitArgs(['-o', '"a b"', 'c']) == (['-o', 'a b', 'c'], '')
+    # Suffix kept verbatim with several commands, quoted ';' stays in the tokens
+    assert BackendFunc.SplitArgs(['-o', "'x;y'", '; rm a ; rm b']) == (['-o', 'x;y'], 'rm a ; rm b')
+
+def test_stub_bundle_adjust(tmp_path, monkeypatch):
+    lstTok=['-o', str(tmp_path/'ba'/'run')]
+    out, strOut=BackendFunc._StubBundleAdjust(lstTok)
+    assert not out and strOut.strip()=='Termination:                      CONVERGENCE'
+    monkeypatch.setitem(BackendFunc.dicDocker, 'stubConverge', False)
+    out, strOut=BackendFunc._StubBundleAdjust(lstTok)
+    assert strOut.strip()=='Termination:                   NO_CONVERGENCE'
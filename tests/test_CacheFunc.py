@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Tool output cache: keys and hits (BlockProc.CacheFunc).
+'''
+import os
+import subprocess
+
+from BlockProc import CacheFunc, DockerLibs
+
+def _Tool(pathIn, pathOut, value):
+    '''Command runner writing value in the output'''
+    def funRun(fun, subArgs):
+        with open(pathOut, 'w') as fileOut: fileOut.write(value)
+        return 0
+    return funRun
+
+def test_key_backend(tmp_path):
+    pathIn=str(tmp_path/'in.tif')
+    with open(pathIn, 'w') as fileOut: fileOut.write('in')
+    objCache=CacheFunc.ToolCache(str(tmp_path/'cache'))
+    lstArgs=[pathIn, str(tmp_path/'out.tif')]
+    keyDocker=objCache.Key('img', 'gdal_translate', lstArgs, backend='docker')[0]
+    keyNative=objCache.Key('img', 'gdal_translate', lstArgs, backend='native')[0]
+    assert keyDocker and keyNative and not keyDocker==keyNative
+
+def test_run_backend(tmp_path):
+    pathIn, pathOut=str(tmp_path/'in.tif'), str(tmp_path/'out.tif')
+    with open(pathIn, 'w') as fileOut: fileOut.write('in')
+    objCache=CacheFunc.ToolCache(str(tmp_path/'cache'))
+    assert not objCache.Run('img', 'gdal_translate', [pathIn, pathOut], _Tool(pathIn, pathOut, 'docker'), backend='docker')
+    # Other backend: miss, the command runs
+    assert not objCache.Run('img', 'gdal_translate', [pathIn, pathOut], _Tool(pathIn, pathOut, 'native'), backend='native')
+    assert objCache.nbHit==0 and open(pathOut).read()=='native'
+    # Same backend: hit, the output is restored
+    os.remove(pathOut)
+    assert not objCache.Run('img', 'gdal_translate', [pathIn, pathOut], _Tool(pathIn, pathOut, 'none'), backend='docker')
+    assert objCache.nbHit==1 and open(pathOut).read()=='docker'
+
+def test_stub_no_cache(tmp_path):
+    objCache=CacheFunc.ToolCache(str(tmp_path/'cache'))
+    assert DockerLibs.GdalPython(cache=objCache, backend='stub').objCache is None
+    assert DockerLibs.AspPython(cache=objCache, backend='stub').objCache is None
+    assert DockerLibs.AspPython(cache=objCache, backend='native').objCache is objCache
+
+def test_key_relative_path(tmp_path, monkeypatch):
+    objCache=CacheFunc.ToolCache(str(tmp_path/'cache'))
+    lstKey=[]
+    for nameDir, value in (('a', 'in1'), ('b', 'in2'), ('c', 'in1')):
+        (tmp_path/nameDir).mkdir()
+        (tmp_path/nameDir/'in.tif').write_text(value)
+        monkeypatch.chdir(tmp_path/nameDir)
+        lstKey.append(objCache.Key('img', 'gdal_translate', ['in.tif', 'out.tif'])[0])
+    # Relative inputs are keyed by content, not by name
+    assert not lstKey[0]==lstKey[1] and lstKey[0]==lstKey[2]
+
+def test_key_image_version(tmp_path, monkeypatch):
+    pathIn=str(tmp_path/'in.tif')
+    with open(pathIn, 'w') as fileOut: fileOut.write('in')
+    objCache=CacheFunc.ToolCache(str(tmp_path/'cache'))
+    lstArgs=[pathIn, str(tmp_path/'out.tif')]
+    lstKey=[]
+    for strId in ('sha256:aaa', 'sha256:bbb'):
+        # Image upgrade: new image ID, former results are not reused
+        monkeypatch.setattr(CacheFunc, '_dicToolVersion', {})
+        monkeypatch.setattr(CacheFunc, 'Run', lambda lstCmd, **kwargs: subprocess.CompletedProcess(lstCmd, 0, stdout=strId+'\n', stderr=''))
+        lstKey.append(objCache.Key('img', 'gdal_translate', lstArgs, backend='docker')[0])
+    assert lstKey[0] and not lstKey[0]==lstKey[1]
+    assert CacheFunc.ToolVersion('img', 'gdal_translate', backend='docker')=='sha256:bbb'
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Task signatures of the incremental rebuild (BlockProc.DagFunc).
+'''
+import sys
+import importlib
+
+from BlockProc import DagFunc
+
+def _Module(tmp_path, strBody):
+    '''Write and (re)load a task module'''
+    (tmp_path/'dagtask.py').write_text('def Write(pathIn, pathOut):\n    with open(pathOut, "w") as fileOut: fileOut.write(%s)\n    return 0\n'% strBody)
+    sys.path.insert(0, str(tmp_path))
+    try:
+        sys.modules.pop('dagtask', None)
+        return importlib.import_module('dagtask')
+    finally:
+        sys.path.remove(str(tmp_path))
+
+def _Graph(tmp_path, modTask, dicParam=None):
+    pathIn, pathOut=str(tmp_path/'in.txt'), str(tmp_path/'out.txt')
+    objGraph=DagFunc.TaskGraph(str(tmp_path/'state.json'), ['s1'], nbWorker=1)
+    objTask=objGraph.Add(DagFunc.Task('t1', 's1', modTask.Write, args=(pathIn, pathOut), lstIn=[pathIn], lstOut=[pathOut], dicParam=dicParam))
+    return objGraph, objTask
+
+def _Build(tmp_path, modTask, dicParam=None):
+    objGraph, objTask=_Graph(tmp_path, modTask, dicParam)
+    objGraph.Run()
+    objGraph.Save()
+    return objGraph
+
+def test_up_to_date(tmp_path):
+    (tmp_path/'in.txt').write_text('a')
+    modTask=_Module(tmp_path, '"x"')
+    assert _Build(tmp_path, modTask).dicStatus['t1']=='done'
+    objGraph, objTask=_Graph(tmp_path, modTask)
+    assert objGraph.UpToDate(objTask)
+    (tmp_path/'in.txt').write_text('b')
+    assert not objGraph.UpToDate(objTask)
+
+def test_code_change(tmp_path):
+    (tmp_path/'in.txt').write_text('a')
+    _Build(tmp_path, _Module(tmp_path, '"x"'))
+    objGraph, objTask=_Graph(tmp_path, _Module(tmp_path, '"y"'))
+    assert not objGraph.UpToDate(objTask)
+
+def test_param_change(tmp_path):
+    (tmp_path/'in.txt').write_text('a')
+    modTask=_Module(tmp_path, '"x"')
+    _Build(tmp_path, modTask, {'dicFilterPC': {'outMeanK': 8}})
+    objGraph, objTask=_Graph(tmp_path, modTask, {'dicFilterPC': {'outMeanK': 8}})
+    assert objGraph.UpToDate(objTask)
+    objGraph, objTask=_Graph(tmp_path, modTask, {'dicFilterPC': {'outMeanK': 12}})
+    assert not objGraph.UpToDate(objTask)
+
+def test_code_hash():
+    def FunA(x): return x+1
+    def FunB(x): return x+2
+    assert DagFunc.Task.CodeHash(FunA)==DagFunc.Task.CodeHash(FunA)
+    assert not DagFunc.Task.CodeHash(FunA)==DagFunc.Task.CodeHash(FunB)
+
+def test_script_hash_modules(tmp_path):
+    (tmp_path/'Pkg').mkdir()
+    (tmp_path/'Pkg'/'__init__.py').write_text('')
+    (tmp_path/'Pkg'/'ModA.py').write_text('from Pkg import ModB\n')
+    (tmp_path/'Pkg'/'ModB.py').write_text('x=1\n')
+    (tmp_path/'run.py').write_text('import os\nfrom Pkg import ModA\n')
+    strHash=DagFunc.Task.ScriptHash(str(tmp_path/'run.py'))
+    assert DagFunc.Task.ScriptHash(str(tmp_path/'run.py'))==strHash
+    # Module imported by an imported module
+    (tmp_path/'Pkg'/'ModB.py').write_text('x=22\n')
+    assert not DagFunc.Task.ScriptHash(str(tmp_path/'run.py'))==strHash
+
+def test_select_only_shared(tmp_path):
+    objGraph=DagFunc.TaskGraph(str(tmp_path/'state.json'), ['aoi', 'blk'], nbWorker=1)
+    objGraph.Add(DagFunc.Task('aoi', 'aoi', ['true'], lstOut=[str(tmp_path/'B*'/'sel.txt')]))
+    for nameB in ('B1', 'B2'):
+        objGraph.Add(DagFunc.Task('blk:%s'% nameB, 'blk', ['true'], lstIn=[str(tmp_path/nameB/'sel.txt')], dicScope={'block': nameB}))
+    assert objGraph.Select(lstOnly=['B1'])=={'aoi', 'blk:B1'}
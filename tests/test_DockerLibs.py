@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Docker tool sessions (BlockProc.DockerLibs).
+'''
+import atexit
+import fcntl
+
+from BlockProc import DockerLibs
+
+def test_session_stop_at_exit(monkeypatch):
+    lstCmd, lstExit=[], []
+    monkeypatch.setattr(DockerLibs, 'Run', lambda lstArgs, **dicArg: lstCmd.append(lstArgs) or DockerLibs.CompletedProcess(lstArgs, 0, stdout=b'true', stderr=b''))
+    monkeypatch.setattr(DockerLibs.shutil, 'which', lambda name: '/usr/bin/docker')
+    monkeypatch.setattr(atexit, 'register', lstExit.append)
+    monkeypatch.setattr(DockerLibs.DockerSession, 'Alive', lambda self: bool(lstCmd) and lstCmd[-1][:2]==['docker', 'run'])
+    objSession=DockerLibs.DockerSession('osgeo/gdal', '/tmp/test_session')
+    assert objSession.Start()==0
+    assert lstExit==[objSession.Stop]
+    assert objSession.Stop()==0
+    assert lstCmd[-1]==['docker', 'rm', '-f', objSession.name]
+
+def test_session_kept_for_holders(monkeypatch):
+    lstCmd=[]
+    monkeypatch.setattr(DockerLibs, 'Run', lambda lstArgs, **dicArg: lstCmd.append(lstArgs) or DockerLibs.CompletedProcess(lstArgs, 0, stdout=b'true', stderr=b''))
+    monkeypatch.setattr(atexit, 'register', lambda fun: None)
+    monkeypatch.setattr(atexit, 'unregister', lambda fun: None)
+    monkeypatch.setattr(DockerLibs.DockerSession, 'Alive', lambda self: True)
+    objSession=DockerLibs.DockerSession('osgeo/gdal', '/tmp/test_holders')
+    assert objSession.Check()
+    # Another process holding the session
+    with open(objSession.pathLock+'.hold', 'a') as fileOther:
+        fcntl.flock(fileOther, fcntl.LOCK_SH)
+        assert objSession.Stop()==1
+        assert not ['docker', 'rm', '-f', objSession.name] in lstCmd
+    assert objSession.Stop()==0
+    assert lstCmd[-1]==['docker', 'rm', '-f', objSession.name]
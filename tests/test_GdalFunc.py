@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+In-process GDAL utilities (BlockProc.GdalFunc).
+'''
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from BlockProc import GdalFunc
+
+def _Strip(pathOut, x, lstValue, nodata=-32767, mask=None):
+    '''Write a one row image starting at column x'''
+    profOut={'driver': 'GTiff', 'width': len(lstValue), 'height': 1, 'count': 1, 'dtype': 'float32',
+             'nodata': nodata, 'crs': 'EPSG:32619', 'transform': from_origin(x, 1, 1, 1)}
+    with rasterio.open(pathOut, 'w', **profOut) as imgOut:
+        imgOut.write(np.array([[lstValue]], dtype=np.float32))
+        if mask is not None: imgOut.write_mask(np.array([mask], dtype=np.uint8)*255)
+    return pathOut
+
+def _Merge(tmp_path, lstPathIn, **dicArg):
+    pathOut=str(tmp_path/'merge.tif')
+    GdalFunc.Merge(lstPathIn, pathOut, nodata=-32767, lstInit=[-32767], nbWorker=2, **dicArg)
+    with rasterio.open(pathOut) as imgIn:
+        return imgIn.read(1)[0].tolist()
+
+def test_merge_source_nodata(tmp_path):
+    # Later inputs do not overwrite with their own nodata (gdal_merge without -n)
+    lstPathIn=[_Strip(str(tmp_path/'a.tif'), 0, [-32767, -32767, 1, 1]),
+               _Strip(str(tmp_path/'b.tif'), 2, [-32767, -32767, 2, 2])]
+    assert _Merge(tmp_path, lstPathIn)==[-32767, -32767, 1, 1, 2, 2]
+
+def test_merge_source_mask(tmp_path):
+    lstPathIn=[_Strip(str(tmp_path/'a.tif'), 0, [1, 1, 1, 1], nodata=None),
+               _Strip(str(tmp_path/'b.tif'), 2, [5, 5, 2, 2], nodata=None, mask=[0, 0, 1, 1])]
+    assert _Merge(tmp_path, lstPathIn)==[1, 1, 1, 1, 2, 2]
+
+def test_merge_nodata_in(tmp_path):
+    # -n overrides the input masks
+    lstPathIn=[_Strip(str(tmp_path/'a.tif'), 0, [1, 1, 1, 1]),
+               _Strip(str(tmp_path/'b.tif'), 2, [0, 0, 2, -32767])]
+    assert _Merge(tmp_path, lstPathIn, nodataIn=0)==[1, 1, 1, 1, 2, -32767]
+
+def test_merge_all_valid(tmp_path):
+    lstPathIn=[_Strip(str(tmp_path/'a.tif'), 0, [1, 1, 1, 1], nodata=None),
+               _Strip(str(tmp_path/'b.tif'), 2, [3, 3, 2, 2], nodata=None)]
+    assert _Merge(tmp_path, lstPathIn)==[1, 1, 3, 3, 2, 2]
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Stereo pair dense matching filters (BlockProc.MSSFunc).
+'''
+import numpy as np
+
+from BlockProc import MSSFunc
+
+def _Geom(x0, x1):
+    return {'type': 'Polygon', 'coordinates': [[[x0, 0], [x1, 0], [x1, 1], [x0, 1], [x0, 0]]]}
+
+def _Cam(pathOut, vectC):
+    '''Nadir TSAI camera looking down -X'''
+    with open(pathOut, 'w') as fileOut:
+        fileOut.write('\n'.join(['VERSION_4', 'PINHOLE', 'fu = 0.7', 'fv = 0.7', 'cu = 0.5', 'cv = 0.5',
+                                 'u_direction = 1 0 0', 'v_direction = 0 1 0', 'w_direction = 0 0 1',
+                                 'C = %.1f %.1f %.1f'% tuple(vectC), 'R = 0 0 -1 1 0 0 0 -1 0', 'pitch = 0.001', 'NULL'])+'\n')
+
+def test_batch_same_selection(tmp_path):
+    dicScene={'s0': ((6878137, 0, 0), 100),
+              's1': ((6878137, 100e3, 0), 110),
+              's2': ((6878137, 80e3, 0), 85), # ascending
+              's3': ((6978137, 0, 0), 100), # baseline along the view axis
+              's4': (None, 100), # no camera
+              's5': ((6878137, -90e3, 0), None), # no azimuth
+              }
+    lstFeat=[]
+    for idImg, (vectC, az) in dicScene.items():
+        if vectC: _Cam(str(tmp_path/('%s.tsai'% idImg)), vectC)
+        lstFeat.append({'id': idImg, 'properties': {} if az is None else {'sat:satellite_azimuth_mean_deg': az}})
+    lstPair=[('s0;s1', 2, _Geom(0, 1)),
+             ('s1;s0', 2, _Geom(0, 1)),
+             ('s0;s2', 2, _Geom(0, 1)),
+             ('s0;s3', 2, _Geom(0, 1)),
+             ('s1;s4', 2, _Geom(0, 1)),
+             ('s0;s1;s5', 3, _Geom(0, 1)),
+             ('s1;s5', 2, _Geom(5, 6)), # outside the AOI
+             ('s0;s5', 2, _Geom(0.5, 1.5)),
+             ('s1;s5', 2, _Geom(0, 1)), # matched before
+             ]
+    lstCouple=[{'id': j, 'geometry': geomCur, 'properties': {'scenes': strId, 'nbScene': nb}} for j, (strId, nb, geomCur) in enumerate(lstPair)]
+    lstPathPC=[str(tmp_path/('pc_%i.las'% j)) for j in range(len(lstCouple))]
+    with open(lstPathPC[-1], 'w') as fileOut: fileOut.write('Failed')
+    formTsai=str(tmp_path/'{}.tsai')
+
+    lstRef=[MSSFunc.FilterDmProces(lstFeat, coupleCur, pathPC, formTsai, _Geom(0, 2)) for coupleCur, pathPC in zip(lstCouple, lstPathPC)]
+    maskRun=MSSFunc.FilterDmBatch(lstFeat, lstCouple, lstPathPC, formTsai, _Geom(0, 2))
+    assert maskRun.tolist()==lstRef
+    assert lstRef==[True, True, False, False, False, False, False, True, False]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+DSM mosaic: VRT and incremental rendering (BlockProc.MosaicFunc).
+'''
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from BlockProc import MosaicFunc
+
+def _Tile(pathOut, x, value, size=64):
+    '''Write a DSM tile of a constant value, tiles are side by side along x'''
+    profOut={'driver': 'GTiff', 'width': size, 'height': size, 'count': 1, 'dtype': 'float32',
+             'nodata': -32767, 'crs': 'EPSG:32619', 'transform': from_origin(x*size, size, 1, 1)}
+    with rasterio.open(pathOut, 'w', **profOut) as imgOut:
+        imgOut.write(np.full((1, size, size), value, dtype=np.float32))
+    return pathOut
+
+def _Render(tmp_path, lstTile, lstUpdate=None):
+    pathVrt, pathOut=str(tmp_path/'DSM.vrt'), str(tmp_path/'DSM-Final.tif')
+    dicGrid=MosaicFunc.BuildVrt(lstTile, pathVrt)
+    nbWin=MosaicFunc.RenderMosaic(pathVrt, pathOut, dicGrid, lstUpdate=lstUpdate, nbThread=2)
+    with rasterio.open(pathOut) as imgIn:
+        return nbWin, imgIn.read(1)
+
+def test_full_render(tmp_path):
+    lstTile=[_Tile(str(tmp_path/('t%i.tif'% i)), i, i+1) for i in range(3)]
+    _, matOut=_Render(tmp_path, lstTile)
+    assert matOut.shape==(64, 192)
+    assert [matOut[0, 64*i] for i in range(3)]==[1, 2, 3]
+
+def test_update_changed_tile(tmp_path):
+    lstTile=[_Tile(str(tmp_path/('t%i.tif'% i)), i, i+1) for i in range(3)]
+    _Render(tmp_path, lstTile)
+    _Tile(lstTile[1], 1, 20)
+    _, matOut=_Render(tmp_path, lstTile, lstUpdate=[lstTile[1]])
+    assert [matOut[0, 64*i] for i in range(3)]==[1, 20, 3]
+
+def test_update_removed_tile(tmp_path):
+    lstTile=[_Tile(str(tmp_path/('t%i.tif'% i)), i, i+1) for i in range(3)]
+    _Render(tmp_path, lstTile)
+    # Middle tile removed, grid unchanged: its pixels must become nodata
+    os.remove(lstTile[1])
+    nbWin, matOut=_Render(tmp_path, [lstTile[0], lstTile[2]], lstUpdate=[])
+    assert nbWin
+    assert [matOut[0, 64*i] for i in range(3)]==[1, -32767, 3]
+
+def test_band_nodata(tmp_path):
+    # 3 band tiles with a gap: uncovered pixels as gdal_merge -init "-32767 -32767 0"
+    os.makedirs(tmp_path/'a.tif')
+    lstTile=[]
+    for i in (0, 2):
+        profOut={'driver': 'GTiff', 'width': 64, 'height': 64, 'count': 3, 'dtype': 'float32',
+                 'nodata': -32767, 'crs': 'EPSG:32619', 'transform': from_origin(i*64, 64, 1, 1)}
+        lstTile.append(str(tmp_path/'a.tif'/('t%i.tif'% i)))
+        with rasterio.open(lstTile[-1], 'w', **profOut) as imgOut:
+            imgOut.write(np.full((3, 64, 64), 5, dtype=np.float32))
+    pathVrt, pathOut=str(tmp_path/'a.tif'/'DSM.vrt'), str(tmp_path/'a.tif'/'DSM-Final.TIFF')
+    dicGrid=MosaicFunc.BuildVrt(lstTile, pathVrt, lstNodata=(-32767, -32767, 0))
+    MosaicFunc.RenderMosaic(pathVrt, pathOut, dicGrid, nbThread=2)
+    with rasterio.open(pathOut) as imgIn:
+        assert list(imgIn.read()[:, 0, 64])==[-32767, -32767, 0]
+        assert list(imgIn.read()[:, 0, 0])==[5, 5, 5]
+    assert sorted(os.listdir(tmp_path/'a.tif'))==['DSM-Final.TIFF', 'DSM.vrt', 't0.tif', 't2.tif']
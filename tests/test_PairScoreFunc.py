@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Pair ranking and redundancy budget (BlockProc.PairScoreFunc).
+'''
+from BlockProc import PairScoreFunc
+
+def _Geom(x0, x1):
+    return {'type': 'Polygon', 'coordinates': [[[x0, 0], [x1, 0], [x1, 1], [x0, 1], [x0, 0]]]}
+
+def _Cam(pathOut, y):
+    '''Nadir TSAI camera 500 km above the equator'''
+    with open(pathOut, 'w') as fileOut:
+        fileOut.write('\n'.join(['VERSION_4', 'PINHOLE', 'fu = 0.7', 'fv = 0.7', 'cu = 0.5', 'cv = 0.5',
+                                  'u_direction = 1 0 0', 'v_direction = 0 1 0', 'w_direction = 0 0 1',
+                                  'C = 6878137 %.1f 0'% y, 'R = 0 1 0 0 0 1 -1 0 0', 'pitch = 0.001', 'NULL'])+'\n')
+
+def _Pairs(tmp_path, dicBase):
+    '''One pair per base [m] between a scene at 0 and a scene at the base'''
+    lstFeat, lstCouple=[{'id': 's0', 'properties': {}}], []
+    _Cam(str(tmp_path/'s0.tsai'), 0)
+    for j, (idImg, base) in enumerate(dicBase.items()):
+        _Cam(str(tmp_path/('%s.tsai'% idImg)), base)
+        lstFeat.append({'id': idImg, 'properties': {}})
+        lstCouple.append({'id': j, 'geometry': _Geom(0, 1), 'properties': {'scenes': 's0;%s'% idImg}})
+    return lstFeat, lstCouple, str(tmp_path/'{}.tsai')
+
+def test_score_order(tmp_path):
+    lstFeat, lstCouple, formTsai=_Pairs(tmp_path, {'s1': 10e3, 's2': 150e3, 's3': 1000e3})
+    matScore=PairScoreFunc.PairScore(lstFeat, lstCouple, formTsai, _Geom(0, 1))
+    # B/H 0.3 beats a narrow base (height error) and a wide one (match probability)
+    assert matScore[:,2].argsort().tolist()==[0, 1, 2]
+    assert matScore[:,0].argmax()==1
+    assert matScore[0,5]>matScore[1,5]>matScore[2,5]
+
+def test_score_history(tmp_path):
+    lstFeat, lstCouple, formTsai=_Pairs(tmp_path, {'s1': 150e3, 's2': 150e3, 's3': 150e3})
+    dicHist={'s2': [1, 2], 's3': [0, 1]}
+    matScore=PairScoreFunc.PairScore(lstFeat, lstCouple, formTsai, _Geom(0, 1), dicHist=dicHist)
+    # No history > 1 failure in 2 > 1 failure in 1
+    assert matScore[0,0]>matScore[1,0]>matScore[2,0]>0
+    assert abs(matScore[1,4]/matScore[0,4]-0.5)<1e-9
+
+def test_redundancy_cover():
+    objRed=PairScoreFunc.Redundancy(_Geom(0, 1), 2, cover=0.95)
+    objRed.Add(_Geom(0, 0.97))
+    assert not objRed.Reached()
+    objRed.Add(_Geom(0.05, 1))
+    # 92% of the AOI covered twice
+    assert abs(objRed.Ratio()-0.92)<1e-9 and not objRed.Reached()
+    objRed.Add(_Geom(0, 0.1))
+    assert objRed.Reached()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Job leases of the work queue (BlockProc.QueueFunc).
+'''
+import time
+
+from BlockProc import QueueFunc
+
+def _Queue(tmp_path, lease=0.2, maxTry=3):
+    objQueue=QueueFunc.JobQueue(str(tmp_path/'queue'), lease=lease, maxTry=maxTry)
+    objQueue.Submit('job1', 'dm', {'out': []})
+    return objQueue
+
+def test_lease_complete(tmp_path):
+    objQueue=_Queue(tmp_path, lease=60)
+    dicJob=objQueue.Lease('w1')
+    assert dicJob['try']==1 and objQueue.Lease('w2') is None
+    assert objQueue.Renew(dicJob)
+    assert objQueue.Complete(dicJob, {'out': 0})
+    dicRec=objQueue.Result('job1')
+    assert dicRec['state']=='done' and dicRec['worker']=='w1' and dicRec['result']=={'out': 0}
+    assert not objQueue.Complete(dicJob, {'out': 0})
+
+def test_lease_expiry(tmp_path):
+    objQueue=_Queue(tmp_path)
+    dicOld=objQueue.Lease('w1')
+    time.sleep(0.3)
+    dicNew=objQueue.Lease('w2')
+    assert dicNew['try']==2 and dicNew['worker']=='w2'
+    assert not objQueue.Renew(dicOld)
+    assert objQueue.Fail(dicOld, 'late') is None
+    assert objQueue.Status()['leased']==1
+
+def test_stale_complete(tmp_path):
+    objQueue=_Queue(tmp_path)
+    dicOld=objQueue.Lease('w1')
+    time.sleep(0.3)
+    # Expired and back to pending: the late result is dropped
+    with QueueFunc.FileLock(objQueue.pLock): objQueue._Expire()
+    assert not objQueue.Complete(dicOld, {'out': 0})
+    assert objQueue.Status()['pending']==1
+    # Leased again: only the new holder completes it
+    dicNew=objQueue.Lease('w2')
+    assert not objQueue.Complete(dicOld, {'out': 0})
+    assert objQueue.Complete(dicNew, {'out': 0})
+    assert objQueue.Result('job1')['worker']=='w2'
+
+def test_max_try(tmp_path):
+    objQueue=_Queue(tmp_path, lease=60, maxTry=2)
+    assert objQueue.Fail(objQueue.Lease('w1'), 'error')=='pending'
+    assert objQueue.Fail(objQueue.Lease('w1'), 'error')=='failed'
+    assert objQueue.Result('job1')['state']=='failed'
+
+def test_worker_spawn(tmp_path):
+    # Spawned worker processes do not inherit the worker_main globals
+    import sys
+    import multiprocessing
+    import worker_main
+    objQueue=QueueFunc.JobQueue(str(tmp_path/'queue'), lease=60)
+    pathOut=str(tmp_path/'out.txt')
+    objQueue.Submit('cmd1', 'cmd', {'cmd': [sys.executable, '-c', 'open(%r, "w").write("ok")'% pathOut], 'out': [pathOut]})
+    dicSet={'q': str(tmp_path/'queue'), 'lease': 60, 'kind': None, 'idle': 5, 'nbJob': 1, 'scratch': str(tmp_path/'scratch')}
+    procCur=multiprocessing.get_context('spawn').Process(target=worker_main.RunWorker, args=(0, dicSet))
+    procCur.start()
+    procCur.join(60)
+    assert procCur.exitcode==0
+    assert objQueue.Result('cmd1')['state']=='done' and open(pathOut).read()=='ok'
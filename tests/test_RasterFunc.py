@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Raster policy and quantised intermediates (BlockProc.RasterFunc).
+'''
+import numpy as np
+import rasterio
+
+from BlockProc import RasterFunc
+
+def test_quantised_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setitem(RasterFunc.dicRasterPolicy, 'quantRadio', 'uint16')
+    pathOut=str(tmp_path/'img.tif')
+    matIn=np.linspace(0, 1000, 64*64, dtype=np.float32).reshape(64, 64)
+    assert RasterFunc.WriteRaster(pathOut, matIn, radio=True)
+    with rasterio.open(pathOut) as imgIn:
+        assert imgIn.dtypes[0]=='uint16' and imgIn.scales[0]>0
+    assert np.allclose(RasterFunc.ReadRaster(pathOut, band=1), matIn, atol=1000/65535)
+    # Not a radiometric intermediate: float32 kept
+    assert RasterFunc.WriteRaster(pathOut, matIn)
+    with rasterio.open(pathOut) as imgIn:
+        assert imgIn.dtypes[0]=='float32' and imgIn.scales[0]==1
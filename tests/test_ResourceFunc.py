@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Stereo pair resource model (BlockProc.ResourceFunc).
+'''
+import sys
+import time
+import numpy as np
+from subprocess import Popen
+
+from BlockProc import ResourceFunc
+
+def test_tree_rss_child():
+    sizeBase=ResourceFunc.TreeRss()
+    assert sizeBase>0
+    procCur=Popen([sys.executable, '-c', 'import time; a=bytearray(200*1024**2); time.sleep(3)'])
+    try:
+        time.sleep(1.5)
+        assert ResourceFunc.TreeRss()-sizeBase>150*1024**2
+        assert ResourceFunc.TreeRss(procCur.pid)>150*1024**2
+    finally:
+        procCur.kill()
+        procCur.wait()
+
+def test_monitor_stop():
+    objMon=ResourceFunc.ResourceMonitor()
+    objMon.Start()
+    matBig=bytearray(100*1024**2)
+    peak, wall=objMon.Stop()
+    assert peak>=100*1024**2 and wall>=0
+    assert objMon.Stop()==(peak, wall)
+
+def test_fit_measured_features(tmp_path):
+    objRes=ResourceFunc.ResourceModel(str(tmp_path/'res.jsonl'))
+    lstFeat=[ResourceFunc.PairFeatures(area, nbPxl=nbPxl*1e6, dispRange=disp)
+                for area, nbPxl, disp in ((10, 40, 100), (20, 60, 300), (40, 50, 150), (80, 90, 80), (160, 70, 250), (320, 120, 120))]
+    for dicFeat in lstFeat: objRes.Record(dicFeat, (1+dicFeat['mpxl']*dicFeat['disp']/100*0.05)*1024**3, 60)
+    assert objRes.lstRec[0]['mpxl']==40 and objRes.lstRec[0]['disp']==100
+    assert abs(objRes.Predict(lstFeat[2])[0,0]/ResourceFunc.dicResource['safety']-(1+50*1.5*0.05)*1024**3)<1e-3*1024**3
+
+def test_fit_non_negative(tmp_path):
+    objRes=ResourceFunc.ResourceModel(str(tmp_path/'res.jsonl'))
+    lstFeat=[ResourceFunc.PairFeatures(area, nbPxl=area*1e6, dispRange=100) for area in (10, 20, 40, 80, 160, 320)]
+    # Memory decreasing with the pair size: the constrained optimum is a constant
+    for dicFeat in lstFeat: objRes.Record(dicFeat, (10-dicFeat['area']*0.01)*1024**3, 60)
+    vectCoef=objRes.dicCoef['rss']
+    assert (vectCoef>=0).all() and (vectCoef[1:]<1e-9).all()
+    assert abs(vectCoef[0]-np.mean([10-dicFeat['area']*0.01 for dicFeat in lstFeat]))<1e-6
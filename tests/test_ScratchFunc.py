@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Scratch directory (BlockProc.ScratchFunc).
+'''
+import os
+
+from BlockProc import ScratchFunc
+
+def test_written_per_pair(tmp_path):
+    objScratch=ScratchFunc.ScratchDir(str(tmp_path/'scratch'))
+    (tmp_path/'scratch'/'kept.tif').write_bytes(b'0'*100)
+    objScratch.Mark()
+    (tmp_path/'scratch'/'new.tif').write_bytes(b'0'*30)
+    os.makedirs(tmp_path/'scratch'/'sub')
+    (tmp_path/'scratch'/'sub'/'new.tif').write_bytes(b'0'*20)
+    assert objScratch.Written()==50
+    # Rewritten file counted, held bytes unchanged
+    (tmp_path/'scratch'/'kept.tif').write_bytes(b'1'*100)
+    os.utime(tmp_path/'scratch'/'kept.tif', ns=(0, 1))
+    assert objScratch.Written()==150
+    assert objScratch.Clean()==150 and objScratch.Usage()==0
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Tool command records (BlockProc.TelemetryFunc).
+'''
+import json
+
+from BlockProc import TelemetryFunc
+
+def _Rec(mode, wall, user, peak, read):
+    recCur={'run': 'r1', 'time': 0, 'tool': 'AspPython', 'fun': 'stereo', 'backend': 'docker', 'mode': mode,
+            'stage': 'Dense matching', 'caller': None, 'rc': 0, 'wall': wall, 'user': user, 'sys': 0,
+            'peak': peak, 'read': read, 'write': 0, 'args': ''}
+    if mode=='session': recCur['scope']='container'
+    return recCur
+
+def test_report_container_wide(tmp_path):
+    pathRecord=tmp_path/'Telemetry.jsonl'
+    lstRec=[_Rec('session', 10, 100, 8*1024**3, 4*1024**3), _Rec('session', 10, 100, 8*1024**3, 4*1024**3), _Rec('container', 5, 7, 1024**3, 1024**3)]
+    pathRecord.write_text(''.join([json.dumps(recCur)+'\n' for recCur in lstRec]))
+    strOut=TelemetryFunc.Report(str(pathRecord), lstKey=('stage',))
+    assert '2 session commands with container-wide counters' in strOut
+    lineGrp=[lineCur for lineCur in strOut.splitlines() if lineCur.startswith('Dense matching')][0]
+    # Calls, wall, wall%, mean, commands, CPU, peak, IO, fail
+    assert lineGrp.split()[2:]==['3', '25.0', '100.0', '8.33', '1', '7.0', '1.00', '1.00', '0']
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Tile dependencies of the incremental rebuild (BlockProc.TileFunc).
+'''
+from BlockProc import TileFunc
+
+def test_neighbour_keys():
+    setNeigh=TileFunc.NeighbourKeys({'3_5'})
+    assert len(setNeigh)==8 and not '3_5' in setNeigh
+    assert {'2_4', '4_6', '3_6'}<=setNeigh
+    assert TileFunc.NeighbourKeys({'3_5', '4_5'})=={'%i_%i'% (x, y) for x in (2, 3, 4, 5) for y in (4, 5, 6)}-{'3_5', '4_5'}
+
+def test_index_update(tmp_path):
+    pathPC=str(tmp_path/'pc.las')
+    with open(pathPC, 'w') as fileOut: fileOut.write('pc')
+    objIdx=TileFunc.TileIndex(str(tmp_path/'index.json'), 10)
+    assert objIdx.Update({pathPC: [100, 100, 900, 900]})=={'0_1'}
+    assert objIdx.Update({pathPC: [100, 100, 900, 900]})==set()
+    # Removed pair: its tiles are dirty
+    assert objIdx.Update({})=={'0_1'}
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-'''
+'''
+Native triangulation (BlockProc.TriangFunc).
+'''
+import numpy as np
+import rasterio
+
+from BlockProc import TriangFunc, ShmFunc, RasterFunc, GeomFunc
+
+def _Cam(pathOut, cx):
+    '''Epipolar TSAI camera without distortion'''
+    with open(pathOut, 'w') as fileOut:
+        fileOut.write('\n'.join(['VERSION_4', 'PINHOLE', 'fu = 0.7', 'fv = 0.7', 'cu = 0.5', 'cv = 0.5',
+                                  'u_direction = 1 0 0', 'v_direction = 0 1 0', 'w_direction = 0 0 1',
+                                  'C = %.1f 0 -10000'% cx, 'R = 1 0 0 0 1 0 0 0 1', 'pitch = 0.001', 'NULL'])+'\n')
+    return pathOut
+
+def _Disp(nbRow=2999, nbCol=1200):
+    '''Disparity alternating per row so the subsample median depends on the sampled rows'''
+    matDisp=np.zeros((3, nbRow, nbCol), dtype=np.float32)
+    matDisp[0]=-100
+    matDisp[0, 1::2]=-110
+    matDisp[2]=1
+    return matDisp
+
+def test_offset_shm_file(tmp_path):
+    prefIn=str(tmp_path/'run')
+    lstPathCam=[_Cam(prefIn+'-L.tsai', 0), _Cam(prefIn+'-R.tsai', 1000)]
+    matDisp=_Disp()
+    RasterFunc.WriteRaster(prefIn+'-F.tif', matDisp)
+    assert not TriangFunc.Triangulate(prefIn, lstPathCam, nbProc=2)
+    with rasterio.open(prefIn+'-PC.tif') as imgIn:
+        strFile=imgIn.tags()['POINT_OFFSET']
+    with ShmFunc.ShmChannel() as objShm:
+        objShm.Put(prefIn+'-F.tif', matDisp)
+        assert not TriangFunc.Triangulate(prefIn, lstPathCam, nbProc=2, shm=objShm, write=False)
+        strShm=objShm.Desc(prefIn+'-PC.tif')['meta']['POINT_OFFSET']
+    assert strFile==strShm
+
+def _CamNadir(pathOut, y):
+    '''Epipolar camera 500 km above (lon 0, lat 0), rows along ECEF Y, looking down -X'''
+    with open(pathOut, 'w') as fileOut:
+        fileOut.write('\n'.join(['VERSION_4', 'PINHOLE', 'fu = 0.7', 'fv = 0.7', 'cu = 0.001', 'cv = 0.00075',
+                                 'u_direction = 1 0 0', 'v_direction = 0 1 0', 'w_direction = 0 0 1',
+                                 'C = 6878137 %.1f 0'% y, 'R = 0 0 -1 1 0 0 0 -1 0', 'pitch = 0.00001', 'NULL'])+'\n')
+    return pathOut
+
+def test_geometry_ramp(tmp_path):
+    prefIn=str(tmp_path/'run')
+    lstPathCam=[_CamNadir(prefIn+'-L.tsai', -50e3), _CamNadir(prefIn+'-R.tsai', 50e3)]
+    lstCam=[GeomFunc.TSAIin(pathCam) for pathCam in lstPathCam]
+    # Sloped ground X=a+250+0.2*(Y+50 km) seen by every left pixel, projected into the right camera
+    nbRow, nbCol=150, 200
+    matRow, matCol=np.mgrid[0:nbRow, 0:nbCol]
+    ptsL=np.array([matCol.flatten(), matRow.flatten()], dtype=float).T
+    matDir=TriangFunc.RayDir(lstCam[0], ptsL)
+    vectC=lstCam[0].vectX0.flatten()
+    vectT=(6378137+250+0.2*(vectC[1]+50e3)-vectC[0])/(matDir[:,0]-0.2*matDir[:,1])
+    matGround=vectC+vectT[:,np.newaxis]*matDir
+    ptsR_h=(lstCam[1].matP@np.append(matGround, np.ones([matGround.shape[0], 1]), axis=1).T).T
+    ptsR=ptsR_h[:,:2]/ptsR_h[:,[2]]
+    matDisp=np.ones((3, nbRow, nbCol), dtype=np.float32)
+    matDisp[:2]=(ptsR-ptsL).T.reshape(2, nbRow, nbCol)
+    assert np.abs(matDisp[1]).max()<1e-3 and np.ptp(matDisp[0])>0
+    RasterFunc.WriteRaster(prefIn+'-F.tif', matDisp)
+
+    assert not TriangFunc.Triangulate(prefIn, lstPathCam, nbProc=2)
+    with rasterio.open(prefIn+'-PC.tif') as imgIn:
+        matPC=imgIn.read()
+        vectOff=np.array([float(v) for v in imgIn.tags()['POINT_OFFSET'].split()])
+    matPts=matPC[:3].reshape(3, -1).T.astype(float)+vectOff
+    # float32 disparity and point cloud: centimetre level at 500 km
+    assert np.abs(matPts-matGround).max()<0.05
+    assert matPC[3].max()<0.05
+    # Heights of the ramp
+    vectH=GeomFunc.Cart2Geo_Elli(matPts)[:,2]
+    vectHRef=GeomFunc.Cart2Geo_Elli(matGround)[:,2]
+    assert np.ptp(vectHRef)>100 and np.abs(vectH-vectHRef).max()<0.05